@@ -59,6 +59,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'projects.middleware.RequestCacheMiddleware',
 ]
 
 # ✅ CONFIGURACIONES DE SEGURIDAD
@@ -151,6 +152,44 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# ========================
+#  EVM
+# ========================
+# Backend de series EVM: 'decimal' (exacto) o 'numpy' (vectorizado, requiere numpy)
+EVM_SERIES_BACKEND = os.getenv('EVM_SERIES_BACKEND', 'decimal')
+
+# ========================
+#  CACHÉ
+# ========================
+# Debe ser COMPARTIDA por todos los procesos (workers de gunicorn, run_jobs y
+# comandos como import_chunked): los contadores de generación de
+# ProjectCacheVersion viven aquí y un cambio hecho en un proceso tiene que
+# invalidar las entradas de los demás. CACHE_URL (ver env.example):
+# redis://... -> Redis; locmem:// -> memoria del proceso (solo desarrollo);
+# sin definir -> archivos en CACHE_DIR, compartidos entre procesos del servidor.
+CACHE_URL = os.getenv('CACHE_URL', '')
+if 'test' in sys.argv or CACHE_URL.startswith('locmem://'):
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+elif CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CACHE_URL}}
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_DIR', str(BASE_DIR / 'cache')),
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
+# TTL (segundos) de cachés versionadas por proyecto (dashboard, logística, navegación).
+# Se invalidan al escribir datos del proyecto, así que pueden vivir horas, pero
+# SOLO con una caché compartida: con LocMemCache cada proceso tiene sus propios
+# contadores y ProjectCacheVersion.timeout() usa LOCAL_CACHE_TTL (minutos).
+PROJECT_CACHE_TTL = int(os.getenv('PROJECT_CACHE_TTL', 6 * 60 * 60))
+LOCAL_CACHE_TTL = int(os.getenv('LOCAL_CACHE_TTL', 300))
+# Tamaño máximo (bytes, comprimido) de cada payload de caché; los mayores no se guardan
+CACHE_PAYLOAD_MAX_BYTES = int(os.getenv('CACHE_PAYLOAD_MAX_BYTES', 256 * 1024))
+
 # ✅ LOGGING DE SEGURIDAD
 LOGGING = {
     'version': 1,
@@ -229,4 +268,10 @@ else:
 if os.path.exists(TESSERACT_CMD):
     print(f"[OK] Tesseract configurado")
 else:
-    print(f"[WARN] Tesseract no encontrado - OCR no funcionara")
\ No newline at end of file
+    print(f"[WARN] Tesseract no encontrado - OCR no funcionara")
+
+# OCR de facturas escaneadas (InvoiceOCRPipeline): resolución de rasterizado,
+# procesos para OCR en paralelo y máximo de páginas a leer por archivo
+INVOICE_OCR_DPI = int(os.getenv('INVOICE_OCR_DPI', 200))
+INVOICE_OCR_WORKERS = int(os.getenv('INVOICE_OCR_WORKERS', 2))
+INVOICE_OCR_MAX_PAGES = int(os.getenv('INVOICE_OCR_MAX_PAGES', 5))
\ No newline at end of file
@@ -1,4 +1,6 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.shortcuts import redirect, render
+from django.urls import path, reverse
 from import_export.admin import ImportExportModelAdmin
 
 from .models import (
@@ -7,7 +9,8 @@ from .models import (
     Billing, Hoursrecord,
     PurchaseOrder, PODetailProduct, PODetailSupplier, Invoice,
     BudgetChange,
-    ProjectBaseline, ProjectMonthlyBaseline, ProjectActivity, ClientInvoice
+    ProjectBaseline, ProjectMonthlyBaseline, ProjectActivity, ClientInvoice,
+    BackgroundJob, InvoiceParseCache
 )
 
 # ✅ IMPORTAR RESOURCES DESDE resources.py
@@ -318,6 +321,46 @@ class ClientInvoiceAdmin(ImportExportModelAdmin):
     search_fields = ("project__cod_projects__cod_projects", "invoice_number")
     list_filter = ("status", "invoice_date", "bank_verified_date", "fully_paid_date", "project")
     ordering = ("-invoice_date", "project")
+    import_export_change_list_template = "admin/projects/clientinvoice/change_list_ingest.html"
+    actions = ["emitir_borradores"]
+
+    def get_urls(self):
+        urls = [
+            path("ingest/", self.admin_site.admin_view(self.ingest_view), name="projects_clientinvoice_ingest"),
+        ]
+        return urls + super().get_urls()
+
+    def ingest_view(self, request):
+        """Sube un .zip de facturas y encola su ingesta (manage.py run_jobs)."""
+        from .services.background_jobs import BackgroundJobService
+
+        if request.method == "POST":
+            upload = request.FILES.get("file")
+            if not upload or not upload.name.lower().endswith(".zip"):
+                messages.error(request, "Seleccione un archivo .zip")
+            else:
+                job = BackgroundJobService.enqueue("ingest_client_invoices", params={
+                    "path": BackgroundJobService.store_upload(upload, "invoice_batches"),
+                    "status": "EMITIDA" if request.POST.get("status") == "EMITIDA" else "BORRADOR",
+                    "dry_run": request.POST.get("dry_run") == "1",
+                }, user=request.user)
+                messages.success(request, f"Lote encolado como trabajo #{job.pk}; el reporte por archivo queda en su resultado")
+                return redirect(reverse("admin:projects_backgroundjob_change", args=[job.pk]))
+        return render(request, "admin/projects/clientinvoice/ingest_batch.html", {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Importar lote de facturas",
+        })
+
+    @admin.action(description="Emitir borradores revisados")
+    def emitir_borradores(self, request, queryset):
+        # save() por factura: mantiene el resumen financiero del proyecto
+        emitted = 0
+        for invoice in queryset.filter(status="BORRADOR"):
+            invoice.status = "EMITIDA"
+            invoice.save()
+            emitted += 1
+        self.message_user(request, f"{emitted} facturas emitidas")
     
     def get_import_formats(self):
         from import_export.formats import base_formats
@@ -325,4 +368,34 @@ class ClientInvoiceAdmin(ImportExportModelAdmin):
     
     def get_export_formats(self):
         from import_export.formats import base_formats
-        return [base_formats.XLSX, base_formats.CSV]
\ No newline at end of file
+        return [base_formats.XLSX, base_formats.CSV]
+
+
+# ------------------------------
+# TRABAJOS EN SEGUNDO PLANO (worker: manage.py run_jobs)
+# ------------------------------
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "status", "progress", "attempts", "max_attempts", "created_by", "created_at", "finished_at")
+    list_filter = ("status", "kind")
+    search_fields = ("kind", "message", "error")
+    ordering = ("-created_at",)
+    readonly_fields = ("attempts", "locked_by", "started_at", "finished_at", "result", "error")
+    actions = ["retry_jobs"]
+
+    @admin.action(description="Reintentar trabajos fallidos")
+    def retry_jobs(self, request, queryset):
+        retried = sum(1 for job in queryset.filter(status='FAILED') if job.retry())
+        self.message_user(request, f"{retried} trabajos reencolados")
+
+
+# ------------------------------
+# CACHÉ DE LECTURA DE FACTURAS (PDF/OCR)
+# ------------------------------
+@admin.register(InvoiceParseCache)
+class InvoiceParseCacheAdmin(admin.ModelAdmin):
+    list_display = ("file_name", "parser_version", "hits", "created_at", "last_used_at")
+    list_filter = ("parser_version",)
+    search_fields = ("file_name", "sha256")
+    ordering = ("-last_used_at",)
+    readonly_fields = ("sha256", "parser_version", "data", "hits", "created_at", "last_used_at")
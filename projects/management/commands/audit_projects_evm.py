@@ -1,12 +1,19 @@
 import os
 import csv
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 
 from projects.models.projects import Projects
-from projects.models.oc import PurchaseOrder
-from projects.services.earned_value.calculator import EarnedValueCalculator
-from projects.services.earned_value.activity_calculator import ActivityCalculator
+from projects.services.portfolio_audit import (
+    SUMMARY_FIELDS, SERIES_FIELDS, audit_shard, changed_project_ids, date_sensitive_project_ids,
+    init_worker,
+)
 
 
 class Command(BaseCommand):
@@ -15,6 +22,16 @@ class Command(BaseCommand):
         "detecta datos faltantes y exporta CSVs (resumen y series)."
     )
 
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Procesos en paralelo, cada uno con su conexión a BD (default: 1, en serie)')
+        parser.add_argument('--shard-size', type=int, default=0,
+                            help='Proyectos por grupo en modo paralelo (default: reparto automático)')
+        parser.add_argument('--since',
+                            help="Re-auditar solo proyectos con datos cambiados desde esta fecha/hora ISO "
+                                 "o 'last' (fecha del último CSV), más los en progreso; el resto se copia "
+                                 "de los CSV anteriores si son del mismo mes")
+
     def handle(self, *args, **options):
         reports_dir = os.path.join(settings.BASE_DIR, 'projects', 'reports')
         os.makedirs(reports_dir, exist_ok=True)
@@ -22,138 +39,132 @@ class Command(BaseCommand):
         summary_path = os.path.join(reports_dir, 'evm_audit_summary.csv')
         series_path = os.path.join(reports_dir, 'evm_graph_data.csv')
 
-        summary_fields = [
-            'project_id', 'cost_center', 'state', 'start_date', 'duration_months',
-            'bac', 'bac_source', 'physical_progress_percent', 'activities_count', 'weights_valid_100',
-            'po_count', 'pv_last', 'ev_last', 'ac_last', 'cpi', 'spi', 'eac', 'etc', 'vac',
-            'pmi_compliant', 'missing_data'
-        ]
-        series_fields = ['project_id', 'month_index', 'pv', 'ev', 'ac']
-
-        projects_qs = Projects.objects.select_related('cod_projects').all().order_by('cod_projects_id')
-
-        with open(summary_path, 'w', newline='', encoding='utf-8') as fsum, \
-             open(series_path, 'w', newline='', encoding='utf-8') as fser:
-            summary_writer = csv.DictWriter(fsum, fieldnames=summary_fields)
-            series_writer = csv.DictWriter(fser, fieldnames=series_fields)
+        project_ids = list(Projects.objects.order_by('cod_projects_id').values_list('cod_projects_id', flat=True))
+        to_audit, preserved = project_ids, {}
+
+        # ✅ --since: copiar del CSV anterior los proyectos sin cambios
+        if options.get('since'):
+            since = self._parse_since(options['since'], summary_path)
+            previous = self._read_previous(summary_path, series_path)
+            computed_at = self._computed_at(summary_path)
+            now = timezone.localtime()
+            if previous is None:
+                self.stdout.write(self.style.WARNING('Sin CSV anteriores: se audita todo el portafolio'))
+            elif (computed_at.year, computed_at.month) != (now.year, now.month):
+                # PV y SPI dependen del mes de cálculo: las filas anteriores ya no valen
+                self.stdout.write(self.style.WARNING(
+                    f'CSV anteriores de {computed_at:%Y-%m}: se audita todo el portafolio'
+                ))
+            else:
+                changed = changed_project_ids(since) | date_sensitive_project_ids(computed_at.date())
+                to_audit = [pid for pid in project_ids if pid in changed or pid not in previous]
+                audit_set = set(to_audit)
+                preserved = {pid: previous[pid] for pid in project_ids if pid not in audit_set}
+                self.stdout.write(
+                    f'Cambios desde {since:%Y-%m-%d %H:%M}: {len(to_audit)} a auditar, {len(preserved)} sin cambios'
+                )
+
+        workers = max(1, options['workers'])
+        position = {pid: i for i, pid in enumerate(project_ids)}
+        next_index = 0
+
+        # Escribir en temporales y reemplazar al final: un fallo no deja CSV a medias
+        with open(summary_path + '.tmp', 'w', newline='', encoding='utf-8') as fsum, \
+             open(series_path + '.tmp', 'w', newline='', encoding='utf-8') as fser:
+            summary_writer = csv.DictWriter(fsum, fieldnames=SUMMARY_FIELDS)
+            series_writer = csv.DictWriter(fser, fieldnames=SERIES_FIELDS)
             summary_writer.writeheader()
             series_writer.writeheader()
 
-            for p in projects_qs:
-                project_id = p.cod_projects_id
-
-                # BAC
-                missing_bac = False
-                bac_source = 'Missing'
-                bac_val = 0.0
-                try:
-                    bac_real = EarnedValueCalculator.get_bac_real(p)
-                    bac_val = float(bac_real)
-                    if hasattr(p.cod_projects, 'presale'):
-                        bac_source = 'Presale.total_cost'
-                    elif getattr(p.cod_projects, 'cost_aprox_chance', None):
-                        bac_source = 'Chance.cost_aprox_chance'
-                    else:
-                        bac_source = 'Unknown'
-                except Exception:
-                    missing_bac = True
-
-                duration = p.estimated_duration or 0
-                start_date_iso = p.start_date.isoformat() if p.start_date else ''
-                missing_start_date = p.start_date is None
-
-                po_count = PurchaseOrder.objects.filter(project_code=p).count()
-                missing_purchase_orders = po_count == 0
-
-                # Avance físico y validaciones de actividades
-                try:
-                    phys = ActivityCalculator.get_physical_progress_detail(project_id)
-                    activities_count = phys.get('activities_count', 0)
-                    weights_valid = bool(phys.get('weights_valid', False))
-                    physical_progress = float(phys.get('total_physical_progress', 0.0))
-                except Exception:
-                    activities_count = 0
-                    weights_valid = False
-                    physical_progress = 0.0
-
-                missing_activities = activities_count == 0
-                invalid_weights = not weights_valid
-
-                # Métricas EVM y curvas
-                try:
-                    evm = EarnedValueCalculator.calculate_earned_value(project_id)
-                    metrics = evm.get('metrics', {})
-                    curve = evm.get('curve_data', {'months': [], 'pv': [], 'ev': [], 'ac': []})
-                    pmi_compliant = bool(evm.get('pmi_compliant', False))
-                except Exception:
-                    metrics = {
-                        'cpi': 1.0, 'spi': 1.0, 'cv': 0.0, 'sv': 0.0,
-                        'eac': bac_val, 'vac': bac_val - bac_val, 'etc': bac_val
-                    }
-                    curve = {
-                        'months': list(range(1, (duration or 0) + 1)),
-                        'pv': [0.0] * (duration or 0),
-                        'ev': [0.0] * (duration or 0),
-                        'ac': [0.0] * (duration or 0)
-                    }
-                    pmi_compliant = False
-
-                pv_last = float(curve['pv'][-1]) if curve['pv'] else 0.0
-                ev_last = float(curve['ev'][-1]) if curve['ev'] else 0.0
-                ac_last = float(curve['ac'][-1]) if curve['ac'] else 0.0
-
-                missing_data_flags = []
-                if missing_bac:
-                    missing_data_flags.append('Falta BAC (Presale/Chance)')
-                if missing_start_date:
-                    missing_data_flags.append('Falta start_date')
-                if missing_purchase_orders:
-                    missing_data_flags.append('Sin OC/AC')
-                if missing_activities:
-                    missing_data_flags.append('Sin actividades')
-                if invalid_weights:
-                    missing_data_flags.append('Pesos != 100%')
-
-                summary_writer.writerow({
-                    'project_id': project_id,
-                    'cost_center': p.cost_center,
-                    'state': p.state_projects,
-                    'start_date': start_date_iso,
-                    'duration_months': duration,
-                    'bac': round(bac_val, 2),
-                    'bac_source': bac_source,
-                    'physical_progress_percent': round(physical_progress, 2),
-                    'activities_count': activities_count,
-                    'weights_valid_100': 1 if weights_valid else 0,
-                    'po_count': po_count,
-                    'pv_last': round(pv_last, 2),
-                    'ev_last': round(ev_last, 2),
-                    'ac_last': round(ac_last, 2),
-                    'cpi': round(float(metrics.get('cpi', 0.0)), 4),
-                    'spi': round(float(metrics.get('spi', 0.0)), 4),
-                    'eac': round(float(metrics.get('eac', 0.0)), 2),
-                    'etc': round(float(metrics.get('etc', 0.0)), 2),
-                    'vac': round(float(metrics.get('vac', 0.0)), 2),
-                    'pmi_compliant': 1 if pmi_compliant else 0,
-                    'missing_data': '; '.join(missing_data_flags)
-                })
-
-                months = curve.get('months', [])
-                pv_series = curve.get('pv', [])
-                ev_series = curve.get('ev', [])
-                ac_series = curve.get('ac', [])
-                for idx, m in enumerate(months):
-                    series_writer.writerow({
-                        'project_id': project_id,
-                        'month_index': m,
-                        'pv': round(float(pv_series[idx]) if idx < len(pv_series) else 0.0, 2),
-                        'ev': round(float(ev_series[idx]) if idx < len(ev_series) else 0.0, 2),
-                        'ac': round(float(ac_series[idx]) if idx < len(ac_series) else 0.0, 2),
-                    })
+            def write_preserved(until):
+                # Proyectos sin cambios, en orden, hasta la posición `until`
+                nonlocal next_index
+                while next_index < until:
+                    pid = project_ids[next_index]
+                    if pid in preserved:
+                        summary_writer.writerow(preserved[pid][0])
+                        series_writer.writerows(preserved[pid][1])
+                    next_index += 1
+
+            # ✅ Un único escritor: los grupos llegan en orden a medida que terminan
+            for rows in self._audit_results(to_audit, project_ids, workers, options['shard_size']):
+                for project_id, summary, series in rows:
+                    index = position.get(project_id)
+                    if index is not None:
+                        write_preserved(index)
+                        next_index = index + 1
+                    summary_writer.writerow(summary)
+                    series_writer.writerows(series)
+            write_preserved(len(project_ids))
+
+        os.replace(summary_path + '.tmp', summary_path)
+        os.replace(series_path + '.tmp', series_path)
 
         self.stdout.write(self.style.SUCCESS(f'CSV generado: {summary_path}'))
         self.stdout.write(self.style.SUCCESS(f'CSV series: {series_path}'))
         self.stdout.write(self.style.WARNING(
             'Fórmulas: EV=BAC*(avance físico), PV según cronograma (lineal acumulado), AC acumulado por OCs; '
             'CPI=EV/AC; SPI=EV/PV; EAC=BAC/CPI; ETC=EAC-AC; VAC=BAC-EAC'
-        ))
\ No newline at end of file
+        ))
+
+    def _audit_results(self, to_audit, project_ids, workers, shard_size):
+        """Genera, grupo a grupo y en orden de id, las filas de los proyectos a auditar."""
+        if not to_audit:
+            return
+        if workers == 1:
+            # En serie: todo en un solo grupo (número fijo de consultas)
+            yield audit_shard(None if len(to_audit) == len(project_ids) else to_audit)
+            return
+
+        # Grupos contiguos más pequeños que N/workers para repartir la carga
+        size = shard_size or max(1, -(-len(to_audit) // (workers * 4)))
+        shards = [to_audit[i:i + size] for i in range(0, len(to_audit), size)]
+        self.stdout.write(f'Auditoría en paralelo: {len(shards)} grupos en {workers} procesos')
+
+        # Las conexiones del padre no se comparten con los procesos hijos
+        connections.close_all()
+        start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=init_worker,
+            initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'core.settings'),),
+        ) as pool:
+            for i, rows in enumerate(pool.map(audit_shard, shards), start=1):
+                self.stdout.write(f'   Grupo {i}/{len(shards)}: {len(rows)} proyectos')
+                yield rows
+
+    @staticmethod
+    def _computed_at(summary_path):
+        """Fecha/hora (aware) en que se generó el último resumen; 1970 si no existe."""
+        if not os.path.exists(summary_path):
+            return timezone.make_aware(datetime.min.replace(year=1970))
+        return datetime.fromtimestamp(os.path.getmtime(summary_path), tz=timezone.get_current_timezone())
+
+    @staticmethod
+    def _parse_since(value, summary_path):
+        """Fecha/hora ISO, fecha ISO (inicio del día) o 'last' (mtime del último resumen)."""
+        if value == 'last':
+            return Command._computed_at(summary_path)
+        since = parse_datetime(value)
+        if since is None:
+            day = parse_date(value)
+            if day is None:
+                raise CommandError(f"--since inválido: {value} (use YYYY-MM-DD[THH:MM] o 'last')")
+            since = datetime.combine(day, time.min)
+        return since if timezone.is_aware(since) else timezone.make_aware(since)
+
+    @staticmethod
+    def _read_previous(summary_path, series_path):
+        """{project_id: (fila de resumen, [filas de serie])} de los CSV anteriores; None si faltan."""
+        if not (os.path.exists(summary_path) and os.path.exists(series_path)):
+            return None
+        previous = {}
+        with open(summary_path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                previous[row['project_id']] = (row, [])
+        with open(series_path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                if row['project_id'] in previous:
+                    previous[row['project_id']][1].append(row)
+        return previous
@@ -0,0 +1,77 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from projects import resources
+from projects.services.chunked_import import ChunkedImportService
+
+# nombre en línea de comandos -> resource de import_export (mismo que usa el admin)
+RESOURCES = {
+    'clientes': resources.CostumerResource,
+    'suppliers': resources.SupplierResource,
+    'products': resources.ProductResource,
+    'chances': resources.ChanceResource,
+    'purchase_orders': resources.PurchaseOrderResource,
+    'po_details': resources.PODetailProductResource,
+    'invoices': resources.InvoiceResource,
+    'po_suppliers': resources.PODetailSupplierResource,
+    'activities': resources.ProjectActivityResource,
+    'client_invoices': resources.ClientInvoiceResource,
+    'baselines': resources.ProjectMonthlyBaselineResource,
+}
+
+
+class Command(BaseCommand):
+    help = "Importa CSV/XLSX grandes por bloques (cada bloque en su propia transacción)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('resource', choices=sorted(RESOURCES), help='Tipo de dato a importar')
+        parser.add_argument('archivo', type=str, help='Archivo CSV o XLSX')
+        parser.add_argument('--chunk-size', type=int, default=ChunkedImportService.CHUNK_SIZE,
+                            help=f'Filas por bloque/transacción (default: {ChunkedImportService.CHUNK_SIZE})')
+        parser.add_argument('--sheet', help='Hoja del XLSX (default: la activa)')
+        parser.add_argument('--encoding', default='utf-8-sig', help='Codificación del CSV (default: utf-8-sig)')
+        parser.add_argument('--delimiter', help='Separador del CSV (default: autodetectar)')
+        parser.add_argument('--dry-run', action='store_true', help='Validar sin guardar')
+        parser.add_argument('--debug', action='store_true', help='Log fila a fila del resource')
+
+    def handle(self, *args, **options):
+        archivo = options['archivo']
+        if not os.path.exists(archivo):
+            raise CommandError(f'Archivo no encontrado: {archivo}')
+
+        self.stdout.write(self.style.WARNING(
+            f"📊 Importando {options['resource']} desde {archivo} en bloques de {options['chunk_size']}"
+            + (' (dry-run)' if options['dry_run'] else '')
+        ))
+
+        def progress(info):
+            totals = info['totals']
+            self.stdout.write(
+                f"   📦 Bloque {info['chunk']}: {info['rows']} filas leídas | "
+                f"nuevas {totals.get('new', 0)} | actualizadas {totals.get('update', 0)} | "
+                f"omitidas {totals.get('skip', 0)} | bloques con error {info['chunk_errors']}"
+            )
+
+        try:
+            info = ChunkedImportService.run(
+                RESOURCES[options['resource']], archivo,
+                chunk_size=options['chunk_size'],
+                dry_run=options['dry_run'],
+                sheet=options.get('sheet'),
+                encoding=options['encoding'],
+                delimiter=options.get('delimiter'),
+                progress=progress,
+                debug=options['debug'],
+            )
+        except (ValueError, KeyError, UnicodeDecodeError) as e:
+            raise CommandError(str(e))
+
+        for row_number, message in info['errors'][:20]:
+            self.stdout.write(self.style.ERROR(f"   ❌ Fila {row_number or '-'}: {message}"))
+        if len(info['errors']) > 20:
+            self.stdout.write(self.style.ERROR(f"   ... y {len(info['errors']) - 20} errores más"))
+
+        style = self.style.SUCCESS if not info['chunk_errors'] else self.style.WARNING
+        self.stdout.write(style(
+            f"✅ {info['rows']} filas en {info['chunk']} bloques; "
+            f"{info['chunk_errors']} bloques revertidos por errores ({info['rolled_back_rows']} filas)"
+        ))
@@ -0,0 +1,58 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from projects.services.invoice_management.batch_ingest import ClientInvoiceBatchIngestService
+
+
+class Command(BaseCommand):
+    help = (
+        "Lee una carpeta o .zip de facturas de cliente (PDF/imagen) en paralelo, "
+        "las asigna a proyectos por número/RUC/cliente y crea las facturas en lote"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('origen', type=str, help='Carpeta o archivo .zip con las facturas')
+        parser.add_argument('--workers', type=int, default=ClientInvoiceBatchIngestService.DEFAULT_WORKERS,
+                            help=f'Archivos leídos en paralelo (default: {ClientInvoiceBatchIngestService.DEFAULT_WORKERS})')
+        parser.add_argument('--status', choices=['BORRADOR', 'EMITIDA'], default='BORRADOR',
+                            help='Estado de las facturas creadas (default: BORRADOR, para revisión)')
+        parser.add_argument('--report', help='CSV de reporte por archivo (default: <origen>_reporte.csv)')
+        parser.add_argument('--dry-run', action='store_true', help='Leer y asignar sin crear facturas')
+
+    def handle(self, *args, **options):
+        origen = options['origen'].rstrip('/\\')
+        if not os.path.exists(origen):
+            raise CommandError(f'No existe: {origen}')
+        report_path = options.get('report') or f"{os.path.splitext(origen)[0]}_reporte.csv"
+
+        self.stdout.write(self.style.WARNING(
+            f"📄 Leyendo facturas de {origen} con {options['workers']} hilos"
+            + (' (dry-run)' if options['dry_run'] else '')
+        ))
+
+        def progress(done, total):
+            if done == total or done % 10 == 0:
+                self.stdout.write(f"   {done}/{total} archivos leídos")
+
+        try:
+            result = ClientInvoiceBatchIngestService.run(
+                origen,
+                workers=options['workers'],
+                status=options['status'],
+                dry_run=options['dry_run'],
+                progress=progress,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        ClientInvoiceBatchIngestService.write_report(result['rows'], report_path)
+        for row in result['rows']:
+            if row['status'] in ('review', 'error'):
+                self.stdout.write(self.style.ERROR(f"   ❌ {row['file']}: {row['reason']}"))
+
+        totals = result['totals']
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {len(result['rows'])} archivos | creadas {totals.get('created', 0)} | "
+            f"listas (dry-run) {totals.get('parsed', 0)} | duplicadas {totals.get('duplicate', 0)} | "
+            f"a revisar {totals.get('review', 0)} | con error {totals.get('error', 0)}"
+        ))
+        self.stdout.write(self.style.SUCCESS(f'Reporte: {report_path}'))
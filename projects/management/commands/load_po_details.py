@@ -6,14 +6,18 @@ Orden: 5 (Último - después de todo lo demás)
 
 import csv
 import os
+from decimal import Decimal, InvalidOperation
 from django.core.management.base import BaseCommand, CommandError
-from projects.models import PurchaseOrder, PODetailProduct, Product
+from projects.models import PurchaseOrder, PODetailProduct, Product, Supplier
+from projects.services.po_detail_bulk import PODetailBulkService
 
 class Command(BaseCommand):
     help = 'Carga detalles de productos desde archivo CSV (Orden: 5 - Último)'
 
     def add_arguments(self, parser):
         parser.add_argument('archivo_csv', type=str, help='Archivo CSV con detalles de productos')
+        parser.add_argument('--batch-size', type=int, default=PODetailBulkService.BATCH_SIZE,
+                            help=f'Filas por bulk_create/bulk_update (default: {PODetailBulkService.BATCH_SIZE})')
 
     def handle(self, *args, **options):
         archivo_csv = options['archivo_csv']
@@ -23,129 +27,105 @@ class Command(BaseCommand):
         
         self.stdout.write(self.style.WARNING(f'📊 Cargando detalles de productos desde: {archivo_csv}'))
         
-        detalles_creados = 0
-        detalles_existentes = 0
         errores = 0
         pos_no_encontradas = 0
+        unidades = {value for value, _ in PODetailProduct._meta.get_field('measurement_unit').choices}
         
+        # 1. Leer y limpiar todas las filas (sin tocar la BD)
+        filas = []
         with open(archivo_csv, 'r', encoding='utf-8') as file:
             reader = csv.DictReader(file)
             
             for row_num, row in enumerate(reader, start=2):
-                try:
-                    # Limpiar y validar datos
-                    po_number = str(row.get('purchase_order', '')).strip()
-                    product_name = str(row.get('product_name', '')).strip()
-                    quantity_str = str(row.get('quantity', '1')).strip()
-                    unit_price_str = str(row.get('unit_price', '0')).strip()
-                    measurement_unit = str(row.get('measurement_unit', 'unit')).strip()
-                    currency = str(row.get('currency', 'USD')).strip().upper()
-                    
-                    if not po_number or not product_name:
-                        self.stdout.write(self.style.WARNING(f'⚠️  Fila {row_num}: PO Number o Product Name faltante'))
-                        errores += 1
-                        continue
-                    
-                    # Parsear cantidad y precio
-                    try:
-                        quantity = float(quantity_str)
-                    except:
-                        quantity = 1.0
-                    
-                    try:
-                        unit_price = float(unit_price_str)
-                    except:
-                        unit_price = 0.0
-                    
-                    # Buscar Purchase Order
-                    try:
-                        po = PurchaseOrder.objects.get(po_number=po_number)
-                    except PurchaseOrder.DoesNotExist:
-                        self.stdout.write(self.style.ERROR(f'❌ Purchase Order no encontrada: {po_number}'))
-                        pos_no_encontradas += 1
-                        continue
-                    
-                    # Buscar o crear Product
-                    product, product_creado = Product.objects.get_or_create(
-                        name_product=product_name,
-                        defaults={
-                            'code_product': product_name[:20].upper().replace(' ', '_'),
-                            'measurement_unit': measurement_unit
-                        }
-                    )
-                    
-                    if product_creado:
-                        self.stdout.write(self.style.SUCCESS(f'✅ Producto creado: {product_name}'))
-                    
-                    # Crear o actualizar detalle
-                    detalle, creado = PODetailProduct.objects.get_or_create(
-                        purchase_order=po,
-                        product=product,
-                        defaults={
-                            'quantity': quantity,
-                            'unit_price': unit_price,
-                            'measurement_unit': measurement_unit,
-                            'currency': currency
-                        }
-                    )
-                    
-                    if creado:
-                        detalles_creados += 1
-                        self.stdout.write(self.style.SUCCESS(f'✅ Detalle creado: {product_name} en OC {po_number}'))
-                    else:
-                        detalles_existentes += 1
-                        # Actualizar si es necesario
-                        actualizado = False
-                        if detalle.quantity != quantity:
-                            detalle.quantity = quantity
-                            actualizado = True
-                        if detalle.unit_price != unit_price:
-                            detalle.unit_price = unit_price
-                            actualizado = True
-                        if detalle.measurement_unit != measurement_unit:
-                            detalle.measurement_unit = measurement_unit
-                            actualizado = True
-                        if detalle.currency != currency:
-                            detalle.currency = currency
-                            actualizado = True
-                        
-                        if actualizado:
-                            detalle.save()
-                            self.stdout.write(self.style.WARNING(f'⚠️  Detalle actualizado: {product_name} en OC {po_number}'))
-                        else:
-                            self.stdout.write(self.style.WARNING(f'⚠️  Detalle existente: {product_name} en OC {po_number}'))
-                        
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f'❌ Error fila {row_num}: {str(e)}'))
+                # Acepta el CSV legado (purchase_order, product_name) y el de importación (po_number, code_art)
+                po_number = str(row.get('purchase_order') or row.get('po_number') or '').strip()
+                code_art = str(row.get('code_art') or row.get('product') or '').strip()
+                product_name = str(row.get('product_name', '')).strip()
+                measurement_unit = str(row.get('measurement_unit', '')).strip()
+                
+                if not po_number or not (code_art or product_name):
+                    self.stdout.write(self.style.WARNING(f'⚠️  Fila {row_num}: PO Number o Product faltante'))
                     errores += 1
+                    continue
+                
+                # Parsear cantidad y precio
+                try:
+                    quantity = int(Decimal(str(row.get('quantity', '1')).strip() or '1').to_integral_value())
+                except (InvalidOperation, ValueError):
+                    quantity = 1
+                
+                try:
+                    unit_price = Decimal(str(row.get('unit_price', '0')).strip() or '0')
+                except InvalidOperation:
+                    unit_price = Decimal('0.00')
+                
+                filas.append({
+                    'row_num': row_num,
+                    'po_number': po_number,
+                    'code_art': code_art or product_name[:20].upper().replace(' ', '_'),
+                    'product_name': product_name,
+                    'quantity': quantity,
+                    'unit_price': unit_price,
+                    'measurement_unit': measurement_unit if measurement_unit in unidades else 'unidades',
+                    'comment': str(row.get('comment') or '').strip(),
+                })
+        
+        # 2. ✅ Resolver OCs y productos con una consulta cada uno
+        ocs = PurchaseOrder.objects.in_bulk({f['po_number'] for f in filas})
+        productos = Product.objects.in_bulk({f['code_art'] for f in filas})
+        
+        nuevos = {}
+        for fila in filas:
+            if fila['code_art'] not in productos and fila['code_art'] not in nuevos:
+                nuevos[fila['code_art']] = fila
+        if nuevos:
+            proveedor, _ = Supplier.objects.get_or_create(
+                ruc_supplier='DUMMY',
+                defaults={'name_supplier': 'SIN_PROVEEDOR'}
+            )
+            creados = Product.objects.bulk_create([
+                Product(
+                    code_art=code,
+                    part_number=code,
+                    descrip=fila['product_name'] or f"Producto {code}",
+                    ruc_supplier=proveedor,
+                    manufac='NO_ESPECIFICADO',
+                    cost=fila['unit_price'],
+                )
+                for code, fila in nuevos.items()
+            ], batch_size=options['batch_size'])
+            productos.update({p.code_art: p for p in creados})
+            self.stdout.write(self.style.SUCCESS(f'✅ Productos creados: {len(creados)}'))
+        
+        entries = []
+        for fila in filas:
+            po = ocs.get(fila['po_number'])
+            if po is None:
+                self.stdout.write(self.style.ERROR(f"❌ Fila {fila['row_num']}: Purchase Order no encontrada: {fila['po_number']}"))
+                pos_no_encontradas += 1
+                continue
+            entries.append({
+                'purchase_order': po,
+                'product': productos[fila['code_art']],
+                'quantity': fila['quantity'],
+                'unit_price': fila['unit_price'],
+                'measurement_unit': fila['measurement_unit'],
+                'product_name': fila['product_name'],
+                'comment': fila['comment'],
+            })
+        
+        # 3. ✅ bulk_create/bulk_update + totales de OC y proveedores una vez por OC
+        resultado = PODetailBulkService.upsert(entries, batch_size=options['batch_size'])
         
         # Resumen
         self.stdout.write(self.style.SUCCESS(f"\n📈 RESUMEN DE CARGA DE DETALLES:"))
-        self.stdout.write(self.style.SUCCESS(f"✅ Creados: {detalles_creados}"))
-        self.stdout.write(self.style.SUCCESS(f"⚠️  Existentes: {detalles_existentes}"))
+        self.stdout.write(self.style.SUCCESS(f"✅ Creados: {resultado['created']}"))
+        self.stdout.write(self.style.SUCCESS(f"⚠️  Actualizados: {resultado['updated']}"))
         if pos_no_encontradas > 0:
             self.stdout.write(self.style.ERROR(f"❌ Purchase Orders no encontradas: {pos_no_encontradas}"))
         if errores > 0:
             self.stdout.write(self.style.ERROR(f"❌ Errores: {errores}"))
-        
-        # Calcular totales automáticamente
-        self.stdout.write(self.style.WARNING(f"\n🧮 ACTUALIZANDO TOTALES DE ÓRDENES DE COMPRA..."))
-        total_pos_actualizadas = 0
-        
-        for po in PurchaseOrder.objects.all():
-            total_anterior = po.total_amount or 0
-            total_nuevo = 0
-            
-            for detalle in po.podetailproduct_set.all():
-                subtotal = detalle.quantity * detalle.unit_price
-                total_nuevo += subtotal
-            
-            if total_anterior != total_nuevo:
-                po.total_amount = total_nuevo
-                po.save()
-                total_pos_actualizadas += 1
-        
-        self.stdout.write(self.style.SUCCESS(f"✅ Totales actualizados en {total_pos_actualizadas} órdenes de compra"))
+        self.stdout.write(self.style.SUCCESS(f"✅ Totales actualizados en {len(resultado['purchase_orders'])} órdenes de compra"))
         
         self.stdout.write(self.style.SUCCESS(f"\n🎉 ¡CARGA COMPLETA!"))
         self.stdout.write(self.style.SUCCESS(f"Todos los datos han sido cargados en orden jerárquico:"))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from projects.services.earned_value.snapshot_service import EVMSnapshotService
+
+
+class Command(BaseCommand):
+    help = "Reconstruye los snapshots EVM materializados (ProjectEVMSnapshot) de todos los proyectos"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project_id', help='Reconstruir solo este proyecto (cod_projects_id)')
+        parser.add_argument('--stale-only', action='store_true', help='Solo proyectos con snapshots obsoletos o faltantes')
+
+    def handle(self, *args, **options):
+        project_id = options.get('project_id')
+
+        if project_id:
+            try:
+                EVMSnapshotService.refresh(project_id)
+            except Exception as e:
+                raise CommandError(f'Error reconstruyendo {project_id}: {e}')
+            self.stdout.write(self.style.SUCCESS(f'Snapshot EVM reconstruido para {project_id}'))
+            return
+
+        rebuilt, errors = EVMSnapshotService.rebuild_all(
+            stale_only=options.get('stale_only', False),
+            stdout=self.stdout,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Snapshots EVM reconstruidos: {rebuilt}'))
+        if errors:
+            self.stdout.write(self.style.WARNING(f'Proyectos con error: {len(errors)}'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from projects.models import Projects, ProjectFinancialRollup
+
+
+class Command(BaseCommand):
+    help = "Recalcula los resúmenes financieros por proyecto (ProjectFinancialRollup)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project_id', help='Recalcular solo este proyecto (cod_projects_id)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Proyectos por lote (default: 500)')
+
+    def handle(self, *args, **options):
+        project_id = options.get('project_id')
+        if project_id:
+            ids = [project_id]
+        else:
+            ids = list(Projects.objects.order_by('cod_projects_id').values_list('cod_projects_id', flat=True))
+
+        batch_size = max(1, options['batch_size'])
+        total = 0
+        for start in range(0, len(ids), batch_size):
+            total += len(ProjectFinancialRollup.refresh(*ids[start:start + batch_size]))
+
+        self.stdout.write(self.style.SUCCESS(f'Resúmenes financieros recalculados: {total}'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from projects.models import Projects, ProjectPOFacet
+
+
+class Command(BaseCommand):
+    help = "Recalcula las facetas de OCs por proyecto (filtros de logística, ProjectPOFacet)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project_id', help='Recalcular solo este proyecto (cod_projects_id)')
+        parser.add_argument('--batch-size', type=int, default=200, help='Proyectos por lote (default: 200)')
+
+    def handle(self, *args, **options):
+        project_id = options.get('project_id')
+        if project_id:
+            ids = [project_id]
+        else:
+            ids = list(Projects.objects.order_by('cod_projects_id').values_list('cod_projects_id', flat=True))
+
+        batch_size = max(1, options['batch_size'])
+        total = 0
+        for start in range(0, len(ids), batch_size):
+            total += ProjectPOFacet.refresh(*ids[start:start + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(f'Facetas de OCs recalculadas: {total} valores en {len(ids)} proyectos'))
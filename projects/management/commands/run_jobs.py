@@ -0,0 +1,52 @@
+import os
+import socket
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from projects.models import BackgroundJob
+from projects.services.background_jobs import BackgroundJobService, JOB_HANDLERS
+
+
+class Command(BaseCommand):
+    help = "Worker de la cola de trabajos en BD (BackgroundJob): importaciones, auditorías, OCR"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Procesar los pendientes y salir')
+        parser.add_argument('--max-jobs', type=int, default=0, help='Salir tras N trabajos (0 = sin límite)')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Segundos de espera sin trabajos (default: 2)')
+        parser.add_argument('--kind', action='append', choices=sorted(JOB_HANDLERS),
+                            help='Solo estos tipos de trabajo (repetible)')
+        parser.add_argument('--stale-minutes', type=int, default=60,
+                            help='Reencolar RUNNING de workers caídos tras N minutos (default: 60)')
+
+    def handle(self, *args, **options):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        stale_after = timedelta(minutes=max(1, options['stale_minutes']))
+        max_jobs = options['max_jobs']
+        processed = 0
+
+        self.stdout.write(self.style.WARNING(f'⚙️  Worker {worker_id} iniciado'))
+        requeued = BackgroundJob.requeue_stale(stale_after)
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'   ♻️  {requeued} trabajos reencolados'))
+
+        while True:
+            close_old_connections()
+            job = BackgroundJobService.run_next(worker_id, kinds=options.get('kind'))
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                BackgroundJob.requeue_stale(stale_after)
+                continue
+
+            processed += 1
+            style = self.style.SUCCESS if job.status == 'SUCCEEDED' else self.style.ERROR
+            self.stdout.write(style(
+                f'   #{job.pk} {job.kind}: {job.status} (intento {job.attempts}/{job.max_attempts})'
+            ))
+            if max_jobs and processed >= max_jobs:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Trabajos procesados: {processed}'))
@@ -0,0 +1,13 @@
+from projects.services.request_cache import RequestCache
+
+
+class RequestCacheMiddleware:
+    """Abre un scope de RequestCache por request: cada proyecto, baseline y resultado
+    EVM se calcula como máximo una vez por request y se descarta al terminar."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with RequestCache.scope():
+            return self.get_response(request)
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0040_alter_invoice_purchase_order_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectEVMSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('month', 'Mensual'), ('week', 'Semanal'), ('day', 'Diario')], default='month', max_length=10)),
+                ('series', models.JSONField(blank=True, default=dict)),
+                ('metrics', models.JSONField(blank=True, default=dict)),
+                ('bac', models.DecimalField(decimal_places=2, default=0.0, max_digits=14, verbose_name='BAC calculado')),
+                ('physical_progress', models.DecimalField(decimal_places=2, default=0.0, max_digits=7, verbose_name='% Avance físico')),
+                ('is_stale', models.BooleanField(default=True, verbose_name='Obsoleto')),
+                ('computed_at', models.DateTimeField(auto_now=True, verbose_name='Calculado el')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='evm_snapshots', to='projects.projects')),
+            ],
+            options={
+                'verbose_name': 'Snapshot EVM de Proyecto',
+                'verbose_name_plural': 'Snapshots EVM de Proyectos',
+                'db_table': 'project_evm_snapshot',
+                'indexes': [models.Index(fields=['is_stale'], name='project_evm_is_stal_e1f1e4_idx')],
+                'unique_together': {('project', 'granularity')},
+            },
+        ),
+    ]
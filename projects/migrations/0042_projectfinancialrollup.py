@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0041_projectevmsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectFinancialRollup',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='financial_rollup', serialize=False, to='projects.projects')),
+                ('total_invoiced', models.DecimalField(decimal_places=2, default=0.0, max_digits=14, verbose_name='Total facturado')),
+                ('invoices_count', models.PositiveIntegerField(default=0)),
+                ('total_paid', models.DecimalField(decimal_places=2, default=0.0, max_digits=14, verbose_name='Total pagado')),
+                ('paid_count', models.PositiveIntegerField(default=0)),
+                ('total_verified', models.DecimalField(decimal_places=2, default=0.0, max_digits=14, verbose_name='Pagado verificado')),
+                ('verified_count', models.PositiveIntegerField(default=0)),
+                ('pending_verification', models.DecimalField(decimal_places=2, default=0.0, max_digits=14, verbose_name='Pendiente de verificación')),
+                ('pending_count', models.PositiveIntegerField(default=0)),
+                ('verified_not_confirmed', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('problem_amount', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('problem_count', models.PositiveIntegerField(default=0)),
+                ('overdue_amount', models.DecimalField(decimal_places=2, default=0.0, max_digits=14, verbose_name='Vencido')),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0.0, max_digits=14, verbose_name='Total gastado')),
+                ('po_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Actualizado el')),
+            ],
+            options={
+                'verbose_name': 'Resumen Financiero de Proyecto',
+                'verbose_name_plural': 'Resúmenes Financieros de Proyectos',
+                'db_table': 'project_financial_rollup',
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:06
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0043_backgroundjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceParseCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, verbose_name='SHA-256')),
+                ('parser_version', models.CharField(max_length=20, verbose_name='Versión del parser')),
+                ('file_name', models.CharField(blank=True, default='', max_length=255, verbose_name='Archivo')),
+                ('data', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Campos extraídos')),
+                ('hits', models.PositiveIntegerField(default=0, verbose_name='Reutilizaciones')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Creado el')),
+                ('last_used_at', models.DateTimeField(auto_now=True, verbose_name='Último uso')),
+            ],
+            options={
+                'verbose_name': 'Caché de lectura de factura',
+                'verbose_name_plural': 'Caché de lecturas de facturas',
+                'db_table': 'invoice_parse_cache',
+                'unique_together': {('sha256', 'parser_version')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0045_purchaseorder_issue_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectPOFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(max_length=30, verbose_name='Faceta')),
+                ('value', models.CharField(blank=True, max_length=255, null=True, verbose_name='Valor')),
+                ('sort_key', models.CharField(blank=True, max_length=255, null=True)),
+                ('item', models.JSONField(blank=True, null=True)),
+                ('po_count', models.PositiveIntegerField(default=0, verbose_name='OCs')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='po_facets', to='projects.projects')),
+            ],
+            options={
+                'verbose_name': 'Faceta de OCs por proyecto',
+                'verbose_name_plural': 'Facetas de OCs por proyecto',
+                'db_table': 'project_po_facet',
+                'indexes': [models.Index(fields=['facet', 'project'], name='po_facet_facet_project_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Índices GIN trigram (pg_trgm) para las búsquedas de logística.
+# Solo PostgreSQL: en otros motores la búsqueda usa el índice de prefijos en
+# memoria (projects/services/catalog_search.py) y esta migración no hace nada.
+
+from django.db import migrations, transaction
+
+# (índice, tabla, columna): Django traduce `icontains` a UPPER(col::text) LIKE UPPER(%s)
+TRIGRAM_INDEXES = [
+    ('supplier_name_trgm_idx', 'supplier', 'name_supplier'),
+    ('supplier_ruc_trgm_idx', 'supplier', 'ruc_supplier'),
+    ('product_code_art_trgm_idx', 'product', 'code_art'),
+    ('product_part_number_trgm_idx', 'product', 'part_number'),
+    ('product_descrip_trgm_idx', 'product', 'descrip'),
+    ('product_manufac_trgm_idx', 'product', 'manufac'),
+    ('po_number_trgm_idx', 'purchase_order', 'po_number'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    try:
+        # Crear la extensión requiere permisos; sin ella se usa el fallback en memoria
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except Exception:
+        return
+    with connection.cursor() as cursor:
+        for name, table, column in TRIGRAM_INDEXES:
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (UPPER({column}::text) gin_trgm_ops)'
+            )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for name, _, _ in TRIGRAM_INDEXES:
+            cursor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0046_projectpofacet'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0048_backgroundjob_heartbeat_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chance',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Actualizado el'),
+        ),
+        migrations.AddField(
+            model_name='projects',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Actualizado el'),
+        ),
+    ]
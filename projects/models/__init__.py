@@ -27,5 +27,10 @@ from .activity import ProjectActivity
 from .budget_change import BudgetChange
 from .project_baseline import ProjectBaseline
 from .project_monthly_baseline import ProjectMonthlyBaseline
+from .evm_snapshot import ProjectEVMSnapshot
+from .financial_rollup import ProjectFinancialRollup
+from .background_job import BackgroundJob
+from .invoice_parse_cache import InvoiceParseCache
+from .po_facet import ProjectPOFacet
 from .client_invoice import STATUS_MAPPING
 from .client_invoice import INVOICE_STATUS
@@ -1,5 +1,6 @@
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
+from .evm_snapshot import ProjectEVMSnapshot
 
 class ProjectActivity(models.Model):
     """
@@ -122,6 +123,13 @@ class ProjectActivity(models.Model):
             self.completed_units = self.total_units
             
         super().save(*args, **kwargs)
+        ProjectEVMSnapshot.mark_stale(self.project_id)
+
+    def delete(self, *args, **kwargs):
+        project_id = self.project_id
+        result = super().delete(*args, **kwargs)
+        ProjectEVMSnapshot.mark_stale(project_id)
+        return result
 
 
 
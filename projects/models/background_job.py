@@ -0,0 +1,189 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+
+class BackgroundJob(models.Model):
+    """Trabajo en cola para ejecutar fuera del request (worker `run_jobs`).
+
+    Importaciones, auditorías EVM, recálculo de pesos y lectura de PDFs/OCR se
+    encolan con `enqueue()`; la vista responde de inmediato con el id y el
+    cliente consulta el estado en /api/jobs/<id>/. Si el handler falla se
+    reintenta con espera exponencial hasta `max_attempts`.
+    """
+
+    STATUS_CHOICES = [
+        ('PENDING', 'Pendiente'),
+        ('RUNNING', 'En ejecución'),
+        ('SUCCEEDED', 'Completado'),
+        ('FAILED', 'Fallido'),
+    ]
+    # Segundos de espera antes del reintento n: RETRY_BASE_SECONDS * 2**(n-1)
+    RETRY_BASE_SECONDS = 30
+
+    kind = models.CharField(max_length=50, verbose_name='Tipo')
+    params = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder, verbose_name='Parámetros')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING', verbose_name='Estado')
+
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name='% Avance')
+    message = models.CharField(max_length=255, blank=True, default='', verbose_name='Mensaje')
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder, verbose_name='Resultado')
+    error = models.TextField(blank=True, default='', verbose_name='Último error')
+
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')
+    max_attempts = models.PositiveSmallIntegerField(default=3, verbose_name='Máx. intentos')
+    run_after = models.DateTimeField(default=timezone.now, verbose_name='Ejecutar desde')
+
+    locked_by = models.CharField(max_length=100, blank=True, default='', verbose_name='Worker')
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='background_jobs'
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Creado el')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='Iniciado el')
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name='Última señal del worker')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Terminado el')
+
+    class Meta:
+        db_table = 'background_job'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+            models.Index(fields=['kind', 'status']),
+        ]
+        verbose_name = 'Trabajo en segundo plano'
+        verbose_name_plural = 'Trabajos en segundo plano'
+
+    def __str__(self):
+        return f"#{self.pk} {self.kind} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in ('SUCCEEDED', 'FAILED')
+
+    @classmethod
+    def enqueue(cls, kind, params=None, user=None, max_attempts=None, run_after=None):
+        """Crea el trabajo PENDING; el worker lo toma en su siguiente ciclo."""
+        job = cls(
+            kind=kind,
+            params=params or {},
+            created_by=user if getattr(user, 'is_authenticated', False) else None,
+            run_after=run_after or timezone.now(),
+        )
+        if max_attempts:
+            job.max_attempts = max_attempts
+        job.save()
+        return job
+
+    @classmethod
+    def claim(cls, worker_id, kinds=None):
+        """
+        Toma el siguiente trabajo listo y lo marca RUNNING. Con PostgreSQL usa
+        SKIP LOCKED, así varios workers no toman el mismo trabajo.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            qs = cls.objects.select_for_update(skip_locked=True).filter(status='PENDING', run_after__lte=now)
+            if kinds:
+                qs = qs.filter(kind__in=kinds)
+            job = qs.order_by('run_after', 'pk').first()
+            if job is None:
+                return None
+            job.status = 'RUNNING'
+            job.attempts += 1
+            job.locked_by = worker_id
+            job.started_at = job.heartbeat_at = now
+            job.finished_at = None
+            job.progress = 0
+            job.save(update_fields=[
+                'status', 'attempts', 'locked_by', 'started_at', 'heartbeat_at', 'finished_at', 'progress'
+            ])
+        return job
+
+    @classmethod
+    def requeue_stale(cls, older_than):
+        """
+        RUNNING de workers caídos (sin señal en `older_than`): vuelven a PENDING
+        si les quedan intentos; si ya agotaron `max_attempts` quedan FAILED.
+        Devuelve cuántos trabajos se liberaron.
+        """
+        now = timezone.now()
+        cutoff = now - older_than
+        stale = cls.objects.filter(status='RUNNING').filter(
+            Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+        )
+        failed = stale.filter(attempts__gte=F('max_attempts')).update(
+            status='FAILED', locked_by='', finished_at=now,
+            error='Worker sin respuesta', message='Fallido: worker sin respuesta',
+        )
+        requeued = stale.update(status='PENDING', locked_by='', message='Reencolado: worker sin respuesta')
+        return failed + requeued
+
+    def set_progress(self, progress=None, message=None):
+        """
+        Actualiza avance/mensaje con una UPDATE puntual (visible para el polling).
+        Cada llamada renueva `heartbeat_at`, así requeue_stale no toma un
+        trabajo largo que sigue avanzando.
+        """
+        self.heartbeat_at = timezone.now()
+        fields = {'heartbeat_at': self.heartbeat_at}
+        if progress is not None:
+            self.progress = fields['progress'] = max(0, min(100, int(progress)))
+        if message is not None:
+            self.message = fields['message'] = str(message)[:255]
+        type(self).objects.filter(pk=self.pk).update(**fields)
+
+    def mark_succeeded(self, result=None):
+        self.status = 'SUCCEEDED'
+        self.result = result
+        self.progress = 100
+        self.error = ''
+        self.finished_at = timezone.now()
+        self.save(update_fields=['status', 'result', 'progress', 'error', 'finished_at'])
+
+    def mark_failed(self, error):
+        """Reintenta con espera exponencial; FAILED al agotar `max_attempts`."""
+        self.error = str(error)
+        if self.attempts < self.max_attempts:
+            self.status = 'PENDING'
+            self.run_after = timezone.now() + timedelta(
+                seconds=self.RETRY_BASE_SECONDS * 2 ** max(self.attempts - 1, 0)
+            )
+            self.message = f'Reintento {self.attempts + 1}/{self.max_attempts} programado'
+        else:
+            self.status = 'FAILED'
+            self.finished_at = timezone.now()
+        self.locked_by = ''
+        self.save(update_fields=['status', 'error', 'run_after', 'message', 'finished_at', 'locked_by'])
+
+    def retry(self):
+        """Reencola manualmente un trabajo FAILED (da un intento más)."""
+        if self.status != 'FAILED':
+            return False
+        self.status = 'PENDING'
+        self.max_attempts = max(self.max_attempts, self.attempts + 1)
+        self.run_after = timezone.now()
+        self.finished_at = None
+        self.message = 'Reencolado manualmente'
+        self.save(update_fields=['status', 'max_attempts', 'run_after', 'finished_at', 'message'])
+        return True
+
+    def to_dict(self):
+        """Estado primitivo para las respuestas JSON de polling."""
+        return {
+            'id': self.pk,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'result': self.result,
+            'error': self.error,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
@@ -1,6 +1,7 @@
 from django.db import models
 from .projects import Projects
 from .choices import approval_stats
+from .evm_snapshot import ProjectEVMSnapshot
 
 
 class BudgetChange(models.Model):
@@ -25,4 +26,14 @@ class BudgetChange(models.Model):
 
     def __str__(self):
         sign = "+" if self.amount and self.amount >= 0 else "-"
-        return f"{self.project.cod_projects_id} • {sign}{abs(self.amount)} ({self.status})"
\ No newline at end of file
+        return f"{self.project.cod_projects_id} • {sign}{abs(self.amount)} ({self.status})"
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        ProjectEVMSnapshot.mark_stale(self.project_id)
+
+    def delete(self, *args, **kwargs):
+        project_id = self.project_id
+        result = super().delete(*args, **kwargs)
+        ProjectEVMSnapshot.mark_stale(project_id)
+        return result
\ No newline at end of file
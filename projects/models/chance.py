@@ -140,6 +140,8 @@ class Chance(models.Model):
         editable=False,
         verbose_name="Costo Gastos Generales (%)"
     )
+    # Costos/BAC editados (auditoría EVM incremental)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Actualizado el")
     
     class Meta:
         db_table = "chance"
@@ -208,6 +210,9 @@ class Chance(models.Model):
                 estimated_duration=self.estimated_duration,
             )
 
+        # El BAC sale de los costos del Chance: invalidar snapshots EVM
+        apps.get_model('projects', 'ProjectEVMSnapshot').mark_stale(self.pk)
+
     def set_extra_cost_centers(self, centers, replace=False):
         normalized = []
         if centers is None:
@@ -1,11 +1,13 @@
 # client.py - CONTENIDO COMPLETO PARA client_invoice.py
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 from decimal import Decimal
 
 # Importar las opciones desde choice.py
 from .choices import INVOICE_STATUS, STATUS_MAPPING
+from .evm_snapshot import ProjectEVMSnapshot
+from .financial_rollup import ProjectFinancialRollup
 
 class ClientInvoice(models.Model):
     """
@@ -214,7 +216,19 @@ class ClientInvoice(models.Model):
         # Sincronizar payment_status legacy usando STATUS_MAPPING importado
         self.payment_status = STATUS_MAPPING.get(self.status, 'PENDING')
         
-        super().save(*args, **kwargs)
+        # ✅ Factura y resumen financiero del proyecto en la misma transacción
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            ProjectFinancialRollup.refresh(self.project_id)
+        ProjectEVMSnapshot.mark_stale(self.project_id)
+
+    def delete(self, *args, **kwargs):
+        project_id = self.project_id
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            ProjectFinancialRollup.refresh(project_id)
+        ProjectEVMSnapshot.mark_stale(project_id)
+        return result
     
     @property
     def is_overdue(self):
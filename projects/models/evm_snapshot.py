@@ -0,0 +1,82 @@
+from datetime import datetime, time
+
+from django.db import models, transaction, OperationalError, ProgrammingError
+from django.utils import timezone
+from .derived_tables import table_missing
+from .projects import Projects
+
+
+class ProjectEVMSnapshot(models.Model):
+    """Series y métricas EVM materializadas por proyecto y granularidad.
+
+    Se marca como obsoleta (`is_stale`) cuando cambia un dato fuente del proyecto
+    (facturas, detalles de OC, actividades, cambios de presupuesto, facturas de
+    cliente o baseline) y se recalcula solo al leerla o con `rebuild_evm_snapshots`.
+    PV y SPI dependen de la fecha del cálculo, así que un snapshot de un mes
+    anterior tampoco está vigente (ver `is_current`).
+    """
+
+    GRANULARITY_CHOICES = [
+        ('month', 'Mensual'),
+        ('week', 'Semanal'),
+        ('day', 'Diario'),
+    ]
+
+    project = models.ForeignKey(Projects, on_delete=models.CASCADE, related_name='evm_snapshots')
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES, default='month')
+
+    # Serie acumulada (labels/months, pv, ev, ac, ac_paid, interval_days)
+    series = models.JSONField(default=dict, blank=True)
+    # Métricas EVM finales (cpi, spi, cv, sv, eac, vac, etc)
+    metrics = models.JSONField(default=dict, blank=True)
+    bac = models.DecimalField(max_digits=14, decimal_places=2, default=0.00, verbose_name='BAC calculado')
+    physical_progress = models.DecimalField(max_digits=7, decimal_places=2, default=0.00, verbose_name='% Avance físico')
+
+    is_stale = models.BooleanField(default=True, verbose_name='Obsoleto')
+    computed_at = models.DateTimeField(auto_now=True, verbose_name='Calculado el')
+
+    class Meta:
+        db_table = 'project_evm_snapshot'
+        unique_together = [('project', 'granularity')]
+        indexes = [
+            models.Index(fields=['is_stale']),
+        ]
+        verbose_name = 'Snapshot EVM de Proyecto'
+        verbose_name_plural = 'Snapshots EVM de Proyectos'
+
+    def __str__(self):
+        estado = 'obsoleto' if self.is_stale else 'vigente'
+        return f"{self.project_id} - {self.granularity} ({estado})"
+
+    @staticmethod
+    def period_start(today=None):
+        """Inicio (aware) del mes en curso: los snapshots calculados antes están vencidos."""
+        today = today or timezone.localdate()
+        return timezone.make_aware(datetime.combine(today.replace(day=1), time.min))
+
+    def is_current(self, today=None):
+        """Vigente = no marcado obsoleto y calculado en el mes en curso."""
+        if self.is_stale or not self.computed_at:
+            return False
+        return self.computed_at >= self.period_start(today)
+
+    @classmethod
+    def mark_stale(cls, project_id):
+        """
+        Marca como obsoletos los snapshots del proyecto (una sola UPDATE).
+        Es el punto único de aviso de cambios del proyecto: también invalida lo
+        memoizado en el request y sube la generación de caché del proyecto.
+        """
+        if not project_id:
+            return 0
+        from projects.services.request_cache import RequestCache
+        from projects.services.cache_versioning import ProjectCacheVersion
+        RequestCache.invalidate(project_id)
+        ProjectCacheVersion.bump(project_id)
+        try:
+            with transaction.atomic():
+                return cls.objects.filter(project_id=project_id, is_stale=False).update(is_stale=True)
+        except (ProgrammingError, OperationalError):
+            if not table_missing(cls):
+                raise
+            return 0
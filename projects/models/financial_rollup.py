@@ -0,0 +1,185 @@
+from decimal import Decimal
+from django.db import models, transaction, OperationalError, ProgrammingError
+from django.db.models import Sum, Count, Q
+from .derived_tables import table_missing
+from .projects import Projects
+
+ZERO = Decimal('0.00')
+
+# Estados de ClientInvoice agrupados como en InvoiceManager / FinancialMetricsCalculator
+PROBLEM_STATUSES = ['PAGO_NO_RECIBIDO', 'CONTROVERSIA']
+
+
+class ProjectFinancialRollup(models.Model):
+    """Totales financieros desnormalizados por proyecto (una fila por proyecto).
+
+    Se recalcula dentro de la misma transacción que guarda/elimina una
+    ClientInvoice o una PurchaseOrder (los PODetailProduct actualizan el total
+    de su OC con `update_totals`, también al eliminarse), así las vistas
+    financieras leen una sola fila en lugar de re-sumar facturas y OCs en cada
+    request.
+    """
+
+    project = models.OneToOneField(
+        Projects, on_delete=models.CASCADE, primary_key=True, related_name='financial_rollup'
+    )
+
+    # Facturación al cliente (ClientInvoice)
+    total_invoiced = models.DecimalField(max_digits=14, decimal_places=2, default=0.00, verbose_name='Total facturado')
+    invoices_count = models.PositiveIntegerField(default=0)
+    # paid_amount de facturas PAGADA
+    total_paid = models.DecimalField(max_digits=14, decimal_places=2, default=0.00, verbose_name='Total pagado')
+    paid_count = models.PositiveIntegerField(default=0)
+    # Verificadas en banco: Σ paid_amount (si es 0, Σ amount)
+    total_verified = models.DecimalField(max_digits=14, decimal_places=2, default=0.00, verbose_name='Pagado verificado')
+    verified_count = models.PositiveIntegerField(default=0)
+    # amount de facturas PAGO_REPORTADO
+    pending_verification = models.DecimalField(max_digits=14, decimal_places=2, default=0.00, verbose_name='Pendiente de verificación')
+    pending_count = models.PositiveIntegerField(default=0)
+    # amount de facturas PAGO_VERIFICADO (aún no confirmadas)
+    verified_not_confirmed = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    # amount de facturas PAGO_NO_RECIBIDO / CONTROVERSIA
+    problem_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    problem_count = models.PositiveIntegerField(default=0)
+    # amount de facturas VENCIDA
+    overdue_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0.00, verbose_name='Vencido')
+
+    # Costos (PurchaseOrder.total_amount, en moneda local)
+    total_spent = models.DecimalField(max_digits=14, decimal_places=2, default=0.00, verbose_name='Total gastado')
+    po_count = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Actualizado el')
+
+    AMOUNT_FIELDS = [
+        'total_invoiced', 'invoices_count', 'total_paid', 'paid_count', 'total_verified', 'verified_count',
+        'pending_verification', 'pending_count', 'verified_not_confirmed', 'problem_amount', 'problem_count',
+        'overdue_amount', 'total_spent', 'po_count',
+    ]
+
+    class Meta:
+        db_table = 'project_financial_rollup'
+        verbose_name = 'Resumen Financiero de Proyecto'
+        verbose_name_plural = 'Resúmenes Financieros de Proyectos'
+
+    def __str__(self):
+        return f"{self.project_id} - facturado {self.total_invoiced} / gastado {self.total_spent}"
+
+    @property
+    def pending_collection(self):
+        """Facturado aún no cobrado (verificado)."""
+        return self.total_invoiced - self.total_verified
+
+    @classmethod
+    def from_aggregates(cls, project_id, invoice_row=None, po_row=None):
+        """Instancia (sin guardar) a partir de las filas agrupadas de facturas y OCs."""
+        invoice_row = invoice_row or {}
+        po_row = po_row or {}
+        verified = invoice_row.get('verified_paid') or ZERO
+        if verified == ZERO:
+            # Fallback si no existe paid_amount: usar amount de facturas verificadas
+            verified = invoice_row.get('verified_amount') or ZERO
+        return cls(
+            project_id=project_id,
+            total_invoiced=invoice_row.get('total_invoiced') or ZERO,
+            invoices_count=invoice_row.get('invoices_count') or 0,
+            total_paid=invoice_row.get('total_paid') or ZERO,
+            paid_count=invoice_row.get('paid_count') or 0,
+            total_verified=verified,
+            verified_count=invoice_row.get('verified_count') or 0,
+            pending_verification=invoice_row.get('pending_verification') or ZERO,
+            pending_count=invoice_row.get('pending_count') or 0,
+            verified_not_confirmed=invoice_row.get('verified_not_confirmed') or ZERO,
+            problem_amount=invoice_row.get('problem_amount') or ZERO,
+            problem_count=invoice_row.get('problem_count') or 0,
+            overdue_amount=invoice_row.get('overdue_amount') or ZERO,
+            total_spent=po_row.get('total_spent') or ZERO,
+            po_count=po_row.get('po_count') or 0,
+        )
+
+    @classmethod
+    def refresh(cls, *project_ids):
+        """
+        Recalcula la fila de los proyectos indicados con dos consultas agrupadas
+        (facturas y OCs) y un upsert. Bloquea los proyectos para que dos
+        guardados concurrentes no se pisen el resultado.
+        """
+        from .client_invoice import ClientInvoice
+        from .oc import PurchaseOrder
+
+        ids = sorted({pid for pid in project_ids if pid})
+        if not ids:
+            return []
+
+        paid = Q(status='PAGADA')
+        verified = Q(bank_verified_date__isnull=False)
+        pending = Q(status='PAGO_REPORTADO')
+        problem = Q(status__in=PROBLEM_STATUSES)
+        try:
+            with transaction.atomic():
+                existing = set(Projects.objects.select_for_update().filter(cod_projects_id__in=ids).values_list('pk', flat=True))
+                invoices = {
+                    row.pop('project_id'): row
+                    for row in ClientInvoice.objects.filter(project_id__in=ids).values('project_id').annotate(
+                        total_invoiced=Sum('amount'),
+                        invoices_count=Count('id'),
+                        total_paid=Sum('paid_amount', filter=paid),
+                        paid_count=Count('id', filter=paid),
+                        verified_paid=Sum('paid_amount', filter=verified),
+                        verified_amount=Sum('amount', filter=verified),
+                        verified_count=Count('id', filter=verified),
+                        pending_verification=Sum('amount', filter=pending),
+                        pending_count=Count('id', filter=pending),
+                        verified_not_confirmed=Sum('amount', filter=Q(status='PAGO_VERIFICADO')),
+                        problem_amount=Sum('amount', filter=problem),
+                        problem_count=Count('id', filter=problem),
+                        overdue_amount=Sum('amount', filter=Q(status='VENCIDA')),
+                    ).order_by()
+                }
+                purchases = {
+                    row.pop('project_code_id'): row
+                    for row in PurchaseOrder.objects.filter(project_code_id__in=ids).values('project_code_id').annotate(
+                        total_spent=Sum('total_amount'),
+                        po_count=Count('pk'),
+                    ).order_by()
+                }
+                rollups = [
+                    cls.from_aggregates(pid, invoices.get(pid), purchases.get(pid))
+                    for pid in ids if pid in existing
+                ]
+                cls.objects.bulk_create(
+                    rollups,
+                    update_conflicts=True,
+                    unique_fields=['project'],
+                    update_fields=cls.AMOUNT_FIELDS + ['updated_at'],
+                )
+                return rollups
+        except (ProgrammingError, OperationalError):
+            if not table_missing(cls):
+                raise
+            return []
+
+    @classmethod
+    def ensure(cls, project_ids=None):
+        """Crea las filas que falten (proyectos anteriores a la tabla); devuelve las creadas."""
+        missing = Projects.objects.filter(financial_rollup__isnull=True)
+        if project_ids is not None:
+            missing = missing.filter(cod_projects_id__in=project_ids)
+        return cls.refresh(*missing.values_list('pk', flat=True))
+
+    @classmethod
+    def for_projects(cls, project_ids=None):
+        """{project_id: rollup} de los proyectos indicados (todos si es None)."""
+        rollups = cls.objects.all() if project_ids is None else cls.objects.filter(project_id__in=project_ids)
+        result = {r.project_id: r for r in rollups}
+        if project_ids is None:
+            created = cls.ensure()
+        else:
+            created = cls.ensure([pid for pid in project_ids if pid not in result])
+        for rollup in created:
+            result[rollup.project_id] = rollup
+        return result
+
+    @classmethod
+    def for_project(cls, project_id):
+        """Fila del proyecto (creándola si falta); rollup vacío si el proyecto no existe."""
+        return cls.for_projects([project_id]).get(project_id) or cls.from_aggregates(project_id)
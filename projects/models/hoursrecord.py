@@ -6,3 +6,16 @@ class Hoursrecord(models.Model):
     date= models.DateField()
     hours = models.DecimalField(max_digits=6, decimal_places=2)
     acti=models.CharField(max_length=200 , blank=True, null=True)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Las horas se muestran en el dashboard cacheado: nueva generación de caché
+        from projects.services.cache_versioning import ProjectCacheVersion
+        ProjectCacheVersion.bump(self.pro_id)
+
+    def delete(self, *args, **kwargs):
+        project_id = self.pro_id
+        result = super().delete(*args, **kwargs)
+        from projects.services.cache_versioning import ProjectCacheVersion
+        ProjectCacheVersion.bump(project_id)
+        return result
@@ -2,6 +2,7 @@ from django.db import models
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 from decimal import Decimal
+from .evm_snapshot import ProjectEVMSnapshot
 
 
 class Invoice(models.Model):
@@ -93,6 +94,22 @@ class Invoice(models.Model):
     def save(self, *args, **kwargs):
         """Solo guarda los datos, NO genera cálculos automáticos"""
         super().save(*args, **kwargs)
+        ProjectEVMSnapshot.mark_stale(self.project_id_for_evm())
+
+    def delete(self, *args, **kwargs):
+        project_id = self.project_id_for_evm()
+        result = super().delete(*args, **kwargs)
+        ProjectEVMSnapshot.mark_stale(project_id)
+        return result
+
+    def project_id_for_evm(self):
+        """Proyecto al que imputa esta factura (vía su OC), o None."""
+        if not self.purchase_order_id:
+            return None
+        try:
+            return self.purchase_order.project_code_id
+        except Exception:
+            return None
 
 
 class InvoiceDetail(models.Model):
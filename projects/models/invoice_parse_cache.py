@@ -0,0 +1,74 @@
+from decimal import Decimal, InvalidOperation
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction, OperationalError, ProgrammingError
+from django.db.models import F
+from django.utils import timezone
+from .derived_tables import table_missing
+
+
+class InvoiceParseCache(models.Model):
+    """Campos extraídos de un PDF/imagen de factura, por SHA-256 del archivo.
+
+    El mismo archivo suele subirse dos veces (vista previa AJAX y luego
+    `factura_cliente_crear`); con el hash del contenido más la versión del
+    parser, la segunda vez se reutiliza el resultado sin volver a hacer OCR.
+    Al cambiar la extracción se sube `ClientInvoicePDFParser.PARSER_VERSION`
+    y las filas anteriores dejan de usarse.
+    """
+
+    sha256 = models.CharField(max_length=64, verbose_name='SHA-256')
+    parser_version = models.CharField(max_length=20, verbose_name='Versión del parser')
+    file_name = models.CharField(max_length=255, blank=True, default='', verbose_name='Archivo')
+    data = models.JSONField(default=dict, encoder=DjangoJSONEncoder, verbose_name='Campos extraídos')
+    hits = models.PositiveIntegerField(default=0, verbose_name='Reutilizaciones')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Creado el')
+    last_used_at = models.DateTimeField(auto_now=True, verbose_name='Último uso')
+
+    class Meta:
+        db_table = 'invoice_parse_cache'
+        unique_together = [('sha256', 'parser_version')]
+        verbose_name = 'Caché de lectura de factura'
+        verbose_name_plural = 'Caché de lecturas de facturas'
+
+    def __str__(self):
+        return f"{self.file_name or self.sha256[:12]} (v{self.parser_version})"
+
+    @classmethod
+    def lookup(cls, sha256, parser_version):
+        """Campos guardados (amount como Decimal) o None si no hay entrada."""
+        try:
+            # Savepoint propio: un fallo no deja abortada la transacción del llamador
+            with transaction.atomic():
+                entry = cls.objects.filter(sha256=sha256, parser_version=parser_version).first()
+                if entry is None:
+                    return None
+                cls.objects.filter(pk=entry.pk).update(hits=F('hits') + 1, last_used_at=timezone.now())
+        except (ProgrammingError, OperationalError):
+            # Tabla aún no migrada: parsear normalmente
+            if not table_missing(cls):
+                raise
+            return None
+        data = dict(entry.data)
+        if data.get('amount') not in (None, ''):
+            try:
+                data['amount'] = Decimal(str(data['amount']))
+            except InvalidOperation:
+                pass
+        return data
+
+    @classmethod
+    def store(cls, sha256, parser_version, data, file_name=''):
+        """Guarda (o reemplaza) el resultado; los resultados vacíos no se guardan."""
+        if not data:
+            return None
+        try:
+            with transaction.atomic():
+                entry, _ = cls.objects.update_or_create(
+                    sha256=sha256, parser_version=parser_version,
+                    defaults={'data': data, 'file_name': (file_name or '')[:255]},
+                )
+            return entry
+        except (ProgrammingError, OperationalError):
+            if not table_missing(cls):
+                raise
+            return None
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from .choices import oc_state
 
 class PurchaseOrder(models.Model):
@@ -50,9 +50,49 @@ class PurchaseOrder(models.Model):
     class Meta:
         db_table = "purchase_order"
         # Ya no necesitas unique_together porque po_number es PK
+        indexes = [
+            # Paginación por cursor del grid de logística (PurchaseOrderGridService)
+            models.Index(fields=['issue_date', 'po_number'], name='po_issue_date_po_idx'),
+        ]
     
     def __str__(self):
         return f"PO {self.po_number} - Project {self.project_code}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Proyecto al cargar: si la OC se mueve, también se recalcula el anterior
+        instance._loaded_project_code_id = instance.__dict__.get('project_code_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        from .evm_snapshot import ProjectEVMSnapshot
+        from .financial_rollup import ProjectFinancialRollup
+        from .po_facet import ProjectPOFacet
+        previous_project_id = getattr(self, '_loaded_project_code_id', None)
+        if previous_project_id == self.project_code_id:
+            previous_project_id = None
+        # ✅ OC y resumen financiero en la misma transacción; facetas de logística al confirmar
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            ProjectFinancialRollup.refresh(self.project_code_id, previous_project_id)
+            ProjectPOFacet.refresh_on_commit(self.project_code_id, previous_project_id)
+        ProjectEVMSnapshot.mark_stale(self.project_code_id)
+        if previous_project_id:
+            ProjectEVMSnapshot.mark_stale(previous_project_id)
+        self._loaded_project_code_id = self.project_code_id
+
+    def delete(self, *args, **kwargs):
+        from .evm_snapshot import ProjectEVMSnapshot
+        from .financial_rollup import ProjectFinancialRollup
+        from .po_facet import ProjectPOFacet
+        project_id = self.project_code_id
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            ProjectFinancialRollup.refresh(project_id)
+            ProjectPOFacet.refresh_on_commit(project_id)
+        ProjectEVMSnapshot.mark_stale(project_id)
+        return result
     
     def update_totals(self):
         details = self.podetailproduct_set.all()
@@ -0,0 +1,180 @@
+from django.db import models, transaction, OperationalError, ProgrammingError
+from django.db.models import Count
+from .derived_tables import table_missing
+from .projects import Projects
+
+
+def _po_facet_rows(ids):
+    """(faceta, proyecto, valor, orden, item, n° de OCs) de los proyectos `ids`, una consulta agrupada por faceta."""
+    from .oc import PurchaseOrder
+    from .podetail_product import PODetailProduct
+    from .podetail_supplier import PODetailSupplier
+
+    pos = PurchaseOrder.objects.filter(project_code_id__in=ids)
+    suppliers = PODetailSupplier.objects.filter(purchase_order__project_code_id__in=ids)
+    products = PODetailProduct.objects.filter(purchase_order__project_code_id__in=ids)
+
+    for facet, field in (('statuses', 'po_status'), ('currencies', 'currency')):
+        for row in pos.values('project_code_id', field).annotate(n=Count('pk')).order_by():
+            yield facet, row['project_code_id'], row[field], row[field], row[field], row['n']
+
+    for facet, field in (('supplier_statuses', 'supplier_status'), ('contab_statuses', 'status_factura_contabilidad')):
+        for row in suppliers.values('purchase_order__project_code_id', field).annotate(
+            n=Count('purchase_order', distinct=True)
+        ).order_by():
+            yield facet, row['purchase_order__project_code_id'], row[field], row[field], row[field], row['n']
+
+    for row in suppliers.values(
+        'purchase_order__project_code_id', 'supplier__ruc_supplier', 'supplier__name_supplier'
+    ).annotate(n=Count('purchase_order', distinct=True)).order_by():
+        item = {'ruc_supplier': row['supplier__ruc_supplier'], 'name_supplier': row['supplier__name_supplier']}
+        yield ('suppliers', row['purchase_order__project_code_id'], row['supplier__ruc_supplier'],
+               row['supplier__name_supplier'], item, row['n'])
+
+    for row in products.values(
+        'purchase_order__project_code_id', 'product__code_art', 'product__part_number', 'product__manufac'
+    ).annotate(n=Count('purchase_order', distinct=True)).order_by():
+        item = {'code_art': row['product__code_art'], 'part_number': row['product__part_number'],
+                'manufac': row['product__manufac']}
+        yield ('products', row['purchase_order__project_code_id'], row['product__code_art'],
+               row['product__part_number'], item, row['n'])
+
+    for row in products.values('purchase_order__project_code_id', 'product__manufac').annotate(
+        n=Count('purchase_order', distinct=True)
+    ).order_by():
+        yield ('manufacturers', row['purchase_order__project_code_id'], row['product__manufac'],
+               row['product__manufac'], row['product__manufac'], row['n'])
+
+
+class ProjectPOFacet(models.Model):
+    """Valores de los filtros de logística por proyecto, con su número de OCs.
+
+    Una fila por (proyecto, faceta, valor): proveedores, productos,
+    fabricantes, estados y monedas de las OCs del proyecto. Guardar/eliminar
+    una OC, sus proveedores, un proveedor o un producto solo anota los
+    proyectos afectados (`refresh_on_commit`); se recalculan una vez al
+    confirmar la transacción, así una importación de miles de filas no
+    reconstruye las facetas en cada fila. Los desplegables de logística se
+    leen de esta tabla en lugar de volver a unir las tablas de detalle en
+    cada request.
+    """
+
+    FACETS = ['suppliers', 'products', 'manufacturers', 'statuses', 'currencies', 'supplier_statuses', 'contab_statuses']
+
+    project = models.ForeignKey(Projects, on_delete=models.CASCADE, related_name='po_facets')
+    facet = models.CharField(max_length=30, verbose_name='Faceta')
+    value = models.CharField(max_length=255, null=True, blank=True, verbose_name='Valor')
+    sort_key = models.CharField(max_length=255, null=True, blank=True)
+    # Elemento tal como lo usa el desplegable (texto o dict de proveedor/producto)
+    item = models.JSONField(null=True, blank=True)
+    po_count = models.PositiveIntegerField(default=0, verbose_name='OCs')
+
+    class Meta:
+        db_table = 'project_po_facet'
+        indexes = [
+            models.Index(fields=['facet', 'project'], name='po_facet_facet_project_idx'),
+        ]
+        verbose_name = 'Faceta de OCs por proyecto'
+        verbose_name_plural = 'Facetas de OCs por proyecto'
+
+    def __str__(self):
+        return f"{self.project_id} {self.facet}={self.value} ({self.po_count})"
+
+    @classmethod
+    def refresh(cls, *project_ids):
+        """
+        Recalcula las facetas de los proyectos indicados (una consulta agrupada
+        por faceta y un reemplazo en bloque). Bloquea los proyectos para que
+        dos guardados concurrentes no dupliquen filas.
+        """
+        ids = sorted({pid for pid in project_ids if pid})
+        if not ids:
+            return 0
+        try:
+            with transaction.atomic():
+                existing = set(Projects.objects.select_for_update().filter(cod_projects_id__in=ids).values_list('pk', flat=True))
+                rows = [
+                    cls(project_id=project_id, facet=facet, value=None if value is None else str(value)[:255],
+                        sort_key=None if sort_key is None else str(sort_key)[:255], item=item, po_count=n)
+                    for facet, project_id, value, sort_key, item, n in _po_facet_rows(sorted(existing))
+                ]
+                cls.objects.filter(project_id__in=ids).delete()
+                cls.objects.bulk_create(rows, batch_size=1000)
+            return len(rows)
+        except (ProgrammingError, OperationalError):
+            if not table_missing(cls):
+                raise
+            return 0
+
+    @staticmethod
+    def _pending():
+        """Proyectos, proveedores y productos anotados en esta conexión y aún sin recalcular."""
+        connection = transaction.get_connection()
+        if not hasattr(connection, 'po_facet_pending'):
+            connection.po_facet_pending = {'projects': set(), 'suppliers': set(), 'products': set()}
+        return connection.po_facet_pending
+
+    @classmethod
+    def _defer(cls, kind, keys):
+        keys = {key for key in keys if key}
+        if not keys:
+            return
+        cls._pending()[kind].update(keys)
+        # Cada guardado registra su callback, pero el primero que corre recalcula
+        # todo lo anotado y el resto no hace nada; si un savepoint se revierte con
+        # su callback, lo anotado lo recoge el siguiente commit (recalcular de más
+        # es inocuo). Fuera de una transacción corre en el acto.
+        transaction.on_commit(cls.flush_pending)
+
+    @classmethod
+    def refresh_on_commit(cls, *project_ids):
+        """Recalcula los proyectos una sola vez al confirmar la transacción en curso."""
+        cls._defer('projects', project_ids)
+
+    @classmethod
+    def refresh_for_supplier(cls, ruc_supplier):
+        """Como refresh_on_commit, para los proyectos con OCs del proveedor (se buscan al confirmar)."""
+        cls._defer('suppliers', [ruc_supplier])
+
+    @classmethod
+    def refresh_for_product(cls, code_art):
+        """Como refresh_on_commit, para los proyectos con OCs del producto (se buscan al confirmar)."""
+        cls._defer('products', [code_art])
+
+    @classmethod
+    def flush_pending(cls):
+        """Recalcula lo anotado con refresh_on_commit/refresh_for_*; devuelve las filas escritas."""
+        from .podetail_product import PODetailProduct
+        from .podetail_supplier import PODetailSupplier
+
+        pending = cls._pending()
+        project_ids = set(pending['projects'])
+        suppliers, products = set(pending['suppliers']), set(pending['products'])
+        for keys in pending.values():
+            keys.clear()
+        if suppliers:
+            project_ids.update(PODetailSupplier.objects.filter(supplier_id__in=suppliers).values_list(
+                'purchase_order__project_code_id', flat=True).distinct())
+        if products:
+            project_ids.update(PODetailProduct.objects.filter(product_id__in=products).values_list(
+                'purchase_order__project_code_id', flat=True).distinct())
+        return cls.refresh(*project_ids)
+
+    @classmethod
+    def values(cls, facet, project_id=None, with_counts=False):
+        """
+        Valores de una faceta ordenados como el desplegable; sin proyecto se
+        suman los conteos de todos. Con `with_counts`: [(item, n° de OCs)].
+        """
+        qs = cls.objects.filter(facet=facet)
+        if project_id:
+            qs = qs.filter(project_id=project_id)
+        merged = {}
+        for value, item, count in qs.order_by('sort_key', 'value').values_list('value', 'item', 'po_count'):
+            if value in merged:
+                merged[value][1] += count
+            else:
+                merged[value] = [item, count]
+        if with_counts:
+            return [tuple(entry) for entry in merged.values()]
+        return [entry[0] for entry in merged.values()]
@@ -1,8 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from decimal import Decimal
 from .oc import PurchaseOrder
 from projects.models.product import Product
 from projects.models.podetail_supplier import PODetailSupplier
+from .evm_snapshot import ProjectEVMSnapshot
 
 class PODetailProduct(models.Model):
     purchase_order = models.ForeignKey(PurchaseOrder, to_field='po_number', on_delete=models.CASCADE)
@@ -32,8 +33,11 @@ class PODetailProduct(models.Model):
     total = models.DecimalField(max_digits=12, decimal_places=2, editable=False)
     local_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
 
-    def save(self, *args, **kwargs):
-        # Cálculo canónico: subtotal, igv, total y local_total
+    def calculate_amounts(self):
+        """
+        Cálculo canónico en memoria: subtotal, igv, total y local_total (sin guardar).
+        Lo usan save() y la importación masiva (PODetailBulkService).
+        """
         self.subtotal = Decimal(self.quantity) * self.unit_price
 
         # IGV aplica solo si la OC es LOCAL
@@ -61,11 +65,16 @@ class PODetailProduct(models.Model):
         if not self.product_name and self.product:
             self.product_name = self.product.descrip
 
-        super().save(*args, **kwargs)
+    def save(self, *args, **kwargs):
+        self.calculate_amounts()
+
+        # ✅ Detalle, total de la OC y resumen financiero (PurchaseOrder.save) en una transacción
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
-        # Actualizar automáticamente el total de la orden padre en moneda local
-        if self.purchase_order:
-            self.purchase_order.update_totals()
+            # Actualizar automáticamente el total de la orden padre en moneda local
+            if self.purchase_order:
+                self.purchase_order.update_totals()
 
         # Sin signals: recalcular supplier_amount del proveedor afectado
         try:
@@ -82,6 +91,19 @@ class PODetailProduct(models.Model):
             # Evitar que errores en el recálculo rompan el guardado del detalle
             pass
 
+        if self.purchase_order:
+            ProjectEVMSnapshot.mark_stale(self.purchase_order.project_code_id)
+
+    def delete(self, *args, **kwargs):
+        purchase_order = self.purchase_order if self.purchase_order_id else None
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            # Total de la OC sin esta línea; PurchaseOrder.save recalcula el resumen
+            # financiero y las facetas y marca el snapshot EVM como obsoleto
+            if purchase_order:
+                purchase_order.update_totals()
+        return result
+
     def __str__(self):
         return f"{self.product} x {self.quantity}"
 
@@ -1,8 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Sum
 from decimal import Decimal
 from .oc import PurchaseOrder
 from projects.models.supplier import Supplier
+from .evm_snapshot import ProjectEVMSnapshot
 
 class PODetailSupplier(models.Model):
     purchase_order = models.ForeignKey(PurchaseOrder, to_field='po_number', on_delete=models.CASCADE)
@@ -31,7 +32,23 @@ class PODetailSupplier(models.Model):
         # ✅ NUEVO: CALCULAR supplier_amount AUTOMÁTICAMENTE
         self.calculate_supplier_amount()
         
-        super().save(*args, **kwargs)
+        from .po_facet import ProjectPOFacet
+        project_id = self.purchase_order.project_code_id if self.purchase_order_id else None
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Solo supplier_amount (recálculo desde PODetailProduct) no cambia los filtros
+            if set(kwargs.get('update_fields') or ()) != {'supplier_amount'}:
+                ProjectPOFacet.refresh_on_commit(project_id)
+        ProjectEVMSnapshot.mark_stale(project_id)
+
+    def delete(self, *args, **kwargs):
+        from .po_facet import ProjectPOFacet
+        project_id = self.purchase_order.project_code_id if self.purchase_order_id else None
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            ProjectPOFacet.refresh_on_commit(project_id)
+        ProjectEVMSnapshot.mark_stale(project_id)
+        return result
     
     def calculate_supplier_amount(self):
         """Calcula el monto total facturado por el proveedor sumando los productos"""
@@ -20,3 +20,18 @@ class Product(models.Model):
 
     def __str__(self):
         return f"{self.part_number} - {self.manufac}"
+
+    def save(self, *args, **kwargs):
+        from .po_facet import ProjectPOFacet
+        from projects.services.catalog_search import CatalogSearchService
+        super().save(*args, **kwargs)
+        CatalogSearchService.invalidate()
+        # ✅ N° de parte y fabricante se muestran en los filtros de logística de sus proyectos
+        # (también si es nuevo: con PK natural, save() de un registro existente llega con _state.adding)
+        ProjectPOFacet.refresh_for_product(self.pk)
+
+    def delete(self, *args, **kwargs):
+        from projects.services.catalog_search import CatalogSearchService
+        result = super().delete(*args, **kwargs)
+        CatalogSearchService.invalidate()
+        return result
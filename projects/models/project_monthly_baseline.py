@@ -1,6 +1,7 @@
 from django.db import models
 from .projects import Projects
 from .project_baseline import ProjectBaseline
+from .evm_snapshot import ProjectEVMSnapshot
 
 class ProjectMonthlyBaseline(models.Model):
     """Datos mensuales planeados para abastecer gráficas (PV/EV/AC/Facturación/Avance)."""
@@ -38,4 +39,14 @@ class ProjectMonthlyBaseline(models.Model):
         verbose_name_plural = 'Baselines Mensuales de Proyecto'
 
     def __str__(self):
-        return f"{self.project.cod_projects_id} - Mes {self.month_index}"
\ No newline at end of file
+        return f"{self.project.cod_projects_id} - Mes {self.month_index}"
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        ProjectEVMSnapshot.mark_stale(self.project_id)
+
+    def delete(self, *args, **kwargs):
+        project_id = self.project_id
+        result = super().delete(*args, **kwargs)
+        ProjectEVMSnapshot.mark_stale(project_id)
+        return result
\ No newline at end of file
@@ -1,5 +1,6 @@
 from django.db import models
 from .projects import Projects
+from .evm_snapshot import ProjectEVMSnapshot
 
 class ProjectProgress(models.Model):
     """Modelo para seguimiento mensual de avance del proyecto"""
@@ -33,4 +34,8 @@ class ProjectProgress(models.Model):
         verbose_name_plural = "Avances de Proyectos"
     
     def __str__(self):
-        return f"{self.project.cod_projects_id} - Mes {self.month_number}"
\ No newline at end of file
+        return f"{self.project.cod_projects_id} - Mes {self.month_number}"
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        ProjectEVMSnapshot.mark_stale(self.project_id)
\ No newline at end of file
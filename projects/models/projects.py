@@ -27,6 +27,8 @@ class Projects(models.Model):
         null=True, blank=True,
         verbose_name="Última actualización avance"
     )
+    # Fecha/duración/estado editados (auditoría EVM incremental)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Actualizado el")
 
 
     class Meta:
@@ -34,4 +36,17 @@ class Projects(models.Model):
 
     def __str__(self):
         return f"projects {self.cod_projects} ({self.state_projects})"
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Duración, fechas o avance físico cambian las series EVM
+        from .evm_snapshot import ProjectEVMSnapshot
+        ProjectEVMSnapshot.mark_stale(self.pk)
+
+    def delete(self, *args, **kwargs):
+        project_id = self.pk
+        result = super().delete(*args, **kwargs)
+        from .evm_snapshot import ProjectEVMSnapshot
+        ProjectEVMSnapshot.mark_stale(project_id)
+        return result
  
\ No newline at end of file
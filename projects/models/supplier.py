@@ -9,3 +9,18 @@ class Supplier(models.Model):
 
     def __str__(self):
         return f"{self.ruc_supplier} - {self.name_supplier}"
+
+    def save(self, *args, **kwargs):
+        from .po_facet import ProjectPOFacet
+        from projects.services.catalog_search import CatalogSearchService
+        super().save(*args, **kwargs)
+        CatalogSearchService.invalidate()
+        # ✅ El nombre se muestra en los filtros de logística de sus proyectos
+        # (también si es nuevo: con PK natural, save() de un registro existente llega con _state.adding)
+        ProjectPOFacet.refresh_for_supplier(self.pk)
+
+    def delete(self, *args, **kwargs):
+        from projects.services.catalog_search import CatalogSearchService
+        result = super().delete(*args, **kwargs)
+        CatalogSearchService.invalidate()
+        return result
@@ -10,6 +10,24 @@ from .models import (
     PurchaseOrder, PODetailProduct, PODetailSupplier, Invoice,
     ProjectActivity, ClientInvoice, ProjectMonthlyBaseline
 )
+from .services.po_detail_bulk import PODetailBulkService
+
+
+class IndexedForeignKeyWidget(ForeignKeyWidget):
+    """
+    ForeignKeyWidget que resuelve desde el índice en memoria del resource
+    (`BaseModelResource.lookup_index`), cargado una vez por dataset, en lugar
+    de un `.get()` por fila. Fuera de un resource se comporta como el original.
+    """
+    lookup_source = None
+
+    def get_instance_by_lookup_fields(self, value, row, **kwargs):
+        if self.lookup_source is None:
+            return super().get_instance_by_lookup_fields(value, row, **kwargs)
+        obj = self.lookup_source.lookup_index(self.model, self.field).get(str(value).strip())
+        if obj is None:
+            raise self.model.DoesNotExist(f"{self.model.__name__} con {self.field}='{value}' no existe")
+        return obj
 
 
 # ========================================
@@ -33,6 +51,8 @@ class BaseModelResource(resources.ModelResource):
     HEADER_MAPPINGS = {}
     REQUIRED_FIELDS = []
     DEBUG_ENABLED = False
+    # True: los índices en memoria se conservan entre datasets (importación por bloques)
+    KEEP_LOOKUP_INDEXES = False
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -45,6 +65,12 @@ class BaseModelResource(resources.ModelResource):
             'skipped': 0,
             'error_details': []
         }
+        self._lookup_indexes = {}
+        self._lookup_keys = {}
+        self._written_pks = {}
+        for field in self.fields.values():
+            if isinstance(field.widget, IndexedForeignKeyWidget):
+                field.widget.lookup_source = self
     
     # ========================================
     # CICLO DE VIDA DE IMPORTACIÓN
@@ -52,6 +78,12 @@ class BaseModelResource(resources.ModelResource):
     
     def before_import(self, dataset, **kwargs):
         """Preparación global antes de importar"""
+        # Índices de búsqueda nuevos para cada dataset (salvo que se compartan entre bloques)
+        if not self.KEEP_LOOKUP_INDEXES:
+            self._lookup_indexes = {}
+            self._lookup_keys = {}
+        self._written_pks = {}
+        
         if self.DEBUG_ENABLED:
             self._log_import_start(dataset)
         
@@ -399,27 +431,143 @@ class BaseModelResource(resources.ModelResource):
         except Exception:
             return ''.join(ch for ch in str(s) if ch.isdigit())
 
+    # ================================
+    # Índices de búsqueda en memoria (una vez por dataset)
+    # ================================
+    def lookup_index(self, model_class, field_name):
+        """
+        {valor normalizado: instancia} de `model_class` por `field_name`.
+        Se carga con UNA consulta la primera vez que se pide en el dataset y se
+        reutiliza en todas las filas (before_import lo reinicia); lo que el
+        import guarda después se agrega con `register_instance`.
+        """
+        key = (model_class, field_name)
+        index = self._lookup_indexes.get(key)
+        if index is None:
+            attname = model_class._meta.get_field(field_name).attname
+            index, keys_by_pk = {}, {}
+            for obj in model_class.objects.all():
+                value = str(getattr(obj, attname)).strip()
+                if value not in index:
+                    index[value] = obj
+                    keys_by_pk[obj.pk] = value
+            self._lookup_indexes[key] = index
+            self._lookup_keys[key] = keys_by_pk
+        return index
+
+    def register_instance(self, instance):
+        """
+        Agrega a los índices ya cargados una instancia recién guardada, para que
+        las filas siguientes del mismo dataset la encuentren sin recargar la
+        tabla. Si su valor indexado cambió, se quita la clave anterior.
+        """
+        if instance is None or instance.pk is None:
+            return
+        model_class = type(instance)
+        self._written_pks.setdefault(model_class, set()).add(instance.pk)
+        self._index_instance(instance)
+
+    def _index_instance(self, instance):
+        model_class = type(instance)
+        for key, index in self._lookup_indexes.items():
+            if not isinstance(key, tuple) or key[0] is not model_class:
+                continue
+            keys_by_pk = self._lookup_keys[key]
+            value = str(getattr(instance, model_class._meta.get_field(key[1]).attname)).strip()
+            previous = keys_by_pk.get(instance.pk)
+            if previous is not None and previous != value:
+                index.pop(previous, None)
+                del keys_by_pk[instance.pk]
+            current = index.get(value)
+            if current is None or current.pk == instance.pk:
+                index[value] = instance
+                keys_by_pk[instance.pk] = value
+
+        digits_index = self._lookup_indexes.get('po_digits')
+        digits = self._digits_only(instance.pk) if model_class is PurchaseOrder else ''
+        if digits and digits_index is not None:
+            # po_number es la PK: una OC no cambia de grupo de dígitos
+            bucket = digits_index.setdefault(digits, [])
+            bucket[:] = [po for po in bucket if po.pk != instance.pk] + [instance]
+
+    def discard_written(self):
+        """
+        Tras revertir el dataset: las filas que se escribieron se vuelven a leer
+        de la BD en los índices (las creadas desaparecen, las actualizadas
+        recuperan sus valores). El resto de los índices se conserva.
+        """
+        for model_class, pks in self._written_pks.items():
+            for key, index in self._lookup_indexes.items():
+                if isinstance(key, tuple) and key[0] is model_class:
+                    keys_by_pk = self._lookup_keys[key]
+                    for pk in pks:
+                        value = keys_by_pk.pop(pk, None)
+                        if value is not None:
+                            index.pop(value, None)
+            digits_index = self._lookup_indexes.get('po_digits')
+            if model_class is PurchaseOrder and digits_index is not None:
+                for pk in pks:
+                    bucket = digits_index.get(self._digits_only(pk), [])
+                    bucket[:] = [po for po in bucket if po.pk != pk]
+            for obj in model_class.objects.filter(pk__in=pks):
+                self._index_instance(obj)
+        self._written_pks = {}
+
+    def after_save_instance(self, instance, row, **kwargs):
+        """Mantiene los índices en memoria al día con lo que se va guardando."""
+        super().after_save_instance(instance, row, **kwargs)
+        self.register_instance(instance)
+
+    def _po_digits_index(self):
+        """{solo dígitos del po_number: [OCs]} derivado del índice de OCs."""
+        index = self._lookup_indexes.get('po_digits')
+        if index is None:
+            index = {}
+            for po in self.lookup_index(PurchaseOrder, 'po_number').values():
+                digits = self._digits_only(po.po_number)
+                if digits:
+                    index.setdefault(digits, []).append(po)
+            self._lookup_indexes['po_digits'] = index
+        return index
+
+    @staticmethod
+    def _newest_first(purchase_orders):
+        """Mismo orden que order_by('-issue_date', '-pk') (NULLs primero, como en PostgreSQL)."""
+        return sorted(
+            purchase_orders,
+            key=lambda po: (po.issue_date is None, po.issue_date or date.min, po.pk),
+            reverse=True,
+        )
+
+    def _match_purchase_orders(self, candidates, project_code=None):
+        """OCs cuyo po_number coincide exactamente con algún candidato (en orden de candidatos)."""
+        by_number = self.lookup_index(PurchaseOrder, 'po_number')
+        project_code = self.clean_string(project_code) if project_code else ''
+        matches = []
+        for candidate in candidates:
+            po = by_number.get(candidate)
+            if po is not None and po not in matches and (not project_code or po.project_code_id == project_code):
+                matches.append(po)
+        return matches
+
     def resolve_purchase_order(self, po_raw, project_code=None):
         """Intenta resolver una PurchaseOrder probando múltiples variantes del número.
         Devuelve el objeto o None si no se encuentra.
         
-        Estrategia:
+        Estrategia (sobre el índice en memoria, sin consultas por fila):
         1) Coincidencia exacta contra candidatos generados (decimales, coma, espacios).
-        2) Si falla, fallback por dígitos: buscar por contains del tramo numérico y
-           elegir la OC cuyo `po_number` al quitar no-dígitos coincida exactamente
-           con el tramo numérico (cubre prefijos/sufijos no estándar y espacios).
+        2) Si falla, fallback por dígitos: la OC cuyo `po_number` al quitar no-dígitos
+           coincida exactamente con el tramo numérico (cubre prefijos/sufijos no
+           estándar y espacios).
         """
         candidates = self._po_candidates(po_raw)
         if not candidates:
             return None
 
         # 1) Exact match por candidatos
-        qs = PurchaseOrder.objects.filter(po_number__in=candidates)
-        if project_code:
-            qs = qs.filter(project_code__cod_projects=self.clean_string(project_code))
-        po = qs.order_by('-issue_date', '-id').first()
-        if po:
-            return po
+        matches = self._match_purchase_orders(candidates, project_code)
+        if matches:
+            return self._newest_first(matches)[0]
 
         # 2) Fallback: dígitos únicamente (para casos con prefijos/sufijos/espacios)
         #    Ej.: 'OC 10000460', 'N°10000460', '10000460.0000', '10000460,0'
@@ -439,23 +587,16 @@ class BaseModelResource(resources.ModelResource):
         if not integer_part:
             return None
 
-        qs2 = PurchaseOrder.objects.all()
-        if project_code:
-            qs2 = qs2.filter(project_code__cod_projects=self.clean_string(project_code))
-
-        # Buscar por contains para reducir candidatos, luego validar por dígitos exactos
-        qs2 = qs2.filter(po_number__icontains=integer_part).order_by('-issue_date', '-id')
-        for cand in qs2[:20]:  # limitar inspección
-            cand_digits = self._digits_only(cand.po_number)
-            if cand_digits == integer_part:
-                return cand
-
+        project_code = self.clean_string(project_code) if project_code else ''
+        candidates = [
+            po for po in self._po_digits_index().get(integer_part, [])
+            if not project_code or po.project_code_id == project_code
+        ]
         # Si nada coincide en fallback, devolver None
-        return None
+        return self._newest_first(candidates)[0] if candidates else None
     
-    @staticmethod
-    def validate_foreign_key(model_class, field_name, value, allow_null=True):
-        """Valida que existe una foreign key"""
+    def validate_foreign_key(self, model_class, field_name, value, allow_null=True):
+        """Valida que existe una foreign key (contra el índice en memoria)"""
         if not value or str(value).strip() == '':
             if allow_null:
                 return None
@@ -468,16 +609,11 @@ class BaseModelResource(resources.ModelResource):
                 return None
             raise ValueError(f"{model_class.__name__} - {field_name} es requerido pero tiene valor N/A")
         
-        try:
-            kwargs = {field_name: value_clean}
-            obj = model_class.objects.get(**kwargs)
+        if value_clean in self.lookup_index(model_class, field_name):
             return value_clean
-        except model_class.DoesNotExist:
-            if allow_null:
-                return None
-            raise ValueError(f"{model_class.__name__} con {field_name}='{value_clean}' no existe en la base de datos")
-        except model_class.MultipleObjectsReturned:
-            raise ValueError(f"Múltiples {model_class.__name__} con {field_name}='{value_clean}'")
+        if allow_null:
+            return None
+        raise ValueError(f"{model_class.__name__} con {field_name}='{value_clean}' no existe en la base de datos")
 
 
 # ========================================
@@ -542,7 +678,7 @@ class SupplierResource(BaseModelResource):
 class ProductResource(BaseModelResource):
     ruc_supplier = fields.Field(
         attribute='ruc_supplier',
-        widget=ForeignKeyWidget(Supplier, 'ruc_supplier')
+        widget=IndexedForeignKeyWidget(Supplier, 'ruc_supplier')
     )
 
     HEADER_MAPPINGS = {
@@ -586,7 +722,7 @@ class ProductResource(BaseModelResource):
 class ChanceResource(BaseModelResource):
     info_costumer = fields.Field(
         attribute='info_costumer',
-        widget=ForeignKeyWidget(Costumer, 'ruc_costumer')
+        widget=IndexedForeignKeyWidget(Costumer, 'ruc_costumer')
     )
 
     HEADER_MAPPINGS = {
@@ -632,7 +768,7 @@ class ChanceResource(BaseModelResource):
 class PurchaseOrderResource(BaseModelResource):
     project_code = fields.Field(
         attribute='project_code',
-        widget=ForeignKeyWidget(Projects, 'cod_projects')
+        widget=IndexedForeignKeyWidget(Projects, 'cod_projects')
     )
 
     HEADER_MAPPINGS = {
@@ -721,11 +857,11 @@ class PurchaseOrderResource(BaseModelResource):
 class PODetailProductResource(BaseModelResource):
     purchase_order = fields.Field(
         attribute='purchase_order',
-        widget=ForeignKeyWidget(PurchaseOrder, 'id')
+        widget=IndexedForeignKeyWidget(PurchaseOrder, 'po_number')
     )
     product = fields.Field(
         attribute='product',
-        widget=ForeignKeyWidget(Product, 'code_art')
+        widget=IndexedForeignKeyWidget(Product, 'code_art')
     )
 
     HEADER_MAPPINGS = {
@@ -745,9 +881,24 @@ class PODetailProductResource(BaseModelResource):
     REQUIRED_FIELDS = ['purchase_order', 'product', 'quantity']
     DEBUG_ENABLED = True
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._affected_purchase_orders = set()
+        self._existing_details = {}
+
+    def _resolve_detail_po(self, po_number, project_code=None):
+        """OC exacta (con proyecto si viene) o con sufijo decimal de Excel (ej. 10000460.0)."""
+        if not po_number:
+            return None
+        matches = self._match_purchase_orders(
+            [po_number, f"{po_number}.0", f"{po_number}.00"], project_code
+        )
+        return matches[0] if matches else None
+
     def before_import(self, dataset, **kwargs):
         # Pre-filtrar filas con OC vacía o inexistente ANTES de resolver FKs
         super().before_import(dataset, **kwargs)
+        self._existing_details = {}
 
         headers = list(dataset.headers)
         po_idx = headers.index('purchase_order') if 'purchase_order' in headers else None
@@ -776,37 +927,18 @@ class PODetailProductResource(BaseModelResource):
                     print(f"   ⚠️  Pre-filtro: fila {i} sin OC; purchase_order=NULL")
                 # Continuar a validar factura/fecha
 
-            try:
-                if project_code:
-                    po = PurchaseOrder.objects.get(po_number=po_number, project_code__cod_projects=project_code)
-                else:
-                    po = PurchaseOrder.objects.get(po_number=po_number)
-            except PurchaseOrder.MultipleObjectsReturned:
-                po = PurchaseOrder.objects.filter(po_number=po_number).order_by('-issue_date', '-id').first()
-                if not po:
-                    to_delete.append(i - 1)
-                    skipped += 1
-                    if self.DEBUG_ENABLED:
-                        print(f"   ⏭️  Pre-filtro: fila {i} eliminada (OC '{po_number}' múltiple y no resolvible)")
-                    continue
-            except PurchaseOrder.DoesNotExist:
-                # Fallback: sufijos decimales almacenados en BD (ej. 10000460.0)
-                alt_numbers = [f"{po_number}.0", f"{po_number}.00"]
-                qs = PurchaseOrder.objects.filter(po_number__in=alt_numbers)
-                if project_code:
-                    qs = qs.filter(project_code__cod_projects=project_code)
-                po = qs.order_by('-issue_date', '-id').first()
-                if not po:
-                    to_delete.append(i - 1)
-                    skipped += 1
-                    if self.DEBUG_ENABLED:
-                        print(f"   ⏭️  Pre-filtro: fila {i} eliminada (OC '{po_number}' no existe)")
-                    continue
+            po = self._resolve_detail_po(po_number, project_code)
+            if not po:
+                to_delete.append(i - 1)
+                skipped += 1
+                if self.DEBUG_ENABLED:
+                    print(f"   ⏭️  Pre-filtro: fila {i} eliminada (OC '{po_number}' no existe)")
+                continue
 
-            # Si existe, escribir el id directo en el dataset para el FK widget
+            # Si existe, escribir el po_number (PK) directo en el dataset para el FK widget
             if po_idx is not None:
                 row_values = list(dataset[i - 1])
-                row_values[po_idx] = str(po.id)
+                row_values[po_idx] = str(po.pk)
                 dataset[i - 1] = tuple(row_values)
 
         # Eliminar filas desde el final para mantener índices
@@ -816,6 +948,26 @@ class PODetailProductResource(BaseModelResource):
         if self.DEBUG_ENABLED and skipped:
             print(f"   ⏭️  Pre-filtro: {skipped} filas eliminadas por OC inválida")
 
+        # Modo masivo: una sola fila por (OC, producto); gana la última, como con el upsert fila a fila
+        product_idx = headers.index('product') if 'product' in headers else None
+        if po_idx is not None and product_idx is not None:
+            last_row = {}
+            for i, values in enumerate(dataset):
+                last_row[(values[po_idx], self.clean_string(values[product_idx]))] = i
+            keep = set(last_row.values())
+            duplicates = [i for i in range(len(dataset)) if i not in keep]
+            for idx in reversed(duplicates):
+                del dataset[idx]
+            self._import_stats['skipped'] += len(duplicates)
+
+            # ✅ Detalles existentes de las OCs del archivo en una consulta (para get_instance)
+            self._existing_details = {
+                (detail.purchase_order_id, detail.product_id): detail
+                for detail in PODetailProduct.objects.filter(
+                    purchase_order_id__in={values[po_idx] for values in dataset}
+                ).order_by('-pk')
+            }
+
     def before_import_row(self, row, row_number=None, **kwargs):
         super().before_import_row(row, row_number, **kwargs)
         
@@ -841,37 +993,18 @@ class PODetailProductResource(BaseModelResource):
                 print(f"   ⏭️  Omitida fila {row_number}: OC vacía")
             return
         
-        try:
-            if project_code:
-                po = PurchaseOrder.objects.get(po_number=po_number, project_code__cod_projects=project_code)
-            else:
-                po = PurchaseOrder.objects.get(po_number=po_number)
-            # Pasar ID porque el po_number no es único entre proyectos
-            row['purchase_order'] = str(po.id)
-        except PurchaseOrder.DoesNotExist:
-            # Fallback: sufijos decimales en BD
-            alt_numbers = [f"{po_number}.0", f"{po_number}.00"]
-            qs = PurchaseOrder.objects.filter(po_number__in=alt_numbers)
-            if project_code:
-                qs = qs.filter(project_code__cod_projects=project_code)
-            po = qs.order_by('-issue_date', '-id').first()
-            if not po:
-                # Omitir si no existe la OC
-                row['__skip__'] = True
-                row['__skip_reason'] = f"Fila omitida: OC '{po_number}' no existe"
-                # Neutralizar campo para evitar resolución del ForeignKeyWidget
-                row['purchase_order'] = ''
-                if self.DEBUG_ENABLED:
-                    print(f"   ⏭️  Omitida fila {row_number}: OC '{po_number}' no existe")
-                return
-            else:
-                row['purchase_order'] = str(po.id)
-        except PurchaseOrder.MultipleObjectsReturned:
-            # Sin columna 'project': elegir una OC de forma determinista (la más reciente)
-            po = PurchaseOrder.objects.filter(po_number=po_number).order_by('-issue_date', '-id').first()
-            if not po:
-                raise ValueError(f"OC '{po_number}' existe en múltiples proyectos, y no se pudo seleccionar.")
-            row['purchase_order'] = str(po.id)
+        po = self._resolve_detail_po(po_number, project_code)
+        if not po:
+            # Omitir si no existe la OC
+            row['__skip__'] = True
+            row['__skip_reason'] = f"Fila omitida: OC '{po_number}' no existe"
+            # Neutralizar campo para evitar resolución del ForeignKeyWidget
+            row['purchase_order'] = ''
+            if self.DEBUG_ENABLED:
+                print(f"   ⏭️  Omitida fila {row_number}: OC '{po_number}' no existe")
+            return
+        # Pasar el po_number (PK) resuelto al FK widget
+        row['purchase_order'] = str(po.pk)
         
         # Validar/crear producto del catálogo si falta
         product_code = self.clean_string(row.get('product'))
@@ -896,16 +1029,16 @@ class PODetailProductResource(BaseModelResource):
             descrip = self.clean_string(row.get('product_name'), default='')
 
             if product_code and part_number and manufac:
-                try:
-                    # Si no se proporciona supplier_ruc, usar un proveedor por defecto
-                    if supplier_ruc:
-                        supplier = Supplier.objects.get(ruc_supplier=supplier_ruc)
-                    else:
-                        supplier, _ = Supplier.objects.get_or_create(
-                            ruc_supplier='DUMMY',
-                            defaults={'name_supplier': 'SIN_PROVEEDOR'}
-                        )
-                except Supplier.DoesNotExist:
+                suppliers = self.lookup_index(Supplier, 'ruc_supplier')
+                # Si no se proporciona supplier_ruc, usar un proveedor por defecto
+                if not supplier_ruc and 'DUMMY' not in suppliers:
+                    dummy, _ = Supplier.objects.get_or_create(
+                        ruc_supplier='DUMMY',
+                        defaults={'name_supplier': 'SIN_PROVEEDOR'}
+                    )
+                    self.register_instance(dummy)
+                supplier = suppliers.get(supplier_ruc or 'DUMMY')
+                if supplier is None:
                     # Omitir si no se puede crear producto por proveedor inexistente
                     row['__skip__'] = True
                     row['__skip_reason'] = (
@@ -916,8 +1049,8 @@ class PODetailProductResource(BaseModelResource):
                     if self.DEBUG_ENABLED:
                         print(f"   ⏭️  Omitida fila {row_number}: proveedor '{supplier_ruc}' no existe")
                     return
-                # Crear producto mínimo con defaults razonables
-                Product.objects.create(
+                # Crear producto mínimo con defaults razonables (y registrarlo en el índice)
+                self.register_instance(Product.objects.create(
                     code_art=product_code,
                     part_number=part_number,
                     descrip=descrip or f"Producto {product_code}",
@@ -925,7 +1058,7 @@ class PODetailProductResource(BaseModelResource):
                     manufac=manufac,
                     model=model,
                     cost=self.clean_decimal(row.get('unit_price'), default='0.00', decimal_places=2)
-                )
+                ))
                 row['product'] = product_code
             else:
                 # Omitir si no hay suficientes datos para crear producto
@@ -959,24 +1092,42 @@ class PODetailProductResource(BaseModelResource):
         if self.DEBUG_ENABLED:
             print(f"   ✅ OC: {po_number} | Producto: {row['product']} | Qty: {row['quantity']}")
 
+    # ========================================
+    # MODO MASIVO (use_bulk)
+    # ========================================
+    def before_save_instance(self, instance, row, **kwargs):
+        """Importes en memoria: bulk_create/bulk_update no pasan por save()."""
+        super().before_save_instance(instance, row, **kwargs)
+        instance.calculate_amounts()
+        self._affected_purchase_orders.add(instance.purchase_order_id)
+
+    def get_bulk_update_fields(self):
+        return PODetailBulkService.UPDATE_FIELDS
+
+    def after_import(self, dataset, result, **kwargs):
+        """Totales de OC, montos de proveedor y resúmenes UNA vez por OC afectada."""
+        if not kwargs.get('dry_run') and not result.has_errors():
+            PODetailBulkService.finalize(self._affected_purchase_orders)
+        self._affected_purchase_orders = set()
+        super().after_import(dataset, result, **kwargs)
+
     def get_instance(self, instance_loader, row):
         """Actualizar si ya existe detalle por (purchase_order, product)"""
         po_id = row.get('purchase_order')
         prod_code = self.clean_string(row.get('product'))
-        try:
-            if po_id and prod_code:
-                return PODetailProduct.objects.get(
-                    purchase_order_id=int(po_id),
-                    product__code_art=prod_code
-                )
-        except (PODetailProduct.DoesNotExist, ValueError, TypeError):
-            return None
+        if po_id and prod_code:
+            # Índice cargado en before_import (sin consulta por fila)
+            return self._existing_details.get((str(po_id), prod_code))
+        return None
 
     class Meta:
         model = PODetailProduct
         import_id_fields = ['purchase_order', 'product']
         skip_unchanged = True
         report_skipped = True
+        # ✅ Sin guardado en cascada por fila (ver PODetailBulkService)
+        use_bulk = True
+        batch_size = PODetailBulkService.BATCH_SIZE
         fields = ('purchase_order', 'product', 'product_name', 'quantity', 'measurement_unit', 'unit_price', 'comment')
 
 
@@ -986,7 +1137,7 @@ class PODetailProductResource(BaseModelResource):
 class InvoiceResource(BaseModelResource):
     purchase_order = fields.Field(
         attribute='purchase_order',
-        widget=ForeignKeyWidget(PurchaseOrder, 'id')
+        widget=IndexedForeignKeyWidget(PurchaseOrder, 'po_number')
     )
 
     HEADER_MAPPINGS = {
@@ -1044,10 +1195,10 @@ class InvoiceResource(BaseModelResource):
                 if self.DEBUG_ENABLED:
                     print(f"   ⚠️  Pre-filtro: fila {i} OC '{self.clean_string(po_raw)}' no existe; purchase_order=NULL")
             else:
-                # Escribir id de OC para el FK widget
+                # Escribir po_number (PK) de OC para el FK widget
                 if po_idx is not None:
                     row_values = list(dataset[i - 1])
-                    row_values[po_idx] = str(po.id)
+                    row_values[po_idx] = str(po.pk)
                     dataset[i - 1] = tuple(row_values)
 
             # Marcar y eliminar facturas 'ANULADA'
@@ -1058,6 +1209,7 @@ class InvoiceResource(BaseModelResource):
                 if po:
                     po.po_status = 'ANULADA'
                     po.save()
+                    self.register_instance(po)
                 to_delete.append(i - 1)
                 skipped += 1
                 if self.DEBUG_ENABLED:
@@ -1113,24 +1265,12 @@ class InvoiceResource(BaseModelResource):
         )
         project_code = self.clean_string(row.get('project', ''))
 
-        # Si ya viene el ID (del pre-filtro), no intentar resolver por número
+        # Si ya viene el po_number resuelto (del pre-filtro), confirmarlo en el índice
         po_raw_str = self.clean_string(po_raw)
-        if po_raw_str and po_raw_str.isdigit():
-            try:
-                po_id = int(po_raw_str)
-                PurchaseOrder.objects.get(id=po_id)
-                row['purchase_order'] = str(po_id)
-                if self.DEBUG_ENABLED:
-                    print(f"   ✅ Fila {row_number}: OC por id {po_id} confirmada")
-            except PurchaseOrder.DoesNotExist:
-                # Si el id no existe, intentar resolver por número usando el texto original
-                po = self.resolve_purchase_order(po_raw_str, project_code)
-                if not po:
-                    row['purchase_order'] = ''
-                    if self.DEBUG_ENABLED:
-                        print(f"   ⚠️  Fila {row_number}: OC id '{po_raw_str}'/num no existe; purchase_order=NULL")
-                else:
-                    row['purchase_order'] = str(po.id)
+        if po_raw_str and po_raw_str in self.lookup_index(PurchaseOrder, 'po_number'):
+            row['purchase_order'] = po_raw_str
+            if self.DEBUG_ENABLED:
+                print(f"   ✅ Fila {row_number}: OC {po_raw_str} confirmada")
         else:
             if not self.clean_string(po_raw):
                 # Permitir factura sin OC (campo nullable en modelo)
@@ -1144,7 +1284,7 @@ class InvoiceResource(BaseModelResource):
                     if self.DEBUG_ENABLED:
                         print(f"   ⚠️  Fila {row_number}: OC '{self.clean_string(po_raw)}' no existe; purchase_order=NULL")
                 else:
-                    row['purchase_order'] = str(po.id)
+                    row['purchase_order'] = str(po.pk)
 
         # Tratar 'ANULADA' como estado de la OC: no crear factura
         invoice_number = self.clean_string(row.get('invoice_number'))
@@ -1155,14 +1295,11 @@ class InvoiceResource(BaseModelResource):
         issue_date_val = self.clean_string(row.get('issue_date'))
         if invoice_token == 'ANULADA' or (issue_date_val and issue_date_val.strip().upper() == 'ANULADA'):
             # Si hay OC resuelta, actualizar estado; si no, solo omitir
-            po_id_val = row.get('purchase_order')
-            if po_id_val:
-                try:
-                    po_obj = PurchaseOrder.objects.get(id=int(po_id_val))
-                    po_obj.po_status = 'ANULADA'
-                    po_obj.save()
-                except (PurchaseOrder.DoesNotExist, ValueError, TypeError):
-                    pass
+            po_obj = self.lookup_index(PurchaseOrder, 'po_number').get(str(row.get('purchase_order') or ''))
+            if po_obj:
+                po_obj.po_status = 'ANULADA'
+                po_obj.save()
+                self.register_instance(po_obj)
             row['__skip__'] = True
             row['__skip_reason'] = "Fila omitida: ANULADA"
             if self.DEBUG_ENABLED:
@@ -1197,26 +1334,19 @@ class InvoiceResource(BaseModelResource):
             return
 
         # Si existe ya la factura en BD, validar conflictos de enlace OneToOne con OC
-        try:
-            existing_invoice = Invoice.objects.get(invoice_number=invoice_number)
-        except Invoice.DoesNotExist:
-            existing_invoice = None
+        existing_invoice = self.lookup_index(Invoice, 'invoice_number').get(invoice_number)
 
         po_id_val = row.get('purchase_order')
         if existing_invoice and po_id_val:
-            try:
-                po_id_int = int(po_id_val)
-                # Si la factura ya está enlazada a otra OC distinta, omitir para evitar conflicto OneToOne
-                if existing_invoice.purchase_order_id and existing_invoice.purchase_order_id != po_id_int:
-                    row['__skip__'] = True
-                    row['__skip_reason'] = (
-                        f"Fila omitida: factura {invoice_number} ya vinculada a otra OC (id {existing_invoice.purchase_order_id})"
-                    )
-                    if self.DEBUG_ENABLED:
-                        print(f"   ⏭️  Omitida fila {row_number}: {row['__skip_reason']}")
-                    return
-            except (ValueError, TypeError):
-                pass
+            # Si la factura ya está enlazada a otra OC distinta, omitir para evitar conflicto OneToOne
+            if existing_invoice.purchase_order_id and existing_invoice.purchase_order_id != str(po_id_val):
+                row['__skip__'] = True
+                row['__skip_reason'] = (
+                    f"Fila omitida: factura {invoice_number} ya vinculada a otra OC ({existing_invoice.purchase_order_id})"
+                )
+                if self.DEBUG_ENABLED:
+                    print(f"   ⏭️  Omitida fila {row_number}: {row['__skip_reason']}")
+                return
 
         # Caso normal: si resolvimos OC, ya se asignó arriba
         row['invoice_number'] = invoice_number
@@ -1233,20 +1363,14 @@ class InvoiceResource(BaseModelResource):
 
         invoice_number = row.get('invoice_number')
         if invoice_number:
-            try:
-                return Invoice.objects.get(invoice_number=str(invoice_number))
-            except Invoice.DoesNotExist:
-                pass
-            except (ValueError, TypeError):
-                pass
+            invoice = self.lookup_index(Invoice, 'invoice_number').get(str(invoice_number).strip())
+            if invoice:
+                return invoice
 
         # Fallback por OC si no hubo número
         po_id = row.get('purchase_order')
-        try:
-            if po_id:
-                return Invoice.objects.get(purchase_order_id=int(po_id))
-        except (Invoice.DoesNotExist, ValueError, TypeError):
-            return None
+        if po_id:
+            return self.lookup_index(Invoice, 'purchase_order').get(str(po_id).strip())
         return None
 
     class Meta:
@@ -1263,11 +1387,11 @@ class InvoiceResource(BaseModelResource):
 class PODetailSupplierResource(BaseModelResource):
     purchase_order = fields.Field(
         attribute='purchase_order',
-        widget=ForeignKeyWidget(PurchaseOrder, 'id')  # ✅ CORRECTO: usar 'id'
+        widget=IndexedForeignKeyWidget(PurchaseOrder, 'po_number')
     )
     supplier = fields.Field(
         attribute='supplier',
-        widget=ForeignKeyWidget(Supplier, 'ruc_supplier')
+        widget=IndexedForeignKeyWidget(Supplier, 'ruc_supplier')
     )
 
     HEADER_MAPPINGS = {
@@ -1320,19 +1444,17 @@ class PODetailSupplierResource(BaseModelResource):
                 or row.get('ruc')
                 or row.get('proveedor')
             )
-            try:
-                Supplier.objects.get(ruc_supplier=self.clean_string(supplier_raw))
-            except Supplier.DoesNotExist:
+            if self.clean_string(supplier_raw) not in self.lookup_index(Supplier, 'ruc_supplier'):
                 to_delete.append(i - 1)
                 skipped += 1
                 if self.DEBUG_ENABLED:
                     print(f"   ⏭️  Pre-filtro: fila {i} eliminada (Proveedor no existe)")
                 continue
 
-            # ✅ Escribir ID de OC
+            # ✅ Escribir po_number (PK) de OC
             if po_idx is not None:
                 row_values = list(dataset[i - 1])
-                row_values[po_idx] = str(po.id)
+                row_values[po_idx] = str(po.pk)
                 dataset[i - 1] = tuple(row_values)
 
         for idx in reversed(to_delete):
@@ -1353,19 +1475,8 @@ class PODetailSupplierResource(BaseModelResource):
         project_code = self.clean_string(row.get('project', ''))
 
         po_raw_str = self.clean_string(po_raw)
-        if po_raw_str and po_raw_str.isdigit():
-            try:
-                po_id = int(po_raw_str)
-                PurchaseOrder.objects.get(id=po_id)
-                row['purchase_order'] = str(po_id)
-            except PurchaseOrder.DoesNotExist:
-                po = self.resolve_purchase_order(po_raw_str, project_code)
-                if not po:
-                    row['__skip__'] = True
-                    row['__skip_reason'] = f"OC no existe"
-                    row['purchase_order'] = ''
-                    return
-                row['purchase_order'] = str(po.id)
+        if po_raw_str and po_raw_str in self.lookup_index(PurchaseOrder, 'po_number'):
+            row['purchase_order'] = po_raw_str
         else:
             if not self.clean_string(po_raw):
                 row['__skip__'] = True
@@ -1379,7 +1490,7 @@ class PODetailSupplierResource(BaseModelResource):
                 row['__skip_reason'] = f"OC no existe"
                 row['purchase_order'] = ''
                 return
-            row['purchase_order'] = str(po.id)
+            row['purchase_order'] = str(po.pk)
 
         # ✅ Validar proveedor desde múltiples columnas
         supplier_raw = (
@@ -14,16 +14,16 @@ class AlertManager:
     """
     
     @staticmethod
-    def check_pmi_alerts(project_id):
-        """Verificar alertas de métricas PMI"""
-        from projects.services.earned_value.calculator import EarnedValueCalculator
-        from projects.services.earned_value.metrics import ProjectMetrics
+    def check_pmi_alerts(project_id, evm_data=None):
+        """Verificar alertas de métricas PMI (evm_data: datos ya calculados, p.ej. por PortfolioEVMCalculator)"""
+        from projects.services.earned_value.snapshot_service import EVMSnapshotService
         
         alerts = []
         
         try:
             # Obtener métricas PMI
-            evm_data = EarnedValueCalculator.calculate_earned_value(project_id)
+            if evm_data is None:
+                evm_data = EVMSnapshotService.get_earned_value(project_id, granularities=('month',))
             metrics = evm_data['metrics']
             physical_progress = evm_data['physical_progress']
             
@@ -187,9 +187,9 @@ class AlertManager:
         return alerts
     
     @staticmethod
-    def get_all_alerts(project_id):
+    def get_all_alerts(project_id, evm_data=None):
         """Obtener todas las alertas del proyecto"""
-        pmi_alerts = AlertManager.check_pmi_alerts(project_id)
+        pmi_alerts = AlertManager.check_pmi_alerts(project_id, evm_data=evm_data)
         financial_alerts = AlertManager.check_financial_alerts(project_id)
         invoice_alerts = AlertManager.check_invoice_alerts(project_id)
         
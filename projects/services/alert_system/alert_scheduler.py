@@ -17,13 +17,19 @@ class AlertScheduler:
         try:
             from .alert_manager import AlertManager
             from projects.models import Projects
+            from projects.services.earned_value.portfolio import PortfolioEVMCalculator
             
             active_projects = Projects.objects.filter(state_projects='ACTIVO')
             total_alerts = 0
             
-            for project in active_projects:
+            # ✅ EVM de todos los proyectos activos en un número fijo de consultas
+            portfolio = PortfolioEVMCalculator.calculate(active_projects)
+            
+            for project_id, entry in portfolio.items():
+                project = entry['project']
                 try:
-                    alerts = AlertManager.get_all_alerts(project.cod_projects_id)
+                    # Sin EVM precalculado (p.ej. falta BAC) se usa el cálculo por proyecto
+                    alerts = AlertManager.get_all_alerts(project_id, evm_data=entry['evm'])
                     
                     if alerts:
                         total_alerts += len(alerts)
@@ -37,7 +43,7 @@ class AlertScheduler:
                 except Exception as e:
                     logger.error(f"Error verificando {project.cod_projects_id}: {e}")
             
-            logger.info(f"Verificación diaria completada: {total_alerts} alertas en {active_projects.count()} proyectos")
+            logger.info(f"Verificación diaria completada: {total_alerts} alertas en {len(portfolio)} proyectos")
             return total_alerts
             
         except Exception as e:
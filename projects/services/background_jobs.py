@@ -0,0 +1,171 @@
+# projects/services/background_jobs.py
+import io
+import logging
+import os
+import traceback
+import uuid
+from decimal import Decimal
+
+from django.core.files.storage import default_storage
+
+logger = logging.getLogger(__name__)
+
+# tipo de trabajo -> handler(job) que devuelve un resultado JSON-serializable
+JOB_HANDLERS = {}
+
+
+def job_handler(kind):
+    """Registra `func(job)` como handler de los trabajos `kind`."""
+    def decorator(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+class BackgroundJobService:
+    """
+    Cola de trabajos en BD (BackgroundJob) para operaciones largas.
+    Las vistas encolan con `enqueue()` y responden con el id; el comando
+    `run_jobs` ejecuta los handlers registrados en JOB_HANDLERS.
+    """
+
+    UPLOAD_DIR = 'jobs'
+
+    @staticmethod
+    def enqueue(kind, params=None, user=None, max_attempts=None):
+        from projects.models import BackgroundJob
+
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Tipo de trabajo desconocido: {kind}")
+        return BackgroundJob.enqueue(kind, params=params, user=user, max_attempts=max_attempts)
+
+    @staticmethod
+    def store_upload(uploaded_file, subdir):
+        """Guarda un archivo subido para que el worker lo lea; devuelve la ruta en storage."""
+        name = f"{uuid.uuid4().hex}_{os.path.basename(uploaded_file.name)}"
+        return default_storage.save(os.path.join(BackgroundJobService.UPLOAD_DIR, subdir, name), uploaded_file)
+
+    @staticmethod
+    def run(job):
+        """Ejecuta un trabajo ya reclamado (RUNNING) y registra éxito, reintento o fallo."""
+        handler = JOB_HANDLERS.get(job.kind)
+        if handler is None:
+            job.attempts = job.max_attempts
+            job.mark_failed(f"Tipo de trabajo desconocido: {job.kind}")
+            return job
+        try:
+            result = handler(job)
+        except Exception as e:
+            logger.exception(f"Trabajo {job.pk} ({job.kind}) falló")
+            job.mark_failed(f"{e}\n{traceback.format_exc(limit=5)}")
+        else:
+            job.mark_succeeded(result)
+        return job
+
+    @staticmethod
+    def run_next(worker_id, kinds=None):
+        """Reclama y ejecuta un trabajo; None si no hay pendientes."""
+        from projects.models import BackgroundJob
+
+        job = BackgroundJob.claim(worker_id, kinds=kinds)
+        if job is None:
+            return None
+        return BackgroundJobService.run(job)
+
+
+# ========================================
+# HANDLERS
+# ========================================
+
+@job_handler('import_file')
+def _import_file(job):
+    """Importación por bloques de un CSV/XLSX subido (ver ChunkedImportService)."""
+    from projects.management.commands.import_chunked import RESOURCES
+    from projects.services.chunked_import import ChunkedImportService
+
+    params = job.params
+    resource_class = RESOURCES[params['resource']]
+    path = default_storage.path(params['path'])
+
+    def progress(info):
+        job.set_progress(message=(
+            f"{info['rows']} filas ({info['chunk']} bloques, {info['chunk_errors']} con error)"
+        ))
+
+    info = ChunkedImportService.run(
+        resource_class, path,
+        chunk_size=params.get('chunk_size'),
+        dry_run=params.get('dry_run', False),
+        sheet=params.get('sheet'),
+        progress=progress,
+        debug=False,
+    )
+    default_storage.delete(params['path'])
+    return {
+        'rows': info['rows'],
+        'chunks': info['chunk'],
+        'chunk_errors': info['chunk_errors'],
+        'rolled_back_rows': info['rolled_back_rows'],
+        'totals': info['totals'],
+        'errors': info['errors'][:100],
+    }
+
+
+@job_handler('audit_projects_evm')
+def _audit_projects_evm(job):
+    """Auditoría EVM del portafolio (mismo comando de consola)."""
+    from django.core.management import call_command
+
+    out = io.StringIO()
+    call_command('audit_projects_evm', stdout=out, **job.params)
+    return {'output': out.getvalue()[-4000:]}
+
+
+@job_handler('activity_weights')
+def _activity_weights(job):
+    """Recalcula pesos de actividades de los proyectos indicados (todos si no hay lista)."""
+    from projects.models import Projects
+    from projects.services.earned_value.activity_calculator import ActivityCalculator
+
+    project_ids = job.params.get('project_ids')
+    projects = Projects.objects.order_by('cod_projects_id')
+    if project_ids:
+        projects = projects.filter(cod_projects_id__in=project_ids)
+    projects = list(projects)
+
+    updated = []
+    for i, project in enumerate(projects, start=1):
+        if ActivityCalculator.calculate_activity_weights(project):
+            updated.append(project.cod_projects_id)
+        job.set_progress(i * 100 // len(projects), f"{i}/{len(projects)} proyectos")
+    return {'projects': len(projects), 'updated': updated}
+
+
+@job_handler('parse_invoice_pdf')
+def _parse_invoice_pdf(job):
+    """Lectura de factura PDF/imagen (texto u OCR) subida por el usuario."""
+    from projects.services.invoice_management.client_invoice_pdf_parser import ClientInvoicePDFParser
+
+    path = job.params['path']
+    with default_storage.open(path, 'rb') as f:
+        f.name = job.params.get('name') or os.path.basename(path)
+        data = ClientInvoicePDFParser().parse_uploaded_pdf(f)
+    default_storage.delete(path)
+    return {k: str(v) if isinstance(v, Decimal) else v for k, v in (data or {}).items()}
+
+
+@job_handler('ingest_client_invoices')
+def _ingest_client_invoices(job):
+    """Lote de facturas de cliente (.zip subido) -> ClientInvoice (ver ingest_client_invoices)."""
+    from projects.services.invoice_management.batch_ingest import ClientInvoiceBatchIngestService
+
+    params = job.params
+    result = ClientInvoiceBatchIngestService.run(
+        default_storage.path(params['path']),
+        workers=params.get('workers'),
+        status=params.get('status', 'BORRADOR'),
+        dry_run=params.get('dry_run', False),
+        progress=lambda done, total: job.set_progress(done * 100 // total, f"{done}/{total} archivos"),
+    )
+    default_storage.delete(params['path'])
+    return {'totals': result['totals'], 'rows': result['rows'][:500]}
@@ -1,7 +1,8 @@
 from datetime import date
 from calendar import month_name
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_EVEN, ROUND_HALF_UP
 
+from django.db import connection
 from django.utils import timezone
 
 from projects.models import (
@@ -9,6 +10,7 @@ from projects.models import (
     ProjectBaseline,
     ProjectMonthlyBaseline,
 )
+from projects.services.request_cache import RequestCache, request_memoized
 
 class BaselineService:
     """Servicio para crear/leer baseline mensual persistente.
@@ -40,6 +42,26 @@ class BaselineService:
         baseline.ensure_defaults()
         baseline.save()
 
+        planned = BaselineService._planned_rows(project, baseline)
+
+        # Crear filas si no existen
+        try:
+            existing = set(
+                ProjectMonthlyBaseline.objects.filter(project=project).values_list('month_index', flat=True)
+            )
+        except Exception:
+            # Si la tabla no existe aún, salir sin intentar crear filas (migraciones pendientes)
+            return baseline
+        for row in planned:
+            if row['month_index'] in existing:
+                continue
+            ProjectMonthlyBaseline.objects.create(project=project, baseline=baseline, **row)
+
+        return baseline
+
+    @staticmethod
+    def _planned_rows(project, baseline):
+        """Filas mensuales lineales (sin guardar) del baseline ya completado con ensure_defaults."""
         months = baseline.duration_months
         start_date = baseline.start_date or (project.start_date or timezone.now().date())
         bac = Decimal(str(baseline.bac_planned or 0))
@@ -71,30 +93,51 @@ class BaselineService:
                 cur_month = 1
                 cur_year += 1
 
-        # Crear filas si no existen
-        try:
-            existing = set(
-                ProjectMonthlyBaseline.objects.filter(project=project).values_list('month_index', flat=True)
-            )
-        except Exception:
-            # Si la tabla no existe aún, salir sin intentar crear filas (migraciones pendientes)
-            return baseline
-        for idx in range(1, months + 1):
-            if idx in existing:
-                continue
-            ProjectMonthlyBaseline.objects.create(
-                project=project,
-                baseline=baseline,
-                month_index=idx,
-                pv_planned=pv_series[idx-1],
-                ev_planned=ev_series[idx-1],
-                ac_planned=ac_series[idx-1],
-                client_billing_planned=billing_series[idx-1],
-                progress_planned=progress_series[idx-1],
-                label=labels[idx-1]
-            )
+        return [
+            {
+                'month_index': idx,
+                'pv_planned': pv_series[idx-1],
+                'ev_planned': ev_series[idx-1],
+                'ac_planned': ac_series[idx-1],
+                'client_billing_planned': billing_series[idx-1],
+                'progress_planned': progress_series[idx-1],
+                'label': labels[idx-1],
+            }
+            for idx in range(1, months + 1)
+        ]
 
-        return baseline
+    @staticmethod
+    def preview_arrays(project, rows, baseline=None):
+        """
+        Arrays que devolvería get_monthly_arrays, SIN escribir: con menos de 2
+        filas persistidas (`rows`, dicts de values()) las faltantes se completan
+        en memoria como lo haría ensure_baseline, a partir del ProjectBaseline
+        existente (`baseline`) o de uno nuevo con los valores por defecto.
+        """
+        if len(rows) < 2:
+            baseline = baseline or ProjectBaseline()
+            baseline.project = project
+            baseline.ensure_defaults()
+            # Mismo redondeo que al guardar en DecimalField(2 decimales): numeric redondea
+            # half-up; en SQLite lo hace Django con half-even
+            rounding = ROUND_HALF_EVEN if connection.vendor == 'sqlite' else ROUND_HALF_UP
+            by_index = {}
+            for row in BaselineService._planned_rows(project, baseline):
+                by_index[row['month_index']] = {
+                    key: value.quantize(Decimal('0.01'), rounding=rounding) if isinstance(value, Decimal) else value
+                    for key, value in row.items()
+                }
+            by_index.update((row['month_index'], row) for row in rows)
+            rows = [by_index[idx] for idx in sorted(by_index)]
+        return {
+            'months': [r['month_index'] for r in rows],
+            'labels': [r['label'] for r in rows],
+            'pv': [float(r['pv_planned'] or 0) for r in rows],
+            'ev': [float(r['ev_planned'] or 0) for r in rows],
+            'ac': [float(r['ac_planned'] or 0) for r in rows],
+            'billing': [float(r['client_billing_planned'] or 0) for r in rows],
+            'progress': [float(r['progress_planned'] or 0) for r in rows],
+        }
 
     @staticmethod
     def _build_ephemeral_arrays(project):
@@ -143,11 +186,12 @@ class BaselineService:
         }
 
     @staticmethod
+    @request_memoized('baseline_arrays')
     def get_monthly_arrays(project_id: int):
         """Devuelve arrays: months, pv, ev, ac, billing, progress.
         Pasa a modo efímero si las tablas aún no existen (migraciones pendientes).
         """
-        project = Projects.objects.get(cod_projects_id=project_id)
+        project = RequestCache.get_project(project_id)
         # Si las tablas aún no existen, generar arrays efímeros sin DB
         try:
             rows = ProjectMonthlyBaseline.objects.filter(project=project).order_by('month_index')
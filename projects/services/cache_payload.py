@@ -0,0 +1,132 @@
+# projects/services/cache_payload.py
+import json
+import logging
+import zlib
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import Paginator
+from .cache_versioning import ProjectCacheVersion
+
+logger = logging.getLogger(__name__)
+
+
+class _CountedList:
+    """Secuencia 'vacía' con tamaño conocido: permite paginar sin re-consultar la BD."""
+
+    def __init__(self, total):
+        self.total = total
+
+    def count(self):
+        return self.total
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, item):
+        return []
+
+
+class CachePayload:
+    """
+    Entradas de caché compactas: solo datos primitivos (str, números, listas,
+    dicts), serializados a JSON y comprimidos. Nada de instancias de modelo ni
+    QuerySets, así que el backend compartido guarda muchas más entradas y un
+    hit no vuelve a la BD. Cada entrada tiene un presupuesto de tamaño
+    (settings.CACHE_PAYLOAD_MAX_BYTES); si lo supera no se guarda.
+    """
+
+    @staticmethod
+    def budget():
+        return getattr(settings, 'CACHE_PAYLOAD_MAX_BYTES', 256 * 1024)
+
+    @staticmethod
+    def pack(data):
+        """dict primitivo -> bytes (JSON compacto + zlib). TypeError si hay tipos no primitivos."""
+        raw = json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+        return zlib.compress(raw.encode('utf-8'), 6)
+
+    @staticmethod
+    def unpack(blob):
+        return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+    @staticmethod
+    def set(key, data, timeout=None, max_bytes=None):
+        """Guarda `data` si cabe en el presupuesto. Devuelve True si se guardó."""
+        try:
+            blob = CachePayload.pack(data)
+        except (TypeError, ValueError) as e:
+            logger.error(f"Payload de caché no serializable ({key}): {e}")
+            return False
+
+        max_bytes = max_bytes or CachePayload.budget()
+        if len(blob) > max_bytes:
+            logger.warning(f"Payload de caché omitido ({key}): {len(blob)} bytes > {max_bytes}")
+            return False
+
+        cache.set(key, blob, ProjectCacheVersion.timeout() if timeout is None else timeout)
+        return True
+
+    @staticmethod
+    def get(key):
+        """dict guardado con set(), o None si no existe o está corrupto."""
+        blob = cache.get(key)
+        if blob is None:
+            return None
+        try:
+            return CachePayload.unpack(blob)
+        except Exception:
+            cache.delete(key)
+            return None
+
+    @staticmethod
+    def page(rows, total, number, per_page):
+        """Page de Django para `rows` ya cargadas, sin contar ni consultar de nuevo."""
+        page = Paginator(_CountedList(total), per_page).get_page(number)
+        page.object_list = rows
+        return page
+
+    @staticmethod
+    def has_presale():
+        """True si Chance tiene la relación `presale` (nombre de respaldo de las plantillas)."""
+        from projects.models import Chance
+        try:
+            Chance._meta.get_field('presale')
+        except FieldDoesNotExist:
+            return False
+        return True
+
+    @staticmethod
+    def chance_names(dres_chance, job_name=None):
+        """`cod_projects` para las plantillas: dres_chance y, de respaldo, presale.job_name."""
+        return {'dres_chance': dres_chance, 'presale': {'job_name': job_name}}
+
+    @staticmethod
+    def project_options():
+        """
+        Proyectos para selects/navegación como dicts primitivos:
+        {'cod_projects_id', 'cost_center', 'state_projects',
+        'cod_projects': {'dres_chance', 'presale': {'job_name'}}}.
+        Cacheado con la generación del portafolio.
+        """
+        from projects.models import Projects
+
+        key = ProjectCacheVersion.key('project_options')
+        options = CachePayload.get(key)
+        if options is None:
+            fields = ['cod_projects_id', 'cost_center', 'state_projects', 'cod_projects__dres_chance']
+            if CachePayload.has_presale():
+                fields.append('cod_projects__presale__job_name')
+            options = [
+                {
+                    'cod_projects_id': row['cod_projects_id'],
+                    'cost_center': row['cost_center'],
+                    'state_projects': row['state_projects'],
+                    'cod_projects': CachePayload.chance_names(
+                        row['cod_projects__dres_chance'], row.get('cod_projects__presale__job_name')
+                    ),
+                }
+                for row in Projects.objects.order_by('cod_projects_id').values(*fields)
+            ]
+            CachePayload.set(key, options)
+        return options
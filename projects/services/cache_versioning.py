@@ -0,0 +1,91 @@
+# projects/services/cache_versioning.py
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+
+class ProjectCacheVersion:
+    """
+    Namespace de caché versionado por proyecto.
+    Cada proyecto tiene un contador de generación que se incrementa al escribir
+    OCs, detalles, facturas, facturas de cliente, actividades o baseline
+    (ver ProjectEVMSnapshot.mark_stale). Las claves incluyen la generación, así
+    que tras un cambio las claves viejas simplemente dejan de leerse y el TTL
+    puede ser de horas.
+
+    Las cachés que abarcan varios proyectos (listados, logística sin filtro)
+    usan la generación del portafolio, que sube con cualquier cambio.
+    """
+
+    PORTFOLIO = '__portfolio__'
+    # Los contadores viven más que cualquier entrada versionada
+    COUNTER_TIMEOUT = None
+
+    @staticmethod
+    def _counter_key(project_id):
+        return f'projver:{project_id}'
+
+    @staticmethod
+    def _fresh_version():
+        # Si el contador se pierde (expulsión/reinicio) arranca en un valor nunca
+        # usado, para no volver a leer entradas de una generación anterior
+        return time.time_ns() // 1000
+
+    @staticmethod
+    def get(project_id=None):
+        """Generación actual del proyecto (o del portafolio si project_id es None)."""
+        key = ProjectCacheVersion._counter_key(project_id or ProjectCacheVersion.PORTFOLIO)
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, ProjectCacheVersion._fresh_version(), ProjectCacheVersion.COUNTER_TIMEOUT)
+            version = cache.get(key) or ProjectCacheVersion._fresh_version()
+        return version
+
+    @staticmethod
+    def bump(project_id):
+        """Invalida todas las cachés del proyecto y las del portafolio."""
+        for scope in (project_id, ProjectCacheVersion.PORTFOLIO):
+            if not scope:
+                continue
+            key = ProjectCacheVersion._counter_key(scope)
+            try:
+                cache.incr(key)
+            except ValueError:
+                # Contador inexistente (expulsado o primer uso)
+                cache.set(key, ProjectCacheVersion._fresh_version(), ProjectCacheVersion.COUNTER_TIMEOUT)
+            except Exception:
+                # Backend de caché caído: no romper el guardado
+                pass
+
+    @staticmethod
+    def key(prefix, project_id=None, *parts):
+        """
+        Clave versionada: `prefix:p<proyecto>:v<generación>[:<hash de parts>]`.
+        Sin project_id se usa la generación del portafolio. `parts` (parámetros
+        de filtro, orden, etc.) se resumen en un hash corto.
+        """
+        scope = project_id or ProjectCacheVersion.PORTFOLIO
+        key = f'{prefix}:p{scope}:v{ProjectCacheVersion.get(project_id)}'
+        if parts:
+            raw = '|'.join('' if p is None else str(p) for p in parts)
+            key += ':' + hashlib.md5(raw.encode('utf-8')).hexdigest()
+        return key
+
+    @staticmethod
+    def is_shared():
+        """False si la caché es LocMemCache: contadores por proceso, los cambios de otro proceso no la invalidan."""
+        backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+        return not backend.endswith('LocMemCache')
+
+    @staticmethod
+    def timeout():
+        """
+        TTL de las cachés versionadas: settings.PROJECT_CACHE_TTL con caché
+        compartida; con LocMemCache, LOCAL_CACHE_TTL (las escrituras de otros
+        procesos solo se ven al expirar la entrada).
+        """
+        ttl = getattr(settings, 'PROJECT_CACHE_TTL', 6 * 60 * 60)
+        if ProjectCacheVersion.is_shared():
+            return ttl
+        return min(ttl, getattr(settings, 'LOCAL_CACHE_TTL', 300))
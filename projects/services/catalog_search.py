@@ -0,0 +1,257 @@
+# projects/services/catalog_search.py
+"""
+Búsqueda con ranking de proveedores, productos y OCs (autocompletes de
+logística).
+
+- PostgreSQL con pg_trgm: filtro `icontains` por palabra (resuelto con los
+  índices GIN trigram de la migración 0047) y orden por similitud de palabra
+  + coincidencia al inicio del código/número de parte.
+- Otros motores (SQLite en desarrollo) o sin pg_trgm: índice de prefijos en
+  memoria del proceso (tokens ordenados + bisect), reconstruido cuando
+  cambia el catálogo (generación de ProjectCacheVersion) o vence su TTL
+  (ProjectCacheVersion.timeout(): corto si la caché no es compartida y la
+  generación no ve los cambios de otros procesos).
+
+Un término con varias palabras exige que todas aparezcan (en cualquier campo).
+"""
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+
+from django.db import connection
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Greatest
+
+from projects.services.cache_versioning import ProjectCacheVersion
+
+try:
+    from django.contrib.postgres.search import TrigramWordSimilarity
+    TRIGRAM_IMPORTABLE = True
+except ImportError:
+    TRIGRAM_IMPORTABLE = False
+
+# Generación de proveedores/productos (Supplier.save / Product.save la suben)
+CATALOG_SCOPE = '__catalog__'
+MAX_RESULTS = 50
+
+# tipo -> modelo, clave, campo a mostrar, campos buscados, campos "código"
+# (coincidir al inicio pesa más) y campos extra de la respuesta
+SEARCH_KINDS = {
+    'suppliers': {
+        'model': 'Supplier', 'id': 'ruc_supplier', 'label': 'name_supplier',
+        'fields': ('name_supplier', 'ruc_supplier'), 'codes': ('ruc_supplier',),
+        'extra': (), 'scope': CATALOG_SCOPE,
+    },
+    'products': {
+        'model': 'Product', 'id': 'code_art', 'label': 'descrip',
+        'fields': ('code_art', 'part_number', 'descrip', 'manufac'), 'codes': ('code_art', 'part_number'),
+        'extra': ('part_number', 'manufac'), 'scope': CATALOG_SCOPE,
+    },
+    'purchase_orders': {
+        'model': 'PurchaseOrder', 'id': 'po_number', 'label': 'po_number',
+        'fields': ('po_number',), 'codes': ('po_number',),
+        'extra': ('project_code_id', 'issue_date'), 'scope': None,  # OCs: generación del portafolio
+    },
+}
+
+_TOKEN_RE = re.compile(r'[0-9a-z]+')
+_MAX_CHAR = '\U0010ffff'
+
+
+def normalize(text):
+    """Minúsculas sin tildes (para comparar 'Válvula' con 'valvula')."""
+    text = str(text or '').casefold()
+    if text.isascii():
+        return text
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def tokenize(text):
+    """Palabras normalizadas; con separadores se agrega además el texto compacto ('abc-12' -> abc, 12, abc12)."""
+    tokens = _TOKEN_RE.findall(normalize(text))
+    if len(tokens) > 1:
+        tokens.append(''.join(tokens))
+    return tokens
+
+
+class PrefixIndex:
+    """
+    Índice de prefijos en memoria: listas ordenadas de (token, registro) y de
+    etiquetas/claves normalizadas. Los valores que empiezan con un prefijo
+    forman un rango contiguo que se ubica con dos bisect (equivalente a bajar
+    por un trie, sin un nodo por carácter).
+
+    Los registros se numeran en el orden de desempate (etiqueta más corta
+    primero), así el ranking solo recorre los candidatos con bonificación y el
+    resto se toma por número de registro.
+    """
+
+    def __init__(self, records):
+        # records: [(id, label, extra: dict, texts: tuple)]
+        rows = sorted(
+            ((record_id, str(label or record_id), extra, texts) for record_id, label, extra, texts in records),
+            key=lambda row: (len(row[1]), row[1]),
+        )
+        self.records = [(record_id, label, extra) for record_id, label, extra, _ in rows]
+        pairs, starts = [], []
+        for index, (record_id, label, _, texts) in enumerate(rows):
+            tokens = set()
+            for text in texts:
+                tokens.update(tokenize(text))
+            pairs.extend((token, index) for token in tokens)
+            starts.append((' '.join(_TOKEN_RE.findall(normalize(label))), index))
+            starts.append((' '.join(_TOKEN_RE.findall(normalize(record_id))), index))
+        pairs.sort()
+        starts.sort()
+        self.tokens = [token for token, _ in pairs]
+        self.postings = [index for _, index in pairs]
+        self.starts = [text for text, _ in starts]
+        self.starts_postings = [index for _, index in starts]
+
+    @staticmethod
+    def _range(keys, postings, prefix, exact=False):
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + ('\0' if exact else _MAX_CHAR), lo=start)
+        return set(postings[start:end])
+
+    def search(self, term, limit=10):
+        query = _TOKEN_RE.findall(normalize(term))
+        if not query:
+            return []
+        # Primero el token más largo (rango más chico); luego intersección
+        ordered = sorted(query, key=len, reverse=True)
+        candidates = self._range(self.tokens, self.postings, ordered[0])
+        for token in ordered[1:]:
+            if not candidates:
+                return []
+            candidates &= self._range(self.tokens, self.postings, token)
+
+        # Puntaje: 0.5 por palabra con prefijo, +0.5 si es palabra completa,
+        # +1 si la etiqueta o la clave empiezan con el término
+        bonus = Counter()
+        for token in set(query):
+            exact = self._range(self.tokens, self.postings, token, exact=True) & candidates
+            bonus.update(dict.fromkeys(exact, 0.5 * query.count(token)))
+        bonus.update(self._range(self.starts, self.starts_postings, ' '.join(query)) & candidates)
+
+        base = 0.5 * len(query)
+        top = heapq.nsmallest(limit, ((-score, index) for index, score in bonus.items()))
+        ranked = [(base - neg, index) for neg, index in top]
+        if len(ranked) < limit:
+            ranked += [(base, index) for index in heapq.nsmallest(limit - len(ranked), candidates - bonus.keys())]
+        return [
+            {'id': self.records[index][0], 'label': self.records[index][1], **self.records[index][2], 'score': score}
+            for score, index in ranked
+        ]
+
+
+class CatalogSearchService:
+
+    _lock = threading.Lock()
+    # tipo -> (generación, PrefixIndex), por proceso
+    _indexes = {}
+    _trigram = None
+
+    @staticmethod
+    def trigram_available():
+        """PostgreSQL con la extensión pg_trgm instalada (se consulta una vez por proceso)."""
+        if CatalogSearchService._trigram is None:
+            available = TRIGRAM_IMPORTABLE and connection.vendor == 'postgresql'
+            if available:
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                        available = cursor.fetchone() is not None
+                except Exception:
+                    available = False
+            CatalogSearchService._trigram = available
+        return CatalogSearchService._trigram
+
+    @staticmethod
+    def search(kind, term, limit=10):
+        """
+        [{'id', 'label', <extra>, 'score'}] ordenado por relevancia.
+        `kind`: 'suppliers', 'products' o 'purchase_orders'.
+        """
+        spec = SEARCH_KINDS[kind]
+        limit = max(1, min(int(limit), MAX_RESULTS))
+        if not _TOKEN_RE.search(normalize(term)):
+            return []
+        if CatalogSearchService.trigram_available():
+            return CatalogSearchService._search_trigram(spec, term, limit)
+        return CatalogSearchService.prefix_index(kind).search(term, limit)
+
+    @staticmethod
+    def _model(spec):
+        from django.apps import apps
+        return apps.get_model('projects', spec['model'])
+
+    @staticmethod
+    def _search_trigram(spec, term, limit):
+        term = term.strip()
+        # Cada palabra debe estar en algún campo: UPPER(campo) LIKE usa los índices GIN trigram
+        q = Q()
+        for word in term.split():
+            word_q = Q()
+            for field in spec['fields']:
+                word_q |= Q(**{f'{field}__icontains': word})
+            q &= word_q
+
+        similarities = [TrigramWordSimilarity(Value(term), F(field)) for field in spec['fields']]
+        similarity = Greatest(*similarities) if len(similarities) > 1 else similarities[0]
+        starts = Q()
+        for field in spec['codes']:
+            starts |= Q(**{f"{field}__istartswith": term})
+        rank = similarity + Case(When(starts, then=Value(1.0)), default=Value(0.0), output_field=FloatField())
+
+        id_field, label_field = spec['id'], spec['label']
+        rows = CatalogSearchService._model(spec).objects.filter(q).annotate(rank=rank).order_by(
+            '-rank', label_field, id_field
+        ).values(id_field, label_field, 'rank', *spec['extra'])[:limit]
+        return [
+            {
+                'id': row[id_field],
+                'label': row[label_field] or row[id_field],
+                **{field: row[field] for field in spec['extra']},
+                'score': round(float(row['rank']), 4),
+            }
+            for row in rows
+        ]
+
+    @staticmethod
+    def prefix_index(kind):
+        """PrefixIndex del tipo, reconstruido si cambió la generación del catálogo o venció su TTL."""
+        spec = SEARCH_KINDS[kind]
+        version = ProjectCacheVersion.get(spec['scope'])
+        oldest = time.monotonic() - ProjectCacheVersion.timeout()
+        cached = CatalogSearchService._indexes.get(kind)
+        if cached and cached[0] == version and cached[1] > oldest:
+            return cached[2]
+        with CatalogSearchService._lock:
+            cached = CatalogSearchService._indexes.get(kind)
+            if cached and cached[0] == version and cached[1] > oldest:
+                return cached[2]
+            id_field, label_field = spec['id'], spec['label']
+            columns = list(dict.fromkeys((id_field, label_field, *spec['fields'], *spec['extra'])))
+            records = [
+                (
+                    row[id_field],
+                    row[label_field],
+                    {field: row[field] for field in spec['extra']},
+                    tuple(row[field] for field in spec['fields']),
+                )
+                for row in CatalogSearchService._model(spec).objects.order_by().values(*columns).iterator(chunk_size=5000)
+            ]
+            index = PrefixIndex(records)
+            CatalogSearchService._indexes[kind] = (version, time.monotonic(), index)
+            return index
+
+    @staticmethod
+    def invalidate():
+        """Sube la generación del catálogo (proveedores/productos modificados)."""
+        ProjectCacheVersion.bump(CATALOG_SCOPE)
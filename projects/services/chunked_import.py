@@ -0,0 +1,180 @@
+# projects/services/chunked_import.py
+import csv
+import os
+from itertools import islice
+
+import tablib
+
+
+class ChunkedImportService:
+    """
+    Importación en streaming de CSV/XLSX grandes con los resources de
+    django-import-export.
+
+    El admin (y `resource.import_data`) carga todo el archivo en un Dataset
+    antes de procesar. Aquí el archivo se lee por partes (iterador csv u
+    openpyxl en modo read-only) y cada bloque de `chunk_size` filas pasa por
+    el mismo resource, así que HEADER_MAPPINGS, los `clean_*` y los
+    pre-filtros se aplican igual que en el admin. Cada bloque se confirma en
+    su propia transacción: un bloque con errores se revierte solo, los
+    anteriores quedan guardados.
+
+    Un solo resource atiende todos los bloques, así que los índices de
+    búsqueda se cargan una vez; si un bloque se revierte, solo se releen las
+    filas que ese bloque había escrito.
+    """
+
+    CHUNK_SIZE = 1000
+    # Columna auxiliar con el número de fila del archivo (los resources la ignoran)
+    SOURCE_ROW_COLUMN = '__source_row__'
+    CSV_EXTENSIONS = ('.csv', '.txt')
+    XLSX_EXTENSIONS = ('.xlsx', '.xlsm')
+
+    @staticmethod
+    def _clean_headers(headers):
+        return [str(h).strip() if h is not None else '' for h in headers]
+
+    @staticmethod
+    def _is_empty(row):
+        return all(v is None or (isinstance(v, str) and not v.strip()) for v in row)
+
+    @staticmethod
+    def iter_csv(path, encoding='utf-8-sig', delimiter=None):
+        """(encabezados, iterador de filas) de un CSV, sin leerlo completo."""
+        f = open(path, newline='', encoding=encoding)
+        if delimiter is None:
+            # El separador más frecuente en la línea de encabezados (',' por defecto)
+            first_line = f.readline()
+            f.seek(0)
+            delimiter = max(',;\t|', key=first_line.count) if first_line.strip() else ','
+        reader = csv.reader(f, delimiter=delimiter)
+        headers = next(reader, [])
+
+        def rows():
+            try:
+                yield from reader
+            finally:
+                f.close()
+
+        return ChunkedImportService._clean_headers(headers), rows()
+
+    @staticmethod
+    def iter_xlsx(path, sheet=None):
+        """(encabezados, iterador de filas) de una hoja XLSX en modo read-only."""
+        from openpyxl import load_workbook
+
+        wb = load_workbook(path, read_only=True, data_only=True)
+        ws = wb[sheet] if sheet else wb.active
+        values = ws.iter_rows(values_only=True)
+        headers = next(values, ())
+
+        def rows():
+            try:
+                yield from values
+            finally:
+                wb.close()
+
+        return ChunkedImportService._clean_headers(headers), rows()
+
+    @staticmethod
+    def iter_rows(path, sheet=None, encoding='utf-8-sig', delimiter=None):
+        """Elige el lector según la extensión del archivo."""
+        ext = os.path.splitext(path)[1].lower()
+        if ext in ChunkedImportService.XLSX_EXTENSIONS:
+            return ChunkedImportService.iter_xlsx(path, sheet=sheet)
+        if ext in ChunkedImportService.CSV_EXTENSIONS:
+            return ChunkedImportService.iter_csv(path, encoding=encoding, delimiter=delimiter)
+        raise ValueError(f"Formato no soportado: {ext or path} (use CSV o XLSX)")
+
+    @staticmethod
+    def iter_chunks(headers, rows, chunk_size=None):
+        """
+        Datasets de hasta `chunk_size` filas no vacías, con los mismos
+        encabezados más SOURCE_ROW_COLUMN (fila del archivo; la 1 es el encabezado).
+        """
+        chunk_size = max(1, chunk_size or ChunkedImportService.CHUNK_SIZE)
+        width = len(headers)
+        rows = (
+            (number, row) for number, row in enumerate(rows, start=2)
+            if not ChunkedImportService._is_empty(row)
+        )
+        while True:
+            block = list(islice(rows, chunk_size))
+            if not block:
+                return
+            dataset = tablib.Dataset(headers=list(headers) + [ChunkedImportService.SOURCE_ROW_COLUMN])
+            for number, row in block:
+                # Ajustar filas cortas/largas al ancho del encabezado
+                row = tuple(row[:width]) + (None,) * (width - len(row))
+                dataset.append(row + (number,))
+            yield dataset
+
+    @staticmethod
+    def _source_row(dataset, number):
+        """Fila del archivo de la fila `number` (1..n) del dataset ya procesado por el resource."""
+        try:
+            column = dataset.headers.index(ChunkedImportService.SOURCE_ROW_COLUMN)
+            return dataset[number - 1][column]
+        except (ValueError, IndexError):
+            return None
+
+    @staticmethod
+    def run(resource_class, path, chunk_size=None, dry_run=False, sheet=None,
+            encoding='utf-8-sig', delimiter=None, progress=None, debug=None, resource_kwargs=None):
+        """
+        Importa `path` con `resource_class` bloque a bloque.
+        `progress(info)` se llama tras cada bloque con {'chunk', 'rows', 'totals',
+        'errors', 'chunk_errors', 'rolled_back_rows'}. Devuelve el mismo dict al terminar.
+        'totals' cuenta solo los bloques confirmados; las filas de los bloques
+        revertidos van en 'rolled_back_rows'.
+        `debug` (si no es None) reemplaza DEBUG_ENABLED del resource.
+        """
+        headers, rows = ChunkedImportService.iter_rows(path, sheet=sheet, encoding=encoding, delimiter=delimiter)
+        info = {
+            'chunk': 0,
+            'rows': 0,
+            'totals': {},
+            'errors': [],           # (fila del archivo, mensaje)
+            'chunk_errors': 0,      # bloques revertidos
+            'rolled_back_rows': 0,  # filas leídas de esos bloques
+        }
+        if not headers:
+            return info
+
+        resource = resource_class(**(resource_kwargs or {}))
+        if debug is not None:
+            resource.DEBUG_ENABLED = debug
+        # Índices compartidos entre bloques (discard_written los corrige si un bloque se revierte)
+        resource.KEEP_LOOKUP_INDEXES = True
+
+        for dataset in ChunkedImportService.iter_chunks(headers, rows, chunk_size):
+            chunk_rows = len(dataset)
+            info['chunk'] += 1
+            info['rows'] += chunk_rows
+
+            result = resource.import_data(
+                dataset, dry_run=dry_run, use_transactions=True, raise_errors=False,
+            )
+
+            if result.has_errors() or result.has_validation_errors():
+                info['chunk_errors'] += 1
+                info['rolled_back_rows'] += chunk_rows
+                for error in result.base_errors:
+                    info['errors'].append((None, str(error.error)))
+                for error_row in result.error_rows:
+                    source_row = ChunkedImportService._source_row(dataset, error_row.number)
+                    info['errors'].extend((source_row, str(e.error)) for e in error_row.errors)
+                for invalid in result.invalid_rows:
+                    info['errors'].append(
+                        (ChunkedImportService._source_row(dataset, invalid.number), str(invalid.error_dict))
+                    )
+            else:
+                for import_type, count in result.totals.items():
+                    info['totals'][import_type] = info['totals'].get(import_type, 0) + count
+            if dry_run or result.has_errors() or result.has_validation_errors():
+                # Lo escrito en este bloque no quedó en la BD
+                resource.discard_written()
+
+            if progress:
+                progress(info)
+        return info
@@ -0,0 +1,124 @@
+# projects/services/cost_grid.py
+"""
+Filas del grid de costos variables (una por línea de OC del proyecto) como
+dicts planos, desde una sola consulta `values()` con los JOINs a OC,
+producto, proveedor, proyecto y factura de proveedor. Sin instancias de
+modelo ni prefetch: se puede recorrer con `.iterator()` para exportar, y la
+vista saca de la misma pasada los totales por moneda, el AC y los montos
+por mes.
+"""
+from decimal import Decimal
+
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, NullIf
+
+MONTH_NAMES = {
+    1: 'Enero', 2: 'Febrero', 3: 'Marzo', 4: 'Abril', 5: 'Mayo', 6: 'Junio',
+    7: 'Julio', 8: 'Agosto', 9: 'Septiembre', 10: 'Octubre', 11: 'Noviembre', 12: 'Diciembre',
+}
+
+# (clave de la fila, encabezado del grid en project/index.html)
+COLUMNS = [
+    ('categoria', 'Categoría'),
+    ('cod_projects', 'Cod. Proyecto'),
+    ('cost_center', 'Centro de Costos'),
+    ('cod_art', 'Cod. Producto'),
+    ('part_number', 'PN'),
+    ('descrip', 'Detalle'),
+    ('manufac', 'Marca'),
+    ('model', 'Modelo'),
+    ('sn', 'S/N'),
+    ('quantity', 'Metrado'),
+    ('measurement_unit', 'UND'),
+    ('unit_price', 'Costo Unitario'),
+    ('currency', 'Moneda'),
+    ('total', 'Costo Total'),
+    ('exchange_rate', 'T.C.'),
+    ('local_total', 'S/.'),
+    ('name_supplier', 'Proveedor'),
+    ('po_number', 'Orden de Compra'),
+    ('issue_date', 'Fecha de Orden'),
+    ('guide_number', 'GR'),
+    ('guide_date', 'Fecha Guía'),
+    ('invoice_number', 'N° Comprobante'),
+    ('invoice_date', 'F. Factura'),
+    ('comment', 'Comentarios'),
+]
+
+
+class CostGridService:
+
+    CHUNK_SIZE = 2000
+
+    @staticmethod
+    def queryset(project_id):
+        """values() de las líneas de OC del proyecto con las claves de COLUMNS (fechas y montos sin formatear)."""
+        from projects.models import PODetailProduct, PODetailSupplier
+
+        # Proveedor del producto; si no tiene, el primer proveedor de la OC
+        first_supplier = PODetailSupplier.objects.filter(
+            purchase_order_id=OuterRef('purchase_order_id')
+        ).order_by('id').values('supplier__name_supplier')[:1]
+
+        return PODetailProduct.objects.filter(
+            purchase_order__project_code_id=project_id
+        ).order_by('purchase_order_id', 'id').values(
+            'quantity', 'measurement_unit', 'unit_price', 'total', 'local_total', 'comment',
+            categoria=Value('Equipamiento'),
+            cod_projects=F('purchase_order__project_code__cod_projects_id'),
+            cost_center=F('purchase_order__project_code__cod_projects__cost_center'),
+            cod_art=F('product__code_art'),
+            part_number=F('product__part_number'),
+            descrip=Coalesce(NullIf(F('product__descrip'), Value('')), F('product_name')),
+            manufac=F('product__manufac'),
+            model=F('product__model'),
+            sn=Value(''),
+            currency=F('purchase_order__currency'),
+            exchange_rate=F('purchase_order__exchange_rate'),
+            name_supplier=Coalesce(
+                NullIf(F('product__ruc_supplier__name_supplier'), Value('')),
+                Subquery(first_supplier),
+                Value(''),
+            ),
+            po_number=F('purchase_order_id'),
+            issue_date=F('purchase_order__issue_date'),
+            guide_number=F('purchase_order__guide_number'),
+            guide_date=F('purchase_order__guide_date'),
+            invoice_number=Coalesce(F('purchase_order__invoice__invoice_number'), Value('')),
+            invoice_date=F('purchase_order__invoice__issue_date'),
+        )
+
+    @staticmethod
+    def iter_rows(project_id, chunk_size=None):
+        """Filas del grid leídas por bloques (memoria acotada para exportar miles de líneas)."""
+        return CostGridService.queryset(project_id).iterator(chunk_size=chunk_size or CostGridService.CHUNK_SIZE)
+
+    @staticmethod
+    def grid(project_id):
+        """
+        Filas del grid y sus totales en una sola consulta:
+        {'rows', 'currency_totals': {moneda: Σ total} ('' -> PEN), 'ac': Σ local_total,
+        'by_month': [{'mes', 'total'}] de local_total por mes de la factura de
+        proveedor (o de la OC si no tiene), en orden cronológico}.
+        """
+        rows = list(CostGridService.queryset(project_id))
+        currency_totals, by_month = {}, {}
+        ac = Decimal('0')
+        for row in rows:
+            currency = row['currency'] or 'PEN'
+            currency_totals[currency] = currency_totals.get(currency, Decimal('0')) + (row['total'] or 0)
+            local_total = row['local_total'] or Decimal('0')
+            ac += local_total
+            ref = row['invoice_date'] or row['issue_date']
+            if ref:
+                key = (ref.year, ref.month)
+                by_month[key] = by_month.get(key, Decimal('0')) + local_total
+        return {
+            'rows': rows,
+            'currency_totals': currency_totals,
+            'ac': ac,
+            'by_month': [
+                {'mes': f"{MONTH_NAMES[month]} {year}", 'total': total}
+                for (year, month), total in sorted(by_month.items())
+            ],
+        }
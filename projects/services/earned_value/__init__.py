@@ -1,9 +1,16 @@
 from .calculator import EarnedValueCalculator
 from .activity_calculator import ActivityCalculator
 from .metrics import ProjectMetrics  # Si existe
+from .series_engine import EVMSeriesEngine, ProjectEVMFacts
+from .snapshot_service import EVMSnapshotService
+from .portfolio import PortfolioEVMCalculator
 
 __all__ = [
     'EarnedValueCalculator',
     'ActivityCalculator',
-    'ProjectMetrics'
+    'ProjectMetrics',
+    'EVMSeriesEngine',
+    'ProjectEVMFacts',
+    'EVMSnapshotService',
+    'PortfolioEVMCalculator'
 ]
\ No newline at end of file
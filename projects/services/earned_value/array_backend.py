@@ -0,0 +1,71 @@
+# services/earned_value/array_backend.py
+"""
+Backend vectorizado (NumPy) para las series acumuladas EVM.
+
+Trabaja con arrays float64 y solo convierte a Decimal en el borde de la API
+(`to_decimals`). Si NumPy no está instalado, `NUMPY_AVAILABLE` es False y el
+motor usa el camino Decimal.
+"""
+from decimal import Decimal
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+
+def as_array(values):
+    """Convierte una secuencia (Decimal/float/None) a array float64."""
+    return np.array([float(v or 0) for v in values], dtype=np.float64)
+
+
+def bucket_cumulative(offsets, amounts, units_count, interval=1):
+    """
+    Suma montos por intervalo y devuelve el acumulado.
+    - offsets: desplazamiento de cada monto (días o meses) desde el inicio.
+    - interval: tamaño del intervalo en las mismas unidades (30, 7, 1...).
+    Los índices se recortan a [0, units_count - 1], igual que el camino Decimal.
+    """
+    if units_count <= 0:
+        return np.zeros(0, dtype=np.float64)
+    if len(offsets) == 0:
+        return np.zeros(units_count, dtype=np.float64)
+    idx = np.clip(np.floor_divide(offsets, interval), 0, units_count - 1)
+    return np.cumsum(np.bincount(idx, weights=amounts, minlength=units_count))
+
+
+def bucket_cumulative_in_range(offsets, amounts, units_count):
+    """Como bucket_cumulative, pero descarta (no recorta) los índices fuera de rango."""
+    if units_count <= 0:
+        return np.zeros(0, dtype=np.float64)
+    mask = (offsets >= 0) & (offsets < units_count)
+    if not mask.any():
+        return np.zeros(units_count, dtype=np.float64)
+    return np.cumsum(np.bincount(offsets[mask], weights=amounts[mask], minlength=units_count))
+
+
+def linear_ramp(total, units_count):
+    """Rampa lineal acumulada hasta `total` en `units_count` pasos."""
+    if units_count <= 0:
+        return np.zeros(0, dtype=np.float64)
+    return float(total or 0) * (np.arange(1, units_count + 1, dtype=np.float64) / units_count)
+
+
+def non_decreasing(series):
+    """Serie acumulada no decreciente y >= 0 (equivale a _ensure_non_decreasing)."""
+    arr = series if isinstance(series, np.ndarray) else as_array(series)
+    if arr.size == 0:
+        return arr
+    return np.maximum.accumulate(np.maximum(arr, 0.0))
+
+
+def to_decimals(arr):
+    """Borde de la API: array float -> lista de Decimal."""
+    return [Decimal(str(x)) for x in arr.tolist()]
+
+
+def to_floats(arr):
+    """Borde de la API: array -> lista de float nativos (JSON)."""
+    return arr.tolist()
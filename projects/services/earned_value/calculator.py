@@ -6,7 +6,9 @@ from django.db.models.functions import TruncMonth
 from django.utils import timezone
 from projects.models import Projects, PurchaseOrder, PODetailProduct, BudgetChange, ProjectActivity, Invoice, ClientInvoice
 from .activity_calculator import ActivityCalculator  # ✅ Import limpio
+from .series_engine import EVMSeriesEngine
 from projects.services.baseline_service import BaselineService
+from projects.services.request_cache import request_memoized
 
 class EarnedValueCalculator:
     """
@@ -15,104 +17,14 @@ class EarnedValueCalculator:
     """
 
     @staticmethod
+    @request_memoized('evm_result')
     def calculate_earned_value(project_id):
         """
         Calcula datos EVM según estándar PMI - CON AVANCE FÍSICO REAL
+        Los hechos del proyecto se cargan una sola vez (EVMSeriesEngine) y las
+        series mensual, semanal y diaria se construyen en memoria.
         """
-        project = Projects.objects.get(cod_projects_id=project_id)
-        
-        # 1. BAC desde Chance/Baseline
-        bac = EarnedValueCalculator.get_bac_real(project)
-        
-        # 2. Duración del proyecto
-        duration = project.estimated_duration or 12
-
-        # 2.1 Fecha de inicio segura (corrige inconsistencias)
-        start_date_safe = EarnedValueCalculator.get_safe_start_date(project)
-        
-        # 3. ✅ AVANCE FÍSICO desde ActivityCalculator
-        physical_progress = ActivityCalculator.calculate_physical_progress(project)
-        
-        # 4. ✅ EV basado en avance físico real
-        ev_total = bac * (physical_progress / Decimal('100.00'))
-        
-        # 5. AC desde OCs (costos reales)
-        ac_data = EarnedValueCalculator.calculate_actual_cost_real(project, duration)
-        # 5.1 Pagos verificados (cliente) como serie acumulada paralela
-        ac_paid_data = EarnedValueCalculator.calculate_verified_payments_series(project, duration)
-        
-        # 6. PV acumulado lineal a lo largo de toda la duración (evita ceros iniciales)
-        pv_data = EarnedValueCalculator.calculate_planned_value_pmi(bac, duration, start_date_safe)
-        
-        # 7. Métricas EVM (preliminar, se recalcula tras integrar baseline)
-        metrics = EarnedValueCalculator.calculate_metrics(pv_data, [ev_total] * duration, ac_data, bac)
-        
-        # ➕ Datos por semanas y días (para filtros de visualización)
-        weekly = EarnedValueCalculator._build_granular_curves(project, duration, bac, physical_progress, start_date_safe, interval_days=7)
-        daily = EarnedValueCalculator._build_granular_curves(project, duration, bac, physical_progress, start_date_safe, interval_days=1)
-
-        # EV mensual como acumulado progresivo lineal hasta el EV total
-        ev_months = []
-        for i in range(duration):
-            frac = Decimal(str((i + 1) / duration))
-            ev_months.append(ev_total * frac)
-
-        # ==== Integración con Baseline persistente ====
-        baseline_arrays = BaselineService.get_monthly_arrays(project_id)
-        if baseline_arrays and baseline_arrays.get('months'):
-            # Usar la longitud/meses del baseline para graficar
-            duration = len(baseline_arrays['months'])
-            # PV siempre desde baseline (plan)
-            pv_data = [Decimal(str(x)) for x in baseline_arrays['pv']]
-
-            # EV: solo usar baseline si no existe avance físico real
-            try:
-                has_progress = float(physical_progress or 0) > 0.0 and ev_total > Decimal('0')
-            except Exception:
-                has_progress = False
-            if has_progress:
-                # Recalcular rampa EV con la nueva duración
-                ev_months = []
-                for i in range(duration):
-                    frac = Decimal(str((i + 1) / duration))
-                    ev_months.append(ev_total * frac)
-            else:
-                ev_months = [Decimal(str(x)) for x in baseline_arrays['ev']]
-
-            # Solo sobrescribir AC si la serie real está vacía/cero
-            ac_is_zero = all(v == 0 for v in [float(x) for x in ac_data])
-            if ac_is_zero:
-                ac_data = [Decimal(str(x)) for x in baseline_arrays['ac']]
-
-            # Recalcular series relacionadas con nueva duración
-            ac_paid_data = EarnedValueCalculator.calculate_verified_payments_series(project, duration)
-            weekly = EarnedValueCalculator._build_granular_curves(project, duration, bac, physical_progress, start_date_safe, interval_days=7)
-            daily = EarnedValueCalculator._build_granular_curves(project, duration, bac, physical_progress, start_date_safe, interval_days=1)
-
-            # Asegurar series no decrecientes
-            pv_data = EarnedValueCalculator._ensure_non_decreasing(pv_data)
-            ev_months = EarnedValueCalculator._ensure_non_decreasing(ev_months)
-            ac_data = EarnedValueCalculator._ensure_non_decreasing(ac_data)
-            ac_paid_data = EarnedValueCalculator._ensure_non_decreasing(ac_paid_data)
-
-            # Recalcular métricas con las series finales
-            metrics = EarnedValueCalculator.calculate_metrics(pv_data, ev_months, ac_data, bac)
-
-        return {
-            'curve_data': {
-                'months': list(range(1, duration + 1)),
-                'pv': [float(val) for val in pv_data],
-                'ev': [float(val) for val in ev_months],
-                'ac': [float(val) for val in ac_data],
-                'ac_paid': [float(val) for val in ac_paid_data]
-            },
-            'curve_data_weekly': weekly,
-            'curve_data_daily': daily,
-            'metrics': metrics,
-            'bac_calculated': float(bac),
-            'physical_progress': float(physical_progress),
-            'pmi_compliant': True
-        }
+        return EVMSeriesEngine.for_project(project_id).calculate()
 
     @staticmethod
     def calculate_verified_payments_series(project, duration):
@@ -16,9 +16,9 @@ class ProjectMetrics:
         """
         Calcula índices de desempeño avanzados según PMI
         """
-        from .calculator import EarnedValueCalculator
+        from .snapshot_service import EVMSnapshotService
         
-        evm_data = EarnedValueCalculator.calculate_earned_value(project_id)
+        evm_data = EVMSnapshotService.get_earned_value(project_id, granularities=('month',))
         metrics = evm_data['metrics']
         
         # Índices de desempeño avanzados
@@ -100,9 +100,9 @@ class ProjectMetrics:
         """
         Métricas de riesgo del proyecto según PMI
         """
-        from .calculator import EarnedValueCalculator
+        from .snapshot_service import EVMSnapshotService
         
-        evm_data = EarnedValueCalculator.calculate_earned_value(project_id)
+        evm_data = EVMSnapshotService.get_earned_value(project_id, granularities=('month',))
         metrics = evm_data['metrics']
         bac = evm_data['bac_calculated']
         
@@ -198,9 +198,9 @@ class ProjectMetrics:
         """
         Métricas de pronóstico y proyección
         """
-        from .calculator import EarnedValueCalculator
+        from .snapshot_service import EVMSnapshotService
         
-        evm_data = EarnedValueCalculator.calculate_earned_value(project_id)
+        evm_data = EVMSnapshotService.get_earned_value(project_id, granularities=('month',))
         metrics = evm_data['metrics']
         bac = evm_data['bac_calculated']
         physical_progress = evm_data['physical_progress']
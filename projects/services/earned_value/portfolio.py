@@ -0,0 +1,186 @@
+# services/earned_value/portfolio.py
+from decimal import Decimal
+from django.db.models import (
+    Sum, Max, Min, Count, F, Q, Case, When, Value, DecimalField, ExpressionWrapper,
+)
+from django.db.models.functions import Coalesce, TruncMonth
+from projects.models import (
+    Projects,
+    PurchaseOrder,
+    PODetailProduct,
+    BudgetChange,
+    ProjectActivity,
+    ProjectProgress,
+    ProjectBaseline,
+    ProjectMonthlyBaseline,
+    Invoice,
+    ClientInvoice,
+)
+from .series_engine import EVMSeriesEngine, ProjectEVMFacts
+
+MONEY = DecimalField(max_digits=20, decimal_places=4)
+
+
+class PortfolioEVMCalculator:
+    """
+    EVM de todo el portafolio con un número FIJO de consultas.
+    Cada fuente se agrega en una sola consulta agrupada por proyecto
+    (`values('project').annotate(...)`); el bucketing por intervalo se hace en
+    memoria con EVMSeriesEngine, así que el resultado es el mismo que
+    calculate_earned_value proyecto por proyecto. Es de solo lectura: el
+    baseline faltante se completa en memoria en lugar de crearse.
+    """
+
+    WEIGHT_TOLERANCE = Decimal('0.05')
+
+    @staticmethod
+    def load_facts(projects=None):
+        """
+        Devuelve (facts_por_proyecto, extras_por_proyecto).
+        extras: activities_count, weights_total, weights_valid y po_count (para auditoría).
+        """
+        if projects is None:
+            projects = Projects.objects.all()
+        projects = list(projects.select_related('cod_projects').order_by('cod_projects_id'))
+        ids = [p.cod_projects_id for p in projects]
+        facts = {p.cod_projects_id: ProjectEVMFacts(p) for p in projects}
+        extras = {
+            pid: {'activities_count': 0, 'weights_total': Decimal('0.00'), 'weights_valid': False, 'po_count': 0}
+            for pid in ids
+        }
+        if not ids:
+            return facts, extras
+
+        # Cambios de presupuesto aprobados
+        for row in (BudgetChange.objects.filter(project_id__in=ids, status='Aprobado')
+                    .values('project_id').annotate(total=Sum('amount'))):
+            if row['total'] is not None:
+                facts[row['project_id']].changes_total = Decimal(str(row['total']))
+
+        # Facturas de proveedor agrupadas por día/moneda/TC (mismo AC que factura a factura)
+        for row in (Invoice.objects.filter(purchase_order__project_code_id__in=ids)
+                    .values('purchase_order__project_code_id', 'issue_date', 'currency', 'exchange_rate')
+                    .annotate(total_amount=Sum('total_amount'))
+                    .order_by('purchase_order__project_code_id', 'issue_date')):
+            facts[row.pop('purchase_order__project_code_id')].invoices.append(row)
+
+        # Detalles de OC por fecha de OC, solo para proyectos sin facturas
+        without_invoices = [pid for pid in ids if not facts[pid].invoices]
+        if without_invoices:
+            for row in (PODetailProduct.objects.filter(purchase_order__project_code_id__in=without_invoices)
+                        .values('purchase_order__project_code_id', 'purchase_order__issue_date')
+                        .annotate(amount=Sum(Coalesce('local_total', 'total')))
+                        .order_by('purchase_order__project_code_id', 'purchase_order__issue_date')):
+                facts[row['purchase_order__project_code_id']].po_details.append({
+                    'purchase_order__issue_date': row['purchase_order__issue_date'],
+                    'local_total': row['amount'] if row['amount'] is not None else Decimal('0.00'),
+                    'total': None,
+                })
+
+        # Pagos verificados del cliente agrupados por mes (TruncMonth de la fecha efectiva)
+        paid_value = Case(
+            When(Q(paid_amount__isnull=False) & ~Q(paid_amount=0), then=F('paid_amount')),
+            default=Coalesce(F('amount'), Value(Decimal('0.00'))),
+            output_field=MONEY,
+        )
+        for row in (ClientInvoice.objects.filter(project_id__in=ids, status__in=ProjectEVMFacts.PAID_STATUSES)
+                    .annotate(month=TruncMonth(Coalesce(
+                        'fully_paid_date', 'bank_verified_date', 'payment_reported_date', 'invoice_date'
+                    )), value=paid_value)
+                    .values('project_id', 'month')
+                    .annotate(total=Sum('value'))
+                    .order_by('project_id', 'month')):
+            facts[row['project_id']].client_payments.append({
+                'fully_paid_date': row['month'],
+                'bank_verified_date': None,
+                'payment_reported_date': None,
+                'invoice_date': None,
+                'paid_amount': row['total'],
+                'amount': None,
+            })
+
+        # Actividades activas: Σ(peso × %) agregado en una fila por proyecto
+        for row in (ProjectActivity.objects.filter(project_id__in=ids, is_active=True)
+                    .values('project_id')
+                    .annotate(
+                        weighted=Sum(ExpressionWrapper(F('calculated_weight') * F('percentage_completed'), output_field=MONEY)),
+                        weights_total=Sum('calculated_weight'),
+                        first_created=Min('created_at'),
+                        activities_count=Count('id'),
+                    )):
+            pid = row['project_id']
+            facts[pid].activities = [{
+                'calculated_weight': Decimal(str(row['weighted'] or 0)) / Decimal('100.00'),
+                'percentage_completed': Decimal('100.00'),
+                'created_at': row['first_created'],
+            }]
+            weights_total = Decimal(str(row['weights_total'] or 0))
+            extras[pid].update({
+                'activities_count': row['activities_count'],
+                'weights_total': weights_total,
+                'weights_valid': abs(weights_total - Decimal('100.00')) <= PortfolioEVMCalculator.WEIGHT_TOLERANCE,
+            })
+
+        # Fallback de avance: máximo ProjectProgress de proyectos sin actividades
+        without_activities = [pid for pid in ids if not facts[pid].activities]
+        if without_activities:
+            try:
+                for row in (ProjectProgress.objects.filter(project_id__in=without_activities)
+                            .values('project_id').annotate(max_pct=Max('actual_percentage'))):
+                    facts[row['project_id']].progress_max = row['max_pct']
+            except Exception:
+                pass
+
+        # Baseline mensual persistente
+        try:
+            rows = (ProjectMonthlyBaseline.objects.filter(project_id__in=ids)
+                    .order_by('project_id', 'month_index')
+                    .values('project_id', 'month_index', 'label', 'pv_planned', 'ev_planned',
+                            'ac_planned', 'client_billing_planned', 'progress_planned'))
+            for pid in ids:
+                facts[pid].baseline_rows = []
+            for row in rows:
+                facts[row.pop('project_id')].baseline_rows.append(row)
+        except Exception:
+            for pid in ids:
+                facts[pid].baseline_rows = None
+
+        # Resumen de baseline de los proyectos sin filas suficientes (se completan en memoria)
+        incomplete = [pid for pid in ids if facts[pid].baseline_rows is not None and len(facts[pid].baseline_rows) < 2]
+        if incomplete:
+            try:
+                for baseline in ProjectBaseline.objects.filter(project_id__in=incomplete):
+                    facts[baseline.project_id].baseline = baseline
+            except Exception:
+                pass
+
+        # OCs: primera fecha de emisión y cantidad
+        for row in (PurchaseOrder.objects.filter(project_code_id__in=ids)
+                    .values('project_code_id')
+                    .annotate(first=Min('issue_date'), po_count=Count('pk'))):
+            facts[row['project_code_id']].po_first_date = row['first']
+            extras[row['project_code_id']]['po_count'] = row['po_count']
+
+        return facts, extras
+
+    @staticmethod
+    def calculate(projects=None, include_granular=False, backend=None):
+        """
+        EVM de todos los proyectos de `projects` (queryset; por defecto todos).
+        Devuelve {project_id: {'project', 'evm', 'error', 'physical_progress', **extras}}; 'evm' es None
+        si el proyecto no se pudo calcular (p.ej. sin BAC) y 'error' trae el motivo.
+        """
+        facts_by_project, extras = PortfolioEVMCalculator.load_facts(projects)
+
+        results = {}
+        for pid, facts in facts_by_project.items():
+            entry = {'project': facts.project, 'evm': None, 'error': None}
+            entry.update(extras[pid])
+            engine = EVMSeriesEngine(facts, backend=backend, read_only=True)
+            entry['physical_progress'] = float(engine.physical_progress())
+            try:
+                entry['evm'] = engine.calculate(include_granular=include_granular)
+            except Exception as e:
+                entry['error'] = str(e)
+            results[pid] = entry
+        return results
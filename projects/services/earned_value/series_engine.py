@@ -0,0 +1,462 @@
+# services/earned_value/series_engine.py
+from decimal import Decimal
+from datetime import date
+from django.conf import settings
+from django.db.models import Sum, Max
+from django.utils import timezone
+from projects.models import (
+    PODetailProduct,
+    BudgetChange,
+    ProjectActivity,
+    ProjectProgress,
+    ProjectMonthlyBaseline,
+    Invoice,
+    ClientInvoice,
+)
+from projects.services.baseline_service import BaselineService
+from projects.services.request_cache import RequestCache
+from . import array_backend
+
+
+class ProjectEVMFacts:
+    """
+    Hechos de un proyecto necesarios para las series EVM, cargados UNA sola vez.
+    Cada fuente (facturas, detalles de OC, pagos de cliente, actividades y
+    baseline) se consulta como máximo una vez con `values()`; el resto de
+    cálculos trabaja en memoria.
+    """
+
+    PAID_STATUSES = ['PAGO_VERIFICADO', 'PAGADA']
+
+    def __init__(self, project):
+        self.project = project
+        self.changes_total = Decimal('0.00')
+        self.invoices = []
+        self.po_details = []
+        self.client_payments = []
+        self.activities = []
+        self.progress_max = None
+        self.baseline_rows = None
+        # ProjectBaseline (resumen) precargado para el cálculo de solo lectura
+        self.baseline = None
+        # Primera OC (solo para la fecha de inicio segura); la precarga
+        # PortfolioEVMCalculator, aquí no se consulta
+        self.po_first_date = None
+
+    @classmethod
+    def load(cls, project_id):
+        """Carga el proyecto y todos sus hechos EVM con un número fijo de consultas."""
+        project = RequestCache.get_project(project_id)
+        facts = cls(project)
+
+        # Cambios de presupuesto aprobados
+        try:
+            total = BudgetChange.objects.filter(project=project, status='Aprobado').aggregate(total=Sum('amount'))['total']
+            facts.changes_total = Decimal(str(total)) if total is not None else Decimal('0.00')
+        except Exception as e:
+            print(f"⚠️ Error obteniendo BudgetChange: {e}")
+
+        # Facturas de proveedores (AC preferido)
+        facts.invoices = list(
+            Invoice.objects.filter(purchase_order__project_code=project)
+            .order_by('issue_date')
+            .values('issue_date', 'total_amount', 'exchange_rate', 'currency')
+        )
+
+        # Detalles de OC solo si no hay facturas (fallback de AC)
+        if not facts.invoices:
+            facts.po_details = list(
+                PODetailProduct.objects.filter(purchase_order__project_code=project)
+                .order_by('purchase_order__issue_date')
+                .values('purchase_order__issue_date', 'local_total', 'total')
+            )
+
+        # Pagos verificados del cliente
+        facts.client_payments = list(
+            ClientInvoice.objects.filter(project=project, status__in=cls.PAID_STATUSES)
+            .order_by('invoice_date')
+            .values('fully_paid_date', 'bank_verified_date', 'payment_reported_date',
+                    'invoice_date', 'paid_amount', 'amount')
+        )
+
+        # Actividades activas (avance físico) y fallback a ProjectProgress
+        facts.activities = list(
+            ProjectActivity.objects.filter(project=project, is_active=True)
+            .values('calculated_weight', 'percentage_completed', 'created_at')
+        )
+        if not facts.activities:
+            try:
+                facts.progress_max = ProjectProgress.objects.filter(project=project).aggregate(
+                    max_pct=Max('actual_percentage')
+                )['max_pct']
+            except Exception:
+                facts.progress_max = None
+
+        # Baseline mensual persistente (None = tabla no disponible)
+        try:
+            facts.baseline_rows = list(
+                ProjectMonthlyBaseline.objects.filter(project=project)
+                .order_by('month_index')
+                .values('month_index', 'label', 'pv_planned', 'ev_planned', 'ac_planned',
+                        'client_billing_planned', 'progress_planned')
+            )
+        except Exception:
+            facts.baseline_rows = None
+
+        return facts
+
+
+class EVMSeriesEngine:
+    """
+    Motor de series EVM (PV/EV/AC/AC pagado) mensual, semanal y diario.
+    Construye todas las series a partir de ProjectEVMFacts en memoria,
+    con la misma salida que EarnedValueCalculator.calculate_earned_value.
+
+    backend='numpy' (o settings.EVM_SERIES_BACKEND) usa el backend vectorizado
+    de array_backend; si NumPy no está instalado se usa el camino Decimal.
+    read_only=True no crea filas de baseline faltantes: las completa en memoria
+    (BaselineService.preview_arrays) con el mismo resultado.
+    """
+
+    def __init__(self, facts, backend=None, read_only=False):
+        self.facts = facts
+        self.read_only = read_only
+        self.project = facts.project
+        backend = backend or getattr(settings, 'EVM_SERIES_BACKEND', 'decimal')
+        self.use_arrays = backend == 'numpy' and array_backend.NUMPY_AVAILABLE
+        self._ac_points = None
+
+    @classmethod
+    def for_project(cls, project_id, backend=None):
+        return cls(ProjectEVMFacts.load(project_id), backend=backend)
+
+    # ===== Datos base =====
+    def bac(self):
+        """BAC vigente: Chance.total_costs (o cost_aprox_chance) + cambios aprobados."""
+        bac_baseline = None
+        try:
+            chance = self.project.cod_projects
+            if getattr(chance, 'total_costs', None):
+                bac_baseline = Decimal(str(chance.total_costs))
+            elif getattr(chance, 'cost_aprox_chance', None):
+                bac_baseline = Decimal(str(chance.cost_aprox_chance))
+        except Exception as e:
+            print(f"⚠️ Error obteniendo Chance: {e}")
+
+        if bac_baseline is None:
+            raise ValueError("No hay BAC disponible (necesita Chance con costos)")
+        return bac_baseline + self.facts.changes_total
+
+    def physical_progress(self):
+        """Σ(peso × % completado) / 100 sobre actividades activas (mismo criterio que ActivityCalculator)."""
+        activities = self.facts.activities
+        if not activities:
+            if self.facts.progress_max is not None:
+                return Decimal(str(self.facts.progress_max)).quantize(Decimal('0.01'))
+            return Decimal(str(self.project.physical_percent_complete or 0)).quantize(Decimal('0.01'))
+
+        total_progress = sum(
+            (act['calculated_weight'] * act['percentage_completed']) / Decimal('100.00')
+            for act in activities
+        )
+        return total_progress.quantize(Decimal('0.01'))
+
+    def safe_start_date(self):
+        """
+        Misma prioridad que EarnedValueCalculator.get_safe_start_date, solo con los
+        hechos cargados (sin consultas). El PV lineal no usa la fecha de inicio,
+        así que la primera OC solo cuenta si ya viene precargada.
+        """
+        today = date.today()
+        project = self.project
+        if project.start_date and project.start_date <= today:
+            return project.start_date
+
+        po_first = self.facts.po_first_date
+        created = [a['created_at'] for a in self.facts.activities if a['created_at']]
+        act_first = min(created).date() if created else None
+
+        lp = project.last_progress_update if project.last_progress_update else None
+
+        past_candidates = [d for d in [po_first, act_first, lp] if d and d <= today]
+        if past_candidates:
+            return min(past_candidates)
+        return project.start_date or None
+
+    def baseline_arrays(self):
+        """Arrays de baseline; delega en BaselineService cuando hay que crear/rellenar filas."""
+        rows = self.facts.baseline_rows
+        if self.read_only:
+            if rows is None:
+                return BaselineService._build_ephemeral_arrays(self.project)
+            return BaselineService.preview_arrays(self.project, rows, self.facts.baseline)
+        if rows is None or len(rows) < 2:
+            return BaselineService.get_monthly_arrays(self.project.cod_projects_id)
+        return {
+            'months': [r['month_index'] for r in rows],
+            'labels': [r['label'] for r in rows],
+            'pv': [float(r['pv_planned'] or 0) for r in rows],
+            'ev': [float(r['ev_planned'] or 0) for r in rows],
+            'ac': [float(r['ac_planned'] or 0) for r in rows],
+            'billing': [float(r['client_billing_planned'] or 0) for r in rows],
+            'progress': [float(r['progress_planned'] or 0) for r in rows],
+        }
+
+    # ===== Series en memoria =====
+    @staticmethod
+    def _cumulative(buckets):
+        acc = Decimal('0.00')
+        result = []
+        for val in buckets:
+            acc += val
+            result.append(acc)
+        return result
+
+    def actual_cost_series(self, units_count, interval_days):
+        """
+        AC acumulado por intervalos (30 = meses, 7 = semanas, 1 = días).
+        Prefiere facturas de proveedor; si no existen, usa detalles de OC.
+        """
+        if self.facts.invoices:
+            dated = [inv for inv in self.facts.invoices if inv['issue_date']]
+            if not dated:
+                return [Decimal('0.00')] * units_count
+            start_date = dated[0]['issue_date']
+            buckets = [Decimal('0.00')] * units_count
+            for inv in dated:
+                exchange = Decimal(str(inv['exchange_rate'] or 1))
+                amount_local = Decimal(str(inv['total_amount'] or 0)) * (exchange if inv['currency'] != 'PEN' else Decimal('1'))
+                days = (inv['issue_date'] - start_date).days
+                idx = min(units_count - 1, max(0, days // interval_days))
+                buckets[idx] += amount_local
+            return self._cumulative(buckets)
+
+        dated = [d for d in self.facts.po_details if d['purchase_order__issue_date']]
+        if not dated:
+            return [Decimal('0.00')] * units_count
+        start_date = min(d['purchase_order__issue_date'] for d in dated)
+        buckets = [Decimal('0.00')] * units_count
+        for det in dated:
+            days = (det['purchase_order__issue_date'] - start_date).days
+            idx = min(units_count - 1, max(0, days // interval_days))
+            valor = det['local_total'] if det['local_total'] is not None else det['total'] if det['total'] is not None else Decimal('0.00')
+            buckets[idx] += Decimal(str(valor))
+        return self._cumulative(buckets)
+
+    def verified_payments_series(self, duration):
+        """Serie mensual acumulada de pagos verificados del cliente (ver calculate_verified_payments_series)."""
+        if not self.facts.client_payments:
+            return [Decimal('0.00')] * duration
+
+        ref_date = self.project.start_date or timezone.now().date()
+        monthly = {}
+        for inv in self.facts.client_payments:
+            inv_date = inv['fully_paid_date'] or inv['bank_verified_date'] or inv['payment_reported_date'] or inv['invoice_date']
+            if not inv_date:
+                continue
+            idx = (inv_date.year - ref_date.year) * 12 + (inv_date.month - ref_date.month)
+            if idx < 0 or idx >= duration:
+                continue
+            amount = Decimal(str(inv['paid_amount'] or inv['amount'] or 0))
+            monthly[idx] = monthly.get(idx, Decimal('0')) + amount
+
+        series = []
+        acc = Decimal('0')
+        for i in range(duration):
+            acc += monthly.get(i, Decimal('0'))
+            series.append(acc)
+        return series
+
+    @staticmethod
+    def _linear_ramp(total, units_count):
+        return [total * Decimal(str((i + 1) / units_count)) for i in range(units_count)]
+
+    def granular_curves(self, duration_months, bac, ev_total, interval_days):
+        """Curvas PV/EV/AC por semanas (7) o días (1), como _build_granular_curves."""
+        from .calculator import EarnedValueCalculator
+
+        units_count = max(1, duration_months * (30 // interval_days))
+        pv_units = EarnedValueCalculator._calculate_pv_by_interval(bac, duration_months, None, interval_days, units_count)
+        ev_units = self._linear_ramp(ev_total, units_count)
+        ac_units = self.actual_cost_series(units_count, interval_days)
+        return {
+            'labels': list(range(1, units_count + 1)),
+            'pv': [float(x) for x in pv_units],
+            'ev': [float(x) for x in ev_units],
+            'ac': [float(x) for x in ac_units],
+            'interval_days': interval_days,
+        }
+
+    # ===== Series vectorizadas (backend NumPy) =====
+    def actual_cost_points(self):
+        """(desplazamiento en días, monto local) de cada costo real; se extrae una sola vez."""
+        if self._ac_points is None:
+            np = array_backend.np
+            offsets, amounts = [], []
+            if self.facts.invoices:
+                dated = [inv for inv in self.facts.invoices if inv['issue_date']]
+                if dated:
+                    start_date = dated[0]['issue_date']
+                    for inv in dated:
+                        rate = float(inv['exchange_rate'] or 1) if inv['currency'] != 'PEN' else 1.0
+                        offsets.append((inv['issue_date'] - start_date).days)
+                        amounts.append(float(inv['total_amount'] or 0) * rate)
+            else:
+                dated = [d for d in self.facts.po_details if d['purchase_order__issue_date']]
+                if dated:
+                    start_date = min(d['purchase_order__issue_date'] for d in dated)
+                    for det in dated:
+                        valor = det['local_total'] if det['local_total'] is not None else det['total']
+                        offsets.append((det['purchase_order__issue_date'] - start_date).days)
+                        amounts.append(float(valor or 0))
+            self._ac_points = (np.array(offsets, dtype=np.int64), np.array(amounts, dtype=np.float64))
+        return self._ac_points
+
+    def actual_cost_array(self, units_count, interval_days):
+        offsets, amounts = self.actual_cost_points()
+        return array_backend.bucket_cumulative(offsets, amounts, units_count, interval_days)
+
+    def verified_payments_array(self, duration):
+        np = array_backend.np
+        ref_date = self.project.start_date or timezone.now().date()
+        offsets, amounts = [], []
+        for inv in self.facts.client_payments:
+            inv_date = inv['fully_paid_date'] or inv['bank_verified_date'] or inv['payment_reported_date'] or inv['invoice_date']
+            if not inv_date:
+                continue
+            offsets.append((inv_date.year - ref_date.year) * 12 + (inv_date.month - ref_date.month))
+            amounts.append(float(inv['paid_amount'] or inv['amount'] or 0))
+        return array_backend.bucket_cumulative_in_range(
+            np.array(offsets, dtype=np.int64), np.array(amounts, dtype=np.float64), duration
+        )
+
+    def granular_arrays(self, duration_months, bac, ev_total, interval_days):
+        units_count = max(1, duration_months * (30 // interval_days))
+        return {
+            'labels': list(range(1, units_count + 1)),
+            'pv': array_backend.to_floats(array_backend.linear_ramp(bac, units_count)),
+            'ev': array_backend.to_floats(array_backend.linear_ramp(ev_total, units_count)),
+            'ac': array_backend.to_floats(self.actual_cost_array(units_count, interval_days)),
+            'interval_days': interval_days,
+        }
+
+    def _calculate_arrays(self, include_granular=True):
+        """Igual que calculate(), pero con arrays float64; Decimal solo para métricas."""
+        from .calculator import EarnedValueCalculator
+        ab = array_backend
+
+        bac = self.bac()
+        duration = self.project.estimated_duration or 12
+        physical_progress = self.physical_progress()
+        ev_total = bac * (physical_progress / Decimal('100.00'))
+
+        ac_data = self.actual_cost_array(duration, 30)
+        pv_data = ab.linear_ramp(bac, duration)
+        ev_months = ab.linear_ramp(ev_total, duration)
+
+        baseline_arrays = self.baseline_arrays()
+        if baseline_arrays and baseline_arrays.get('months'):
+            duration = len(baseline_arrays['months'])
+            pv_data = ab.as_array(baseline_arrays['pv'])
+            if float(physical_progress or 0) > 0.0 and ev_total > Decimal('0'):
+                ev_months = ab.linear_ramp(ev_total, duration)
+            else:
+                ev_months = ab.as_array(baseline_arrays['ev'])
+            if not ac_data.any():
+                ac_data = ab.as_array(baseline_arrays['ac'])
+            ac_paid_data = ab.non_decreasing(self.verified_payments_array(duration))
+            pv_data = ab.non_decreasing(pv_data)
+            ev_months = ab.non_decreasing(ev_months)
+            ac_data = ab.non_decreasing(ac_data)
+        else:
+            ac_paid_data = self.verified_payments_array(duration)
+
+        metrics = EarnedValueCalculator.calculate_metrics(
+            ab.to_decimals(pv_data), ab.to_decimals(ev_months), ab.to_decimals(ac_data), bac
+        )
+
+        result = {
+            'curve_data': {
+                'months': list(range(1, duration + 1)),
+                'pv': ab.to_floats(pv_data),
+                'ev': ab.to_floats(ev_months),
+                'ac': ab.to_floats(ac_data),
+                'ac_paid': ab.to_floats(ac_paid_data)
+            },
+            'metrics': metrics,
+            'bac_calculated': float(bac),
+            'physical_progress': float(physical_progress),
+            'pmi_compliant': True
+        }
+        if include_granular:
+            result['curve_data_weekly'] = self.granular_arrays(duration, bac, ev_total, 7)
+            result['curve_data_daily'] = self.granular_arrays(duration, bac, ev_total, 1)
+        return result
+
+    # ===== Resultado completo =====
+    def calculate(self, include_granular=True):
+        """
+        Datos EVM completos (misma estructura que calculate_earned_value).
+        include_granular=False omite las curvas semanal y diaria (solo mensual + métricas).
+        """
+        from .calculator import EarnedValueCalculator
+
+        if self.use_arrays:
+            return self._calculate_arrays(include_granular)
+
+        bac = self.bac()
+        duration = self.project.estimated_duration or 12
+        start_date_safe = self.safe_start_date()
+        physical_progress = self.physical_progress()
+        ev_total = bac * (physical_progress / Decimal('100.00'))
+
+        # AC real con la duración estimada del proyecto
+        ac_data = self.actual_cost_series(duration, 30)
+        pv_data = EarnedValueCalculator.calculate_planned_value_pmi(bac, duration, start_date_safe)
+        ev_months = self._linear_ramp(ev_total, duration)
+
+        baseline_arrays = self.baseline_arrays()
+        if baseline_arrays and baseline_arrays.get('months'):
+            duration = len(baseline_arrays['months'])
+            pv_data = [Decimal(str(x)) for x in baseline_arrays['pv']]
+
+            try:
+                has_progress = float(physical_progress or 0) > 0.0 and ev_total > Decimal('0')
+            except Exception:
+                has_progress = False
+            if has_progress:
+                ev_months = self._linear_ramp(ev_total, duration)
+            else:
+                ev_months = [Decimal(str(x)) for x in baseline_arrays['ev']]
+
+            if all(v == 0 for v in [float(x) for x in ac_data]):
+                ac_data = [Decimal(str(x)) for x in baseline_arrays['ac']]
+
+            ac_paid_data = self.verified_payments_series(duration)
+
+            pv_data = EarnedValueCalculator._ensure_non_decreasing(pv_data)
+            ev_months = EarnedValueCalculator._ensure_non_decreasing(ev_months)
+            ac_data = EarnedValueCalculator._ensure_non_decreasing(ac_data)
+            ac_paid_data = EarnedValueCalculator._ensure_non_decreasing(ac_paid_data)
+        else:
+            ac_paid_data = self.verified_payments_series(duration)
+
+        metrics = EarnedValueCalculator.calculate_metrics(pv_data, ev_months, ac_data, bac)
+
+        result = {
+            'curve_data': {
+                'months': list(range(1, duration + 1)),
+                'pv': [float(val) for val in pv_data],
+                'ev': [float(val) for val in ev_months],
+                'ac': [float(val) for val in ac_data],
+                'ac_paid': [float(val) for val in ac_paid_data]
+            },
+            'metrics': metrics,
+            'bac_calculated': float(bac),
+            'physical_progress': float(physical_progress),
+            'pmi_compliant': True
+        }
+        if include_granular:
+            result['curve_data_weekly'] = self.granular_curves(duration, bac, ev_total, interval_days=7)
+            result['curve_data_daily'] = self.granular_curves(duration, bac, ev_total, interval_days=1)
+        return result
@@ -0,0 +1,120 @@
+# services/earned_value/snapshot_service.py
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from projects.models import Projects, ProjectEVMSnapshot
+from projects.services.request_cache import request_memoized
+from .calculator import EarnedValueCalculator
+
+
+class EVMSnapshotService:
+    """
+    Lectura/escritura de ProjectEVMSnapshot.
+    Los lectores obtienen las series materializadas; solo se recalcula con
+    EarnedValueCalculator cuando el snapshot falta, está marcado como obsoleto
+    o se calculó en un mes anterior.
+    """
+
+    GRANULARITIES = ('month', 'week', 'day')
+
+    # granularidad -> clave en el resultado de calculate_earned_value
+    RESULT_KEYS = {
+        'month': 'curve_data',
+        'week': 'curve_data_weekly',
+        'day': 'curve_data_daily',
+    }
+
+    @staticmethod
+    @request_memoized('evm_snapshot')
+    def get_earned_value(project_id, granularities=GRANULARITIES):
+        """
+        Datos EVM con la misma estructura que calculate_earned_value.
+        Solo incluye las curvas de `granularities` (la mensual siempre va,
+        porque guarda métricas, BAC y avance físico).
+        """
+        wanted = set(granularities) | {'month'}
+        snapshots = {
+            s.granularity: s
+            for s in ProjectEVMSnapshot.objects.filter(project_id=project_id, granularity__in=wanted)
+        }
+        if len(snapshots) < len(wanted) or not all(s.is_current() for s in snapshots.values()):
+            data = EVMSnapshotService.refresh(project_id)
+            skipped = {key for g, key in EVMSnapshotService.RESULT_KEYS.items() if g not in wanted}
+            return {key: value for key, value in data.items() if key not in skipped}
+
+        month = snapshots['month']
+        result = {
+            'metrics': month.metrics,
+            'bac_calculated': float(month.bac),
+            'physical_progress': float(month.physical_progress),
+            'pmi_compliant': True,
+        }
+        for granularity, snapshot in snapshots.items():
+            result[EVMSnapshotService.RESULT_KEYS[granularity]] = snapshot.series
+        return result
+
+    @staticmethod
+    def refresh(project_id):
+        """
+        Recalcula y guarda los snapshots del proyecto. Devuelve el resultado completo.
+        El flag se limpia ANTES de calcular: si un dato fuente cambia durante el
+        cálculo, el snapshot queda marcado como obsoleto para la siguiente lectura.
+        """
+        existing = set(
+            ProjectEVMSnapshot.objects.filter(project_id=project_id).values_list('granularity', flat=True)
+        )
+        missing = [g for g in EVMSnapshotService.GRANULARITIES if g not in existing]
+        if missing:
+            ProjectEVMSnapshot.objects.bulk_create(
+                [ProjectEVMSnapshot(project_id=project_id, granularity=g, is_stale=True) for g in missing],
+                ignore_conflicts=True,
+            )
+        ProjectEVMSnapshot.objects.filter(project_id=project_id).update(is_stale=False)
+
+        try:
+            data = EarnedValueCalculator.calculate_earned_value(project_id)
+        except Exception:
+            ProjectEVMSnapshot.mark_stale(project_id)
+            raise
+
+        now = timezone.now()
+        bac = Decimal(str(data['bac_calculated'])).quantize(Decimal('0.01'))
+        progress = Decimal(str(data['physical_progress'])).quantize(Decimal('0.01'))
+        with transaction.atomic():
+            for granularity, key in EVMSnapshotService.RESULT_KEYS.items():
+                ProjectEVMSnapshot.objects.filter(project_id=project_id, granularity=granularity).update(
+                    series=data[key],
+                    metrics=data['metrics'],
+                    bac=bac,
+                    physical_progress=progress,
+                    computed_at=now,
+                )
+        return data
+
+    @staticmethod
+    def rebuild_all(stale_only=False, stdout=None):
+        """Reconstruye snapshots de todos los proyectos (o solo obsoletos/vencidos/faltantes)."""
+        project_ids = list(Projects.objects.order_by('cod_projects_id').values_list('cod_projects_id', flat=True))
+        if stale_only:
+            period_start = ProjectEVMSnapshot.period_start()
+            fresh = set(
+                ProjectEVMSnapshot.objects.filter(is_stale=False)
+                .values_list('project_id', flat=True)
+            )
+            stale = set(
+                ProjectEVMSnapshot.objects.filter(Q(is_stale=True) | Q(computed_at__lt=period_start))
+                .values_list('project_id', flat=True)
+            )
+            project_ids = [pid for pid in project_ids if pid in stale or pid not in fresh]
+
+        rebuilt, errors = 0, []
+        for project_id in project_ids:
+            try:
+                EVMSnapshotService.refresh(project_id)
+                rebuilt += 1
+            except Exception as e:
+                errors.append((project_id, str(e)))
+                if stdout:
+                    stdout.write(f"⚠️ {project_id}: {e}")
+        return rebuilt, errors
@@ -48,9 +48,9 @@ class BaseExcelReporter:
             cell.value = value
             cell.font = self.styles['data']
     
-    def auto_adjust_columns(self):
-        """Ajustar automáticamente el ancho de columnas"""
-        for column in self.sheet.columns:
+    def auto_adjust_columns(self, sample_rows=500):
+        """Ajustar el ancho de columnas según una muestra de las primeras filas"""
+        for column in self.sheet.iter_cols(max_row=min(self.sheet.max_row, sample_rows)):
             max_length = 0
             column_letter = column[0].column_letter
             
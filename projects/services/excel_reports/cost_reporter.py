@@ -1,5 +1,6 @@
-from projects.models import Projects, PurchaseOrder
+from projects.models import PurchaseOrder
 from django.db.models import Sum
+from projects.services.request_cache import RequestCache
 
 class CostReporter:
     """Servicio para reportar distribución de costos desde Chance/Projects"""
@@ -7,7 +8,7 @@ class CostReporter:
     @staticmethod
     def get_cost_distribution(project_id):
         """Obtiene distribución de costos desde el Chance asociado al Proyecto"""
-        project = Projects.objects.get(cod_projects_id=project_id)
+        project = RequestCache.get_project(project_id)
         
         # Intentar obtener datos desde Chance (relación OneToOne en Projects)
         try:
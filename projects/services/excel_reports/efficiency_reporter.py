@@ -1,7 +1,8 @@
-from projects.models import Projects, PurchaseOrder, Invoice
+from projects.models import PurchaseOrder, Invoice
 from datetime import datetime
 from collections import defaultdict
 from projects.services.baseline_service import BaselineService
+from projects.services.request_cache import RequestCache
 
 class EfficiencyReporter:
     """Servicio para calcular eficiencia mensual del proyecto"""
@@ -9,7 +10,7 @@ class EfficiencyReporter:
     @staticmethod
     def get_monthly_efficiency(project_id):
         """Calcula eficiencia mensual basada en facturacion vs costos"""
-        project = Projects.objects.get(cod_projects_id=project_id)
+        project = RequestCache.get_project(project_id)
         invoices = Invoice.objects.filter(purchase_order__project_code=project).order_by('issue_date')
         
         # Agrupar por mes
@@ -1,7 +1,8 @@
-from projects.models import Projects, PurchaseOrder, Invoice, PODetailProduct, ClientInvoice
+from projects.models import PurchaseOrder, Invoice, PODetailProduct, ClientInvoice
 from django.db.models import Sum
 from datetime import timedelta
 from projects.services.baseline_service import BaselineService
+from projects.services.request_cache import RequestCache
 
 class ExecutiveReporter:
     """Servicio para datos ejecutivos de Excel - CORREGIDO"""
@@ -9,7 +10,7 @@ class ExecutiveReporter:
     @staticmethod
     def generate_executive_data(project_id):
         """Genera datos ejecutivos - CORREGIDO según PMI"""
-        project = Projects.objects.get(cod_projects_id=project_id)
+        project = RequestCache.get_project(project_id)
         
         # ✅ Presupuesto y monto contractual desde Chance asociado
         try:
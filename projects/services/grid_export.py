@@ -0,0 +1,239 @@
+# projects/services/grid_export.py
+"""
+Exportación en streaming de grids (costos variables, logística) a Excel o CSV.
+
+- CSV: `StreamingHttpResponse` que escribe fila por fila mientras se leen
+  los bloques de la consulta; nada se acumula en memoria.
+- Excel: openpyxl en modo write-only (las filas van a un XML temporal, no a
+  un árbol de celdas) y el .xlsx se envía desde un archivo temporal con
+  `FileResponse`. El ancho de columna se estima con una muestra de las
+  primeras filas, no recorriendo todas las celdas.
+
+Las filas son dicts; `columns` es una lista de (clave, encabezado).
+"""
+import csv
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import chain, islice
+
+from django.db.models import F
+from django.http import FileResponse, StreamingHttpResponse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+DATE_FORMAT = '%d/%m/%Y'
+MAX_COLUMN_WIDTH = 60
+
+# Grid de logística: una fila por línea de OC (mismas columnas que logistica/index.html)
+LOGISTICS_COLUMNS = [
+    ('month', 'Mes'),
+    ('year', 'Año'),
+    ('client', 'Cliente'),
+    ('project', 'Proyecto'),
+    ('requester', 'Solicitante'),
+    ('local_import', 'Local/Import'),
+    ('po_status', 'Status'),
+    ('po_number', 'OC'),
+    ('suppliers', 'Proveedor'),
+    ('manufac', 'Fabricante'),
+    ('part_number', 'PN'),
+    ('issue_date', 'Emisión'),
+    ('te', 'TE'),
+    ('cost_center', 'CECO'),
+    ('code_art', 'Código'),
+    ('descrip', 'Descripción'),
+    ('initial_delivery_date', 'Entrega Inicial'),
+    ('quantity', 'Cantidad'),
+    ('unit_price', 'P.U.'),
+    ('currency', 'Moneda'),
+    ('subtotal', 'Subtotal'),
+    ('igv', 'IGV'),
+    ('total', 'Total'),
+    ('local_total', 'Total Local (S/.)'),
+    ('final_delivery_date', 'Entrega Final'),
+    ('comment', 'Observaciones'),
+    ('forma_pago', 'Forma Pago'),
+    ('pagar_a', 'Pagar A'),
+    ('rucs', 'RUC'),
+    ('invoice_number', 'Factura'),
+    ('invoice_date', 'Fecha Factura'),
+    ('supplier_statuses', 'Status Proveedor'),
+    ('contab_statuses', 'Status Factura'),
+]
+
+
+class _Echo:
+    """Buffer mínimo para csv.writer: devuelve la línea en lugar de guardarla."""
+
+    def write(self, value):
+        return value
+
+
+class GridExportService:
+
+    CHUNK_SIZE = 2000
+    SAMPLE_SIZE = 200
+
+    @staticmethod
+    def chunks(rows, size):
+        iterator = iter(rows)
+        while True:
+            chunk = list(islice(iterator, size))
+            if not chunk:
+                return
+            yield chunk
+
+    # ---------- formatos ----------
+
+    @staticmethod
+    def _text(value):
+        if value is None:
+            return ''
+        if isinstance(value, (date, datetime)):
+            return value.strftime(DATE_FORMAT)
+        return str(value)
+
+    @staticmethod
+    def column_widths(columns, sample):
+        """Ancho por columna según el encabezado y una muestra de filas (acotado a MAX_COLUMN_WIDTH)."""
+        widths = []
+        for key, header in columns:
+            longest = max([len(header)] + [len(GridExportService._text(row.get(key))) for row in sample])
+            widths.append(min(longest + 2, MAX_COLUMN_WIDTH))
+        return widths
+
+    @staticmethod
+    def csv_response(filename, columns, rows):
+        """CSV (UTF-8 con BOM, para Excel) escrito a medida que se leen las filas."""
+        writer = csv.writer(_Echo())
+        keys = [key for key, _ in columns]
+
+        def stream():
+            yield '\ufeff' + writer.writerow([header for _, header in columns])
+            for row in rows:
+                yield writer.writerow([GridExportService._text(row.get(key)) for key in keys])
+
+        response = StreamingHttpResponse(stream(), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    @staticmethod
+    def xlsx_response(filename, columns, rows, sheet_title='Datos', sample_size=None):
+        """.xlsx en modo write-only, enviado por partes desde un archivo temporal."""
+        sample_size = sample_size or GridExportService.SAMPLE_SIZE
+        rows = iter(rows)
+        sample = list(islice(rows, sample_size))
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet(title=sheet_title[:31])
+        # En write-only los anchos se fijan antes de escribir filas
+        for idx, width in enumerate(GridExportService.column_widths(columns, sample), start=1):
+            sheet.column_dimensions[get_column_letter(idx)].width = width
+        sheet.freeze_panes = 'A2'
+
+        header_font = Font(name='Arial', size=10, bold=True, color='FFFFFF')
+        header_fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
+        header_align = Alignment(horizontal='center', vertical='center')
+        header = []
+        for _, title in columns:
+            cell = WriteOnlyCell(sheet, value=title)
+            cell.font, cell.fill, cell.alignment = header_font, header_fill, header_align
+            header.append(cell)
+        sheet.append(header)
+
+        keys = [key for key, _ in columns]
+        for row in chain(sample, rows):
+            values = []
+            for key in keys:
+                value = row.get(key)
+                if value == '':
+                    # Texto vacío = celda vacía (write-only no escribe None)
+                    value = None
+                elif isinstance(value, (date, datetime, Decimal)):
+                    cell = WriteOnlyCell(sheet, value=value)
+                    cell.number_format = 'DD/MM/YYYY' if isinstance(value, (date, datetime)) else '#,##0.00'
+                    value = cell
+                values.append(value)
+            sheet.append(values)
+
+        # TemporaryFile se borra al cerrarse (FileResponse lo cierra al terminar de enviar)
+        output = tempfile.TemporaryFile(suffix='.xlsx')
+        workbook.save(output)
+        output.seek(0)
+        return FileResponse(output, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+
+    @staticmethod
+    def response(export_format, filename_base, columns, rows, sheet_title='Datos'):
+        """Respuesta en 'csv' o 'xlsx' (por defecto)."""
+        if export_format == 'csv':
+            return GridExportService.csv_response(f'{filename_base}.csv', columns, rows)
+        return GridExportService.xlsx_response(f'{filename_base}.xlsx', columns, rows, sheet_title=sheet_title)
+
+    # ---------- grid de logística ----------
+
+    @staticmethod
+    def logistics_rows(pos, chunk_size=None):
+        """
+        Líneas de las OCs `pos` (orden del grid: emisión desc., sin fecha al
+        final) leídas por bloques; los proveedores de cada bloque se traen en
+        una consulta.
+        """
+        from projects.models import PODetailProduct, PODetailSupplier
+
+        chunk_size = chunk_size or GridExportService.CHUNK_SIZE
+        lines = PODetailProduct.objects.filter(
+            purchase_order__in=pos.order_by().values('po_number')
+        ).order_by(
+            F('purchase_order__issue_date').desc(nulls_last=True), '-purchase_order_id', 'id'
+        ).values(
+            'quantity', 'unit_price', 'subtotal', 'igv', 'total', 'local_total', 'comment', 'purchase_order_id',
+            issue_date=F('purchase_order__issue_date'),
+            client=F('purchase_order__project_code__cod_projects__info_costumer__com_name'),
+            project=F('purchase_order__project_code_id'),
+            requester=F('purchase_order__project_code__respon_projects__name'),
+            local_import=F('purchase_order__local_import'),
+            po_status=F('purchase_order__po_status'),
+            manufac=F('product__manufac'),
+            part_number=F('product__part_number'),
+            te=F('purchase_order__te'),
+            cost_center=F('purchase_order__project_code__cost_center'),
+            code_art=F('product__code_art'),
+            descrip=F('product__descrip'),
+            initial_delivery_date=F('purchase_order__initial_delivery_date'),
+            currency=F('purchase_order__currency'),
+            final_delivery_date=F('purchase_order__final_delivery_date'),
+            forma_pago=F('purchase_order__forma_pago'),
+            pagar_a=F('purchase_order__pagar_a'),
+            product_supplier=F('product__ruc_supplier__name_supplier'),
+            product_ruc=F('product__ruc_supplier_id'),
+            invoice_number=F('purchase_order__invoice__invoice_number'),
+            invoice_date=F('purchase_order__invoice__issue_date'),
+        )
+
+        for chunk in GridExportService.chunks(lines.iterator(chunk_size=chunk_size), chunk_size):
+            suppliers = {}
+            for po, name, ruc, status, contab in PODetailSupplier.objects.filter(
+                purchase_order_id__in={row['purchase_order_id'] for row in chunk}
+            ).order_by('id').values_list(
+                'purchase_order_id', 'supplier__name_supplier', 'supplier_id',
+                'supplier_status', 'status_factura_contabilidad',
+            ):
+                suppliers.setdefault(po, []).append((name, ruc, status or '', contab or ''))
+
+            for row in chunk:
+                row['po_number'] = row.pop('purchase_order_id')
+                po_suppliers = suppliers.get(row['po_number'], [])
+                product_supplier, product_ruc = row.pop('product_supplier'), row.pop('product_ruc')
+                issue_date = row['issue_date']
+                row['month'] = f'{issue_date.month:02d}' if issue_date else ''
+                row['year'] = issue_date.year if issue_date else ''
+                # Sin proveedores en la OC: el del producto (como el grid)
+                row['suppliers'] = '; '.join(s[0] for s in po_suppliers) if po_suppliers else (product_supplier or '')
+                row['rucs'] = '; '.join(s[1] for s in po_suppliers) if po_suppliers else (product_ruc or '')
+                row['supplier_statuses'] = '; '.join(s[2] for s in po_suppliers)
+                row['contab_statuses'] = '; '.join(s[3] for s in po_suppliers)
+                yield row
@@ -0,0 +1,249 @@
+# projects/services/invoice_management/batch_ingest.py
+"""
+Ingesta por lotes de facturas de cliente (carpeta o .zip de PDFs/imágenes).
+
+Los archivos se leen en paralelo con ClientInvoicePDFParser en hilos: el texto
+embebido es sobre todo E/S y el OCR de PDFs, página 1 incluida, va al pool de
+procesos de InvoiceOCRPipeline (`ocr_in_pool`). Las imágenes sueltas se leen
+con Tesseract, que también corre como proceso aparte. Se ejecuta en el worker
+(`run_jobs`) o en consola, nunca dentro de un request. Cada factura se asigna a
+un proyecto por número (duplicadas), RUC o nombre del cliente, y las asignadas
+se crean con `bulk_create` como BORRADOR para revisión. Lo que no se puede
+asignar queda en el reporte por archivo como "review".
+"""
+import csv
+import os
+import tempfile
+import zipfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.core.files import File
+from django.db import connection, transaction
+from django.utils.dateparse import parse_date
+
+from .client_invoice_pdf_parser import ClientInvoicePDFParser
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.jpg', '.jpeg', '.png', '.tiff', '.tif', '.bmp', '.webp')
+REPORT_FIELDS = [
+    'file', 'status', 'project_id', 'invoice_number', 'invoice_date', 'due_date',
+    'amount', 'ruc', 'client_name', 'reason',
+]
+
+
+def _parse_file(path):
+    """(datos, error) de un archivo; cada hilo cierra su conexión a BD al terminar."""
+    try:
+        with open(path, 'rb') as fh:
+            parser = ClientInvoicePDFParser(ocr_in_pool=True)
+            return parser.parse_uploaded_pdf(File(fh, name=os.path.basename(path))), None
+    except Exception as e:
+        return {}, str(e)
+    finally:
+        connection.close()
+
+
+class ClientInvoiceBatchIngestService:
+
+    DEFAULT_WORKERS = 4
+
+    @staticmethod
+    @contextmanager
+    def source_files(source):
+        """Rutas de facturas de una carpeta (recursiva) o de un .zip (extraído a un temporal)."""
+        if os.path.isdir(source):
+            paths = [
+                os.path.join(root, name)
+                for root, _, names in os.walk(source)
+                for name in names
+                if os.path.splitext(name.lower())[1] in SUPPORTED_EXTENSIONS
+            ]
+            yield sorted(paths)
+            return
+        if not zipfile.is_zipfile(source):
+            raise ValueError(f"{source} no es una carpeta ni un archivo .zip")
+
+        with tempfile.TemporaryDirectory(prefix='facturas_') as tmp_dir, zipfile.ZipFile(source) as archive:
+            paths = []
+            for i, member in enumerate(sorted(archive.infolist(), key=lambda m: m.filename)):
+                name = os.path.basename(member.filename)
+                if member.is_dir() or not name or os.path.splitext(name.lower())[1] not in SUPPORTED_EXTENSIONS:
+                    continue
+                # Solo el nombre base (sin rutas del zip) y prefijo para no pisar repetidos
+                path = os.path.join(tmp_dir, f"{i:05d}_{name}")
+                with archive.open(member) as src, open(path, 'wb') as dst:
+                    dst.write(src.read())
+                paths.append(path)
+            yield paths
+
+    @staticmethod
+    def display_name(path):
+        name = os.path.basename(path)
+        prefix, _, rest = name.partition('_')
+        return rest if prefix.isdigit() and len(prefix) == 5 and rest else name
+
+    @staticmethod
+    def build_index():
+        """Índices en memoria para asignar proyecto sin consultas por archivo."""
+        from projects.models import ClientInvoice, Projects
+
+        by_ruc, by_client = {}, {}
+        for project_id, ruc, client, state in Projects.objects.values_list(
+            'cod_projects_id', 'cod_projects__info_costumer_id',
+            'cod_projects__info_costumer__com_name', 'state_projects',
+        ):
+            by_ruc.setdefault(str(ruc).strip(), []).append((project_id, state))
+            if client:
+                by_client.setdefault(client.strip().upper(), []).append((project_id, state))
+        existing = {
+            number.strip().upper(): project_id
+            for number, project_id in ClientInvoice.objects.values_list('invoice_number', 'project_id')
+        }
+        return {'by_ruc': by_ruc, 'by_client': by_client, 'existing': existing}
+
+    @staticmethod
+    def _pick_project(candidates):
+        """Un único proyecto, o el único 'En Progreso' si el cliente tiene varios."""
+        if len(candidates) == 1:
+            return candidates[0][0]
+        active = [pid for pid, state in candidates if state == 'En Progreso']
+        return active[0] if len(active) == 1 else None
+
+    @staticmethod
+    def match(data, index):
+        """(project_id, status, motivo) para los datos leídos de una factura."""
+        number = (data.get('invoice_number') or '').strip().upper()
+        if not number:
+            return None, 'review', 'Sin número de factura'
+        if number in index['existing']:
+            return index['existing'][number], 'duplicate', 'Ya registrada'
+
+        for key, lookup in (('ruc', 'by_ruc'), ('client_name', 'by_client')):
+            value = (data.get(key) or '').strip()
+            candidates = index[lookup].get(value.upper() if key == 'client_name' else value, [])
+            if candidates:
+                project_id = ClientInvoiceBatchIngestService._pick_project(candidates)
+                if project_id is None:
+                    return None, 'review', f'{len(candidates)} proyectos para {key} {value}'
+                return project_id, 'matched', f'Asignada por {key}'
+        return None, 'review', 'Sin proyecto para el RUC/cliente'
+
+    @staticmethod
+    def run(source, workers=None, status='BORRADOR', dry_run=False, progress=None):
+        """
+        Lee, asigna y (salvo dry_run) crea las facturas del lote.
+        Devuelve {'rows': [fila de reporte por archivo], 'totals': {status: n}}.
+        `progress(hechos, total)` se llama al terminar cada archivo.
+        """
+        from projects.models import ProjectEVMSnapshot
+
+        workers = max(1, workers or ClientInvoiceBatchIngestService.DEFAULT_WORKERS)
+        index = ClientInvoiceBatchIngestService.build_index()
+        rows, to_create = [], []
+
+        with ClientInvoiceBatchIngestService.source_files(source) as paths:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for done, (path, (data, error)) in enumerate(zip(paths, pool.map(_parse_file, paths)), start=1):
+                    row = ClientInvoiceBatchIngestService._report_row(path, data)
+                    if error or not data:
+                        row.update(status='error', reason=error or 'No se detectaron datos')
+                    else:
+                        project_id, row['status'], row['reason'] = ClientInvoiceBatchIngestService.match(data, index)
+                        row['project_id'] = project_id or ''
+                        if row['status'] == 'matched':
+                            row['status'], row['reason'] = ClientInvoiceBatchIngestService._validate(data, row)
+                        if row['status'] == 'created':
+                            # Evita duplicadas dentro del mismo lote
+                            index['existing'][data['invoice_number'].strip().upper()] = project_id
+                            to_create.append((path, project_id, data, row))
+                    rows.append(row)
+                    if progress:
+                        progress(done, len(paths))
+
+            if dry_run:
+                for *_, row in to_create:
+                    row['status'] = 'parsed'
+            elif to_create:
+                stored_files = []
+                try:
+                    with transaction.atomic():
+                        project_ids = ClientInvoiceBatchIngestService._create_invoices(to_create, status, stored_files)
+                except Exception:
+                    # La transacción se revirtió: no dejar archivos huérfanos en el storage
+                    for stored in stored_files:
+                        stored.storage.delete(stored.name)
+                    raise
+                for project_id in project_ids:
+                    ProjectEVMSnapshot.mark_stale(project_id)
+
+        return {'rows': rows, 'totals': dict(Counter(row['status'] for row in rows))}
+
+    @staticmethod
+    def _create_invoices(to_create, status, stored_files):
+        """
+        bulk_create de las facturas del lote con su archivo; anota en
+        `stored_files` cada archivo guardado (para borrarlo si se revierte).
+        Devuelve los proyectos afectados.
+        """
+        from projects.models import ClientInvoice, ProjectFinancialRollup
+        from projects.models.choices import STATUS_MAPPING
+
+        invoices = []
+        for path, project_id, data, row in to_create:
+            invoice = ClientInvoice(
+                project_id=project_id,
+                invoice_number=data['invoice_number'].strip()[:50],
+                invoice_date=parse_date(row['invoice_date']),
+                due_date=parse_date(row['due_date']) if row['due_date'] else None,
+                amount=Decimal(row['amount']),
+                bank_reference=data.get('bank_reference') or '',
+                description=f"Importada del lote: {row['file']}",
+                status=status,
+                payment_status=STATUS_MAPPING.get(status, 'PENDING'),
+            )
+            with open(path, 'rb') as fh:
+                invoice.invoice_file.save(row['file'], File(fh), save=False)
+            stored_files.append(invoice.invoice_file)
+            invoices.append(invoice)
+        # bulk_create no pasa por save(): refrescar resúmenes una vez por proyecto
+        ClientInvoice.objects.bulk_create(invoices, batch_size=500)
+        project_ids = {invoice.project_id for invoice in invoices}
+        for project_id in project_ids:
+            ProjectFinancialRollup.refresh(project_id)
+        return project_ids
+
+    @staticmethod
+    def _report_row(path, data):
+        row = dict.fromkeys(REPORT_FIELDS, '')
+        row['file'] = ClientInvoiceBatchIngestService.display_name(path)
+        for field in ('invoice_number', 'invoice_date', 'due_date', 'ruc', 'client_name'):
+            row[field] = data.get(field) or ''
+        row['amount'] = str(data['amount']) if data.get('amount') is not None else ''
+        return row
+
+    @staticmethod
+    def _validate(data, row):
+        """('created', motivo) si hay fecha y monto válidos; si no ('review', motivo)."""
+        try:
+            invoice_date = parse_date(row['invoice_date'] or '')
+        except ValueError:
+            invoice_date = None
+        if invoice_date is None:
+            return 'review', f"Fecha de emisión inválida: {row['invoice_date'] or 'vacía'}"
+        try:
+            if row['due_date'] and parse_date(row['due_date']) is None:
+                row['due_date'] = ''
+        except ValueError:
+            row['due_date'] = ''
+        if not row['amount']:
+            return 'review', 'Sin monto'
+        return 'created', row['reason']
+
+    @staticmethod
+    def write_report(rows, path):
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
@@ -1,9 +1,15 @@
 from decimal import Decimal
+import hashlib
 import re
 import os
 import tempfile
 from typing import Dict, Any, Optional, List
 
+from .field_extractor import FIELDS, InvoiceFieldExtractor
+
+# Campos que cortan el OCR por páginas en cuanto aparecen todos
+TARGET_FIELDS = ('invoice_number', 'invoice_date', 'amount', 'ruc')
+
 # ============================================================================
 # CONFIGURACIÓN DE RUTAS PARA WINDOWS
 # ============================================================================
@@ -38,13 +44,52 @@ class ClientInvoicePDFParser:
     """
     Parser mejorado para extraer datos de facturas PDF con mejor detección de OCR
     """
-    def parse_uploaded_pdf(self, pdf_file) -> Dict[str, Any]:
+    # Subir al cambiar la extracción: invalida los resultados en InvoiceParseCache
+    PARSER_VERSION = '2'
+
+    def __init__(self, ocr_in_pool: bool = False):
+        # True: el OCR de PDFs no rasteriza en el hilo que llama (ver InvoiceOCRPipeline)
+        self.ocr_in_pool = ocr_in_pool
+
+    @staticmethod
+    def file_sha256(uploaded_file) -> str:
+        """SHA-256 del contenido, leído por bloques; deja el archivo al inicio."""
+        digest = hashlib.sha256()
+        uploaded_file.seek(0)
+        for chunk in uploaded_file.chunks():
+            digest.update(chunk)
+        uploaded_file.seek(0)
+        return digest.hexdigest()
+
+    def parse_uploaded_pdf(self, pdf_file, use_cache: bool = True) -> Dict[str, Any]:
         """
         Procesa un archivo PDF o imagen subido vía Django.
+        Con `use_cache`, un archivo ya leído (mismo contenido y PARSER_VERSION)
+        devuelve los campos guardados sin volver a hacer OCR.
         """
+        from projects.models import InvoiceParseCache
+
+        file_name = getattr(pdf_file, 'name', 'Unknown')
+        sha256 = None
+        if use_cache:
+            try:
+                sha256 = self.file_sha256(pdf_file)
+            except Exception as e:
+                print(f"⚠️  No se pudo calcular el hash del archivo: {e}")
+            if sha256:
+                cached = InvoiceParseCache.lookup(sha256, self.PARSER_VERSION)
+                if cached is not None:
+                    print(f"✅ {file_name}: campos reutilizados de la caché ({sha256[:12]})")
+                    return cached
+
+        data = self._parse_uploaded_file(pdf_file, file_name)
+        if sha256:
+            InvoiceParseCache.store(sha256, self.PARSER_VERSION, data, file_name=file_name)
+        return data
+
+    def _parse_uploaded_file(self, pdf_file, file_name: str) -> Dict[str, Any]:
         temp_path = None
         try:
-            file_name = getattr(pdf_file, 'name', 'Unknown')
             print(f"\n{'='*60}")
             print(f" INICIANDO ANÁLISIS: {file_name}")
             print(f"{'='*60}\n")
@@ -75,7 +120,7 @@ class ClientInvoicePDFParser:
                         destination.write(chunk)
 
             # Detectar el tipo real del archivo (no solo por extensión)
-            file_type = self._detect_file_type(temp_path, file_name)
+            file_type, pdf_text = self._probe_file(temp_path, file_name)
             print(f" Tipo de archivo detectado: {file_type}")
             
             if file_type == 'image':
@@ -86,7 +131,7 @@ class ClientInvoicePDFParser:
                 data = self.parse_pdf_with_ocr(temp_path)
             else:
                 print(" Archivo detectado como PDF con texto")
-                data = self.parse_pdf_smart(temp_path)
+                data = self.parse_pdf_smart(temp_path, text=pdf_text)
 
             print(f"\n{'='*60}")
             print(f"✅ ANÁLISIS COMPLETADO")
@@ -116,33 +161,41 @@ class ClientInvoicePDFParser:
         """
         Detecta el tipo real del archivo (no solo por extensión)
         """
+        return self._probe_file(file_path, file_name)[0]
+
+    def _probe_file(self, file_path: str, file_name: str):
+        """
+        (tipo, texto) del archivo. Para PDFs se mira primero si alguna página
+        tiene objetos de texto; si no, es un escaneo y no se extrae nada más.
+        Si los tiene, el texto extraído aquí lo reutiliza parse_pdf_smart.
+        """
         file_ext = os.path.splitext(file_name.lower())[1]
         
         # Si la extensión es de imagen, es imagen
         if file_ext in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp']:
-            return 'image'
+            return 'image', None
         
         # Si es PDF, verificar si realmente contiene texto o es solo imagen
         if file_ext == '.pdf':
             try:
-                # Intentar extraer texto del PDF
-                text = self._extract_text_improved(file_path)
+                text = _probe_text_layer(file_path)
                 if text and len(text.strip()) > 100 and not self._is_text_garbled(text):
-                    return 'pdf_text'
-                else:
-                    return 'pdf_image'  # PDF que es realmente una imagen
-            except:
-                return 'pdf_image'  # Si hay error, asumir que es imagen
+                    return 'pdf_text', text
+                return 'pdf_image', None  # PDF que es realmente una imagen
+            except Exception:
+                return 'pdf_image', None  # Si hay error, asumir que es imagen
         
         # Por defecto, tratar como PDF
-        return 'pdf_text'
+        return 'pdf_text', None
     
     def parse_pdf_with_ocr(self, pdf_path: str) -> Dict[str, Any]:
         """
         Procesa un PDF que es realmente una imagen usando OCR
         """
         print(" Procesando PDF como imagen con OCR...")
-        text = _extract_text_from_pdf_with_ocr(pdf_path)
+        text = _extract_text_from_pdf_with_ocr(
+            pdf_path, stop_when=self._has_target_fields, first_page_in_pool=self.ocr_in_pool
+        )
         
         if not text:
             print("❌ No se pudo extraer texto del PDF con OCR")
@@ -159,14 +212,16 @@ class ClientInvoicePDFParser:
         normalized = self._normalize(text)
         return self._parse_text(normalized)
     
-    def parse_pdf_smart(self, pdf_path: str) -> Dict[str, Any]:
+    def parse_pdf_smart(self, pdf_path: str, text: Optional[str] = None) -> Dict[str, Any]:
         """
-        Método inteligente que decide si usar extracción de texto o OCR
+        Método inteligente que decide si usar extracción de texto o OCR.
+        `text`: texto ya extraído por _probe_file (evita abrir el PDF otra vez).
         """
         print("\n PASO 1: Intentando extracción de texto...")
         
         # Intentar extraer texto primero
-        text = self._extract_text_improved(pdf_path)
+        if text is None:
+            text = self._extract_text_improved(pdf_path)
         
         # Evaluar calidad del texto extraído
         needs_ocr = False
@@ -192,7 +247,9 @@ class ClientInvoicePDFParser:
         # Si el texto no es útil, usar OCR
         if needs_ocr:
             print("\n PASO 2: Aplicando OCR...")
-            ocr_text = _extract_text_from_pdf_with_ocr(pdf_path)
+            ocr_text = _extract_text_from_pdf_with_ocr(
+                pdf_path, stop_when=self._has_target_fields, first_page_in_pool=self.ocr_in_pool
+            )
             
             if ocr_text and len(ocr_text.strip()) >= 50:
                 print(f"✅ OCR exitoso ({len(ocr_text)} chars)")
@@ -277,6 +334,12 @@ class ClientInvoicePDFParser:
             
         return False
     
+    def _has_target_fields(self, text: str) -> bool:
+        """True si el texto OCR ya trae número, fecha, monto y RUC (corte temprano del OCR)."""
+        normalized = self._normalize(self._clean_ocr_text(text or ''))
+        values, _ = InvoiceFieldExtractor.extract(normalized, fields=TARGET_FIELDS)
+        return all(values.get(field) for field in TARGET_FIELDS)
+
     def _has_invoice_keywords(self, text: str) -> bool:
         """
         Verifica si el texto contiene palabras clave de facturas - MEJORADO
@@ -326,343 +389,52 @@ class ClientInvoicePDFParser:
     
     def _parse_text(self, normalized: str) -> Dict[str, Any]:
         """
-        Extrae datos de factura del texto normalizado - MEJORADO
+        Extrae datos de factura del texto normalizado con las reglas
+        precompiladas de InvoiceFieldExtractor (una regla por campo).
         """
+        values, rules = InvoiceFieldExtractor.extract(normalized)
         data: Dict[str, Any] = {}
-        
-        print("\n" + "="*60)
-        print(" INICIANDO EXTRACCIÓN DE DATOS")
-        print("="*60)
-        
-        # 1. Número de factura - PATRONES MEJORADOS
-        print("\n1️⃣ Buscando número de factura...")
-        inv_num = self._extract_invoice_number(normalized)
-        if inv_num:
-            data["invoice_number"] = inv_num
-            print(f"   ✅ Encontrado: {inv_num}")
-        else:
-            print("   ❌ No encontrado")
-        
-        # 2. Fecha de emisión - PATRONES MEJORADOS
-        print("\n2️⃣ Buscando fecha de emisión...")
-        inv_date = self._extract_invoice_date(normalized)
-        if inv_date:
-            data["invoice_date"] = self._normalize_date(inv_date)
-            print(f"   ✅ Encontrado: {inv_date} → {data['invoice_date']}")
-        else:
-            print("   ❌ No encontrada")
-        
-        # 3. Fecha de vencimiento - MEJORADO
-        print("\n3️⃣ Buscando fecha de vencimiento...")
-        due_date = self._extract_due_date(normalized)
-        if due_date:
-            data["due_date"] = self._normalize_date(due_date)
-            print(f"   ✅ Encontrado: {due_date}")
-        else:
-            print("   ❌ No encontrada")
-        
-        # 4. Monto - PATRONES MEJORADOS
-        print("\n4️⃣ Buscando monto...")
-        amount = self._extract_amount(normalized)
-        if amount:
-            data["amount"] = amount
-            print(f"   ✅ Encontrado: S/ {amount}")
-        else:
-            print("   ❌ No encontrado")
-        
-        # 5. RUC - MEJORADO
-        print("\n5️⃣ Buscando RUC del cliente...")
-        ruc = self._extract_ruc(normalized)
-        if ruc:
-            data["ruc"] = ruc
-            print(f"   ✅ Encontrado: {ruc}")
-        else:
-            print("   ❌ No encontrado")
-        
-        # 6. Nombre del cliente - MEJORADO
-        print("\n6️⃣ Buscando nombre del cliente...")
-        client_name = self._extract_client_name(normalized)
-        if client_name:
-            data["client_name"] = client_name
-            print(f"   ✅ Encontrado: {client_name}")
-        else:
-            print("   ❌ No encontrado")
-        
-        # 7. Referencia bancaria - MEJORADO
-        print("\n7️⃣ Buscando referencia bancaria...")
-        bank_ref = self._extract_bank_reference(normalized)
-        if bank_ref:
-            data["bank_reference"] = bank_ref
-            print(f"   ✅ Encontrado: {bank_ref}")
-        else:
-            print("   ❌ No encontrado")
-        
+        for field in FIELDS:
+            if field not in values:
+                continue
+            value = values[field]
+            data[field] = self._normalize_date(value) if field in ('invoice_date', 'due_date') else value
+
         print("\n" + "="*60)
-        print(f" RESUMEN: {len(data)} campos extraídos")
+        print(f" EXTRACCIÓN: {len(data)} campos")
+        for field in FIELDS:
+            if field in data:
+                print(f"   ✅ {field}: {data[field]}  [{rules[field]}]")
+            else:
+                print(f"   ❌ {field}: no encontrado")
         print("="*60)
-        
         return data
-    
+
     def _extract_invoice_number(self, text: str) -> Optional[str]:
-        """Extrae número de factura - PATRONES MEJORADOS"""
-        patterns = [
-            r"\b([A-Z]{2}\d{2}[-]\d{8,13})\b",  # Boleta: EB01-3710717040134
-            r"\b([A-Z]\d{3}[-]\d{1,8})\b",      # Factura: E001-1211, F001-123
-            r"\b([A-Z]{1,2}\d{3,4}[-]\d{1,8})\b", # Más flexible
-            r"\b([A-Z]\d{3}\s*\d{1,8})\b",      # E001 4211 (sin guión)
-            r"Nro\.?\s*:?\s*([A-Z0-9-\s]+)",    # Nro. F001-00000384 o E001 4211
-            r"Numero\.?\s*:?\s*([A-Z0-9-\s]+)", # Numero F001-00000384
-            r"FACTURA\s+ELECTRONICA\s+([A-Z0-9-\s]+)", # FACTURA ELECTRONICA F001-00000384
-            r"BOLETA\s+ELECTRONICA\s+([A-Z0-9-\s]+)",  # BOLETA ELECTRONICA EB01-123
-            r"COMPROBANTE\s+([A-Z0-9-\s]+)",           # COMPROBANTE F001-123
-            r"\bE001\s*4211\b",                       # Específico para este caso
-        ]
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            if matches:
-                print(f"    Patrón '{pattern}' encontró: {matches}")
-                # Buscar el que parece más válido
-                for match in matches:
-                    cleaned_match = re.sub(r'\s+', '-', match.strip())  # Reemplazar espacios con guiones
-                    if len(cleaned_match) >= 6:  # Mínimo F001-1
-                        return cleaned_match
-        return None
-    
+        return self._extract_field('invoice_number', text)
+
     def _extract_invoice_date(self, text: str) -> Optional[str]:
-        """Extrae fecha de emisión - MEJORADO con más patrones"""
-        # Buscar patrones de fecha en cualquier lugar - MÁS PATRONES
-        date_patterns = [
-            r"(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})",  # dd/mm/yyyy o dd-mm-yyyy
-            r"(\d{1,2}[-/]\w{3,9}[-/]\d{4})",    # dd-mmm-yyyy
-            r"(\d{4}[-/]\d{1,2}[-/]\d{1,2})",    # yyyy-mm-dd
-            r"(\d{1,2}\s+de\s+\w+\s+de\s+\d{4})", # 25 de noviembre de 2025
-            r"(\d{1,2}\s+\w+\s+\d{4})",           # 25 noviembre 2025
-            r"(\d{1,2}[/-]\d{1,2}[/-]\d{2})",     # dd/mm/yy
-            r"Fecha\s*:\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})", # Fecha: 25/11/2025
-        ]
-        
-        # Buscar cerca de palabras clave de fecha - MÁS PALABRAS CLAVE
-        keywords = [
-            "Emisión", "Emision", "Fecha", "Date", "Emitido", "Emisor",
-            "FECHA", "FECHA DE EMISIÓN", "FECHA EMISIÓN", "EMITIDO",
-            "Fecha de Emisión", "Fecha Emisión"
-        ]
-        
-        for keyword in keywords:
-            # Buscar la palabra clave (case insensitive)
-            matches = list(re.finditer(re.escape(keyword), text, re.IGNORECASE))
-            for match in matches:
-                # Buscar en el contexto alrededor de la palabra clave
-                start = max(0, match.start() - 50)
-                end = min(len(text), match.end() + 100)
-                context = text[start:end]
-                
-                print(f"    Buscando fecha cerca de '{keyword}': {context[:50]}...")
-                
-                for pattern in date_patterns:
-                    date_match = re.search(pattern, context, re.IGNORECASE)
-                    if date_match:
-                        date_found = date_match.group(1)
-                        print(f"   ✅ Fecha encontrada con patrón '{pattern}': {date_found}")
-                        return date_found
-        
-        # Buscar cualquier fecha en el texto que parezca reciente
-        all_dates = []
-        for pattern in date_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            for date_str in matches:
-                # Verificar que sea una fecha válida
-                if self._is_valid_date(date_str):
-                    all_dates.append(date_str)
-        
-        if all_dates:
-            print(f"    Fechas encontradas en texto: {all_dates}")
-            # Preferir fechas que parezcan recientes
-            for date_str in all_dates:
-                if any(year in date_str for year in ['2025', '2024', '2023', '2026']):
-                    return date_str
-                if re.search(r'20[2-3][0-9]', date_str):  # 2020-2039
-                    return date_str
-            return all_dates[0]  # Devolver la primera encontrada
-        
-        # Si no se encuentra fecha, buscar números que parezcan fechas
-        print("    Buscando patrones de fecha alternativos...")
-        alternative_patterns = [
-            r"\b(\d{1,2})[/-](\d{1,2})[/-](\d{2,4})\b",
-            r"\b(\d{1,2})\s+(\d{1,2})\s+(\d{2,4})\b",
-        ]
-        
-        for pattern in alternative_patterns:
-            matches = re.findall(pattern, text)
-            for match in matches:
-                d, m, y = match
-                # Verificar si parece una fecha válida
-                if 1 <= int(d) <= 31 and 1 <= int(m) <= 12:
-                    date_str = f"{d}/{m}/{y}"
-                    print(f"   ✅ Fecha alternativa encontrada: {date_str}")
-                    return date_str
-        
-        print("   ❌ No se encontraron fechas en el texto")
-        return None
-    
+        return self._extract_field('invoice_date', text)
+
     def _extract_due_date(self, text: str) -> Optional[str]:
-        """Extrae fecha de vencimiento - MEJORADO"""
-        # Buscar específicamente "Fecha de Vencimiento"
-        vencimiento_patterns = [
-            r"Fecha\s*de\s*Vencimiento\s*[:\-]?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
-            r"Vencimiento\s*[:\-]?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
-            r"Vence\s*[:\-]?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
-            r"Fecha\s*Vencimiento\s*[:\-]?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
-        ]
-        
-        for pattern in vencimiento_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                return match.group(1)
-        
-        # Buscar cerca de "Fecha de Vencimiento" aunque no tenga fecha explícita
-        vencimiento_match = re.search(r"Fecha\s*de\s*Vencimiento", text, re.IGNORECASE)
-        if vencimiento_match:
-            # Buscar cualquier fecha después de "Fecha de Vencimiento"
-            context = text[vencimiento_match.end():vencimiento_match.end() + 50]
-            date_patterns = [
-                r"(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
-                r"(\d{1,2}[-/]\w{3,9}[-/]\d{4})",
-            ]
-            for pattern in date_patterns:
-                date_match = re.search(pattern, context)
-                if date_match:
-                    return date_match.group(1)
-        
-        return None
-    
-    def _is_valid_date(self, date_str: str) -> bool:
-        """Verifica si una cadena parece ser una fecha válida"""
-        try:
-            # Patrones comunes de fecha
-            patterns = [
-                r'\d{1,2}[/-]\d{1,2}[/-]\d{2,4}',
-                r'\d{1,2}[-/]\w{3,9}[-/]\d{4}',
-                r'\d{4}[-/]\d{1,2}[-/]\d{1,2}',
-                r'\d{1,2}\s+de\s+\w+\s+de\s+\d{4}',
-            ]
-            
-            for pattern in patterns:
-                if re.match(pattern, date_str, re.IGNORECASE):
-                    return True
-            return False
-        except:
-            return False
-    
+        return self._extract_field('due_date', text)
+
     def _extract_amount(self, text: str) -> Optional[Decimal]:
-        """Extrae monto total - MEJORADO"""
-        patterns = [
-            r"Importe\s*Total\s*[:\-]?\s*S?/?\s*([0-9]{1,3}(?:\.[0-9]{3})*(?:[.,][0-9]{2})?)",
-            r"TOTAL\s*[:\-]?\s*S?/?\s*([0-9]{1,3}(?:\.[0-9]{3})*(?:[.,][0-9]{2})?)",
-            r"MONTO\s*TOTAL\s*[:\-]?\s*S?/?\s*([0-9]{1,3}(?:\.[0-9]{3})*(?:[.,][0-9]{2})?)",
-            r"Valor\s*Unitario\s*[:\-]?\s*S?/?\s*([0-9]{1,3}(?:\.[0-9]{3})*(?:[.,][0-9]{2})?)",
-            r"\bS?/?\s*([0-9]{1,3}(?:\.[0-9]{3})*[.,][0-9]{2})\b",
-            r"\b([0-9]{1,3}(?:\.[0-9]{3})*[.,][0-9]{2})\s*S?/?\s*",
-        ]
-        
-        # Buscar montos que parezcan importes de factura (no 1.00, 0.00, etc.)
-        candidate_amounts = []
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            for amount_str in matches:
-                try:
-                    # Normalizar formato
-                    if '.' in amount_str and ',' in amount_str:
-                        amount_clean = amount_str.replace('.', '').replace(',', '.')
-                    elif ',' in amount_str:
-                        amount_clean = amount_str.replace(',', '.')
-                    else:
-                        amount_clean = amount_str
-                    
-                    amount_decimal = Decimal(amount_clean)
-                    # Filtrar montos que sean razonables para una factura
-                    if 10.00 <= amount_decimal <= 1000000:  # Entre S/ 10 y 1 millón
-                        candidate_amounts.append((amount_decimal, amount_str))
-                except:
-                    continue
-        
-        if candidate_amounts:
-            # Ordenar por monto y tomar el más alto (probablemente el total)
-            candidate_amounts.sort(reverse=True)
-            print(f"    Montos candidatos: {candidate_amounts}")
-            return candidate_amounts[0][0]
-        
-        return None
-    
+        return self._extract_field('amount', text)
+
     def _extract_ruc(self, text: str) -> Optional[str]:
-        """Extrae RUC del cliente - MEJORADO"""
-        # Buscar RUC en cualquier lugar del texto
-        ruc_pattern = r"\b(\d{11})\b"
-        matches = re.findall(ruc_pattern, text)
-        
-        if matches:
-            # Filtrar RUCs que parezcan válidos (no todos ceros, etc.)
-            for ruc in matches:
-                if not re.match(r'^0+$', ruc):  # No todos ceros
-                    if ruc.startswith('10') or ruc.startswith('20'):  # RUCs peruanos típicos
-                        return ruc
-            return matches[0]  # Devolver el primero si no se encontró uno "ideal"
-        
-        return None
-    
+        return self._extract_field('ruc', text)
+
     def _extract_client_name(self, text: str) -> Optional[str]:
-        """Extrae nombre del cliente - MEJORADO"""
-        # Método 1: Buscar después de "Cliente:"
-        match = re.search(r"Cliente\s*[:\-]?\s*([^\n]+)", text, re.IGNORECASE)
-        if match:
-            nombre = match.group(1).strip()
-            # Limpiar el nombre (remover RUC, etc.)
-            nombre = re.sub(r'\s*RUC\s*\d.*$', '', nombre, flags=re.IGNORECASE)
-            nombre = re.sub(r'\s+', ' ', nombre).strip()
-            if len(nombre) > 3:
-                return nombre
-        
-        # Método 2: Buscar después de "Señor(es)"
-        match = re.search(r"Señor\(es\)\s*[:\-]?\s*([^\n]+)", text, re.IGNORECASE)
-        if match:
-            nombre = match.group(1).strip()
-            nombre = re.sub(r'\s*RUC\s*\d.*$', '', nombre, flags=re.IGNORECASE)
-            nombre = re.sub(r'\s+', ' ', nombre).strip()
-            if len(nombre) > 3:
-                return nombre
-        
-        # Método 3: Buscar patrones de empresa
-        empresa_patterns = [
-            r"([A-Z&][A-Z\s&]+(?:S\.A\.|S\.A\.C\.|E\.I\.R\.L\.|S\.R\.L\.|S\.A\.S\.))",
-            r"([A-Z][a-zA-Z\s&]+(?:S\.A\.|S\.A\.C\.|E\.I\.R\.L\.|S\.R\.L\.))",
-        ]
-        
-        for pattern in empresa_patterns:
-            match = re.search(pattern, text)
-            if match:
-                nombre = match.group(1).strip()
-                if len(nombre) > 5:
-                    return nombre
-        
-        return None
-    
+        return self._extract_field('client_name', text)
+
     def _extract_bank_reference(self, text: str) -> Optional[str]:
-        """Extrae referencia bancaria - MEJORADO para evitar falsos positivos"""
-        patterns = [
-            r"Referencia\s*bancaria\s*[:\-]?\s*([A-Z0-9\-]{4,})",
-            r"Código\s*de\s*operaci[oó]n\s*[:\-]?\s*([A-Z0-9\-]{4,})",
-            r"\b(BR[-_]?[0-9A-Z]{4,})\b",
-            r"Operaci[oó]n\s*[:\-]?\s*([A-Z0-9\-]{4,})",
-            r"Ref\.?\s*[:\-]?\s*([A-Z0-9\-]{4,})",
-        ]
-        
-        result = self._match_first(text, patterns)
-        # Filtrar resultados muy cortos que probablemente sean falsos positivos
-        if result and len(result) >= 4:
-            return result
-        return None
+        return self._extract_field('bank_reference', text)
+
+    def _extract_field(self, field: str, text: str):
+        """Valor crudo de un solo campo (compatibilidad con los _extract_* anteriores)."""
+        values, _ = InvoiceFieldExtractor.extract(text, fields=(field,))
+        return values.get(field)
     
     def parse(self, file_path: str) -> Dict[str, Any]:
         """Método de compatibilidad"""
@@ -691,42 +463,7 @@ def _extract_text_improved(file_path: str) -> Optional[str]:
         import pdfplumber
         
         with pdfplumber.open(file_path) as pdf:
-            all_text = []
-            
-            for i, page in enumerate(pdf.pages):
-                print(f"    Procesando página {i+1}...")
-                
-                # Método 1: Extracción normal
-                text = page.extract_text()
-                
-                if not text or len(text.strip()) < 20:
-                    # Método 2: Con layout
-                    text = page.extract_text(layout=True)
-                
-                if not text or len(text.strip()) < 20:
-                    # Método 3: Tablas
-                    tables = page.extract_tables()
-                    if tables:
-                        table_text = []
-                        for table in tables:
-                            for row in table:
-                                if row:
-                                    table_text.append(" ".join([str(c) if c else "" for c in row]))
-                        text = "\n".join(table_text)
-                
-                if text and len(text.strip()) >= 20:
-                    all_text.append(text)
-                    print(f"      ✓ Extraídos {len(text)} caracteres")
-                else:
-                    print(f"      ⚠️ Texto insuficiente")
-            
-            if all_text:
-                result = "\n".join(all_text)
-                print(f"   ✅ Total: {len(result)} caracteres de {len(all_text)} página(s)")
-                return result
-            else:
-                print(f"   ❌ No se extrajo texto útil")
-                return None
+            return _extract_pages_text(pdf)
                 
     except ImportError:
         print("   ❌ pdfplumber no instalado")
@@ -736,6 +473,72 @@ def _extract_text_improved(file_path: str) -> Optional[str]:
         return None
 
 
+def _probe_text_layer(file_path: str) -> Optional[str]:
+    """
+    Texto del PDF si alguna página tiene capa de texto; None si es un escaneo.
+    Cuenta solo caracteres (sin layout ni tablas) página a página y se detiene
+    en la primera con texto (p.ej. carátula escaneada y factura digital
+    detrás); en ese caso extrae todo con el mismo documento abierto.
+    """
+    try:
+        import pdfplumber
+    except ImportError:
+        print("   ❌ pdfplumber no instalado")
+        return None
+
+    with pdfplumber.open(file_path) as pdf:
+        for number, page in enumerate(pdf.pages, start=1):
+            visible = sum(1 for char in page.chars if char.get('text', '').strip())
+            if visible >= 20:
+                if number > 1:
+                    print(f"    Capa de texto desde la página {number}")
+                return _extract_pages_text(pdf)
+        print(f"    Sin capa de texto en {len(pdf.pages)} página(s): PDF escaneado")
+        return None
+
+
+def _extract_pages_text(pdf) -> Optional[str]:
+    """
+    Texto de un PDF ya abierto con pdfplumber. Layout y tablas (costosos)
+    solo en las páginas donde la extracción normal no da texto suficiente.
+    """
+    all_text = []
+    
+    for i, page in enumerate(pdf.pages):
+        print(f"    Procesando página {i+1}...")
+        
+        # Método 1: Extracción normal
+        text = page.extract_text()
+        
+        if not text or len(text.strip()) < 20:
+            # Método 2: Con layout
+            text = page.extract_text(layout=True)
+        
+        if not text or len(text.strip()) < 20:
+            # Método 3: Tablas
+            tables = page.extract_tables()
+            if tables:
+                table_text = []
+                for table in tables:
+                    for row in table:
+                        if row:
+                            table_text.append(" ".join([str(c) if c else "" for c in row]))
+                text = "\n".join(table_text)
+        
+        if text and len(text.strip()) >= 20:
+            all_text.append(text)
+            print(f"      ✓ Extraídos {len(text)} caracteres")
+        else:
+            print(f"      ⚠️ Texto insuficiente")
+    
+    if all_text:
+        result = "\n".join(all_text)
+        print(f"   ✅ Total: {len(result)} caracteres de {len(all_text)} página(s)")
+        return result
+    print(f"   ❌ No se extrajo texto útil")
+    return None
+
+
 def _normalize(text: str) -> str:
     """Normaliza espacios preservando saltos de línea"""
     text = re.sub(r"[ \t]+", " ", text)
@@ -819,61 +622,25 @@ def _extract_text_with_ocr(image_path: str) -> Optional[str]:
         return None
 
 
-def _extract_text_from_pdf_with_ocr(pdf_path: str) -> Optional[str]:
-    """Convierte PDF a imagen y usa OCR - MEJORADO para mayor robustez"""
+def _extract_text_from_pdf_with_ocr(pdf_path: str, stop_when=None, first_page_in_pool: bool = False) -> Optional[str]:
+    """
+    Convierte PDF a imagen y usa OCR, página a página en paralelo (InvoiceOCRPipeline).
+    `stop_when(texto)` permite dejar de leer páginas cuando ya están los campos buscados.
+    """
     try:
-        from pdf2image import convert_from_path
-        import pytesseract
-        
-        print("    Convirtiendo PDF a imagen con Poppler...")
-        
-        # Usar poppler_path si está disponible
-        poppler_kwargs = {}
-        if POPPLER_PATH:
-            print(f"    Usando Poppler desde: {POPPLER_PATH}")
-            poppler_kwargs['poppler_path'] = POPPLER_PATH
-        
-        try:
-            # Convertir más páginas por si acaso
-            images = convert_from_path(pdf_path, first_page=1, last_page=2, **poppler_kwargs)
-        except Exception as e:
-            print(f"   ⚠️ Error con Poppler: {e}")
-            print("    Intentando sin Poppler...")
-            images = convert_from_path(pdf_path, first_page=1, last_page=2)
-        
-        if not images:
-            print("   ❌ No se pudieron generar imágenes del PDF")
-            return None
-        
-        print(f"   ✅ PDF convertido a {len(images)} imagen(es)")
-        print("    Aplicando OCR con Tesseract...")
-        
-        # Configurar Tesseract si está disponible
-        try:
-            if TESSERACT_PATH and not pytesseract.pytesseract.tesseract_cmd:
-                pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
-        except:
-            pass
-        
-        all_text = []
-        for i, image in enumerate(images):
-            print(f"    Procesando imagen {i+1}...")
-            custom_config = r'--oem 3 --psm 6 -l spa+eng'
-            text = pytesseract.image_to_string(image, config=custom_config)
-            if text and text.strip():
-                all_text.append(text)
-        
-        if all_text:
-            combined_text = '\n'.join(all_text)
-            print(f"   ✅ OCR exitoso: {len(combined_text)} caracteres extraídos")
-            return combined_text
+        from .ocr_pipeline import InvoiceOCRPipeline
+
+        print("    Aplicando OCR (rasterizado por página)...")
+        text = InvoiceOCRPipeline.extract_text(pdf_path, stop_when=stop_when, first_page_in_pool=first_page_in_pool)
+        if text:
+            print(f"   ✅ OCR exitoso: {len(text)} caracteres extraídos")
         else:
             print("   ⚠️ OCR no extrajo texto")
-            return None
-        
+        return text
+
     except ImportError as e:
         print(f"   ❌ Librería faltante: {e}")
         return None
     except Exception as e:
         print(f"   ❌ Error en OCR de PDF: {e}")
-        return None
\ No newline at end of file
+        return None
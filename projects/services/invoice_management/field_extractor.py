@@ -0,0 +1,266 @@
+# projects/services/invoice_management/field_extractor.py
+"""
+Extracción de campos de factura con reglas precompiladas.
+
+Cada campo tiene una lista ordenada de reglas (nombre, regex compilada,
+palabra clave). El texto se pasa una sola vez a minúsculas (`casefold`) y
+una regla con palabra clave solo se evalúa si esa palabra aparece; así las
+regex caras (nombres de empresa, "Cliente", "Referencia"...) no recorren
+facturas donde no pueden coincidir. Se respeta la prioridad de reglas del
+parser original: gana la primera regla con un valor válido, salvo el monto
+(el mayor candidato de todas las reglas). `extract` devuelve también qué
+regla resolvió cada campo.
+"""
+import re
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterable, Optional, Tuple
+
+I = re.IGNORECASE
+
+
+def _rule(name, pattern, keyword=None, flags=I):
+    return name, re.compile(pattern, flags), keyword
+
+
+def _group(match):
+    return match.group(1) if match.re.groups else match.group(0)
+
+
+INVOICE_NUMBER_RULES = [
+    _rule('boleta_serie', r"\b([A-Z]{2}\d{2}[-]\d{8,13})\b"),            # EB01-3710717040134
+    _rule('factura_serie', r"\b([A-Z]\d{3}[-]\d{1,8})\b"),               # E001-1211, F001-123
+    _rule('serie_flexible', r"\b([A-Z]{1,2}\d{3,4}[-]\d{1,8})\b"),
+    _rule('serie_sin_guion', r"\b([A-Z]\d{3}\s*\d{1,8})\b"),             # E001 4211
+    _rule('nro', r"Nro\.?\s*:?\s*([A-Z0-9-\s]+)", 'nro'),
+    _rule('numero', r"Numero\.?\s*:?\s*([A-Z0-9-\s]+)", 'numero'),
+    _rule('factura_electronica', r"FACTURA\s+ELECTRONICA\s+([A-Z0-9-\s]+)", 'factura'),
+    _rule('boleta_electronica', r"BOLETA\s+ELECTRONICA\s+([A-Z0-9-\s]+)", 'boleta'),
+    _rule('comprobante', r"COMPROBANTE\s+([A-Z0-9-\s]+)", 'comprobante'),
+    _rule('e001_4211', r"\bE001\s*4211\b", 'e001'),
+]
+
+DATE_RULES = [
+    _rule('dd/mm/yyyy', r"(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})"),
+    _rule('dd-mmm-yyyy', r"(\d{1,2}[-/]\w{3,9}[-/]\d{4})"),
+    _rule('yyyy-mm-dd', r"(\d{4}[-/]\d{1,2}[-/]\d{1,2})"),
+    _rule('dd_de_mes_de_yyyy', r"(\d{1,2}\s+de\s+\w+\s+de\s+\d{4})"),
+    _rule('dd_mes_yyyy', r"(\d{1,2}\s+\w+\s+\d{4})"),
+    _rule('dd/mm/yy', r"(\d{1,2}[/-]\d{1,2}[/-]\d{2})"),
+    _rule('fecha_dd/mm/yyyy', r"Fecha\s*:\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})"),
+]
+# Palabras clave cerca de las que se busca primero la fecha de emisión (sin
+# repetir las que solo difieren en mayúsculas: la búsqueda ignora mayúsculas)
+DATE_KEYWORDS = [
+    (keyword, re.compile(re.escape(keyword), I))
+    for keyword in (
+        "Emisión", "Emision", "Fecha", "Date", "Emitido", "Emisor",
+        "FECHA DE EMISIÓN", "FECHA EMISIÓN",
+    )
+]
+VALID_DATE_PATTERNS = [
+    re.compile(p, I) for p in (
+        r'\d{1,2}[/-]\d{1,2}[/-]\d{2,4}',
+        r'\d{1,2}[-/]\w{3,9}[-/]\d{4}',
+        r'\d{4}[-/]\d{1,2}[-/]\d{1,2}',
+        r'\d{1,2}\s+de\s+\w+\s+de\s+\d{4}',
+    )
+]
+RECENT_YEAR = re.compile(r'20[2-3][0-9]')
+ALTERNATIVE_DATE_RULES = [
+    _rule('d/m/y_suelto', r"\b(\d{1,2})[/-](\d{1,2})[/-](\d{2,4})\b", flags=0),
+    _rule('d_m_y_espacios', r"\b(\d{1,2})\s+(\d{1,2})\s+(\d{2,4})\b", flags=0),
+]
+
+DUE_DATE_RULES = [
+    _rule('fecha_de_vencimiento', r"Fecha\s*de\s*Vencimiento\s*[:\-]?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})", 'venc'),
+    _rule('vencimiento', r"Vencimiento\s*[:\-]?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})", 'venc'),
+    _rule('vence', r"Vence\s*[:\-]?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})", 'venc'),
+    _rule('fecha_vencimiento', r"Fecha\s*Vencimiento\s*[:\-]?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})", 'venc'),
+]
+DUE_DATE_LABEL = re.compile(r"Fecha\s*de\s*Vencimiento", I)
+DUE_DATE_CONTEXT_RULES = [
+    _rule('tras_vencimiento', r"(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})", flags=0),
+    _rule('tras_vencimiento_mes', r"(\d{1,2}[-/]\w{3,9}[-/]\d{4})", flags=0),
+]
+
+_MONEY = r"([0-9]{1,3}(?:\.[0-9]{3})*(?:[.,][0-9]{2})?)"
+AMOUNT_RULES = [
+    _rule('importe_total', r"Importe\s*Total\s*[:\-]?\s*S?/?\s*" + _MONEY, 'importe'),
+    _rule('total', r"TOTAL\s*[:\-]?\s*S?/?\s*" + _MONEY, 'total'),
+    _rule('monto_total', r"MONTO\s*TOTAL\s*[:\-]?\s*S?/?\s*" + _MONEY, 'monto'),
+    _rule('valor_unitario', r"Valor\s*Unitario\s*[:\-]?\s*S?/?\s*" + _MONEY, 'valor'),
+    _rule('importe_suelto', r"\bS?/?\s*([0-9]{1,3}(?:\.[0-9]{3})*[.,][0-9]{2})\b"),
+    _rule('importe_con_moneda', r"\b([0-9]{1,3}(?:\.[0-9]{3})*[.,][0-9]{2})\s*S?/?\s*"),
+]
+AMOUNT_MIN, AMOUNT_MAX = Decimal('10.00'), Decimal('1000000')
+
+RUC_PATTERN = re.compile(r"\b(\d{11})\b")
+
+CLIENT_LABEL_RULES = [
+    _rule('cliente', r"Cliente\s*[:\-]?\s*([^\n]+)", 'cliente'),
+    _rule('senores', r"Señor\(es\)\s*[:\-]?\s*([^\n]+)", 'señor(es)'),
+]
+CLIENT_COMPANY_RULES = [
+    _rule('razon_social', r"([A-Z&][A-Z\s&]+(?:S\.A\.|S\.A\.C\.|E\.I\.R\.L\.|S\.R\.L\.|S\.A\.S\.))", flags=0),
+    _rule('razon_social_mixta', r"([A-Z][a-zA-Z\s&]+(?:S\.A\.|S\.A\.C\.|E\.I\.R\.L\.|S\.R\.L\.))", flags=0),
+]
+# Sufijos societarios (sensibles a mayúsculas, como las reglas de razón social)
+COMPANY_SUFFIXES = ('S.A.', 'E.I.R.L.', 'S.R.L.')
+CLIENT_RUC_SUFFIX = re.compile(r'\s*RUC\s*\d.*$', I)
+WHITESPACE = re.compile(r'\s+')
+
+BANK_REFERENCE_RULES = [
+    _rule('referencia_bancaria', r"Referencia\s*bancaria\s*[:\-]?\s*([A-Z0-9\-]{4,})", 'referencia'),
+    _rule('codigo_operacion', r"Código\s*de\s*operaci[oó]n\s*[:\-]?\s*([A-Z0-9\-]{4,})", 'código'),
+    _rule('br', r"\b(BR[-_]?[0-9A-Z]{4,})\b", 'br'),
+    _rule('operacion', r"Operaci[oó]n\s*[:\-]?\s*([A-Z0-9\-]{4,})", 'operaci'),
+    _rule('ref', r"Ref\.?\s*[:\-]?\s*([A-Z0-9\-]{4,})", 'ref'),
+]
+
+FIELDS = ('invoice_number', 'invoice_date', 'due_date', 'amount', 'ruc', 'client_name', 'bank_reference')
+
+
+class InvoiceFieldExtractor:
+    """Campos de factura desde texto normalizado, con la regla que resolvió cada uno."""
+
+    @staticmethod
+    def extract(text: str, fields: Optional[Iterable[str]] = None) -> Tuple[Dict[str, object], Dict[str, str]]:
+        """
+        Devuelve (valores, reglas): valores crudos por campo (fechas sin
+        normalizar, monto como Decimal) y {campo: 'campo:regla'} de los
+        campos encontrados. `fields` limita la extracción a esos campos.
+        """
+        lowered = text.casefold()
+        values, rules = {}, {}
+        for field in (fields or FIELDS):
+            found = getattr(InvoiceFieldExtractor, field)(text, lowered)
+            if found is not None:
+                values[field], rules[field] = found[0], f'{field}:{found[1]}'
+        return values, rules
+
+    @staticmethod
+    def _applicable(rules, lowered):
+        return (rule for rule in rules if rule[2] is None or rule[2] in lowered)
+
+    @staticmethod
+    def invoice_number(text, lowered):
+        for name, pattern, _ in InvoiceFieldExtractor._applicable(INVOICE_NUMBER_RULES, lowered):
+            for match in pattern.finditer(text):
+                cleaned = WHITESPACE.sub('-', _group(match).strip())
+                if len(cleaned) >= 6:  # Mínimo F001-1
+                    return cleaned, name
+        return None
+
+    @staticmethod
+    def _is_valid_date(date_str):
+        return any(p.match(date_str) for p in VALID_DATE_PATTERNS)
+
+    @staticmethod
+    def invoice_date(text, lowered):
+        # 1) Cerca de palabras clave de fecha
+        for keyword, keyword_pattern in DATE_KEYWORDS:
+            if keyword.casefold() not in lowered:
+                continue
+            for match in keyword_pattern.finditer(text):
+                context = text[max(0, match.start() - 50):match.end() + 100]
+                for name, pattern, _ in DATE_RULES:
+                    date_match = pattern.search(context)
+                    if date_match:
+                        return date_match.group(1), f'{keyword}:{name}'
+
+        # 2) Cualquier fecha válida, prefiriendo años 2020-2039
+        first = None
+        for name, pattern, _ in DATE_RULES:
+            for match in pattern.finditer(text):
+                date_str = match.group(1)
+                if not InvoiceFieldExtractor._is_valid_date(date_str):
+                    continue
+                if RECENT_YEAR.search(date_str):
+                    return date_str, name
+                if first is None:
+                    first = (date_str, name)
+        if first is not None:
+            return first
+
+        # 3) Números con forma de fecha
+        for name, pattern, _ in ALTERNATIVE_DATE_RULES:
+            for match in pattern.finditer(text):
+                d, m, y = match.groups()
+                if 1 <= int(d) <= 31 and 1 <= int(m) <= 12:
+                    return f"{d}/{m}/{y}", name
+        return None
+
+    @staticmethod
+    def due_date(text, lowered):
+        for name, pattern, _ in InvoiceFieldExtractor._applicable(DUE_DATE_RULES, lowered):
+            match = pattern.search(text)
+            if match:
+                return match.group(1), name
+        if 'venc' not in lowered:
+            return None
+        label = DUE_DATE_LABEL.search(text)
+        if label:
+            context = text[label.end():label.end() + 50]
+            for name, pattern, _ in DUE_DATE_CONTEXT_RULES:
+                match = pattern.search(context)
+                if match:
+                    return match.group(1), name
+        return None
+
+    @staticmethod
+    def amount(text, lowered):
+        # El mayor importe razonable de todas las reglas (probablemente el total)
+        best = None
+        for name, pattern, _ in InvoiceFieldExtractor._applicable(AMOUNT_RULES, lowered):
+            for amount_str in pattern.findall(text):
+                if '.' in amount_str and ',' in amount_str:
+                    amount_clean = amount_str.replace('.', '').replace(',', '.')
+                else:
+                    amount_clean = amount_str.replace(',', '.')
+                try:
+                    value = Decimal(amount_clean)
+                except InvalidOperation:
+                    continue
+                if AMOUNT_MIN <= value <= AMOUNT_MAX and (best is None or (value, amount_str) > best[:2]):
+                    best = (value, amount_str, name)
+        return (best[0], best[2]) if best else None
+
+    @staticmethod
+    def ruc(text, lowered):
+        first = None
+        for match in RUC_PATTERN.finditer(text):
+            ruc = match.group(1)
+            if ruc.strip('0') and ruc[:2] in ('10', '20'):  # RUCs peruanos típicos
+                return ruc, 'ruc_10_20'
+            if first is None:
+                first = ruc
+        return (first, 'ruc_11_digitos') if first else None
+
+    @staticmethod
+    def client_name(text, lowered):
+        for name, pattern, _ in InvoiceFieldExtractor._applicable(CLIENT_LABEL_RULES, lowered):
+            match = pattern.search(text)
+            if match:
+                nombre = CLIENT_RUC_SUFFIX.sub('', match.group(1).strip())
+                nombre = WHITESPACE.sub(' ', nombre).strip()
+                if len(nombre) > 3:
+                    return nombre, name
+        if not any(suffix in text for suffix in COMPANY_SUFFIXES):
+            return None
+        for name, pattern, _ in CLIENT_COMPANY_RULES:
+            match = pattern.search(text)
+            if match:
+                nombre = match.group(1).strip()
+                if len(nombre) > 5:
+                    return nombre, name
+        return None
+
+    @staticmethod
+    def bank_reference(text, lowered):
+        # La primera regla que coincide decide (aunque el valor sea corto)
+        for name, pattern, _ in InvoiceFieldExtractor._applicable(BANK_REFERENCE_RULES, lowered):
+            match = pattern.search(text)
+            if match:
+                value = _group(match).strip()
+                return (value, name) if len(value) >= 4 else None
+        return None
@@ -1,5 +1,4 @@
 # projects/services/invoice_management/financial_metrics.py
-from django.db.models import Sum
 from decimal import Decimal
 
 class FinancialMetricsCalculator:
@@ -12,16 +11,18 @@ class FinancialMetricsCalculator:
     def calculate_project_financials(project_id):
         """Métricas financieras integradas PMI + Finanzas - VERSIÓN SEGURA"""
         try:
-            from projects.models import ClientInvoice, Projects
+            from projects.models import ProjectFinancialRollup
+            from projects.services.request_cache import RequestCache
             
-            project = Projects.objects.get(cod_projects_id=project_id)
-            invoices = ClientInvoice.objects.filter(project=project)
+            project = RequestCache.get_project(project_id)
+            # ✅ Totales precalculados: una fila por proyecto en lugar de re-sumar facturas y OCs
+            rollup = ProjectFinancialRollup.for_project(project_id)
             
             # Métricas de facturación real (con manejo de campos faltantes)
-            invoicing_metrics = FinancialMetricsCalculator._calculate_invoicing_metrics_safe(invoices)
+            invoicing_metrics = FinancialMetricsCalculator._calculate_invoicing_metrics_safe(rollup)
             
             # Métricas de costos reales  
-            cost_metrics = FinancialMetricsCalculator._calculate_cost_metrics(project)
+            cost_metrics = FinancialMetricsCalculator._calculate_cost_metrics(project, rollup)
             
             # Métricas integradas
             integrated_metrics = FinancialMetricsCalculator._calculate_integrated_metrics(
@@ -38,23 +39,16 @@ class FinancialMetricsCalculator:
             return FinancialMetricsCalculator._get_metrics_fallback()
     
     @staticmethod
-    def _calculate_invoicing_metrics_safe(invoices):
-        """Cálculo SEGURO de métricas de facturación"""
+    def _calculate_invoicing_metrics_safe(rollup):
+        """Cálculo SEGURO de métricas de facturación desde ProjectFinancialRollup"""
         try:
-            # Usar amount como fallback si paid_amount no existe
-            total_invoiced = invoices.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+            total_invoiced = rollup.total_invoiced
+            total_paid = rollup.total_paid
             
-            # Para paid_amount, verificar si existe la columna
-            try:
-                total_paid = invoices.filter(status='PAGADA').aggregate(total=Sum('paid_amount'))['total'] or Decimal('0.00')
-            except:
-                # Si paid_amount no existe, usar amount para facturas pagadas
-                total_paid = invoices.filter(status='PAGADA').aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-            
-            # Contar facturas por estado
-            paid_count = invoices.filter(status='PAGADA').count()
-            pending_count = invoices.filter(status='PAGO_REPORTADO').count()
-            problem_count = invoices.filter(status__in=['PAGO_NO_RECIBIDO', 'CONTROVERSIA']).count()
+            # Conteos por estado
+            paid_count = rollup.paid_count
+            pending_count = rollup.pending_count
+            problem_count = rollup.problem_count
             
             # Eficiencia de cobranza
             collection_efficiency = (total_paid / total_invoiced * 100) if total_invoiced > 0 else Decimal('0.00')
@@ -73,13 +67,10 @@ class FinancialMetricsCalculator:
             return FinancialMetricsCalculator._get_invoicing_fallback()
     
     @staticmethod
-    def _calculate_cost_metrics(project):
+    def _calculate_cost_metrics(project, rollup):
         """Cálculo de métricas de costos reales"""
         try:
-            from projects.models import PurchaseOrder
-            
-            ocs = PurchaseOrder.objects.filter(project_code=project)
-            total_spent = ocs.aggregate(total=Sum('total_amount'))['total'] or Decimal('0.00')
+            total_spent = rollup.total_spent
             
             # Obtener BAC (Budget at Completion) desde Chance
             try:
@@ -1,6 +1,6 @@
 # projects/services/invoice_management/invoice_manager.py
 from django.utils import timezone
-from django.db.models import Q, Sum
+from django.db.models import Q
 from decimal import Decimal
 import logging
 
@@ -124,17 +124,18 @@ class InvoiceManager:
     @staticmethod
     def get_financial_metrics(project_id):
         """Métricas financieras reales basadas en estados verificados"""
-        from projects.models import ClientInvoice
+        from projects.models import ProjectFinancialRollup
         
-        invoices = ClientInvoice.objects.filter(project__cod_projects_id=project_id)
+        # ✅ Una fila precalculada por proyecto (se actualiza al guardar facturas/OCs)
+        rollup = ProjectFinancialRollup.for_project(project_id)
         
         metrics = {
-            'total_invoiced': invoices.aggregate(total=Sum('amount'))['total'] or Decimal('0.00'),
-            'total_paid_real': invoices.filter(status='PAGADA').aggregate(total=Sum('paid_amount'))['total'] or Decimal('0.00'),
-            'pending_verification': invoices.filter(status='PAGO_REPORTADO').aggregate(total=Sum('amount'))['total'] or Decimal('0.00'),
-            'verified_not_confirmed': invoices.filter(status='PAGO_VERIFICADO').aggregate(total=Sum('amount'))['total'] or Decimal('0.00'),
-            'problem_invoices': invoices.filter(status__in=['PAGO_NO_RECIBIDO', 'CONTROVERSIA']).aggregate(total=Sum('amount'))['total'] or Decimal('0.00'),
-            'overdue_invoices': invoices.filter(status='VENCIDA').aggregate(total=Sum('amount'))['total'] or Decimal('0.00'),
+            'total_invoiced': rollup.total_invoiced,
+            'total_paid_real': rollup.total_paid,
+            'pending_verification': rollup.pending_verification,
+            'verified_not_confirmed': rollup.verified_not_confirmed,
+            'problem_invoices': rollup.problem_amount,
+            'overdue_invoices': rollup.overdue_amount,
         }
         
         # Calcular eficiencia de cobranza
@@ -148,14 +149,17 @@ class InvoiceManager:
     @staticmethod
     def check_overdue_invoices():
         """Verificar facturas vencidas automáticamente"""
-        from projects.models import ClientInvoice
+        from projects.models import ClientInvoice, ProjectFinancialRollup
         
         overdue = ClientInvoice.objects.filter(
             due_date__lt=timezone.now().date(),
             status__in=['EMITIDA', 'PAGO_REPORTADO']
         )
         
+        project_ids = list(overdue.values_list('project_id', flat=True).distinct())
         updated = overdue.update(status='VENCIDA')
+        # update() no pasa por save(): recalcular los resúmenes afectados
+        ProjectFinancialRollup.refresh(*project_ids)
         logger.info(f"Actualizadas {updated} facturas a estado VENCIDA")
         
         return updated
@@ -0,0 +1,196 @@
+# projects/services/invoice_management/ocr_pipeline.py
+"""
+OCR de PDFs escaneados página a página, en paralelo y con corte temprano.
+
+Cada página se rasteriza (pdf2image, solo esa página y al DPI configurado)
+y se pasa por Tesseract dentro del proceso que la atiende, así no se
+generan ni se copian entre procesos imágenes de páginas que no se van a
+leer. La página 1 se procesa en el propio proceso (caso típico: factura de
+una página), salvo con `first_page_in_pool` (ingesta por lotes en hilos);
+si no alcanza, el resto va a un pool de procesos y se deja de leer en
+cuanto aparecen todos los campos buscados.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+
+OCR_CONFIG = r'--oem 3 --psm 6 -l spa+eng'
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def ocr_pdf_page(pdf_path: str, page_number: int, dpi: int,
+                 poppler_path: Optional[str] = None, tesseract_cmd: Optional[str] = None) -> str:
+    """Rasteriza UNA página y devuelve su texto OCR ('' si no hay). Se ejecuta en el pool."""
+    from pdf2image import convert_from_path
+    import pytesseract
+
+    if tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    kwargs = {'poppler_path': poppler_path} if poppler_path else {}
+    images = convert_from_path(pdf_path, dpi=dpi, first_page=page_number, last_page=page_number, **kwargs)
+    if not images:
+        return ''
+    try:
+        return pytesseract.image_to_string(images[0], config=OCR_CONFIG) or ''
+    finally:
+        for image in images:
+            image.close()
+
+
+class InvoiceOCRPipeline:
+    """OCR multipágina con rasterizado perezoso, pool de procesos y corte temprano."""
+
+    @staticmethod
+    def options():
+        return {
+            'dpi': getattr(settings, 'INVOICE_OCR_DPI', 200),
+            'workers': max(1, getattr(settings, 'INVOICE_OCR_WORKERS', 2)),
+            'max_pages': max(1, getattr(settings, 'INVOICE_OCR_MAX_PAGES', 5)),
+        }
+
+    @staticmethod
+    def _tool_paths():
+        poppler = getattr(settings, 'POPPLER_PATH', None)
+        tesseract = getattr(settings, 'TESSERACT_CMD', None)
+        return (
+            poppler if poppler and os.path.isdir(poppler) else None,
+            tesseract if tesseract and os.path.exists(tesseract) else None,
+        )
+
+    @staticmethod
+    def page_count(pdf_path: str) -> int:
+        """Número de páginas sin rasterizar (pdfplumber ya es dependencia del parser)."""
+        try:
+            import pdfplumber
+            with pdfplumber.open(pdf_path) as pdf:
+                return len(pdf.pages)
+        except Exception:
+            return 1
+
+    @staticmethod
+    def get_pool(workers: int):
+        """Pool de procesos reutilizado entre requests (se recrea si cambia el tamaño o se rompe)."""
+        global _pool, _pool_workers
+        # Lock: la ingesta por lotes lee varias facturas en hilos a la vez
+        with _pool_lock:
+            if _pool is None or _pool_workers != workers:
+                if _pool is not None:
+                    _pool.shutdown(wait=False, cancel_futures=True)
+                _pool = ProcessPoolExecutor(max_workers=workers)
+                _pool_workers = workers
+            return _pool
+
+    @staticmethod
+    def _reset_pool():
+        global _pool
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+    @staticmethod
+    def collect(page_numbers, submit: Callable, stop_when: Optional[Callable[[str], bool]] = None,
+                window: int = 1) -> Dict[int, str]:
+        """
+        Ejecuta `submit(page)` (devuelve un Future) con a lo sumo `window` páginas
+        en curso y evalúa `stop_when` sobre el texto acumulado EN ORDEN de página;
+        al cumplirse cancela lo pendiente y no envía más páginas.
+        Devuelve {página: texto} de las páginas leídas.
+        """
+        pending_pages = list(page_numbers)
+        in_flight = {}
+        texts = {}
+        next_in_order = 0
+
+        def fill():
+            while pending_pages and len(in_flight) < window:
+                page = pending_pages.pop(0)
+                in_flight[submit(page)] = page
+
+        fill()
+        while in_flight:
+            done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            for future in done:
+                page = in_flight.pop(future)
+                try:
+                    texts[page] = future.result() or ''
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    print(f"   ⚠️ OCR página {page}: {e}")
+                    texts[page] = ''
+
+            # Evaluar solo el prefijo contiguo de páginas ya leídas
+            ordered = list(page_numbers)
+            advanced = False
+            while next_in_order < len(ordered) and ordered[next_in_order] in texts:
+                next_in_order += 1
+                advanced = True
+            if advanced and stop_when:
+                prefix = '\n'.join(texts[p] for p in ordered[:next_in_order] if texts[p].strip())
+                if stop_when(prefix):
+                    for future in in_flight:
+                        future.cancel()
+                    return {p: texts[p] for p in ordered[:next_in_order]}
+            fill()
+        return texts
+
+    @staticmethod
+    def extract_text(pdf_path: str, stop_when: Optional[Callable[[str], bool]] = None,
+                     dpi: Optional[int] = None, max_pages: Optional[int] = None,
+                     workers: Optional[int] = None, first_page_in_pool: bool = False) -> Optional[str]:
+        """
+        Texto OCR del PDF (None si no se extrajo nada). `stop_when(texto)` decide
+        si ya están todos los campos buscados y se puede dejar de leer páginas.
+        `first_page_in_pool`: también la página 1 va al pool de procesos, para
+        no rasterizar en el hilo que llama (varios archivos a la vez).
+        """
+        opts = InvoiceOCRPipeline.options()
+        dpi = dpi or opts['dpi']
+        workers = workers or opts['workers']
+        pages = min(InvoiceOCRPipeline.page_count(pdf_path), max_pages or opts['max_pages'])
+        poppler_path, tesseract_cmd = InvoiceOCRPipeline._tool_paths()
+
+        # ✅ Página 1 en el propio proceso: sin coste de pool para facturas de una página
+        print(f"    OCR página 1/{pages} ({dpi} dpi)...")
+        texts = None
+        if first_page_in_pool:
+            try:
+                pool = InvoiceOCRPipeline.get_pool(workers)
+                texts = {1: pool.submit(ocr_pdf_page, pdf_path, 1, dpi, poppler_path, tesseract_cmd).result() or ''}
+            except BrokenProcessPool:
+                InvoiceOCRPipeline._reset_pool()
+        if texts is None:
+            texts = {1: ocr_pdf_page(pdf_path, 1, dpi, poppler_path, tesseract_cmd)}
+        done = stop_when is not None and stop_when(texts[1])
+
+        if not done and pages > 1:
+            rest = range(2, pages + 1)
+            print(f"    OCR páginas 2-{pages} en {workers} proceso(s)...")
+            if workers > 1:
+                try:
+                    pool = InvoiceOCRPipeline.get_pool(workers)
+                    texts.update(InvoiceOCRPipeline.collect(
+                        rest,
+                        lambda page: pool.submit(ocr_pdf_page, pdf_path, page, dpi, poppler_path, tesseract_cmd),
+                        stop_when=(lambda text: stop_when(texts[1] + '\n' + text)) if stop_when else None,
+                        window=workers,
+                    ))
+                except BrokenProcessPool:
+                    InvoiceOCRPipeline._reset_pool()
+                    workers = 1
+            if workers == 1:
+                for page in rest:
+                    texts[page] = ocr_pdf_page(pdf_path, page, dpi, poppler_path, tesseract_cmd)
+                    if stop_when and stop_when('\n'.join(texts[p] for p in sorted(texts))):
+                        break
+
+        read = [p for p in sorted(texts) if texts[p].strip()]
+        print(f"   ✅ OCR: {len(texts)} página(s) leída(s) de {pages}")
+        return '\n'.join(texts[p] for p in read) or None
@@ -0,0 +1,124 @@
+# projects/services/po_detail_bulk.py
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Sum
+
+
+class PODetailBulkService:
+    """
+    Importación masiva de detalles de OC sin el guardado en cascada fila a fila.
+
+    PODetailProduct.save() recalcula el total de la OC (re-sumando todos sus
+    detalles) y los montos de proveedor en cada fila, lo que es cuadrático en
+    detalles por OC. Aquí los importes se calculan en memoria
+    (`PODetailProduct.calculate_amounts`), los detalles se escriben con
+    bulk_create/bulk_update y los totales de OC, montos de proveedor, resumen
+    financiero y snapshots EVM se recalculan UNA vez por OC/proyecto afectado.
+    """
+
+    BATCH_SIZE = 500
+    # Campos que el import puede cambiar en un detalle existente
+    UPDATE_FIELDS = [
+        'product_name', 'comment', 'quantity', 'measurement_unit', 'unit_price',
+        'subtotal', 'igv', 'total', 'local_total',
+    ]
+
+    @staticmethod
+    def upsert(entries, batch_size=None):
+        """
+        Crea o actualiza detalles por (purchase_order, product).
+        `entries`: dicts con purchase_order (PurchaseOrder), product (Product),
+        quantity, unit_price y opcionales measurement_unit, product_name, comment.
+        Si una misma clave aparece varias veces gana la última fila.
+        Devuelve {'created', 'updated', 'purchase_orders'} (po_numbers afectados).
+        """
+        from projects.models import PODetailProduct
+
+        batch_size = batch_size or PODetailBulkService.BATCH_SIZE
+        entries = list(entries)
+        po_numbers = {e['purchase_order'].pk for e in entries}
+
+        # Detalles existentes de las OCs afectadas en una sola consulta
+        existing = {}
+        for detail in PODetailProduct.objects.filter(purchase_order_id__in=po_numbers).order_by('pk'):
+            existing.setdefault((detail.purchase_order_id, detail.product_id), detail)
+
+        to_create, to_update = {}, {}
+        for entry in entries:
+            po, product = entry['purchase_order'], entry['product']
+            key = (po.pk, product.pk)
+            detail = existing.get(key) or to_create.get(key)
+            if detail is None:
+                detail = PODetailProduct(purchase_order=po, product=product)
+                to_create[key] = detail
+            else:
+                # Reusar las instancias ya cargadas (evita consultas por relación)
+                detail.purchase_order, detail.product = po, product
+                if key in existing:
+                    to_update[key] = detail
+
+            detail.quantity = entry['quantity']
+            detail.unit_price = entry['unit_price']
+            for field in ('measurement_unit', 'product_name', 'comment'):
+                if entry.get(field) is not None:
+                    setattr(detail, field, entry[field])
+            detail.calculate_amounts()
+
+        with transaction.atomic():
+            PODetailProduct.objects.bulk_create(list(to_create.values()), batch_size=batch_size)
+            PODetailProduct.objects.bulk_update(
+                list(to_update.values()), PODetailBulkService.UPDATE_FIELDS, batch_size=batch_size
+            )
+            PODetailBulkService.finalize(po_numbers, batch_size=batch_size)
+
+        return {'created': len(to_create), 'updated': len(to_update), 'purchase_orders': po_numbers}
+
+    @staticmethod
+    def finalize(po_numbers, batch_size=None):
+        """
+        Recalcula, una vez por OC, lo que save() hace por fila: total_amount de la
+        OC (Σ local_total), supplier_amount de sus PODetailSupplier, resumen
+        financiero e invalidación EVM de los proyectos afectados.
+        """
+        from projects.models import (
+            PurchaseOrder, PODetailProduct, PODetailSupplier, ProjectFinancialRollup, ProjectEVMSnapshot,
+            ProjectPOFacet,
+        )
+
+        po_numbers = [po for po in set(po_numbers) if po]
+        if not po_numbers:
+            return 0
+        batch_size = batch_size or PODetailBulkService.BATCH_SIZE
+        details = PODetailProduct.objects.filter(purchase_order_id__in=po_numbers)
+
+        with transaction.atomic():
+            # Totales de OC (mismo cálculo que PurchaseOrder.update_totals)
+            totals = dict(
+                details.values('purchase_order_id').annotate(total=Sum('local_total'))
+                .values_list('purchase_order_id', 'total').order_by()
+            )
+            orders = list(PurchaseOrder.objects.filter(po_number__in=po_numbers).only('po_number', 'project_code', 'total_amount'))
+            for po in orders:
+                po.total_amount = totals.get(po.pk) or Decimal('0.00')
+            PurchaseOrder.objects.bulk_update(orders, ['total_amount'], batch_size=batch_size)
+
+            # Montos por proveedor (mismo cálculo que PODetailSupplier.calculate_supplier_amount)
+            by_supplier = {
+                (row['purchase_order_id'], row['product__ruc_supplier_id']): row['total']
+                for row in details.values('purchase_order_id', 'product__ruc_supplier_id')
+                .annotate(total=Sum('local_total')).order_by()
+            }
+            suppliers = list(PODetailSupplier.objects.filter(purchase_order_id__in=po_numbers).only(
+                'pk', 'purchase_order', 'supplier', 'supplier_amount'
+            ))
+            for sp in suppliers:
+                sp.supplier_amount = by_supplier.get((sp.purchase_order_id, sp.supplier_id)) or Decimal('0.00')
+            PODetailSupplier.objects.bulk_update(suppliers, ['supplier_amount'], batch_size=batch_size)
+
+            project_ids = {po.project_code_id for po in orders}
+            ProjectFinancialRollup.refresh(*project_ids)
+            ProjectPOFacet.refresh(*project_ids)
+
+        for project_id in project_ids:
+            ProjectEVMSnapshot.mark_stale(project_id)
+        return len(orders)
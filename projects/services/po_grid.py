@@ -0,0 +1,257 @@
+# projects/services/po_grid.py
+"""
+Grid de órdenes de compra (logística) con filtros en BD, paginación por
+cursor sobre (issue_date, po_number), totales por moneda con GROUP BY y
+listas de filtros (facetas) calculadas solo cuando se piden: sin más filtro
+que el proyecto salen de la tabla ProjectPOFacet, mantenida al guardar.
+
+Los filtros por proveedor/producto/fabricante usan subconsultas en lugar de
+JOINs, así una OC con varios detalles no aparece repetida ni se suma dos
+veces.
+"""
+import base64
+import json
+from datetime import date
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q, Sum, Value
+from django.db.models.functions import Coalesce, NullIf
+
+from projects.security.validators import (
+    validate_project_id,
+    validate_search_query,
+    validate_date_range,
+    sanitize_input,
+)
+
+MAX_PAGE_SIZE = 200
+
+GRID_FIELDS = (
+    'po_number', 'project_code_id', 'issue_date', 'initial_delivery_date', 'final_delivery_date',
+    'total_amount', 'currency', 'exchange_rate', 'po_status', 'local_import', 'te', 'guide_number',
+)
+
+
+def _facet_suppliers(pos):
+    from projects.models import Supplier
+    return list(Supplier.objects.filter(
+        podetailsupplier__purchase_order__in=pos
+    ).values('ruc_supplier', 'name_supplier').distinct().order_by('name_supplier'))
+
+
+def _facet_products(pos):
+    from projects.models import Product
+    return list(Product.objects.filter(
+        podetailproduct__purchase_order__in=pos
+    ).values('code_art', 'part_number', 'manufac').distinct().order_by('part_number'))
+
+
+def _facet_manufacturers(pos):
+    from projects.models import Product
+    return list(Product.objects.filter(
+        podetailproduct__purchase_order__in=pos
+    ).values_list('manufac', flat=True).distinct().order_by('manufac'))
+
+
+def _facet_statuses(pos):
+    return list(pos.order_by().values_list('po_status', flat=True).distinct().order_by('po_status'))
+
+
+def _facet_currencies(pos):
+    return list(pos.order_by().values_list('currency', flat=True).distinct().order_by('currency'))
+
+
+def _facet_supplier_statuses(pos):
+    from projects.models import PODetailSupplier
+    return list(PODetailSupplier.objects.filter(
+        purchase_order__in=pos
+    ).values_list('supplier_status', flat=True).distinct().order_by('supplier_status'))
+
+
+def _facet_contab_statuses(pos):
+    from projects.models import PODetailSupplier
+    return list(PODetailSupplier.objects.filter(
+        purchase_order__in=pos
+    ).values_list('status_factura_contabilidad', flat=True).distinct().order_by('status_factura_contabilidad'))
+
+
+# nombre en la API -> función(queryset de OCs filtradas)
+FACETS = {
+    'suppliers': _facet_suppliers,
+    'products': _facet_products,
+    'manufacturers': _facet_manufacturers,
+    'statuses': _facet_statuses,
+    'currencies': _facet_currencies,
+    'supplier_statuses': _facet_supplier_statuses,
+    'contab_statuses': _facet_contab_statuses,
+}
+
+
+class PurchaseOrderGridService:
+
+    @staticmethod
+    def filters_from_request(params):
+        """Filtros validados del querystring (mismos nombres que la vista de logística)."""
+        date_from, date_to = validate_date_range(params.get('from'), params.get('to'))
+        return {
+            'proyecto_id': validate_project_id(params.get('proyecto_id')) if params.get('proyecto_id') else None,
+            'supplier': validate_search_query(params.get('supplier')),
+            'product': validate_search_query(params.get('product')),
+            'po': validate_search_query(params.get('po')),
+            'status': sanitize_input(params.get('status')),
+            'currency': sanitize_input(params.get('currency')),
+            'local': sanitize_input(params.get('local')),
+            'manuf': validate_search_query(params.get('manuf')),
+            'from': date_from,
+            'to': date_to,
+        }
+
+    @staticmethod
+    def filtered(filters, queryset=None):
+        """OCs que cumplen los filtros (sin orden ni JOINs a los detalles)."""
+        from projects.models import PurchaseOrder, PODetailProduct, PODetailSupplier
+
+        pos = PurchaseOrder.objects.all() if queryset is None else queryset
+        if filters.get('proyecto_id'):
+            pos = pos.filter(project_code_id=filters['proyecto_id'])
+
+        q = Q()
+        supplier = filters.get('supplier')
+        if supplier:
+            q &= Q(po_number__in=PODetailSupplier.objects.filter(
+                Q(supplier__ruc_supplier__icontains=supplier) | Q(supplier__name_supplier__icontains=supplier)
+            ).values('purchase_order_id'))
+        product = filters.get('product')
+        if product:
+            q &= Q(po_number__in=PODetailProduct.objects.filter(
+                Q(product__code_art__icontains=product) | Q(product__part_number__icontains=product)
+            ).values('purchase_order_id'))
+        if filters.get('manuf'):
+            q &= Q(po_number__in=PODetailProduct.objects.filter(
+                product__manufac__icontains=filters['manuf']
+            ).values('purchase_order_id'))
+        if filters.get('po'):
+            q &= Q(po_number__icontains=filters['po'])
+        if filters.get('status'):
+            q &= Q(po_status=filters['status'])
+        if filters.get('currency'):
+            q &= Q(currency=filters['currency'])
+        if filters.get('local'):
+            q &= Q(local_import=filters['local'])
+        if filters.get('from'):
+            q &= Q(issue_date__gte=filters['from'])
+        if filters.get('to'):
+            q &= Q(issue_date__lte=filters['to'])
+        return pos.filter(q) if q else pos
+
+    @staticmethod
+    def currency_totals(pos):
+        """{moneda: Decimal} con la suma de detalle.total por moneda de la OC ('' -> PEN), en BD."""
+        from projects.models import PODetailProduct
+
+        rows = PODetailProduct.objects.filter(
+            purchase_order__in=pos.order_by().values('po_number')
+        ).values(
+            cur=Coalesce(NullIf(F('purchase_order__currency'), Value('')), Value('PEN'))
+        ).annotate(total=Sum('total')).order_by('cur')
+        return {row['cur']: Decimal(row['total']).quantize(Decimal('0.01')) for row in rows if row['total'] is not None}
+
+    @staticmethod
+    def uses_facet_index(filters):
+        """True si solo se filtra por proyecto (o nada): las facetas salen de ProjectPOFacet."""
+        return not any(value for key, value in (filters or {}).items() if key != 'proyecto_id')
+
+    @staticmethod
+    def facet(name, pos, filters=None, with_counts=False):
+        """
+        Valores de un filtro. Sin más filtro que el proyecto se leen de la
+        tabla de facetas (ya agrupada, con n° de OCs); si no, se calculan en
+        vivo sobre `pos` (con `with_counts` el conteo va como None).
+        """
+        from projects.models import ProjectPOFacet
+
+        if name not in FACETS:
+            raise ValidationError(f"Faceta desconocida: {name}")
+        if filters is not None and PurchaseOrderGridService.uses_facet_index(filters):
+            return ProjectPOFacet.values(name, filters.get('proyecto_id'), with_counts=with_counts)
+        values = FACETS[name](pos)
+        return [(value, None) for value in values] if with_counts else values
+
+    # ---------- cursor ----------
+
+    @staticmethod
+    def encode_cursor(issue_date, po_number):
+        raw = json.dumps([issue_date.isoformat() if issue_date else None, po_number])
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+            issue_date, po_number = json.loads(raw)
+            return (date.fromisoformat(issue_date) if issue_date else None), str(po_number)
+        except (ValueError, TypeError):
+            raise ValidationError("Cursor inválido")
+
+    @staticmethod
+    def after_cursor(issue_date, po_number, descending=True):
+        """
+        Filas posteriores al cursor en el orden (issue_date, po_number), con
+        las OCs sin fecha al final en ambos sentidos.
+        """
+        op = 'lt' if descending else 'gt'
+        if issue_date is None:
+            return Q(issue_date__isnull=True, **{f'po_number__{op}': po_number})
+        return (
+            Q(**{f'issue_date__{op}': issue_date})
+            | Q(issue_date=issue_date, **{f'po_number__{op}': po_number})
+            | Q(issue_date__isnull=True)
+        )
+
+    @staticmethod
+    def page(pos, cursor=None, page_size=50, descending=True):
+        """
+        Una página por cursor: {'rows', 'next_cursor'}. Sin OFFSET ni COUNT:
+        se lee page_size + 1 filas para saber si hay más.
+        """
+        page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+        if descending:
+            ordering = (F('issue_date').desc(nulls_last=True), F('po_number').desc())
+        else:
+            ordering = (F('issue_date').asc(nulls_last=True), F('po_number').asc())
+        qs = pos.order_by(*ordering)
+        if cursor:
+            qs = qs.filter(PurchaseOrderGridService.after_cursor(
+                *PurchaseOrderGridService.decode_cursor(cursor), descending=descending
+            ))
+
+        rows = list(qs.values(*GRID_FIELDS)[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        PurchaseOrderGridService._attach_details(rows)
+        next_cursor = None
+        if has_more:
+            last = rows[-1]
+            next_cursor = PurchaseOrderGridService.encode_cursor(last['issue_date'], last['po_number'])
+        return {'rows': rows, 'next_cursor': next_cursor}
+
+    @staticmethod
+    def _attach_details(rows):
+        """Proveedores y total de detalles de las OCs de la página (2 consultas)."""
+        from projects.models import PODetailProduct, PODetailSupplier
+
+        by_po = {row['po_number']: row for row in rows}
+        for row in rows:
+            row['suppliers'] = []
+            row['details_total'] = None
+        if not by_po:
+            return
+        for po, ruc, name, status in PODetailSupplier.objects.filter(
+            purchase_order_id__in=list(by_po)
+        ).values_list('purchase_order_id', 'supplier_id', 'supplier__name_supplier', 'supplier_status').order_by('id'):
+            by_po[po]['suppliers'].append({'ruc': ruc, 'name': name, 'status': status})
+        for row in PODetailProduct.objects.filter(
+            purchase_order_id__in=list(by_po)
+        ).values('purchase_order_id').annotate(total=Sum('total')).order_by():
+            by_po[row['purchase_order_id']]['details_total'] = row['total']
@@ -0,0 +1,206 @@
+# projects/services/portfolio_audit.py
+"""
+Filas de la auditoría EVM del portafolio (`audit_projects_evm`).
+
+Sin imports de modelos a nivel de módulo: los procesos del pool (modo spawn
+en Windows) lo importan antes de `django.setup()` y lo inicializan con
+`init_worker`.
+"""
+import os
+
+SUMMARY_FIELDS = [
+    'project_id', 'cost_center', 'state', 'start_date', 'duration_months',
+    'bac', 'bac_source', 'physical_progress_percent', 'activities_count', 'weights_valid_100',
+    'po_count', 'pv_last', 'ev_last', 'ac_last', 'cpi', 'spi', 'eac', 'etc', 'vac',
+    'pmi_compliant', 'missing_data'
+]
+SERIES_FIELDS = ['project_id', 'month_index', 'pv', 'ev', 'ac']
+
+
+def init_worker(settings_module):
+    """
+    Inicializador del pool: Django configurado en cada proceso. El padre cierra
+    sus conexiones antes de crear el pool, así cada proceso abre la suya.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def audit_rows(project_id, entry):
+    """(fila de resumen, filas de serie) de un proyecto a partir del resultado del portafolio."""
+    p = entry['project']
+    evm = entry['evm']
+
+    # BAC
+    missing_bac = False
+    bac_source = 'Missing'
+    bac_val = 0.0
+    try:
+        if evm is None:
+            raise ValueError(entry['error'])
+        bac_val = float(evm['bac_calculated'])
+        if hasattr(p.cod_projects, 'presale'):
+            bac_source = 'Presale.total_cost'
+        elif getattr(p.cod_projects, 'cost_aprox_chance', None):
+            bac_source = 'Chance.cost_aprox_chance'
+        else:
+            bac_source = 'Unknown'
+    except Exception:
+        missing_bac = True
+
+    duration = p.estimated_duration or 0
+    start_date_iso = p.start_date.isoformat() if p.start_date else ''
+    missing_start_date = p.start_date is None
+
+    po_count = entry['po_count']
+    missing_purchase_orders = po_count == 0
+
+    # Avance físico y validaciones de actividades
+    activities_count = entry['activities_count']
+    weights_valid = bool(entry['weights_valid'])
+    physical_progress = entry['physical_progress']
+
+    missing_activities = activities_count == 0
+    invalid_weights = not weights_valid
+
+    # Métricas EVM y curvas
+    if evm is not None:
+        metrics = evm.get('metrics', {})
+        curve = evm.get('curve_data', {'months': [], 'pv': [], 'ev': [], 'ac': []})
+        pmi_compliant = bool(evm.get('pmi_compliant', False))
+    else:
+        metrics = {
+            'cpi': 1.0, 'spi': 1.0, 'cv': 0.0, 'sv': 0.0,
+            'eac': bac_val, 'vac': bac_val - bac_val, 'etc': bac_val
+        }
+        curve = {
+            'months': list(range(1, (duration or 0) + 1)),
+            'pv': [0.0] * (duration or 0),
+            'ev': [0.0] * (duration or 0),
+            'ac': [0.0] * (duration or 0)
+        }
+        pmi_compliant = False
+
+    pv_last = float(curve['pv'][-1]) if curve['pv'] else 0.0
+    ev_last = float(curve['ev'][-1]) if curve['ev'] else 0.0
+    ac_last = float(curve['ac'][-1]) if curve['ac'] else 0.0
+
+    missing_data_flags = []
+    if missing_bac:
+        missing_data_flags.append('Falta BAC (Presale/Chance)')
+    if missing_start_date:
+        missing_data_flags.append('Falta start_date')
+    if missing_purchase_orders:
+        missing_data_flags.append('Sin OC/AC')
+    if missing_activities:
+        missing_data_flags.append('Sin actividades')
+    if invalid_weights:
+        missing_data_flags.append('Pesos != 100%')
+
+    summary = {
+        'project_id': project_id,
+        'cost_center': p.cost_center,
+        'state': p.state_projects,
+        'start_date': start_date_iso,
+        'duration_months': duration,
+        'bac': round(bac_val, 2),
+        'bac_source': bac_source,
+        'physical_progress_percent': round(physical_progress, 2),
+        'activities_count': activities_count,
+        'weights_valid_100': 1 if weights_valid else 0,
+        'po_count': po_count,
+        'pv_last': round(pv_last, 2),
+        'ev_last': round(ev_last, 2),
+        'ac_last': round(ac_last, 2),
+        'cpi': round(float(metrics.get('cpi', 0.0)), 4),
+        'spi': round(float(metrics.get('spi', 0.0)), 4),
+        'eac': round(float(metrics.get('eac', 0.0)), 2),
+        'etc': round(float(metrics.get('etc', 0.0)), 2),
+        'vac': round(float(metrics.get('vac', 0.0)), 2),
+        'pmi_compliant': 1 if pmi_compliant else 0,
+        'missing_data': '; '.join(missing_data_flags)
+    }
+
+    months = curve.get('months', [])
+    pv_series = curve.get('pv', [])
+    ev_series = curve.get('ev', [])
+    ac_series = curve.get('ac', [])
+    series = [
+        {
+            'project_id': project_id,
+            'month_index': m,
+            'pv': round(float(pv_series[idx]) if idx < len(pv_series) else 0.0, 2),
+            'ev': round(float(ev_series[idx]) if idx < len(ev_series) else 0.0, 2),
+            'ac': round(float(ac_series[idx]) if idx < len(ac_series) else 0.0, 2),
+        }
+        for idx, m in enumerate(months)
+    ]
+    return summary, series
+
+
+def audit_shard(project_ids=None):
+    """
+    Audita un grupo de proyectos (todos si es None) con un número fijo de
+    consultas por grupo. Devuelve [(project_id, resumen, series)] ordenado por id.
+    """
+    from projects.models import Projects
+    from projects.services.earned_value.portfolio import PortfolioEVMCalculator
+
+    projects_qs = Projects.objects.select_related('cod_projects').all().order_by('cod_projects_id')
+    if project_ids is not None:
+        projects_qs = projects_qs.filter(cod_projects_id__in=project_ids)
+    portfolio = PortfolioEVMCalculator.calculate(projects_qs)
+    return [(project_id,) + audit_rows(project_id, entry) for project_id, entry in portfolio.items()]
+
+
+def changed_project_ids(since):
+    """
+    Proyectos con datos fuente modificados desde `since` (datetime aware):
+    el proyecto (inicio, duración, estado) y su Chance (BAC), actividades,
+    avance, baselines, cambios de presupuesto, facturas de proveedor, resumen
+    financiero (se recalcula al guardar facturas de cliente, OCs y sus
+    detalles) y snapshots EVM obsoletos o recalculados desde `since`.
+
+    Borrar una actividad, factura o cambio de presupuesto no deja updated_at:
+    solo marca el snapshot obsoleto (mark_stale). Si una visita al dashboard
+    lo recalcula antes del --since, queda su computed_at posterior a `since`.
+    """
+    from django.db.models import Q
+    from projects.models import (
+        Chance, Projects, ProjectActivity, ProjectProgress, ProjectBaseline, ProjectMonthlyBaseline,
+        BudgetChange, Invoice, ProjectFinancialRollup, ProjectEVMSnapshot,
+    )
+
+    sources = [
+        Projects.objects.filter(updated_at__gte=since).values_list('cod_projects_id', flat=True),
+        Chance.objects.filter(updated_at__gte=since).values_list('cod_projects', flat=True),
+        ProjectActivity.objects.filter(updated_at__gte=since).values_list('project_id', flat=True),
+        ProjectProgress.objects.filter(record_date__gte=since).values_list('project_id', flat=True),
+        ProjectBaseline.objects.filter(updated_at__gte=since).values_list('project_id', flat=True),
+        ProjectMonthlyBaseline.objects.filter(updated_at__gte=since).values_list('project_id', flat=True),
+        BudgetChange.objects.filter(created_at__gte=since).values_list('project_id', flat=True),
+        Invoice.objects.filter(updated_at__gte=since).values_list('purchase_order__project_code_id', flat=True),
+        ProjectFinancialRollup.objects.filter(updated_at__gte=since).values_list('project_id', flat=True),
+        ProjectEVMSnapshot.objects.filter(Q(is_stale=True) | Q(computed_at__gte=since)).values_list('project_id', flat=True),
+    ]
+    changed = set()
+    for qs in sources:
+        changed.update(pid for pid in qs.distinct() if pid)
+    return changed
+
+
+def date_sensitive_project_ids(computed_on):
+    """
+    Proyectos cuyo PV/SPI cambia con la fecha de cálculo aunque no cambien sus
+    datos: en progreso, sin fecha de inicio (la fecha segura depende de hoy) o
+    que iniciaron después de `computed_on` (fecha de los CSV anteriores).
+    """
+    from django.db.models import Q
+    from projects.models import Projects
+
+    return set(Projects.objects.filter(
+        Q(state_projects='En Progreso') | Q(start_date__isnull=True) | Q(start_date__gt=computed_on)
+    ).values_list('cod_projects_id', flat=True))
@@ -0,0 +1,85 @@
+# projects/services/request_cache.py
+import contextvars
+import functools
+from contextlib import contextmanager
+
+# Almacén del request actual (None = fuera de un request / sin memoización)
+_request_store = contextvars.ContextVar('projects_request_cache', default=None)
+
+
+class RequestCache:
+    """
+    Memoización por request (unit of work) para servicios de proyecto.
+    Dentro de `RequestCache.scope()` cada (namespace, proyecto, argumentos) se
+    calcula una sola vez; al salir del scope todo se descarta. Fuera de un
+    scope no hay memoización y cada llamada consulta la BD como siempre.
+
+    Los resultados se comparten entre servicios: NO mutarlos.
+    """
+
+    @staticmethod
+    @contextmanager
+    def scope():
+        """Abre un scope de memoización (anidado = reutiliza el scope externo)."""
+        if _request_store.get() is not None:
+            yield
+            return
+        token = _request_store.set({})
+        try:
+            yield
+        finally:
+            _request_store.reset(token)
+
+    @staticmethod
+    def is_active():
+        return _request_store.get() is not None
+
+    @staticmethod
+    def get_or_compute(namespace, project_id, compute, *extra):
+        """Devuelve el valor memoizado o ejecuta `compute()` y lo guarda (solo si no falla)."""
+        store = _request_store.get()
+        if store is None:
+            return compute()
+        key = (namespace, str(project_id), extra)
+        if key not in store:
+            store[key] = compute()
+        return store[key]
+
+    @staticmethod
+    def invalidate(project_id=None):
+        """Descarta lo memoizado del proyecto (o todo si project_id es None)."""
+        store = _request_store.get()
+        if store is None:
+            return
+        if project_id is None:
+            store.clear()
+            return
+        project_id = str(project_id)
+        for key in [k for k in store if k[1] == project_id]:
+            del store[key]
+
+    @staticmethod
+    def get_project(project_id):
+        """Projects + Chance (select_related) una sola vez por request."""
+        from projects.models import Projects
+
+        return RequestCache.get_or_compute(
+            'project', project_id,
+            lambda: Projects.objects.select_related('cod_projects').get(cod_projects_id=project_id),
+        )
+
+
+def request_memoized(namespace):
+    """
+    Decorador para funciones de servicio cuyo primer argumento es project_id.
+    El resto de argumentos posicionales/keyword forma parte de la clave.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(project_id, *args, **kwargs):
+            extra = args + tuple(sorted(kwargs.items()))
+            return RequestCache.get_or_compute(
+                namespace, project_id, lambda: func(project_id, *args, **kwargs), *extra
+            )
+        return wrapper
+    return decorator
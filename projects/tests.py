@@ -1,3 +1,1260 @@
-from django.test import TestCase
+import csv
+import importlib.util
+import io
+import json
+import math
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import skipUnless, mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from projects.models import (
+    BackgroundJob, BudgetChange, Chance, Costumer, Product, Supplier, ClientInvoice, Invoice, InvoiceParseCache, PODetailProduct,
+    ProjectActivity, ProjectBaseline, ProjectEVMSnapshot, ProjectFinancialRollup, ProjectMonthlyBaseline, ProjectPOFacet, Projects,
+    PurchaseOrder,
+)
+from projects.resources import InvoiceResource, PurchaseOrderResource
+from projects.services.baseline_service import BaselineService
+from projects.services.earned_value import array_backend
+from projects.services.earned_value.activity_calculator import ActivityCalculator
+from projects.services.earned_value.calculator import EarnedValueCalculator
+from projects.services.earned_value.portfolio import PortfolioEVMCalculator
+from projects.services.earned_value.series_engine import EVMSeriesEngine, ProjectEVMFacts
+from projects.services.earned_value.snapshot_service import EVMSnapshotService
+from projects.services.cache_payload import CachePayload
+from projects.services.cache_versioning import ProjectCacheVersion
+from projects.services.catalog_search import PrefixIndex
+from projects.services.chunked_import import ChunkedImportService
+from projects.services.cost_grid import CostGridService
+from projects.services.grid_export import GridExportService
+from projects.services.po_grid import PurchaseOrderGridService
+from projects.services.invoice_management.client_invoice_pdf_parser import ClientInvoicePDFParser
+from projects.services.invoice_management.batch_ingest import ClientInvoiceBatchIngestService
+from projects.services.invoice_management.field_extractor import InvoiceFieldExtractor
+from projects.services.invoice_management.ocr_pipeline import InvoiceOCRPipeline
+from projects.services.request_cache import RequestCache, request_memoized
+
+
+def _assert_close(testcase, a, b, path='root'):
+    """Compara estructuras EVM (dict/list/float) con tolerancia numérica."""
+    if isinstance(a, dict):
+        testcase.assertEqual(set(a.keys()), set(b.keys()), path)
+        for key in a:
+            _assert_close(testcase, a[key], b[key], f"{path}.{key}")
+    elif isinstance(a, list):
+        testcase.assertEqual(len(a), len(b), path)
+        for i, (x, y) in enumerate(zip(a, b)):
+            _assert_close(testcase, x, y, f"{path}[{i}]")
+    elif isinstance(a, float):
+        testcase.assertTrue(math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6), f"{path}: {a} != {b}")
+    else:
+        testcase.assertEqual(a, b, path)
+
+
+
+def _attr_path(obj, path):
+    for part in path.split('__'):
+        obj = getattr(obj, part) if obj is not None else None
+    return obj
+
+
+class _FakeQuerySet(list):
+    """Lista con la API mínima de QuerySet que usan los servicios EVM (filtros ignorados, sin BD)."""
+
+    def __init__(self, items=(), aggregates=None):
+        super().__init__(items)
+        self.aggregates = aggregates or {}
+
+    def filter(self, *args, **kwargs):
+        return self
+
+    select_related = order_by = all = filter
+
+    def exists(self):
+        return bool(self)
+
+    def first(self):
+        return self[0] if self else None
+
+    def aggregate(self, **kwargs):
+        return {key: self.aggregates.get(key) for key in kwargs}
+
+    def values(self, *fields):
+        return _FakeQuerySet([{field: _attr_path(obj, field) for field in fields} for obj in self])
+
+
+def _legacy_earned_value(project):
+    """calculate_earned_value anterior a EVMSeriesEngine (consulta por consulta), como referencia."""
+    calc = EarnedValueCalculator
+    bac = calc.get_bac_real(project)
+    duration = project.estimated_duration or 12
+    start_date_safe = calc.get_safe_start_date(project)
+    physical_progress = ActivityCalculator.calculate_physical_progress(project)
+    ev_total = bac * (physical_progress / Decimal('100.00'))
+    ac_data = calc.calculate_actual_cost_real(project, duration)
+    ac_paid_data = calc.calculate_verified_payments_series(project, duration)
+    pv_data = calc.calculate_planned_value_pmi(bac, duration, start_date_safe)
+    metrics = calc.calculate_metrics(pv_data, [ev_total] * duration, ac_data, bac)
+    ev_months = [ev_total * Decimal(str((i + 1) / duration)) for i in range(duration)]
+
+    baseline_arrays = BaselineService.get_monthly_arrays(project.cod_projects_id)
+    if baseline_arrays and baseline_arrays.get('months'):
+        duration = len(baseline_arrays['months'])
+        pv_data = [Decimal(str(x)) for x in baseline_arrays['pv']]
+        if float(physical_progress or 0) > 0.0 and ev_total > Decimal('0'):
+            ev_months = [ev_total * Decimal(str((i + 1) / duration)) for i in range(duration)]
+        else:
+            ev_months = [Decimal(str(x)) for x in baseline_arrays['ev']]
+        if all(v == 0 for v in [float(x) for x in ac_data]):
+            ac_data = [Decimal(str(x)) for x in baseline_arrays['ac']]
+        ac_paid_data = calc.calculate_verified_payments_series(project, duration)
+        pv_data = calc._ensure_non_decreasing(pv_data)
+        ev_months = calc._ensure_non_decreasing(ev_months)
+        ac_data = calc._ensure_non_decreasing(ac_data)
+        ac_paid_data = calc._ensure_non_decreasing(ac_paid_data)
+        metrics = calc.calculate_metrics(pv_data, ev_months, ac_data, bac)
+
+    return {
+        'curve_data': {
+            'months': list(range(1, duration + 1)),
+            'pv': [float(val) for val in pv_data],
+            'ev': [float(val) for val in ev_months],
+            'ac': [float(val) for val in ac_data],
+            'ac_paid': [float(val) for val in ac_paid_data],
+        },
+        'curve_data_weekly': calc._build_granular_curves(project, duration, bac, physical_progress, start_date_safe, 7),
+        'curve_data_daily': calc._build_granular_curves(project, duration, bac, physical_progress, start_date_safe, 1),
+        'metrics': metrics,
+        'bac_calculated': float(bac),
+        'physical_progress': float(physical_progress),
+        'pmi_compliant': True,
+    }
+
+class EVMSeriesEngineParityTests(SimpleTestCase):
+    """EVMSeriesEngine (hechos cargados una vez) = cálculo anterior consulta por consulta."""
+
+    def _sources(self, with_invoices=True, with_baseline=True):
+        project = Projects(
+            cod_projects=Chance(cod_projects='TEST-EVM', total_costs=Decimal('180000.00')),
+            start_date=date(2024, 1, 10),
+            estimated_duration=10,
+            physical_percent_complete=Decimal('0.00'),
+        )
+        start = date(2024, 1, 15)
+        invoices = [
+            Invoice(
+                issue_date=start + timedelta(days=19 * i),
+                total_amount=Decimal('1500.00') + Decimal(i * 41),
+                exchange_rate=Decimal('3.7500'),
+                currency='USD' if i % 3 == 0 else 'PEN',
+            )
+            for i in range(18)
+        ] if with_invoices else []
+        details = [
+            PODetailProduct(
+                purchase_order=PurchaseOrder(issue_date=start + timedelta(days=23 * i) if i % 5 else None),
+                local_total=Decimal('845.30') if i % 2 else None,
+                total=Decimal('512.10'),
+            )
+            for i in range(12)
+        ]
+        payments = [
+            ClientInvoice(
+                invoice_date=date(2024, 2 + i, 20),
+                fully_paid_date=date(2024, 3 + i, 2) if i % 2 else None,
+                paid_amount=Decimal('9000.00') if i % 3 else None,
+                amount=Decimal('10000.00'),
+            )
+            for i in range(6)
+        ]
+        activities = [
+            ProjectActivity(calculated_weight=Decimal('40.00'), percentage_completed=Decimal('75.00'), created_at=None),
+            ProjectActivity(calculated_weight=Decimal('60.00'), percentage_completed=Decimal('20.00'), created_at=None),
+        ]
+        baseline = [
+            ProjectMonthlyBaseline(
+                month_index=m, label=f"Mes {m}", pv_planned=Decimal('15000.00') * m, ev_planned=Decimal('14000.00') * m,
+                ac_planned=Decimal('13000.00') * m, client_billing_planned=Decimal('16000.00') * m,
+                progress_planned=Decimal('8.00') * m,
+            )
+            for m in range(1, 13)
+        ] if with_baseline else []
+        arrays = {
+            'months': [b.month_index for b in baseline],
+            'labels': [b.label for b in baseline],
+            'pv': [float(b.pv_planned) for b in baseline],
+            'ev': [float(b.ev_planned) for b in baseline],
+            'ac': [float(b.ac_planned) for b in baseline],
+            'billing': [float(b.client_billing_planned) for b in baseline],
+            'progress': [float(b.progress_planned) for b in baseline],
+        } if with_baseline else None
+        patches = [
+            mock.patch.object(RequestCache, 'get_project', return_value=project),
+            mock.patch.object(BudgetChange, 'objects', _FakeQuerySet(aggregates={'total': Decimal('1250.50')})),
+            mock.patch.object(Invoice, 'objects', _FakeQuerySet(invoices)),
+            mock.patch.object(PODetailProduct, 'objects', _FakeQuerySet(details)),
+            mock.patch.object(ClientInvoice, 'objects', _FakeQuerySet(payments)),
+            mock.patch.object(ProjectActivity, 'objects', _FakeQuerySet(activities)),
+            mock.patch.object(ProjectMonthlyBaseline, 'objects', _FakeQuerySet(baseline)),
+            mock.patch.object(BaselineService, 'get_monthly_arrays', return_value=arrays),
+        ]
+        return project, patches
+
+    def _assert_parity(self, **kwargs):
+        project, patches = self._sources(**kwargs)
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        expected = _legacy_earned_value(project)
+        result = EarnedValueCalculator.calculate_earned_value('TEST-EVM')
+        _assert_close(self, expected, result)
+        return result
+
+    def test_parity_with_invoices_and_baseline(self):
+        result = self._assert_parity()
+        self.assertEqual(len(result['curve_data']['pv']), 12)
+        self.assertNotEqual(result['metrics']['cpi'], 1.0)
+
+    def test_parity_with_po_details_without_baseline(self):
+        result = self._assert_parity(with_invoices=False, with_baseline=False)
+        self.assertEqual(len(result['curve_data']['pv']), 10)
+        self.assertGreater(result['curve_data']['ac'][-1], 0)
+
+
+@skipUnless(array_backend.NUMPY_AVAILABLE, "numpy no instalado")
+class ArrayBackendParityTests(SimpleTestCase):
+    """El backend NumPy debe producir las mismas series que el camino Decimal."""
+
+    def _facts(self, with_invoices=True, months=24):
+        chance = Chance(
+            cod_projects='TEST-EVM',
+            cost_aprox_chance=Decimal('250000.00'),
+            total_costs=Decimal('180000.00'),
+        )
+        project = Projects(
+            cod_projects=chance,
+            start_date=date(2024, 1, 10),
+            estimated_duration=months,
+            physical_percent_complete=Decimal('0.00'),
+        )
+        facts = ProjectEVMFacts(project)
+        facts.changes_total = Decimal('1250.50')
+        start = date(2024, 1, 15)
+        if with_invoices:
+            facts.invoices = [
+                {
+                    'issue_date': start + timedelta(days=17 * i),
+                    'total_amount': Decimal('1000.00') + Decimal(i * 37),
+                    'exchange_rate': Decimal('3.7500'),
+                    'currency': 'USD' if i % 3 == 0 else 'PEN',
+                }
+                for i in range(40)
+            ]
+        else:
+            facts.po_details = [
+                {
+                    'purchase_order__issue_date': start + timedelta(days=23 * i) if i % 7 else None,
+                    'local_total': Decimal('845.30') if i % 2 else None,
+                    'total': Decimal('512.10'),
+                }
+                for i in range(30)
+            ]
+        facts.client_payments = [
+            {
+                'fully_paid_date': date(2024, 3 + i, 2) if i % 2 else None,
+                'bank_verified_date': None,
+                'payment_reported_date': None,
+                'invoice_date': date(2024, 2 + i, 20),
+                'paid_amount': Decimal('0.00') if i % 3 == 0 else Decimal('9000.00'),
+                'amount': Decimal('10000.00'),
+            }
+            for i in range(8)
+        ]
+        facts.activities = [
+            {'calculated_weight': Decimal('40.00'), 'percentage_completed': Decimal('75.00'), 'created_at': None},
+            {'calculated_weight': Decimal('60.00'), 'percentage_completed': Decimal('20.00'), 'created_at': None},
+        ]
+        facts.baseline_rows = [
+            {
+                'month_index': m,
+                'label': f"Mes {m}",
+                'pv_planned': Decimal('7500.00') * m,
+                'ev_planned': Decimal('7500.00') * m,
+                'ac_planned': Decimal('7000.00') * m,
+                'client_billing_planned': Decimal('10000.00') * m,
+                'progress_planned': Decimal('4.00') * m,
+            }
+            for m in range(1, months + 1)
+        ]
+        return facts
+
+    def test_parity_with_supplier_invoices(self):
+        facts = self._facts(with_invoices=True)
+        expected = EVMSeriesEngine(facts, backend='decimal').calculate()
+        result = EVMSeriesEngine(facts, backend='numpy').calculate()
+        _assert_close(self, expected, result)
+        self.assertEqual(len(result['curve_data_daily']['pv']), 24 * 30)
+
+    def test_parity_with_po_details_fallback(self):
+        facts = self._facts(with_invoices=False)
+        expected = EVMSeriesEngine(facts, backend='decimal').calculate()
+        result = EVMSeriesEngine(facts, backend='numpy').calculate()
+        _assert_close(self, expected, result)
+
+    def test_non_decreasing_matches_decimal_path(self):
+        from projects.services.earned_value.calculator import EarnedValueCalculator
+        series = [Decimal('-5'), Decimal('10'), Decimal('8'), None, Decimal('12.5')]
+        expected = [float(x) for x in EarnedValueCalculator._ensure_non_decreasing(series)]
+        result = array_backend.to_floats(array_backend.non_decreasing(series))
+        self.assertEqual(expected, result)
+
+
+class PortfolioEVMParityTests(TestCase):
+    """PortfolioEVMCalculator (consultas agrupadas, solo lectura) = calculate_earned_value por proyecto."""
+
+    @classmethod
+    def setUpTestData(cls):
+        customer = Costumer.objects.create(ruc_costumer='20100000001', com_name='ACME')
+        supplier = Supplier.objects.create(ruc_supplier='20555000001', name_supplier='Prov SAC')
+        product = Product.objects.create(code_art='ART-PF', descrip='Producto', ruc_supplier=supplier)
+        for k in range(3):
+            Chance(
+                cod_projects=f'PF{k}', info_costumer=customer, staff_presale='x', cost_center=f'CC{k}', com_exe='y',
+                dres_chance=f'Proyecto {k}', cost_aprox_chance=Decimal('100000'), material_cost=Decimal('30000') + k,
+                labor_cost=Decimal('5000'), subcontracted_cost=Decimal('0'), overhead_cost=Decimal('1000'),
+                estimated_duration=6 + k,
+            ).save()
+            project = Projects.objects.get(cod_projects_id=f'PF{k}')
+            project.start_date = date(2025, 1, 15)
+            project.estimated_duration = 6 + k
+            project.save()
+            for j in range(4):
+                po = PurchaseOrder.objects.create(
+                    po_number=f'OC-PF{k}-{j}', project_code=project, issue_date=date(2025, 1 + j, 2 + j), total_amount=0,
+                    currency='USD' if j % 2 else 'PEN', exchange_rate=Decimal('3.75'),
+                )
+                PODetailProduct(purchase_order=po, product=product, quantity=2 + j, unit_price=Decimal('125.50')).save()
+                if k != 1:
+                    Invoice.objects.create(
+                        invoice_number=f'F-PF{k}-{j}', issue_date=date(2025, 1 + j, 5), purchase_order=po,
+                        supplier_ruc='20555', supplier_name='Prov', total_amount=Decimal('1800.00') + j,
+                        currency='USD' if j == 2 else 'PEN', exchange_rate=Decimal('3.70'),
+                    )
+            ProjectActivity(
+                project=project, name='A', complexity=2, effort=2, impact=3, unit_of_measure='u',
+                total_units=10, completed_units=3 + k, calculated_weight=Decimal('100.00'),
+            ).save()
+        BudgetChange.objects.create(project_id='PF0', amount=Decimal('2500.50'))
+        # PF1: baseline guardado con pocas filas (se completa en memoria); PF2: sin baseline
+        ProjectBaseline.objects.create(project_id='PF1', duration_months=4, bac_planned=Decimal('1234.00'))
+
+    def test_matches_per_project_calculator_without_writing(self):
+        baseline_rows = ProjectMonthlyBaseline.objects.count()
+        with self.assertNumQueries(9):
+            portfolio = PortfolioEVMCalculator.calculate(include_granular=True)
+        self.assertEqual(ProjectMonthlyBaseline.objects.count(), baseline_rows)
+        self.assertEqual(ProjectBaseline.objects.count(), 1)
+
+        for pid in ('PF0', 'PF1', 'PF2'):
+            expected = EarnedValueCalculator.calculate_earned_value(pid)
+            _assert_close(self, expected, portfolio[pid]['evm'], pid)
+        self.assertEqual(portfolio['PF1']['po_count'], 4)
+
+
+class IncrementalPortfolioAuditTests(TestCase):
+    """audit_projects_evm --since: qué filas se copian del CSV anterior y cuáles se recalculan."""
+
+    SENTINEL = '-1'
+
+    @classmethod
+    def setUpTestData(cls):
+        customer = Costumer.objects.create(ruc_costumer='20100000002', com_name='ACME')
+        for code, state in (('AU0', 'Completado'), ('AU1', 'En Progreso')):
+            Chance(
+                cod_projects=code, info_costumer=customer, staff_presale='x', cost_center='CC', com_exe='y',
+                dres_chance=code, cost_aprox_chance=Decimal('50000'), material_cost=Decimal('1000'),
+                labor_cost=Decimal('0'), subcontracted_cost=Decimal('0'), overhead_cost=Decimal('0'),
+            ).save()
+            project = Projects.objects.get(cod_projects_id=code)
+            project.start_date, project.state_projects = date(2024, 1, 10), state
+            project.save()
+
+    def setUp(self):
+        from django.test import override_settings
+
+        self.base_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.base_dir)
+        override = override_settings(BASE_DIR=self.base_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.summary_path = os.path.join(self.base_dir, 'projects', 'reports', 'evm_audit_summary.csv')
+
+    def _audit(self, **options):
+        from django.core.management import call_command
+        call_command('audit_projects_evm', stdout=io.StringIO(), **options)
+        with open(self.summary_path, newline='', encoding='utf-8') as f:
+            return {row['project_id']: row for row in csv.DictReader(f)}
+
+    def _mark_previous(self, mtime=None):
+        """Marca el BAC de todas las filas del CSV anterior para ver cuáles se copian."""
+        with open(self.summary_path, newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            fields, rows = reader.fieldnames, list(reader)
+        with open(self.summary_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(dict(row, bac=self.SENTINEL) for row in rows)
+        if mtime is not None:
+            os.utime(self.summary_path, (mtime, mtime))
+
+    def test_in_progress_projects_are_always_reaudited(self):
+        self._audit()
+        self._mark_previous()
+        rows = self._audit(since='last')
+        self.assertEqual(rows['AU0']['bac'], self.SENTINEL)
+        self.assertNotEqual(rows['AU1']['bac'], self.SENTINEL)
+
+    def test_project_and_chance_edits_are_detected(self):
+        self._audit()
+        self._mark_previous(mtime=(timezone.now() - timedelta(minutes=5)).timestamp())
+        chance = Chance.objects.get(pk='AU0')
+        chance.material_cost = Decimal('2000')
+        chance.save()
+        rows = self._audit(since='last')
+        self.assertEqual(rows['AU0']['bac'], '2000.0')
+
+        self._mark_previous(mtime=(timezone.now() - timedelta(minutes=5)).timestamp())
+        project = Projects.objects.get(pk='AU0')
+        project.estimated_duration = 10
+        project.save()
+        rows = self._audit(since='last')
+        self.assertEqual(rows['AU0']['duration_months'], '10')
+
+    def test_deleted_source_detected_after_snapshot_recompute(self):
+        from projects.models import ProjectMonthlyBaseline
+
+        change = BudgetChange.objects.create(project_id='AU0', amount=Decimal('500.00'))
+        # El primer cálculo crea el baseline (y vuelve a marcar el snapshot obsoleto)
+        EVMSnapshotService.get_earned_value('AU0')
+        self._audit()
+        self._mark_previous(mtime=(timezone.now() - timedelta(minutes=5)).timestamp())
+        hour_ago = timezone.now() - timedelta(hours=1)
+        for model in (Projects, Chance, ProjectBaseline, ProjectMonthlyBaseline, ProjectFinancialRollup):
+            model.objects.update(updated_at=hour_ago)
+        BudgetChange.objects.update(created_at=hour_ago)
+
+        change.delete()
+        # Una visita al dashboard recalcula el snapshot: ya no está obsoleto al correr --since
+        EVMSnapshotService.get_earned_value('AU0')
+        self.assertFalse(ProjectEVMSnapshot.objects.filter(project_id='AU0', is_stale=True).exists())
+        rows = self._audit(since='last')
+        self.assertNotEqual(rows['AU0']['bac'], self.SENTINEL)
+
+    def test_previous_month_csv_is_not_reused(self):
+        self._audit()
+        self._mark_previous(mtime=(timezone.now() - timedelta(days=40)).timestamp())
+        rows = self._audit(since=timezone.now().isoformat())
+        self.assertNotEqual(rows['AU0']['bac'], self.SENTINEL)
+
+
+class EVMSnapshotStalenessTests(SimpleTestCase):
+    """Snapshot EVM: se recalcula si está marcado obsoleto o es de un mes anterior (sin BD)."""
+
+    def _snapshot(self, granularity, computed_at, is_stale=False):
+        return ProjectEVMSnapshot(
+            project_id='P-EVM', granularity=granularity, is_stale=is_stale, computed_at=computed_at,
+            series={'months': [1], 'pv': [1.0]}, metrics={'cpi': 1.0, 'spi': 0.9},
+            bac=Decimal('100.00'), physical_progress=Decimal('10.00'),
+        )
+
+    def _read(self, snapshots):
+        with mock.patch.object(ProjectEVMSnapshot, 'objects', _FakeQuerySet(snapshots)), \
+             mock.patch.object(EVMSnapshotService, 'refresh', return_value={'curve_data': 'recalculado'}) as refresh:
+            data = EVMSnapshotService.get_earned_value('P-EVM', granularities=('month',))
+        return data, refresh.called
+
+    def test_is_current_requires_this_month(self):
+        today = date(2025, 3, 15)
+        period_start = ProjectEVMSnapshot.period_start(today)
+        self.assertTrue(self._snapshot('month', period_start).is_current(today))
+        self.assertFalse(self._snapshot('month', period_start - timedelta(seconds=1)).is_current(today))
+        self.assertFalse(self._snapshot('month', period_start, is_stale=True).is_current(today))
+
+    def test_current_snapshot_is_served(self):
+        data, refreshed = self._read([self._snapshot('month', ProjectEVMSnapshot.period_start())])
+        self.assertFalse(refreshed)
+        self.assertEqual(data['metrics']['spi'], 0.9)
+
+    def test_stale_or_previous_month_snapshot_is_refreshed(self):
+        last_month = ProjectEVMSnapshot.period_start() - timedelta(days=1)
+        for snapshot in (self._snapshot('month', last_month), self._snapshot('month', None, is_stale=True)):
+            data, refreshed = self._read([snapshot])
+            self.assertTrue(refreshed)
+            self.assertEqual(data['curve_data'], 'recalculado')
+        _, refreshed = self._read([])
+        self.assertTrue(refreshed)
+
+    def test_mark_stale_only_ignores_missing_table(self):
+        from django.db import IntegrityError, ProgrammingError
+        objects = mock.MagicMock()
+        with mock.patch.object(ProjectEVMSnapshot, 'objects', objects), \
+             mock.patch('projects.models.evm_snapshot.transaction.atomic'), \
+             mock.patch('projects.models.evm_snapshot.table_missing', return_value=True) as missing:
+            objects.filter.return_value.update.side_effect = ProgrammingError('relation does not exist')
+            self.assertEqual(ProjectEVMSnapshot.mark_stale('P-EVM'), 0)
+            missing.return_value = False
+            with self.assertRaises(ProgrammingError):
+                ProjectEVMSnapshot.mark_stale('P-EVM')
+            objects.filter.return_value.update.side_effect = IntegrityError('boom')
+            with self.assertRaises(IntegrityError):
+                ProjectEVMSnapshot.mark_stale('P-EVM')
+
+
+class RequestCacheTests(SimpleTestCase):
+    """Memoización por request: una vez por scope, nada fuera de él."""
+
+    def setUp(self):
+        self.calls = []
+
+        @request_memoized('test')
+        def compute(project_id, granularity='month'):
+            self.calls.append((project_id, granularity))
+            return len(self.calls)
+
+        self.compute = compute
+
+    def test_memoizes_inside_scope_only(self):
+        self.compute('P1')
+        self.compute('P1')
+        self.assertEqual(len(self.calls), 2)
+
+        with RequestCache.scope():
+            self.assertEqual(self.compute('P1'), self.compute('P1'))
+            self.compute('P1', granularity='day')
+            self.compute('P2')
+        self.assertEqual(len(self.calls), 5)
+
+        with RequestCache.scope():
+            self.compute('P1')
+        self.assertEqual(len(self.calls), 6)
+
+    def test_invalidate_project(self):
+        with RequestCache.scope():
+            self.compute('P1')
+            self.compute('P2')
+            RequestCache.invalidate('P1')
+            self.compute('P1')
+            self.compute('P2')
+        self.assertEqual(self.calls, [('P1', 'month'), ('P2', 'month'), ('P1', 'month')])
+
+
+class ProjectCacheVersionTests(SimpleTestCase):
+    """Las claves versionadas cambian al escribir datos del proyecto."""
+
+    def test_bump_changes_project_and_portfolio_keys(self):
+        project_key = ProjectCacheVersion.key('dashboard_data', 'P-VER-1')
+        other_key = ProjectCacheVersion.key('dashboard_data', 'P-VER-2')
+        portfolio_key = ProjectCacheVersion.key('purchase_orders', None, 'x', None)
+
+        ProjectCacheVersion.bump('P-VER-1')
+
+        self.assertNotEqual(project_key, ProjectCacheVersion.key('dashboard_data', 'P-VER-1'))
+        self.assertEqual(other_key, ProjectCacheVersion.key('dashboard_data', 'P-VER-2'))
+        self.assertNotEqual(portfolio_key, ProjectCacheVersion.key('purchase_orders', None, 'x', None))
+
+    def test_parts_are_hashed(self):
+        key = ProjectCacheVersion.key('purchase_orders', 'P-VER-3', 'proveedor con espacios', None, 'x' * 300)
+        self.assertLess(len(key), 100)
+        self.assertNotIn(' ', key)
+
+    def test_short_ttl_with_per_process_cache(self):
+        from django.test import override_settings
+
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp/x'}}
+        with override_settings(CACHES=locmem, PROJECT_CACHE_TTL=21600, LOCAL_CACHE_TTL=300):
+            self.assertEqual(ProjectCacheVersion.timeout(), 300)
+        with override_settings(CACHES=shared, PROJECT_CACHE_TTL=21600, LOCAL_CACHE_TTL=300):
+            self.assertEqual(ProjectCacheVersion.timeout(), 21600)
+
+
+class ProjectOptionsPayloadTests(TestCase):
+    """El payload de proyectos trae el nombre de respaldo que usan las plantillas (presale.job_name)."""
+
+    def test_template_fallback_name(self):
+        from django.template import Context, Template
+
+        Chance(
+            cod_projects='PN1', info_costumer=Costumer.objects.create(ruc_costumer='20100000003', com_name='ACME'),
+            staff_presale='x', cost_center='CC-PN1', com_exe='y', dres_chance='Obra norte',
+            cost_aprox_chance=Decimal('1000'), material_cost=Decimal('500'), labor_cost=Decimal('0'),
+            subcontracted_cost=Decimal('0'), overhead_cost=Decimal('0'),
+        ).save()
+        options = CachePayload.project_options()
+        self.assertEqual(options[0]['cod_projects']['dres_chance'], 'Obra norte')
+        self.assertIn('job_name', options[0]['cod_projects']['presale'])
+
+        template = Template(
+            '{% if p.cod_projects.dres_chance %}{{ p.cod_projects.dres_chance }}'
+            '{% elif p.cod_projects.presale.job_name %}{{ p.cod_projects.presale.job_name }}{% endif %}'
+        )
+        payload = {'cod_projects': CachePayload.chance_names('', 'Preventa 7')}
+        self.assertEqual(template.render(Context({'p': payload})), 'Preventa 7')
+
+
+class EVMApiETagTests(SimpleTestCase):
+    """El ETag de la API EVM sale de la base de datos, no del contador de caché del proceso."""
+
+    def test_etag_from_database_state(self):
+        from projects.views.project.evm_api import _etag
+
+        updated = timezone.now()
+        computed = updated + timedelta(minutes=1)
+        etag = _etag('P-ETAG', updated, computed, 'month', None, None)
+        ProjectCacheVersion.bump('P-ETAG')
+        self.assertEqual(etag, _etag('P-ETAG', updated, computed, 'month', None, None))
+        self.assertNotEqual(etag, _etag('P-ETAG', updated, computed + timedelta(seconds=1), 'month', None, None))
+        self.assertNotEqual(etag, _etag('P-ETAG', computed, computed, 'month', None, None))
+
+
+class CachePayloadTests(SimpleTestCase):
+    """Payloads compactos: solo primitivos y con presupuesto de tamaño."""
+
+    def test_roundtrip_and_budget(self):
+        data = {'pv': '[1.0, 2.0]', 'kpis': {'cpi': 1.02}, 'page_ids': ['OC-1', 'OC-2']}
+        self.assertTrue(CachePayload.set('payload-test', data))
+        self.assertEqual(CachePayload.get('payload-test'), data)
+        self.assertFalse(CachePayload.set('payload-big', {'x': list(range(50000))}, max_bytes=1024))
+        self.assertIsNone(CachePayload.get('payload-big'))
+
+    def test_rejects_model_instances(self):
+        self.assertFalse(CachePayload.set('payload-model', {'project': Projects()}))
+
+    def test_page_without_queryset(self):
+        page = CachePayload.page(['OC-11', 'OC-12'], total=12, number=2, per_page=10)
+        self.assertEqual(list(page), ['OC-11', 'OC-12'])
+        self.assertEqual((page.start_index(), page.paginator.num_pages), (11, 2))
+        self.assertFalse(page.has_next())
+
+
+class ProjectFinancialRollupTests(SimpleTestCase):
+    """Fila de resumen a partir de los agregados agrupados (sin BD)."""
+
+    def test_verified_falls_back_to_amount(self):
+        rollup = ProjectFinancialRollup.from_aggregates('P-FIN', {
+            'total_invoiced': Decimal('300.00'), 'verified_paid': Decimal('0.00'),
+            'verified_amount': Decimal('200.00'), 'verified_count': 2,
+        }, {'total_spent': Decimal('120.00'), 'po_count': 1})
+        self.assertEqual(rollup.total_verified, Decimal('200.00'))
+        self.assertEqual(rollup.pending_collection, Decimal('100.00'))
+        self.assertEqual((rollup.total_spent, rollup.po_count), (Decimal('120.00'), 1))
+
+    def test_refresh_only_ignores_missing_table(self):
+        from django.db import OperationalError
+        objects = mock.MagicMock()
+        objects.select_for_update.side_effect = OperationalError('lock timeout')
+        with mock.patch.object(Projects, 'objects', objects), \
+             mock.patch('projects.models.financial_rollup.transaction.atomic'), \
+             mock.patch('projects.models.financial_rollup.table_missing', return_value=False):
+            with self.assertRaises(OperationalError):
+                ProjectFinancialRollup.refresh('P-FIN')
+        with mock.patch.object(Projects, 'objects', objects), \
+             mock.patch('projects.models.financial_rollup.transaction.atomic'), \
+             mock.patch('projects.models.financial_rollup.table_missing', return_value=True):
+            self.assertEqual(ProjectFinancialRollup.refresh('P-FIN'), [])
+
+    def test_empty_project(self):
+        rollup = ProjectFinancialRollup.from_aggregates('P-FIN')
+        self.assertEqual((rollup.total_invoiced, rollup.total_paid, rollup.total_spent), (Decimal('0.00'),) * 3)
+        self.assertEqual(rollup.verified_count, 0)
+
+
+class ImportLookupIndexTests(SimpleTestCase):
+    """Los índices en memoria del import incluyen lo guardado en el mismo dataset."""
+
+    def test_saved_invoice_is_found_by_purchase_order(self):
+        resource = InvoiceResource()
+        existing = Invoice(pk=1, invoice_number='F001-1', purchase_order_id='OC-1')
+        with mock.patch.object(Invoice, 'objects', _FakeQuerySet([existing])):
+            self.assertIsNone(resource.get_instance(None, {'invoice_number': 'F001-2', 'purchase_order': 'OC-2'}))
+
+            created = Invoice(pk=2, invoice_number='F001-2', purchase_order_id='OC-2')
+            resource.after_save_instance(created, {})
+
+            self.assertIs(resource.get_instance(None, {'purchase_order': 'OC-2'}), created)
+            self.assertIs(resource.get_instance(None, {'invoice_number': 'F001-2'}), created)
+
+    def test_changed_key_replaces_previous_entry(self):
+        resource = InvoiceResource()
+        invoice = Invoice(pk=1, invoice_number='F001-1', purchase_order_id='OC-1')
+        with mock.patch.object(Invoice, 'objects', _FakeQuerySet([invoice])):
+            resource.lookup_index(Invoice, 'purchase_order')
+            invoice.purchase_order_id = 'OC-3'
+            resource.after_save_instance(invoice, {})
+
+            index = resource.lookup_index(Invoice, 'purchase_order')
+            self.assertNotIn('OC-1', index)
+            self.assertIs(index['OC-3'], invoice)
+
+    def test_discard_written_restores_rolled_back_rows(self):
+        resource = InvoiceResource()
+        invoice = Invoice(pk=1, invoice_number='F001-1', purchase_order_id='OC-1')
+        with mock.patch.object(Invoice, 'objects', _FakeQuerySet([invoice])):
+            resource.lookup_index(Invoice, 'purchase_order')
+        invoice.purchase_order_id = 'OC-3'
+        resource.after_save_instance(invoice, {})
+        resource.after_save_instance(Invoice(pk=2, invoice_number='F001-2', purchase_order_id='OC-2'), {})
+
+        # El bloque se revirtió: en la BD solo queda la factura 1 con su OC original
+        stored = Invoice(pk=1, invoice_number='F001-1', purchase_order_id='OC-1')
+        with mock.patch.object(Invoice, 'objects', _FakeQuerySet([stored])):
+            resource.discard_written()
+        self.assertEqual(resource.lookup_index(Invoice, 'purchase_order'), {'OC-1': stored})
+
+    def test_unsaved_bulk_instances_are_ignored(self):
+        resource = InvoiceResource()
+        with mock.patch.object(Invoice, 'objects', _FakeQuerySet([])):
+            resource.after_save_instance(Invoice(invoice_number='F001-9'), {})
+            self.assertEqual(resource.lookup_index(Invoice, 'invoice_number'), {})
+
+    def test_saved_purchase_order_joins_digits_index(self):
+        resource = PurchaseOrderResource()
+        with mock.patch.object(PurchaseOrder, 'objects', _FakeQuerySet([PurchaseOrder(po_number='OC 100')])):
+            self.assertIsNone(resource.resolve_purchase_order('200'))
+            created = PurchaseOrder(po_number='OC 200')
+            resource.after_save_instance(created, {})
+            self.assertIs(resource.resolve_purchase_order('200'), created)
+            self.assertIs(resource.resolve_purchase_order('OC 200'), created)
+
+
+class ChunkedImportReaderTests(SimpleTestCase):
+    """Lectura por bloques de CSV (sin BD)."""
+
+    def _write_csv(self, content):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8-sig') as f:
+            f.write(content)
+        self.addCleanup(os.unlink, f.name)
+        return f.name
+
+    def test_csv_chunks_skip_blank_rows_and_pad(self):
+        path = self._write_csv(' po_number ;code_art;quantity\nOC-1;A;1\n;;\nOC-2;B\nOC-3;C;3\n')
+        headers, rows = ChunkedImportService.iter_rows(path)
+        chunks = list(ChunkedImportService.iter_chunks(headers, rows, chunk_size=2))
+        self.assertEqual(headers, ['po_number', 'code_art', 'quantity'])
+        self.assertEqual([len(c) for c in chunks], [2, 1])
+        # La última columna es la fila del archivo (la 3 está en blanco)
+        self.assertEqual(chunks[0][1], ('OC-2', 'B', None, 4))
+        self.assertEqual(chunks[1][0], ('OC-3', 'C', '3', 5))
+        self.assertEqual(chunks[1].headers, headers + [ChunkedImportService.SOURCE_ROW_COLUMN])
+
+    def test_run_counts_only_committed_chunks(self):
+        from import_export.results import Error, Result, RowResult
+
+        class FakeResource:
+            instances = []
+
+            def __init__(self):
+                FakeResource.instances.append(self)
+                self.discarded = 0
+
+            def import_data(self, dataset, **kwargs):
+                result = Result()
+                for number, row in enumerate(dataset, start=1):
+                    row_result = RowResult()
+                    if row[0] == 'MAL':
+                        row_result.import_type = RowResult.IMPORT_TYPE_ERROR
+                        row_result.errors = [Error(ValueError('OC inválida'))]
+                        result.append_error_row(number, {}, row_result.errors)
+                    else:
+                        row_result.import_type = RowResult.IMPORT_TYPE_NEW
+                    result.increment_row_result_total(row_result)
+                    result.append_row_result(row_result)
+                return result
+
+            def discard_written(self):
+                self.discarded += 1
+
+        path = self._write_csv('po_number;code_art\nOC-1;A\nOC-2;B\n;\nOC-3;C\nMAL;D\nOC-5;E\n')
+        info = ChunkedImportService.run(FakeResource, path, chunk_size=2)
+
+        self.assertEqual(len(FakeResource.instances), 1)
+        self.assertEqual(FakeResource.instances[0].discarded, 1)
+        self.assertEqual((info['chunk'], info['rows'], info['chunk_errors']), (3, 5, 1))
+        self.assertEqual(info['totals']['new'], 3)
+        self.assertEqual(info['totals']['error'], 0)
+        self.assertEqual(info['rolled_back_rows'], 2)
+        self.assertEqual(info['errors'], [(6, 'OC inválida')])
+
+
+class BackgroundJobRetryTests(SimpleTestCase):
+    """Reintentos con espera exponencial (save simulado, sin BD)."""
+
+    def test_retries_then_fails(self):
+        job = BackgroundJob(kind='audit_projects_evm', max_attempts=2, attempts=1)
+        queued_at = job.run_after
+        with mock.patch.object(BackgroundJob, 'save'):
+            job.mark_failed('error 1')
+            self.assertEqual(job.status, 'PENDING')
+            self.assertGreaterEqual((job.run_after - queued_at).total_seconds(), BackgroundJob.RETRY_BASE_SECONDS)
+            job.attempts = 2
+            job.mark_failed('error 2')
+        self.assertEqual((job.status, job.error), ('FAILED', 'error 2'))
+        self.assertIsNotNone(job.finished_at)
+
+
+class BackgroundJobHeartbeatTests(TestCase):
+    """requeue_stale se basa en la última señal del worker, no en el inicio."""
+
+    def _running(self, attempts, minutes_silent, max_attempts=3):
+        job = BackgroundJob.enqueue('audit_projects_evm', max_attempts=max_attempts)
+        stamp = timezone.now() - timedelta(minutes=minutes_silent)
+        BackgroundJob.objects.filter(pk=job.pk).update(
+            status='RUNNING', attempts=attempts, started_at=timezone.now() - timedelta(hours=5), heartbeat_at=stamp,
+        )
+        job.refresh_from_db()
+        return job
+
+    def test_progress_keeps_long_job_alive(self):
+        job = self._running(attempts=1, minutes_silent=90)
+        job.set_progress(message='sigue avanzando')
+        self.assertEqual(BackgroundJob.requeue_stale(timedelta(minutes=60)), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'RUNNING')
+
+    def test_silent_jobs_requeued_or_failed(self):
+        retry = self._running(attempts=1, minutes_silent=90)
+        exhausted = self._running(attempts=3, minutes_silent=90)
+        self.assertEqual(BackgroundJob.requeue_stale(timedelta(minutes=60)), 2)
+        retry.refresh_from_db()
+        exhausted.refresh_from_db()
+        self.assertEqual(retry.status, 'PENDING')
+        self.assertEqual(exhausted.status, 'FAILED')
+        self.assertIsNotNone(exhausted.finished_at)
+
+
+class JobsApiAccessTests(TestCase):
+    """Anónimos no ven ni encolan trabajos; cada usuario ve solo los suyos."""
+
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        from django.contrib.auth.models import AnonymousUser
+        from django.test import RequestFactory
+
+        self.factory = RequestFactory()
+        self.anonymous = AnonymousUser()
+        User = get_user_model()
+        self.owner = User.objects.create_user('owner', password='x')
+        self.other = User.objects.create_user('other', password='x')
+        self.job = BackgroundJob.enqueue('audit_projects_evm', user=self.owner)
+        BackgroundJob.enqueue('audit_projects_evm')
+
+    def _get(self, view, user, *args):
+        request = self.factory.get('/api/jobs/')
+        request.user = user
+        return view(request, *args)
+
+    def test_anonymous_is_rejected(self):
+        from projects.views.jobs_api import job_enqueue_api, job_list_api, job_status_api
+
+        self.assertEqual(self._get(job_status_api, self.anonymous, self.job.pk).status_code, 401)
+        self.assertEqual(self._get(job_list_api, self.anonymous).status_code, 401)
+        request = self.factory.post('/api/jobs/enqueue/audit_projects_evm/')
+        request.user = self.anonymous
+        self.assertEqual(job_enqueue_api(request, 'audit_projects_evm').status_code, 401)
+        self.assertEqual(BackgroundJob.objects.count(), 2)
+
+    def test_users_see_only_their_jobs(self):
+        from django.http import Http404
+        from projects.views.jobs_api import job_list_api, job_status_api
+
+        self.assertEqual(self._get(job_status_api, self.owner, self.job.pk).status_code, 200)
+        with self.assertRaises(Http404):
+            self._get(job_status_api, self.other, self.job.pk)
+        jobs = json.loads(self._get(job_list_api, self.owner).content)['jobs']
+        self.assertEqual([job['id'] for job in jobs], [self.job.pk])
+
+
+class InvoiceOCRPipelineTests(SimpleTestCase):
+    """Corte temprano del OCR por páginas (OCR simulado en hilos)."""
+
+    def test_stops_once_fields_found(self):
+        from concurrent.futures import ThreadPoolExecutor
+        pages = {2: 'FACTURA F001-1', 3: 'RUC 20123456789', 4: 'anexo', 5: 'anexo', 6: 'anexo'}
+        submitted = []
+
+        def submit(page):
+            submitted.append(page)
+            return pool.submit(lambda: pages[page])
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            texts = InvoiceOCRPipeline.collect(
+                range(2, 7), submit, stop_when=lambda text: 'FACTURA' in text and 'RUC' in text, window=2,
+            )
+        # Con 2 páginas en curso, a lo sumo se envían 2 más tras la que completa los campos
+        self.assertTrue({2, 3} <= set(texts))
+        self.assertLessEqual(len(submitted), 4)
+        self.assertNotIn(6, texts)
+
+
+class InvoiceOCRFirstPageTests(SimpleTestCase):
+    """Con first_page_in_pool la página 1 tampoco se rasteriza en el hilo que llama."""
+
+    def test_first_page_goes_to_pool(self):
+        from concurrent.futures import Future
+        from projects.services.invoice_management import ocr_pipeline
+
+        class FakePool:
+            submitted = []
+
+            def submit(self, fn, *args):
+                self.submitted.append(args[1])
+                future = Future()
+                future.set_result('FACTURA F001-1 RUC 20123456789')
+                return future
+
+        with mock.patch.object(InvoiceOCRPipeline, 'page_count', return_value=1), \
+             mock.patch.object(InvoiceOCRPipeline, 'get_pool', return_value=FakePool()), \
+             mock.patch.object(ocr_pipeline, 'ocr_pdf_page') as inline:
+            text = InvoiceOCRPipeline.extract_text('factura.pdf', first_page_in_pool=True)
+        inline.assert_not_called()
+        self.assertEqual(FakePool.submitted, [1])
+        self.assertIn('F001-1', text)
+
+
+def _minimal_pdf(page_texts):
+    """PDF mínimo con una línea de texto (Helvetica) por página; '' = página sin capa de texto."""
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>', None, '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for text in page_texts:
+        stream = f'BT /F1 10 Tf 20 700 Td ({text}) Tj ET' if text else ''
+        objects.append(f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream')
+        objects.append(
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>'
+        )
+        kids.append(f'{len(objects)} 0 R')
+    objects[1] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {len(kids)} >>'
+    out, offsets = b'%PDF-1.4\n', []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f'{number} 0 obj\n{body}\nendobj\n'.encode('latin-1')
+    xref = len(out)
+    out += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode('latin-1')
+    out += ''.join(f'{offset:010d} 00000 n \n' for offset in offsets).encode('latin-1')
+    out += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode('latin-1')
+    return out
+
+
+@skipUnless(importlib.util.find_spec('pdfplumber'), 'pdfplumber no instalado')
+class InvoiceTextLayerProbeTests(SimpleTestCase):
+    """Una carátula sin texto en la página 1 no manda a OCR un PDF con texto en las siguientes."""
+
+    def _probe(self, page_texts):
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+            f.write(_minimal_pdf(page_texts))
+        self.addCleanup(os.unlink, f.name)
+        return ClientInvoicePDFParser()._probe_file(f.name, 'factura.pdf')
+
+    def test_text_on_later_page(self):
+        line = 'FACTURA ELECTRONICA F001-00012345 RUC 20123456789 TOTAL S/ 1180.00 ' * 2
+        file_type, text = self._probe(['', line])
+        self.assertEqual(file_type, 'pdf_text')
+        self.assertIn('F001-00012345', text)
+
+    def test_scanned_pdf_goes_to_ocr(self):
+        self.assertEqual(self._probe(['', '']), ('pdf_image', None))
+
+
+class InvoiceParseCacheTests(SimpleTestCase):
+    """Un archivo ya leído no vuelve a parsearse (caché simulada, sin BD)."""
+
+    def test_repeat_upload_reuses_fields(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        stored = {}
+
+        def lookup(sha256, version):
+            return dict(stored[(sha256, version)]) if (sha256, version) in stored else None
+
+        def store(sha256, version, data, file_name=''):
+            stored[(sha256, version)] = data
+
+        parser = ClientInvoicePDFParser()
+        parsed = {'invoice_number': 'F001-1', 'amount': Decimal('118.00')}
+        with mock.patch.object(InvoiceParseCache, 'lookup', side_effect=lookup), \
+             mock.patch.object(InvoiceParseCache, 'store', side_effect=store), \
+             mock.patch.object(parser, '_parse_uploaded_file', return_value=parsed) as parse:
+            first = parser.parse_uploaded_pdf(SimpleUploadedFile('a.pdf', b'%PDF-1.4 factura'))
+            second = parser.parse_uploaded_pdf(SimpleUploadedFile('copia.pdf', b'%PDF-1.4 factura'))
+            parser.parse_uploaded_pdf(SimpleUploadedFile('b.pdf', b'%PDF-1.4 otra'))
+        self.assertEqual(first, second)
+        self.assertEqual(parse.call_count, 2)
+
+
+class InvoiceParseCacheStorageTests(TestCase):
+    """lookup/store solo ignoran la tabla sin migrar; cualquier otro error de BD se propaga."""
+
+    def test_roundtrip_counts_hits(self):
+        InvoiceParseCache.store('a' * 64, '2', {'amount': '118.00'}, 'f.pdf')
+        self.assertEqual(InvoiceParseCache.lookup('a' * 64, '2'), {'amount': Decimal('118.00')})
+        self.assertEqual(InvoiceParseCache.objects.get().hits, 1)
+        self.assertIsNone(InvoiceParseCache.lookup('a' * 64, '1'))
+
+    def test_db_errors_propagate_unless_table_missing(self):
+        from django.db import OperationalError
+        from projects.models import invoice_parse_cache
+
+        with mock.patch.object(InvoiceParseCache.objects, 'filter', side_effect=OperationalError('bloqueo')), \
+             mock.patch.object(InvoiceParseCache.objects, 'update_or_create', side_effect=OperationalError('bloqueo')):
+            with self.assertRaises(OperationalError):
+                InvoiceParseCache.lookup('b' * 64, '2')
+            with self.assertRaises(OperationalError):
+                InvoiceParseCache.store('b' * 64, '2', {'x': 1})
+            with mock.patch.object(invoice_parse_cache, 'table_missing', return_value=True):
+                self.assertIsNone(InvoiceParseCache.lookup('b' * 64, '2'))
+                self.assertIsNone(InvoiceParseCache.store('b' * 64, '2', {'x': 1}))
+
+
+class InvoiceFieldExtractorTests(SimpleTestCase):
+    """Reglas precompiladas: valor y regla que resolvió cada campo."""
+
+    def test_extracts_fields_with_rule(self):
+        text = (
+            "FACTURA ELECTRONICA F001-00000384\nFecha de Emisión: 25/11/2025\n"
+            "Cliente: ACME S.A.C. RUC 20123456789\nImporte Total: S/ 1.234,56"
+        )
+        values, rules = InvoiceFieldExtractor.extract(text)
+        self.assertEqual(values['invoice_number'], 'F001-00000384')
+        self.assertEqual(values['invoice_date'], '25/11/2025')
+        self.assertEqual(values['amount'], Decimal('1234.56'))
+        self.assertEqual((values['ruc'], values['client_name']), ('20123456789', 'ACME S.A.C.'))
+        self.assertEqual(rules['amount'], 'amount:importe_total')
+        self.assertNotIn('due_date', values)
+
+
+class ClientInvoiceBatchMatchTests(SimpleTestCase):
+    """Asignación de proyecto en la ingesta por lotes (índices en memoria)."""
+
+    index = {
+        'by_ruc': {
+            '20123456789': [('P001', 'En Progreso')],
+            '20555555555': [('P002', 'Completado'), ('P003', 'En Progreso')],
+            '20999999999': [('P004', 'En Progreso'), ('P005', 'En Progreso')],
+        },
+        'by_client': {'ACME S.A.C.': [('P006', 'Planeado')]},
+        'existing': {'F001-1': 'P001'},
+    }
+
+    def test_match(self):
+        match = ClientInvoiceBatchIngestService.match
+        self.assertEqual(match({'invoice_number': 'f001-1'}, self.index)[:2], ('P001', 'duplicate'))
+        self.assertEqual(match({'invoice_number': 'F001-2', 'ruc': '20123456789'}, self.index)[:2], ('P001', 'matched'))
+        self.assertEqual(match({'invoice_number': 'F001-3', 'ruc': '20555555555'}, self.index)[:2], ('P003', 'matched'))
+        self.assertEqual(match({'invoice_number': 'F001-4', 'ruc': '20999999999'}, self.index)[:2], (None, 'review'))
+        self.assertEqual(match({'invoice_number': 'F001-5', 'client_name': 'Acme S.A.C.'}, self.index)[:2], ('P006', 'matched'))
+
+
+class ClientInvoiceBatchRollbackTests(TestCase):
+    """Si el bulk_create del lote falla, los archivos ya guardados se borran."""
+
+    def test_stored_files_removed_on_rollback(self):
+        from django.test import override_settings
+        from projects.services.invoice_management import batch_ingest
+
+        media_root, source = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.addCleanup(shutil.rmtree, source)
+        with open(os.path.join(source, 'f001-9.pdf'), 'wb') as f:
+            f.write(b'%PDF-1.4 factura')
+        data = {'invoice_number': 'F001-9', 'ruc': '20123456789', 'invoice_date': '2025-03-01', 'amount': Decimal('118.00')}
+        index = {'by_ruc': {'20123456789': [('P001', 'En Progreso')]}, 'by_client': {}, 'existing': {}}
+
+        with override_settings(MEDIA_ROOT=media_root), \
+             mock.patch.object(batch_ingest, '_parse_file', return_value=(data, None)), \
+             mock.patch.object(ClientInvoiceBatchIngestService, 'build_index', return_value=index), \
+             mock.patch.object(ClientInvoice.objects, 'bulk_create', side_effect=RuntimeError('sin conexión')):
+            with self.assertRaises(RuntimeError):
+                ClientInvoiceBatchIngestService.run(source, workers=1)
+            stored = [name for _, _, names in os.walk(media_root) for name in names]
+        self.assertEqual(stored, [])
+
+
+class PurchaseOrderGridCursorTests(SimpleTestCase):
+    """Cursor del grid de OCs: ida y vuelta y condición de página siguiente."""
+
+    def test_cursor_roundtrip(self):
+        cursor = PurchaseOrderGridService.encode_cursor(date(2025, 3, 1), 'OC-001')
+        self.assertEqual(PurchaseOrderGridService.decode_cursor(cursor), (date(2025, 3, 1), 'OC-001'))
+        self.assertEqual(
+            PurchaseOrderGridService.decode_cursor(PurchaseOrderGridService.encode_cursor(None, 'OC-9')),
+            (None, 'OC-9'),
+        )
+
+    def test_after_cursor_keeps_undated_last(self):
+        q = PurchaseOrderGridService.after_cursor(date(2025, 3, 1), 'OC-001')
+        self.assertIn(('issue_date__isnull', True), q.children)
+        q = PurchaseOrderGridService.after_cursor(None, 'OC-9', descending=False)
+        self.assertEqual(dict(q.children), {'issue_date__isnull': True, 'po_number__gt': 'OC-9'})
+
+
+class ProjectPOFacetScopeTests(SimpleTestCase):
+    """Las facetas se leen de ProjectPOFacet solo sin más filtro que el proyecto."""
+
+    def test_uses_facet_index(self):
+        uses = PurchaseOrderGridService.uses_facet_index
+        self.assertTrue(uses({'proyecto_id': 'P001', 'supplier': '', 'from': None}))
+        self.assertTrue(uses({'proyecto_id': None, 'status': None}))
+        self.assertFalse(uses({'proyecto_id': 'P001', 'currency': 'USD'}))
+        self.assertFalse(uses({'proyecto_id': None, 'from': date(2025, 1, 1)}))
+
+
+class ProjectPOFacetRefreshTests(TestCase):
+    """Las facetas se recalculan una vez por proyecto al confirmar, incluido el proyecto anterior de una OC movida."""
+
+    @classmethod
+    def setUpTestData(cls):
+        customer = Costumer.objects.create(ruc_costumer='20100000002', com_name='ACME')
+        for code in ('FA', 'FB'):
+            Chance(
+                cod_projects=code, info_costumer=customer, staff_presale='x', cost_center=f'CC-{code}', com_exe='y',
+                dres_chance=f'Proyecto {code}', cost_aprox_chance=Decimal('1000'), material_cost=Decimal('500'),
+                labor_cost=Decimal('0'), subcontracted_cost=Decimal('0'), overhead_cost=Decimal('0'), estimated_duration=3,
+            ).save()
+
+    def _facets(self, project_id):
+        return set(ProjectPOFacet.objects.filter(project_id=project_id).values_list('facet', 'value'))
+
+    def test_refresh_deferred_and_deduplicated(self):
+        with mock.patch.object(ProjectPOFacet, 'refresh', return_value=0) as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                po = PurchaseOrder.objects.create(po_number='OC-FA-1', project_code_id='FA', total_amount=0, currency='USD')
+                po.po_status = 'Cerrada'
+                po.save()
+                PurchaseOrder.objects.create(po_number='OC-FA-2', project_code_id='FA', total_amount=0)
+                refresh.assert_not_called()
+        calls = [sorted(c.args) for c in refresh.call_args_list if c.args]
+        self.assertEqual(calls, [['FA']])
+
+    def test_moved_po_refreshes_previous_project(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            PurchaseOrder.objects.create(po_number='OC-MV', project_code_id='FA', total_amount=0, currency='USD')
+        self.assertIn(('currencies', 'USD'), self._facets('FA'))
+
+        po = PurchaseOrder.objects.get(pk='OC-MV')
+        po.project_code_id = 'FB'
+        with self.captureOnCommitCallbacks(execute=True):
+            po.save()
+        self.assertEqual(self._facets('FA'), set())
+        self.assertIn(('currencies', 'USD'), self._facets('FB'))
+
+    def test_product_resaved_by_natural_key_refreshes_facets(self):
+        supplier = Supplier.objects.create(ruc_supplier='20555000009', name_supplier='Prov')
+        Product.objects.create(code_art='ART-NK', part_number='PN-OLD', manufac='ACME', ruc_supplier=supplier)
+        with self.captureOnCommitCallbacks(execute=True):
+            po = PurchaseOrder.objects.create(po_number='OC-NK', project_code_id='FA', total_amount=0)
+            PODetailProduct(purchase_order=po, product_id='ART-NK', quantity=1, unit_price=Decimal('10')).save()
+        self.assertIn(('products', 'ART-NK'), self._facets('FA'))
+
+        # Instancia nueva con PK existente: UPDATE con _state.adding en True
+        with self.captureOnCommitCallbacks(execute=True):
+            Product(code_art='ART-NK', part_number='PN-NEW', manufac='Otra', ruc_supplier=supplier).save()
+        self.assertIn(('manufacturers', 'Otra'), self._facets('FA'))
+        self.assertNotIn(('manufacturers', 'ACME'), self._facets('FA'))
+
+    def test_refresh_reraises_unless_table_missing(self):
+        from django.db import OperationalError
+        from projects.models import po_facet
+
+        with mock.patch.object(po_facet, '_po_facet_rows', side_effect=OperationalError('bloqueo')):
+            with self.assertRaises(OperationalError):
+                ProjectPOFacet.refresh('FA')
+            with mock.patch.object(po_facet, 'table_missing', return_value=True):
+                self.assertEqual(ProjectPOFacet.refresh('FA'), 0)
+
+
+class CatalogPrefixIndexTests(SimpleTestCase):
+    """Índice de prefijos (fallback sin pg_trgm): todas las palabras, sin tildes y con ranking."""
+
+    def setUp(self):
+        self.index = PrefixIndex([
+            ('A-1', 'Válvula de bola 2"', {}, ('A-1', 'Válvula de bola 2"', 'VB-200')),
+            ('A-2', 'Cable UTP Cat6', {}, ('A-2', 'Cable UTP Cat6', 'UTP-CAT6')),
+            ('A-3', 'Bomba de valvulas', {}, ('A-3', 'Bomba de valvulas', 'BV-10')),
+        ])
+
+    def test_prefix_and_accents(self):
+        self.assertEqual([r['id'] for r in self.index.search('valv')], ['A-1', 'A-3'])
+        self.assertEqual([r['id'] for r in self.index.search('utp cab')], ['A-2'])
+        self.assertEqual([r['id'] for r in self.index.search('utpcat')], ['A-2'])
+        self.assertEqual(self.index.search('  -- '), [])
+
+    def test_exact_word_ranks_first(self):
+        self.assertEqual(self.index.search('bomba')[0]['id'], 'A-3')
+        self.assertEqual([r['id'] for r in self.index.search('de')][:2], ['A-3', 'A-1'])
+
+
+class CatalogPrefixIndexTTLTests(TestCase):
+    """El índice de prefijos se reconstruye al vencer su TTL aunque la generación no cambie (escritura en otro proceso)."""
+
+    def test_rebuilt_after_ttl(self):
+        from projects.services import catalog_search
+        from projects.services.catalog_search import CatalogSearchService
+
+        Supplier.objects.create(ruc_supplier='20777000001', name_supplier='Alfa SAC')
+        self.addCleanup(CatalogSearchService._indexes.pop, 'suppliers', None)
+        CatalogSearchService._indexes.pop('suppliers', None)
+        self.assertEqual(len(CatalogSearchService.prefix_index('suppliers').search('alfa')), 1)
+
+        # update() no pasa por save(): la generación queda igual, como con un cambio de otro worker
+        Supplier.objects.filter(pk='20777000001').update(name_supplier='Beta SAC')
+        self.assertEqual(CatalogSearchService.prefix_index('suppliers').search('beta'), [])
+        later = catalog_search.time.monotonic() + ProjectCacheVersion.timeout() + 1
+        with mock.patch.object(catalog_search.time, 'monotonic', return_value=later):
+            self.assertEqual(len(CatalogSearchService.prefix_index('suppliers').search('beta')), 1)
+
+
+class GridExportTests(SimpleTestCase):
+    """Exportación en streaming: CSV fila por fila y anchos estimados con una muestra."""
+
+    columns = [('po', 'OC'), ('date', 'Fecha'), ('amount', 'Monto')]
+
+    def _rows(self, n):
+        for i in range(n):
+            yield {'po': f'OC-{i}', 'date': date(2025, 1, 2), 'amount': Decimal('10.50')}
+
+    def test_csv_streams_rows(self):
+        response = GridExportService.csv_response('x.csv', self.columns, self._rows(3))
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lines[0], 'OC,Fecha,Monto')
+        self.assertEqual(lines[1], 'OC-0,02/01/2025,10.50')
+        self.assertEqual(len(lines), 4)
+
+    def test_column_widths_from_sample(self):
+        widths = GridExportService.column_widths(self.columns, [{'po': 'X' * 200, 'date': None}])
+        self.assertEqual(widths, [60, 7, 7])
+
+
+class CostGridTotalsTests(SimpleTestCase):
+    """Totales por moneda, AC y meses del grid de costos salen de las mismas filas."""
+
+    def test_totals_from_rows(self):
+        rows = [
+            {'currency': 'USD', 'total': Decimal('100.00'), 'local_total': Decimal('375.00'),
+             'invoice_date': date(2025, 2, 3), 'issue_date': date(2025, 1, 10)},
+            {'currency': '', 'total': Decimal('50.00'), 'local_total': Decimal('50.00'),
+             'invoice_date': None, 'issue_date': date(2024, 12, 1)},
+            {'currency': 'PEN', 'total': Decimal('25.50'), 'local_total': Decimal('25.50'),
+             'invoice_date': None, 'issue_date': None},
+        ]
+        with mock.patch.object(CostGridService, 'queryset', return_value=rows):
+            grid = CostGridService.grid('P1')
+        self.assertEqual(grid['currency_totals'], {'USD': Decimal('100.00'), 'PEN': Decimal('75.50')})
+        self.assertEqual(grid['ac'], Decimal('450.50'))
+        self.assertEqual(grid['by_month'], [
+            {'mes': 'Diciembre 2024', 'total': Decimal('50.00')},
+            {'mes': 'Febrero 2025', 'total': Decimal('375.00')},
+        ])
@@ -4,6 +4,8 @@ from projects.models import Projects
 from projects.views.project.curva_s_view import curva_s_view
 from projects.views.project.curva_s_home import curva_s_home
 from projects.views.project.dashboard_view import dashboard_view
+from projects.views.project.evm_api import evm_series_api
+from projects.views.jobs_api import job_status_api, job_list_api, job_retry_api, job_enqueue_api
 from projects.views.project.activity_views import (
     project_activities,
     add_project_activity,
@@ -54,6 +56,14 @@ urlpatterns = [
     path('project/<str:project_id>/recalculate-weights/', recalculate_weights, name='recalculate_weights'),
     path('activity/<int:activity_id>/delete/', delete_activity, name='delete_activity'),
     path('api/project/<str:project_id>/physical-progress/', get_physical_progress_api, name='physical_progress_api'),
+    # ✅ API Curva S por granularidad (carga diferida de semanas/días en el dashboard)
+    path('api/projects/<str:project_id>/evm', evm_series_api, name='evm_series_api'),
+
+    # ✅ Cola de trabajos en segundo plano (worker: manage.py run_jobs)
+    path('api/jobs/', job_list_api, name='job_list_api'),
+    path('api/jobs/<int:job_id>/', job_status_api, name='job_status_api'),
+    path('api/jobs/<int:job_id>/retry/', job_retry_api, name='job_retry_api'),
+    path('api/jobs/enqueue/<str:kind>/', job_enqueue_api, name='job_enqueue_api'),
 
     # Incluir URLs PMI centralizadas
     path('', include('projects.urls.pmi')),
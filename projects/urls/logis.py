@@ -6,8 +6,12 @@ from projects.views.logis import (
     purchase_order_delete,
     autocomplete_supplier,
     autocomplete_product,
+    autocomplete_purchase_order,
     update_supplier_status,
     update_contabilidad_status,
+    po_grid_api,
+    po_grid_facet_api,
+    po_grid_export,
 )
 
 urlpatterns = [
@@ -27,7 +31,12 @@ urlpatterns = [
     # Autocompletes
     path("autocomplete/supplier/", autocomplete_supplier, name="autocomplete_supplier"),
     path("autocomplete/product/", autocomplete_product, name="autocomplete_product"),
+    path("autocomplete/po/", autocomplete_purchase_order, name="autocomplete_purchase_order"),
     # AJAX updates from grid
     path("ajax/update-supplier-status/", update_supplier_status, name="update_supplier_status"),
     path("ajax/update-contabilidad-status/", update_contabilidad_status, name="update_contabilidad_status"),
+    # Grid JSON con cursor y facetas bajo demanda
+    path("api/grid/", po_grid_api, name="po_grid_api"),
+    path("api/grid/facets/<str:facet>/", po_grid_facet_api, name="po_grid_facet_api"),
+    path("api/grid/export/", po_grid_export, name="po_grid_export"),
 ]
\ No newline at end of file
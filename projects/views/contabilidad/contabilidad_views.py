@@ -2,14 +2,17 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.utils import timezone
-from django.db.models import Sum, F
+from django.db.models import Sum, Count, F, Q
 from decimal import Decimal
 from datetime import timedelta
 from django.http import JsonResponse
 import os
 from projects.models.client_invoice import ClientInvoice
 from projects.models.projects import Projects
+from projects.models.financial_rollup import ProjectFinancialRollup
 from projects.models.invoice import Invoice
+from projects.services.background_jobs import BackgroundJobService
+from projects.views.jobs_api import job_accepted_response
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -18,63 +21,74 @@ def contabilidad_seleccion(request):
     return render(request, 'contabilidad/seleccion_rol.html')
 
 
-def contabilidad_asistente(request):
-    facturas_emitidas = ClientInvoice.objects.filter(status='EMITIDA').count()
-    pagos_reportados = ClientInvoice.objects.filter(status='PAGO_REPORTADO').count()
-    facturas_pagadas = ClientInvoice.objects.filter(status='PAGADA').count()
-
-    total_facturado = ClientInvoice.objects.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-    ultimas_facturas = ClientInvoice.objects.order_by('-invoice_date')[:10]
-
-
-    # Métricas por proyecto (igual que el jefe)
-    from projects.models.chance import Chance
-    proyectos_chance = Chance.objects.all()
-    metricas_proyectos = []
-
-    for chance in proyectos_chance:
-        facturas = ClientInvoice.objects.filter(project__cod_projects=chance.cod_projects)
-        total_facturado_proj = facturas.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        verificados = facturas.filter(bank_verified_date__isnull=False)
-        total_pagado_proj = verificados.aggregate(total=Sum('paid_amount'))['total'] or Decimal('0.00')
-        if total_pagado_proj == Decimal('0.00'):
-            total_pagado_proj = verificados.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-
-        monto_contractual = chance.cost_aprox_chance
-        pendiente_cobrar = total_facturado_proj - total_pagado_proj
-        pendiente_facturar = monto_contractual - total_facturado_proj
-        avance_pct = (total_pagado_proj / monto_contractual * Decimal('100.0')) if monto_contractual else Decimal('0.00')
-        eficiencia_cobranza = (total_pagado_proj / total_facturado_proj * Decimal('100.0')) if total_facturado_proj else Decimal('0.00')
-        fact_vs_contrato_pct = (total_facturado_proj / monto_contractual * Decimal('100.0')) if monto_contractual else Decimal('0.00')
+def _cobranza_por_proyecto(solo_verificados=False):
+    """
+    Facturación y cobranza por proyecto desde ProjectFinancialRollup (una fila
+    por proyecto, join a Projects/Chance). Devuelve {project_id: fila} con:
+    facturado, pagado (paid_amount verificado; si es 0, amount verificado),
+    verificados_count, descripcion, centro_costo y monto_contractual.
+    """
+    ProjectFinancialRollup.ensure()
+    filas = (ProjectFinancialRollup.objects
+             .values('project_id')
+             .annotate(
+                 descripcion=F('project__cod_projects__dres_chance'),
+                 centro_costo=F('project__cost_center'),
+                 monto_contractual=F('project__cod_projects__cost_aprox_chance'),
+                 facturado=F('total_invoiced'),
+                 pagado=F('total_verified'),
+                 verificados_count=F('verified_count'),
+             )
+             .order_by('project_id'))
+    if solo_verificados:
+        filas = filas.filter(verified_count__gt=0)
+    return {fila['project_id']: fila for fila in filas}
+
+
+def _metrica_proyecto(codigo, descripcion, centro_costo, monto_contractual, facturado, pagado, verificados_count):
+    """Fila de la tabla de proyectos (misma forma para jefe y asistente)."""
+    avance_pct = (pagado / monto_contractual * Decimal('100.0')) if monto_contractual else Decimal('0.00')
+    eficiencia_cobranza = (pagado / facturado * Decimal('100.0')) if facturado else Decimal('0.00')
+    fact_vs_contrato_pct = (facturado / monto_contractual * Decimal('100.0')) if monto_contractual else Decimal('0.00')
+    return {
+        'codigo': codigo,
+        'descripcion': descripcion,
+        'centro_costo': centro_costo,
+        'total_facturado': facturado,
+        'pagado': pagado,
+        'pendiente': facturado - pagado,
+        'pendiente_facturar': monto_contractual - facturado,
+        'avance_pct': float(avance_pct),
+        'fact_vs_contrato_pct': float(fact_vs_contrato_pct),
+        'eficiencia': float(eficiencia_cobranza),
+        'verificados_count': verificados_count,
+    }
 
-        try:
-            proyecto_obj = Projects.objects.get(cod_projects=chance)
-            codigo = proyecto_obj.cod_projects_id
-            centro_costo = proyecto_obj.cost_center
-        except:
-            codigo = ''
-            centro_costo = ''
-
-        metricas_proyectos.append({
-            'codigo': codigo,
-            'descripcion': chance.dres_chance,
-            'centro_costo': centro_costo,
-            'total_facturado': total_facturado_proj,
-            'pagado': total_pagado_proj,
-            'pendiente': pendiente_cobrar,
-            'pendiente_facturar': pendiente_facturar,
-            'avance_pct': float(avance_pct),
-            'fact_vs_contrato_pct': float(fact_vs_contrato_pct),
-            'eficiencia': float(eficiencia_cobranza),
-            'verificados_count': verificados.count(),
-        })
 
-    metricas_proyectos = [m for m in metricas_proyectos if m.get('verificados_count', 0) > 0]
+def contabilidad_asistente(request):
+    # ✅ Conteos por estado y total en una sola consulta
+    resumen = ClientInvoice.objects.aggregate(
+        facturas_emitidas=Count('id', filter=Q(status='EMITIDA')),
+        pagos_reportados=Count('id', filter=Q(status='PAGO_REPORTADO')),
+        facturas_pagadas=Count('id', filter=Q(status='PAGADA')),
+        total=Sum('amount'),
+    )
+    total_facturado = resumen['total'] or Decimal('0.00')
+    ultimas_facturas = ClientInvoice.objects.select_related('project__cod_projects').order_by('-invoice_date')[:10]
+
+    # Métricas por proyecto (igual que el jefe): solo proyectos con pagos verificados
+    metricas_proyectos = [
+        _metrica_proyecto(
+            pid, fila['descripcion'], fila['centro_costo'], fila['monto_contractual'],
+            fila['facturado'], fila['pagado'], fila['verificados_count'],
+        )
+        for pid, fila in _cobranza_por_proyecto(solo_verificados=True).items()
+    ]
 
     context = {
-        'facturas_emitidas': facturas_emitidas,
-        'pagos_reportados': pagos_reportados,
-        'facturas_pagadas': facturas_pagadas,
+        'facturas_emitidas': resumen['facturas_emitidas'],
+        'pagos_reportados': resumen['pagos_reportados'],
+        'facturas_pagadas': resumen['facturas_pagadas'],
         'total_facturado': total_facturado,
         'ultimas_facturas': ultimas_facturas,
         'metricas_proyectos': metricas_proyectos,
@@ -84,70 +98,42 @@ def contabilidad_asistente(request):
 
 def contabilidad_jefe(request):
     # === MÉTRICAS PMI CORREGIDAS CON DECIMAL ===
+    # ✅ Consultas fijas: resumen financiero por proyecto + una de oportunidades,
+    # sin importar cuántas Chance existan
     from projects.models.chance import Chance
-    proyectos_chance = Chance.objects.all()
+    cobranza = _cobranza_por_proyecto()
     metricas_pmi = []
     metricas_proyectos = []
 
-    for chance in proyectos_chance:
-        # Facturas relacionadas a este proyecto
-        facturas = ClientInvoice.objects.filter(project__cod_projects=chance)
-        total_facturado = facturas.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        # Pagos reales: usar paid_amount y considerar 'PAGADA' y 'PAGO_VERIFICADO'
-        # Solo pagos verificados en banco
-        verificados = facturas.filter(bank_verified_date__isnull=False)
-        total_pagado = verificados.aggregate(total=Sum('paid_amount'))['total'] or Decimal('0.00')
-        if total_pagado == Decimal('0.00'):
-            # Fallback si no existe paid_amount: usar amount de facturas verificadas
-            total_pagado = verificados.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+    for chance in Chance.objects.values('cod_projects', 'dres_chance', 'cost_aprox_chance').order_by('cod_projects'):
+        fila = cobranza.get(chance['cod_projects'])
+        total_facturado = fila['facturado'] if fila else Decimal('0.00')
+        total_pagado = fila['pagado'] if fila else Decimal('0.00')
 
         # MÉTRICAS PMI CON DECIMAL
-        monto_contractual = chance.cost_aprox_chance
+        monto_contractual = chance['cost_aprox_chance']
         avance_contractual = (total_pagado / monto_contractual * Decimal('100.0')) if monto_contractual else Decimal('0.00')
         eficiencia_cobranza = (total_pagado / total_facturado * Decimal('100.0')) if total_facturado else Decimal('0.00')
         facturacion_vs_contrato = (total_facturado / monto_contractual * Decimal('100.0')) if monto_contractual else Decimal('0.00')
-        pendiente_facturar = monto_contractual - total_facturado
-        pendiente_cobrar = total_facturado - total_pagado
 
         metricas_pmi.append({
-            'proyecto': chance.dres_chance,
+            'proyecto': chance['dres_chance'],
             'monto_contractual': monto_contractual,
             'total_facturado': total_facturado,
             'total_pagado': total_pagado,
             'avance_contractual': avance_contractual,
             'eficiencia_cobranza': eficiencia_cobranza,
             'facturacion_vs_contrato': facturacion_vs_contrato,
-            'pendiente_facturar': pendiente_facturar,
-            'pendiente_cobrar': pendiente_cobrar,
+            'pendiente_facturar': monto_contractual - total_facturado,
+            'pendiente_cobrar': total_facturado - total_pagado,
         })
 
-        # Métricas por proyecto para la tabla del dashboard (compatibles con plantilla)
-        try:
-            proyecto_obj = Projects.objects.get(cod_projects=chance)
-            codigo = proyecto_obj.cod_projects
-            centro_costo = proyecto_obj.cost_center
-        except:
-            codigo = ''
-            centro_costo = ''
-
-        pendiente_cobrar = (total_facturado - total_pagado)
-        pendiente_facturar = (monto_contractual - total_facturado)
-        avance_pct = (total_pagado / monto_contractual * Decimal('100.0')) if monto_contractual else Decimal('0.00')
-        fact_vs_contrato_pct = (total_facturado / monto_contractual * Decimal('100.0')) if monto_contractual else Decimal('0.00')
-
-        metricas_proyectos.append({
-            'codigo': codigo,
-            'descripcion': chance.dres_chance,
-            'centro_costo': centro_costo,
-            'total_facturado': total_facturado,
-            'pagado': total_pagado,
-            'pendiente': pendiente_cobrar,
-            'pendiente_facturar': pendiente_facturar,
-            'avance_pct': float(avance_pct),
-            'fact_vs_contrato_pct': float(fact_vs_contrato_pct),
-            'eficiencia': float(eficiencia_cobranza),
-            'verificados_count': verificados.count(),
-        })
+        # Métricas por proyecto para la tabla del dashboard: SOLO proyectos con pagos verificados
+        if fila and fila['verificados_count'] > 0:
+            metricas_proyectos.append(_metrica_proyecto(
+                chance['cod_projects'], chance['dres_chance'], fila['centro_costo'], monto_contractual,
+                total_facturado, total_pagado, fila['verificados_count'],
+            ))
 
     # MÉTRICAS GLOBALES
     total_contractual_global = sum(m['monto_contractual'] for m in metricas_pmi)
@@ -161,7 +147,9 @@ def contabilidad_jefe(request):
     pendiente_facturar_global = total_contractual_global - total_facturado_global
 
     # MÉTRICAS OPERATIVAS (existentes)
-    pendientes_qs = ClientInvoice.objects.filter(status='PAGO_REPORTADO').order_by('payment_reported_date')
+    pendientes_qs = (ClientInvoice.objects.filter(status='PAGO_REPORTADO')
+                     .select_related('project__cod_projects')
+                     .order_by('payment_reported_date'))
     alertas_detalle = []
     for f in pendientes_qs:
         if f.payment_reported_date:
@@ -173,17 +161,15 @@ def contabilidad_jefe(request):
                 'invoice_number': f.invoice_number,
                 'amount': f.amount,
                 'dias': f.dias_pendiente,
-                'project_id': getattr(f.project, 'cod_projects_id', None),
+                'project_id': f.project_id,
             })
 
-    pendientes_count = pendientes_qs.count()
-    monto_pendiente = pendientes_qs.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+    # pendientes_qs ya está evaluado: contar y sumar en memoria
+    pendientes_count = len(pendientes_qs)
+    monto_pendiente = sum((f.amount or Decimal('0.00') for f in pendientes_qs), Decimal('0.00'))
     problemas_qs = ClientInvoice.objects.filter(status__in=['PAGO_NO_RECIBIDO', 'CONTROVERSIA'])
     problemas_count = problemas_qs.count()
 
-    # Mostrar SOLO proyectos con pagos verificados
-    metricas_proyectos = [m for m in metricas_proyectos if m.get('verificados_count', 0) > 0]
-
     context = {
         # MÉTRICAS PMI GLOBALES
         'avance_contractual_global': avance_contractual_global,
@@ -257,6 +243,15 @@ def factura_cliente_parse_pdf(request):
                 'error': f'Formato de archivo no soportado. Formatos permitidos: PDF, JPG, PNG, GIF, BMP, TIFF, WEBP'
             }, status=400)
         
+        # ✅ Modo asíncrono: el OCR corre en el worker y el cliente consulta /api/jobs/<id>/
+        #    (solo con sesión: /api/jobs/ no muestra trabajos a usuarios anónimos)
+        if request.POST.get('async') in ('1', 'true') and request.user.is_authenticated:
+            job = BackgroundJobService.enqueue('parse_invoice_pdf', params={
+                'path': BackgroundJobService.store_upload(invoice_file, 'invoices'),
+                'name': invoice_file.name,
+            }, user=request.user)
+            return job_accepted_response(job)
+
         file_type = "imagen" if file_ext in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp'] else "PDF"
         print(f"📄 Procesando {file_type} vía AJAX...")
         parser = ClientInvoicePDFParser()
@@ -0,0 +1,126 @@
+import os
+from functools import wraps
+
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.views.decorators.http import require_http_methods
+
+from projects.management.commands.import_chunked import RESOURCES
+from projects.models import BackgroundJob
+from projects.services.background_jobs import BackgroundJobService, JOB_HANDLERS
+
+
+def job_accepted_response(job):
+    """202 con el estado inicial y la URL de polling del trabajo."""
+    data = job.to_dict()
+    data['status_url'] = reverse('job_status_api', args=[job.pk])
+    return JsonResponse({'success': True, 'job': data}, status=202)
+
+
+def _authenticated_only(view):
+    """401 en JSON para usuarios anónimos (los trabajos siempre tienen dueño o son de staff)."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'success': False, 'error': 'Autenticación requerida'}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _visible_jobs(request):
+    """Staff ve todos los trabajos; el resto, solo los que encoló."""
+    jobs = BackgroundJob.objects.all()
+    user = request.user
+    if not (user.is_staff or user.is_superuser):
+        jobs = jobs.filter(created_by=user)
+    return jobs
+
+
+@require_http_methods(["GET"])
+@_authenticated_only
+def job_status_api(request, job_id):
+    """Estado de un trabajo para polling: /api/jobs/<id>/"""
+    job = get_object_or_404(_visible_jobs(request), pk=job_id)
+    return JsonResponse({'success': True, 'job': job.to_dict()})
+
+
+@require_http_methods(["GET"])
+@_authenticated_only
+def job_list_api(request):
+    """Últimos trabajos (?kind=&status=&limit=)."""
+    jobs = _visible_jobs(request)
+    if request.GET.get('kind'):
+        jobs = jobs.filter(kind=request.GET['kind'])
+    if request.GET.get('status'):
+        jobs = jobs.filter(status=request.GET['status'].upper())
+    try:
+        limit = min(max(int(request.GET.get('limit', 50)), 1), 200)
+    except ValueError:
+        limit = 50
+    return JsonResponse({'success': True, 'jobs': [job.to_dict() for job in jobs[:limit]]})
+
+
+@require_http_methods(["POST"])
+@_authenticated_only
+def job_retry_api(request, job_id):
+    """Reencola un trabajo FAILED."""
+    job = get_object_or_404(_visible_jobs(request), pk=job_id)
+    if not job.retry():
+        return JsonResponse({'success': False, 'error': f'Solo se reintentan trabajos fallidos (estado: {job.status})'}, status=409)
+    return job_accepted_response(job)
+
+
+@require_http_methods(["POST"])
+@_authenticated_only
+def job_enqueue_api(request, kind):
+    """
+    Encola una operación larga y responde de inmediato con el id:
+    - import_file: archivo `file` + `resource` (ver import_chunked), `chunk_size`, `dry_run`
+    - parse_invoice_pdf: archivo `invoice_file`
+    - ingest_client_invoices: .zip `file` con PDFs/imágenes, `status`, `dry_run`
+    - activity_weights: `project_id` (repetible; vacío = todos)
+    - audit_projects_evm: sin parámetros
+    """
+    if kind not in JOB_HANDLERS:
+        return JsonResponse({'success': False, 'error': f'Tipo de trabajo desconocido: {kind}'}, status=404)
+
+    params = {}
+    if kind == 'import_file':
+        upload = request.FILES.get('file')
+        resource = request.POST.get('resource')
+        if not upload or resource not in RESOURCES:
+            return JsonResponse({
+                'success': False,
+                'error': f"Se requiere `file` y `resource` ({', '.join(sorted(RESOURCES))})"
+            }, status=400)
+        if os.path.splitext(upload.name.lower())[1] not in ('.csv', '.txt', '.xlsx', '.xlsm'):
+            return JsonResponse({'success': False, 'error': 'Formato no soportado (use CSV o XLSX)'}, status=400)
+        params = {
+            'resource': resource,
+            'path': BackgroundJobService.store_upload(upload, 'imports'),
+            'dry_run': request.POST.get('dry_run') in ('1', 'true', 'on'),
+        }
+        if request.POST.get('chunk_size', '').isdigit():
+            params['chunk_size'] = int(request.POST['chunk_size'])
+        if request.POST.get('sheet'):
+            params['sheet'] = request.POST['sheet']
+    elif kind == 'parse_invoice_pdf':
+        upload = request.FILES.get('invoice_file')
+        if not upload:
+            return JsonResponse({'success': False, 'error': 'No se proporcionó ningún archivo'}, status=400)
+        params = {'path': BackgroundJobService.store_upload(upload, 'invoices'), 'name': upload.name}
+    elif kind == 'ingest_client_invoices':
+        upload = request.FILES.get('file')
+        if not upload or not upload.name.lower().endswith('.zip'):
+            return JsonResponse({'success': False, 'error': 'Se requiere un archivo .zip en `file`'}, status=400)
+        params = {
+            'path': BackgroundJobService.store_upload(upload, 'invoice_batches'),
+            'status': 'EMITIDA' if request.POST.get('status') == 'EMITIDA' else 'BORRADOR',
+            'dry_run': request.POST.get('dry_run') in ('1', 'true', 'on'),
+        }
+    elif kind == 'activity_weights':
+        params = {'project_ids': request.POST.getlist('project_id')}
+
+    job = BackgroundJobService.enqueue(kind, params=params, user=request.user)
+    return job_accepted_response(job)
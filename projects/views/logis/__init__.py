@@ -10,9 +10,16 @@ from .purchase_order import (
     update_contabilidad_status,
 )
 
+from .po_grid_api import (
+    po_grid_api,
+    po_grid_facet_api,
+    po_grid_export,
+)
+
 from .autocomplete import (
     autocomplete_supplier,
     autocomplete_product,
+    autocomplete_purchase_order,
 )
 
 __all__ = [
@@ -22,6 +29,10 @@ __all__ = [
     "purchase_order_delete",
     "autocomplete_supplier",
     "autocomplete_product",
+    "autocomplete_purchase_order",
     "update_supplier_status",
     "update_contabilidad_status",
+    "po_grid_api",
+    "po_grid_facet_api",
+    "po_grid_export",
 ]
\ No newline at end of file
@@ -1,29 +1,52 @@
 # projects/views/logis/autocomplete.py
 from django.http import JsonResponse
-from projects.models import Supplier, Product
+from projects.services.catalog_search import CatalogSearchService
 
-# 🔹 Buscar proveedores
+
+def _limit(request):
+    try:
+        return int(request.GET.get("limit") or 10)
+    except ValueError:
+        return 10
+
+
+# 🔹 Buscar proveedores (nombre o RUC, con ranking)
 def autocomplete_supplier(request):
     term = request.GET.get("term", "")
-    suppliers = Supplier.objects.filter(name_supplier__icontains=term)[:10]
     results = [
-        {"id": s.ruc_supplier, "label": s.name_supplier, "ruc": s.ruc_supplier}
-        for s in suppliers
+        {"id": s["id"], "label": s["label"], "ruc": s["id"], "score": s["score"]}
+        for s in CatalogSearchService.search("suppliers", term, _limit(request))
     ]
     return JsonResponse(results, safe=False)
 
 
-# 🔹 Buscar productos
+# 🔹 Buscar productos (código, N° de parte, descripción o fabricante)
 def autocomplete_product(request):
     term = request.GET.get("term", "")
-    products = Product.objects.filter(description__icontains=term)[:10]
     results = [
         {
-            "id": p.id,
-            "label": p.description,
-            "part_number": p.part_number,
-            "manufacturer": p.manufacturer,
+            "id": p["id"],
+            "label": p["label"],
+            "part_number": p["part_number"],
+            "manufacturer": p["manufac"],
+            "score": p["score"],
+        }
+        for p in CatalogSearchService.search("products", term, _limit(request))
+    ]
+    return JsonResponse(results, safe=False)
+
+
+# 🔹 Buscar OCs por número
+def autocomplete_purchase_order(request):
+    term = request.GET.get("term", "")
+    results = [
+        {
+            "id": po["id"],
+            "label": po["label"],
+            "project": po["project_code_id"],
+            "issue_date": po["issue_date"],
+            "score": po["score"],
         }
-        for p in products
+        for po in CatalogSearchService.search("purchase_orders", term, _limit(request))
     ]
     return JsonResponse(results, safe=False)
@@ -0,0 +1,102 @@
+# projects/views/logis/po_grid_api.py
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
+from django.views.decorators.http import require_http_methods
+
+from projects.services.cache_payload import CachePayload
+from projects.services.cache_versioning import ProjectCacheVersion
+from projects.services.grid_export import GridExportService, LOGISTICS_COLUMNS
+from projects.services.po_grid import PurchaseOrderGridService, FACETS
+
+
+def _filter_key_parts(filters):
+    return [str(filters[k] or '') for k in sorted(filters) if k != 'proyecto_id']
+
+
+@require_http_methods(["GET"])
+def po_grid_api(request):
+    """
+    Grid de OCs en JSON con paginación por cursor:
+    ?cursor=&page_size=&order=desc|asc&include=totals,count + filtros de logística.
+    Los totales por moneda van en la primera página (o con include=totals).
+    """
+    try:
+        filters = PurchaseOrderGridService.filters_from_request(request.GET)
+        pos = PurchaseOrderGridService.filtered(filters)
+        cursor = request.GET.get('cursor') or None
+        page = PurchaseOrderGridService.page(
+            pos,
+            cursor=cursor,
+            page_size=int(request.GET.get('page_size') or 50),
+            descending=request.GET.get('order', 'desc') != 'asc',
+        )
+    except (ValidationError, ValueError) as e:
+        message = e.messages[0] if isinstance(e, ValidationError) else 'Parámetros inválidos'
+        return JsonResponse({'success': False, 'error': message}, status=400)
+
+    include = set(filter(None, request.GET.get('include', '').split(',')))
+    data = {'success': True, **page}
+
+    if cursor is None or 'totals' in include or 'count' in include:
+        # ✅ Totales y conteo por filtro (no por página): en caché hasta el próximo cambio
+        cache_key = ProjectCacheVersion.key('po_grid_totals', filters['proyecto_id'], *_filter_key_parts(filters))
+        summary = CachePayload.get(cache_key) or {}
+        if 'currency_totals' not in summary:
+            summary['currency_totals'] = {
+                cur: str(total) for cur, total in PurchaseOrderGridService.currency_totals(pos).items()
+            }
+        if 'count' in include and 'count' not in summary:
+            summary['count'] = pos.count()
+        CachePayload.set(cache_key, summary)
+        data['currency_totals'] = summary['currency_totals']
+        if 'count' in include:
+            data['count'] = summary['count']
+
+    return JsonResponse(data)
+
+
+@require_http_methods(["GET"])
+def po_grid_facet_api(request, facet):
+    """
+    Valores de un filtro del grid (suppliers, products, manufacturers, statuses, ...) bajo los filtros actuales.
+    Sin más filtro que el proyecto incluye `counts` (n° de OCs por valor) desde ProjectPOFacet.
+    """
+    if facet not in FACETS:
+        return JsonResponse({'success': False, 'error': f"Faceta desconocida: {facet}"}, status=404)
+    try:
+        filters = PurchaseOrderGridService.filters_from_request(request.GET)
+    except ValidationError as e:
+        return JsonResponse({'success': False, 'error': e.messages[0]}, status=400)
+
+    if PurchaseOrderGridService.uses_facet_index(filters):
+        # ✅ Solo proyecto: valores y n° de OCs ya agrupados en ProjectPOFacet, sin caché
+        pairs = PurchaseOrderGridService.facet(facet, None, filters=filters, with_counts=True)
+        return JsonResponse({
+            'success': True, 'facet': facet, 'source': 'index',
+            'values': [value for value, _ in pairs], 'counts': [count for _, count in pairs],
+        })
+
+    cache_key = ProjectCacheVersion.key('po_grid_facet', filters['proyecto_id'], facet, *_filter_key_parts(filters))
+    cached = CachePayload.get(cache_key)
+    if cached is None:
+        cached = {'values': PurchaseOrderGridService.facet(facet, PurchaseOrderGridService.filtered(filters))}
+        CachePayload.set(cache_key, cached)
+    return JsonResponse({'success': True, 'facet': facet, 'source': 'live', **cached})
+
+
+@require_http_methods(["GET"])
+def po_grid_export(request):
+    """Exporta las líneas de las OCs filtradas (mismos filtros que el grid) a ?format=xlsx|csv en streaming."""
+    try:
+        filters = PurchaseOrderGridService.filters_from_request(request.GET)
+    except ValidationError as e:
+        return JsonResponse({'success': False, 'error': e.messages[0]}, status=400)
+
+    name = f"ordenes_compra_{filters['proyecto_id']}" if filters['proyecto_id'] else 'ordenes_compra'
+    return GridExportService.response(
+        request.GET.get('format', 'xlsx'),
+        name,
+        LOGISTICS_COLUMNS,
+        GridExportService.logistics_rows(PurchaseOrderGridService.filtered(filters)),
+        sheet_title='Órdenes de compra',
+    )
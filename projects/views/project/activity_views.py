@@ -9,6 +9,7 @@ from django.views import View
 from projects.models import Projects, ProjectActivity
 from projects.services.earned_value.activity_calculator import ActivityCalculator
 from projects.services.earned_value.calculator import EarnedValueCalculator
+from projects.services.background_jobs import BackgroundJobService
 from decimal import Decimal
 
 def project_activities(request, project_id):
@@ -131,6 +132,12 @@ def delete_activity(request, activity_id):
 def recalculate_weights(request, project_id):
     """Vista para recalcular pesos de todas las actividades"""
     project = get_object_or_404(Projects, cod_projects_id=project_id)
+
+    # ✅ Modo asíncrono: encolar y volver de inmediato
+    if request.GET.get('async') == '1' or request.POST.get('async') == '1':
+        job = BackgroundJobService.enqueue('activity_weights', params={'project_ids': [project_id]}, user=request.user)
+        messages.info(request, f'Recálculo de pesos en segundo plano (trabajo #{job.pk})')
+        return redirect('activity_list', project_id=project_id)
     
     try:
         success = ActivityCalculator.calculate_activity_weights(project)
@@ -238,13 +245,13 @@ def pmi_physical_progress_api(request, project_id):
 
 def pmi_dashboard(request, project_id):
     """Dashboard PMI integrado con Earned Value Management"""
-    from projects.services.earned_value.calculator import EarnedValueCalculator
+    from projects.services.earned_value.snapshot_service import EVMSnapshotService
     from projects.services.earned_value.activity_calculator import ActivityCalculator
 
     project = get_object_or_404(Projects, cod_projects_id=project_id)
 
     # Obtener datos PMI
-    evm_data = EarnedValueCalculator.calculate_earned_value(project_id)
+    evm_data = EVMSnapshotService.get_earned_value(project_id, granularities=('month',))
     physical_detail = ActivityCalculator.get_physical_progress_detail(project_id)
 
     context = {
@@ -1,15 +1,14 @@
 from django.shortcuts import render, get_object_or_404 
 import json 
 from projects.models import Projects 
-from projects.services.earned_value.calculator import EarnedValueCalculator 
+from projects.services.earned_value.snapshot_service import EVMSnapshotService
  
 def curva_s_view(request, project_id): 
     """Vista SOLO para Curva S EVM""" 
     proyecto = get_object_or_404(Projects, cod_projects_id=project_id) 
  
     # SOLO CURVA S 
-    calculadora = EarnedValueCalculator() 
-    datos_curva = calculadora.calculate_earned_value(project_id) 
+    datos_curva = EVMSnapshotService.get_earned_value(project_id, granularities=('month',))
     bac_real = datos_curva['bac_calculated'] 
  
     context = { 
@@ -1,8 +1,10 @@
 from django.shortcuts import render, get_object_or_404
-from django.core.cache import cache
+from projects.services.cache_versioning import ProjectCacheVersion
+from projects.services.cache_payload import CachePayload
 import json
 from projects.models import Projects, Hoursrecord
 from projects.services.earned_value.calculator import EarnedValueCalculator
+from projects.services.earned_value.snapshot_service import EVMSnapshotService
 from projects.services.excel_reports.executive_reporter import ExecutiveReporter
 from projects.services.excel_reports.cost_reporter import CostReporter
 from projects.services.excel_reports.efficiency_reporter import EfficiencyReporter
@@ -13,7 +15,7 @@ def pmi_dashboard(request, project_id):
     project = get_object_or_404(Projects, cod_projects_id=project_id) 
     
     # Obtener datos PMI 
-    evm_data = EarnedValueCalculator.calculate_earned_value(project_id) 
+    evm_data = EVMSnapshotService.get_earned_value(project_id, granularities=('month',)) 
     physical_detail = EarnedValueCalculator.get_physical_progress_detail(project_id) 
     
     # Calcular métricas financieras básicas 
@@ -47,15 +49,11 @@ def calculate_financial_metrics(project):
         contract_amount = getattr(project.cod_projects, 'cost_aprox_chance', 0) 
         bac = getattr(project.cod_projects, 'total_costs', 0) 
         
-        # Datos de facturación (simplificado - luego se extiende) 
-        from projects.models import ClientInvoice 
-        invoices = ClientInvoice.objects.filter(project=project) 
-        total_invoiced = sum(invoice.amount for invoice in invoices) 
-        
-        # Datos de costos 
-        from projects.models import PurchaseOrder 
-        ocs = PurchaseOrder.objects.filter(project_code=project) 
-        total_spent = sum(oc.total_amount for oc in ocs if oc.total_amount) 
+        # ✅ Facturación y costos desde el resumen financiero precalculado (una fila)
+        from projects.models import ProjectFinancialRollup
+        rollup = ProjectFinancialRollup.for_project(project.cod_projects_id)
+        total_invoiced = rollup.total_invoiced
+        total_spent = rollup.total_spent
         
         return { 
             'contract_amount': float(contract_amount), 
@@ -104,34 +102,24 @@ def analyze_performance(evm_data, financial_metrics):
 
 def dashboard_view(request, project_id):
     """Vista principal del Dashboard Ejecutivo - OPTIMIZADA"""
-    # ✅ OPTIMIZACIÓN: Cache para datos costosos
-    cache_key = f'dashboard_data_{project_id}'
-    cached_data = cache.get(cache_key)
+    # ✅ OPTIMIZACIÓN: Cache versionado por proyecto (se invalida al escribir datos del proyecto)
+    # El payload es compacto (solo primitivos/JSON): un hit no toca la BD
+    cache_key = ProjectCacheVersion.key('dashboard_data', project_id)
+    cached_data = CachePayload.get(cache_key)
+    
+    # Dropdown de proyectos: fuera del caché del proyecto (cambia con otros proyectos)
+    todos_proyectos = CachePayload.project_options()
     
     if cached_data:
-        return render(request, 'dashboard/index.html', cached_data)
-    
-    # 1. ✅ OPTIMIZACIÓN: Una sola consulta con todas las relaciones
-    proyecto = Projects.objects.select_related(
-        'cod_projects',
-        'cod_projects__info_costumer',
-        'respon_projects'
-    ).prefetch_related(
-        'purchaseorder_set__podetailproduct_set__product',
-        'purchaseorder_set__podetailsupplier_set__supplier',
-        'client_invoices',  # ✅ CORREGIDO: Usar el related_name correcto
-        'progress_records',  # ✅ CORREGIDO: Usar el related_name correcto
-        'horas'
-    ).get(cod_projects_id=project_id)
-    
-    # 2. ✅ OPTIMIZACIÓN: Consulta optimizada para dropdown
-    todos_proyectos = Projects.objects.only(
-        'cod_projects_id', 'cost_center', 'state_projects'
-    ).all()
+        return render(request, 'dashboard/index.html', {**cached_data, 'todos_proyectos': todos_proyectos})
+    
+    # 1. ✅ OPTIMIZACIÓN: Solo lo que usa la plantilla (Chance para el nombre)
+    related = ['cod_projects', 'cod_projects__presale'] if CachePayload.has_presale() else ['cod_projects']
+    proyecto = Projects.objects.select_related(*related).get(cod_projects_id=project_id)
     
     # 3. DATOS CURVA S DESDE SERVICIO (mantener servicios especializados)
-    calculadora = EarnedValueCalculator()
-    datos_curva = calculadora.calculate_earned_value(project_id)
+    # Solo la serie mensual: semanas/días se piden a la API al seleccionarlos
+    datos_curva = EVMSnapshotService.get_earned_value(project_id, granularities=('month',))
     
     # 4. DATOS EJECUTIVOS DESDE NUEVO SERVICIO
     executive_reporter = ExecutiveReporter()
@@ -158,17 +146,23 @@ def dashboard_view(request, project_id):
     # ✅ OPTIMIZACIÓN: Horas del proyecto usando datos ya cargados
     horas_records = [
         {
-            'date': str(h.date),
-            'hours': float(h.hours or 0),
-            'respon': h.respon,
-            'acti': h.acti,
-        } for h in proyecto.horas.all()
+            'date': str(h['date']),
+            'hours': float(h['hours'] or 0),
+            'respon': h['respon'],
+            'acti': h['acti'],
+        } for h in proyecto.horas.values('date', 'hours', 'respon', 'acti')
     ]
 
-    # ✅ OPTIMIZACIÓN: Preparar contexto
+    # ✅ OPTIMIZACIÓN: Preparar contexto (solo datos primitivos, cacheable)
     context = {
-        'proyecto': proyecto,
-        'todos_proyectos': todos_proyectos,
+        'proyecto': {
+            'cod_projects_id': proyecto.cod_projects_id,
+            'cost_center': proyecto.cost_center,
+            'cod_projects': CachePayload.chance_names(
+                proyecto.cod_projects.dres_chance,
+                getattr(getattr(proyecto.cod_projects, 'presale', None), 'job_name', None),
+            ),
+        },
         
         # Datos para graficos Curva S
         'meses': json.dumps(datos_curva['curve_data']['months']),
@@ -179,16 +173,6 @@ def dashboard_view(request, project_id):
         'bac': bac_js,
         'bac_display': bac_display,
         
-        # Granularidad (semanas y días)
-        'semanas_labels': json.dumps(datos_curva.get('curve_data_weekly', {}).get('labels', [])),
-        'semanas_pv': json.dumps(datos_curva.get('curve_data_weekly', {}).get('pv', [])),
-        'semanas_ev': json.dumps(datos_curva.get('curve_data_weekly', {}).get('ev', [])),
-        'semanas_ac': json.dumps(datos_curva.get('curve_data_weekly', {}).get('ac', [])),
-        'dias_labels': json.dumps(datos_curva.get('curve_data_daily', {}).get('labels', [])),
-        'dias_pv': json.dumps(datos_curva.get('curve_data_daily', {}).get('pv', [])),
-        'dias_ev': json.dumps(datos_curva.get('curve_data_daily', {}).get('ev', [])),
-        'dias_ac': json.dumps(datos_curva.get('curve_data_daily', {}).get('ac', [])),
-        
         # Metricas EVM
         'cpi': datos_curva['metrics']['cpi'],
         'spi': datos_curva['metrics']['spi'],
@@ -218,7 +202,7 @@ def dashboard_view(request, project_id):
         'horas_data': json.dumps(horas_records),
     }
     
-    # ✅ OPTIMIZACIÓN: Cache del resultado por 10 minutos
-    cache.set(cache_key, context, 600)
+    # ✅ OPTIMIZACIÓN: Cache del resultado hasta el próximo cambio del proyecto
+    CachePayload.set(cache_key, context)
     
-    return render(request, 'dashboard/index.html', context)
+    return render(request, 'dashboard/index.html', {**context, 'todos_proyectos': todos_proyectos})
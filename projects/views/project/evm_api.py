@@ -0,0 +1,145 @@
+import hashlib
+from datetime import date
+
+from django.http import JsonResponse, HttpResponse
+from django.utils.dateparse import parse_date
+from django.utils.http import http_date, quote_etag, parse_http_date_safe
+from django.views.decorators.http import require_http_methods
+
+from projects.models import Projects, ProjectEVMSnapshot
+from projects.services.earned_value.snapshot_service import EVMSnapshotService
+
+# granularidad de la API -> (clave en el resultado EVM, días por intervalo)
+GRANULARITIES = {
+    'month': ('curve_data', 30),
+    'week': ('curve_data_weekly', 7),
+    'day': ('curve_data_daily', 1),
+}
+
+
+def _window_index(value, granularity, start_date):
+    """
+    Convierte `from`/`to` a índice 1-based de la serie.
+    Acepta un índice entero o una fecha ISO (relativa al inicio del proyecto).
+    """
+    if value in (None, ''):
+        return None
+    if value.isdigit():
+        return int(value)
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(f"Parámetro de fecha inválido: {value}")
+    if not start_date:
+        raise ValueError("El proyecto no tiene fecha de inicio; use índices en from/to")
+    if granularity == 'month':
+        return (parsed.year - start_date.year) * 12 + (parsed.month - start_date.month) + 1
+    days = (parsed - start_date).days
+    return days // GRANULARITIES[granularity][1] + 1
+
+
+def _snapshot_state(project_id, granularity):
+    """computed_at del snapshot vigente; None si falta, está obsoleto o es de un mes anterior."""
+    row = ProjectEVMSnapshot.objects.filter(
+        project_id=project_id, granularity=granularity
+    ).values('computed_at', 'is_stale').first()
+    if not row or row['is_stale'] or row['computed_at'] < ProjectEVMSnapshot.period_start():
+        return None
+    return row['computed_at']
+
+
+def _etag(project_id, updated_at, computed_at, *params):
+    """
+    ETag de la respuesta, solo con estado de la base de datos (igual en todos
+    los procesos): última edición del proyecto + cálculo del snapshot + parámetros.
+    """
+    raw = '|'.join(str(p) for p in (project_id, updated_at, computed_at) + params)
+    return quote_etag(hashlib.md5(raw.encode('utf-8')).hexdigest())
+
+
+@require_http_methods(["GET"])
+def evm_series_api(request, project_id):
+    """
+    API JSON de la Curva S: /api/projects/<id>/evm?granularity=day|week|month&from=&to=
+    Devuelve solo la granularidad pedida (y la ventana from/to, por índice o fecha ISO).
+    Soporta ETag/Last-Modified: solo hay 304 con el snapshot vigente, y cualquier
+    escritura de sus datos fuente lo marca obsoleto (mark_stale); al recalcularse
+    cambia computed_at y con él el ETag, así que un 304 nunca es obsoleto.
+    """
+    granularity = request.GET.get('granularity', 'month')
+    if granularity not in GRANULARITIES:
+        return JsonResponse({
+            'success': False,
+            'error': f"granularity debe ser uno de: {', '.join(GRANULARITIES)}"
+        }, status=400)
+
+    project = Projects.objects.filter(cod_projects_id=project_id).only('cod_projects_id', 'start_date', 'updated_at').first()
+    if project is None:
+        return JsonResponse({'success': False, 'error': 'Proyecto no encontrado'}, status=404)
+
+    try:
+        index_from = _window_index(request.GET.get('from'), granularity, project.start_date)
+        index_to = _window_index(request.GET.get('to'), granularity, project.start_date)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    # ✅ Validadores condicionales (sin calcular la serie)
+    computed_at = _snapshot_state(project_id, granularity)
+    etag = _etag(project_id, project.updated_at, computed_at, granularity, index_from, index_to)
+
+    if computed_at is not None:
+        if_none_match = request.headers.get('If-None-Match')
+        if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since') or '')
+        if if_none_match:
+            not_modified = etag in [t.strip() for t in if_none_match.split(',')] or if_none_match.strip() == '*'
+        else:
+            not_modified = if_modified_since is not None and int(computed_at.timestamp()) <= if_modified_since
+        if not_modified:
+            response = HttpResponse(status=304)
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(computed_at.timestamp())
+            return response
+
+    try:
+        evm_data = EVMSnapshotService.get_earned_value(project_id, granularities=(granularity,))
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+    curve_key, interval_days = GRANULARITIES[granularity]
+    curve = evm_data.get(curve_key, {})
+    labels = curve.get('months') if granularity == 'month' else curve.get('labels')
+    labels = labels or []
+
+    # Ventana [from, to] sobre índices 1-based
+    total = len(labels)
+    lo = max(1, index_from or 1)
+    hi = min(total, index_to or total)
+    window = slice(lo - 1, hi) if lo <= hi else slice(0, 0)
+
+    payload = {
+        'success': True,
+        'project_id': project_id,
+        'granularity': granularity,
+        'interval_days': interval_days,
+        'start_date': project.start_date.isoformat() if isinstance(project.start_date, date) else None,
+        'total_points': total,
+        'from': lo if lo <= hi else None,
+        'to': hi if lo <= hi else None,
+        'labels': labels[window],
+        'pv': curve.get('pv', [])[window],
+        'ev': curve.get('ev', [])[window],
+        'ac': curve.get('ac', [])[window],
+        'metrics': evm_data.get('metrics', {}),
+        'bac': evm_data.get('bac_calculated'),
+        'physical_progress': evm_data.get('physical_progress'),
+    }
+    if granularity == 'month':
+        payload['ac_paid'] = curve.get('ac_paid', [])[window]
+
+    response = JsonResponse(payload)
+    # Tras calcular, el snapshot queda vigente: validadores definitivos
+    computed_at = _snapshot_state(project_id, granularity) or computed_at
+    response['ETag'] = _etag(project_id, project.updated_at, computed_at, granularity, index_from, index_to)
+    if computed_at is not None:
+        response['Last-Modified'] = http_date(computed_at.timestamp())
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -2,7 +2,7 @@ from django.shortcuts import render, get_object_or_404
 import json 
 from projects.models import Projects 
 from projects.services.excel_reports.executive_reporter import ExecutiveReporter 
-from projects.services.earned_value.calculator import EarnedValueCalculator
+from projects.services.earned_value.snapshot_service import EVMSnapshotService
  
 def excel_executive_view(request, project_id): 
     """Vista SOLO para Excel Ejecutivo""" 
@@ -13,8 +13,7 @@ def excel_executive_view(request, project_id):
     executive_data = executive_reporter.generate_executive_data(project_id) 
 
     # Obtener BAC real desde Curva S para consistencia
-    calculadora = EarnedValueCalculator()
-    evm_data = calculadora.calculate_earned_value(project_id)
+    evm_data = EVMSnapshotService.get_earned_value(project_id, granularities=('month',))
     bac_real = evm_data['bac_calculated']
     # BAC planeado desde presupuesto de costos
     bac_planeado = executive_data.get('bac_presupuestado', bac_real) 
@@ -20,16 +20,25 @@ def separar_excel_jerarquia(archivo_excel):
     """
     print(f"📊 Leyendo Excel: {archivo_excel}")
     
-    # Leer Excel
+    # Leer Excel UNA sola vez (sin encabezado); la fila de encabezados se elige
+    # sobre las filas ya leídas en lugar de volver a parsear el libro
     try:
-        df = pd.read_excel(archivo_excel)
-        print(f"✅ Excel leído: {len(df)} filas encontradas")
+        raw = pd.read_excel(archivo_excel, header=None, engine='openpyxl')
+        print(f"✅ Excel leído: {max(len(raw) - 1, 0)} filas encontradas")
     except Exception as e:
         print(f"❌ Error leyendo Excel: {e}")
         return
-    
-    # Limpiar nombres de columnas (eliminar espacios y convertir a minúsculas)
-    df.columns = df.columns.astype(str).str.strip().str.lower()
+
+    def con_encabezado(idx):
+        data = raw.iloc[idx + 1:].reset_index(drop=True).infer_objects()
+        columnas = []
+        for pos, col in enumerate(raw.iloc[idx].tolist()):
+            nombre = str(col).strip().lower() if pd.notna(col) else f'unnamed: {pos}'
+            columnas.append(nombre)
+        data.columns = columnas
+        return data
+
+    df = con_encabezado(0) if len(raw) else raw
 
     # Si la mayoría de columnas son 'unnamed', intentar detectar automáticamente la fila de encabezados
     try:
@@ -37,7 +46,6 @@ def separar_excel_jerarquia(archivo_excel):
         unnamed_count = sum([str(col).startswith('unnamed') for col in df.columns])
         if total_cols > 0 and unnamed_count / total_cols > 0.5:
             print("🔎 Encabezados no detectados correctamente. Intentando auto-detección de fila de encabezados...")
-            df_no_header = pd.read_excel(archivo_excel, header=None)
 
             # Buscar fila candidata a encabezado en las primeras 10 filas
             expected_markers = {
@@ -54,9 +62,9 @@ def separar_excel_jerarquia(archivo_excel):
 
             best_idx = None
             best_score = 0
-            max_rows_to_check = min(10, len(df_no_header))
+            max_rows_to_check = min(10, len(raw))
             for idx in range(max_rows_to_check):
-                row_vals = df_no_header.iloc[idx].astype(str).str.strip().str.lower().tolist()
+                row_vals = raw.iloc[idx].astype(str).str.strip().str.lower().tolist()
                 score = sum(1 for v in row_vals if v in expected_markers)
                 if score > best_score:
                     best_score = score
@@ -64,8 +72,7 @@ def separar_excel_jerarquia(archivo_excel):
 
             # Si encontramos una fila con al menos 2 coincidencias, la usamos como encabezado
             if best_idx is not None and best_score >= 2:
-                df = pd.read_excel(archivo_excel, header=best_idx)
-                df.columns = df.columns.astype(str).str.strip().str.lower()
+                df = con_encabezado(best_idx)
                 print(f"✅ Encabezado detectado en fila {best_idx+1} con {best_score} coincidencias.")
             else:
                 print("⚠️ No se pudo detectar fila de encabezados automáticamente. Usando encabezado por defecto.")
@@ -226,8 +226,46 @@ function initializeCurvaSChart() {
     }
 }
 
+// Series semanales/diarias: se piden a la API solo cuando se seleccionan
+var CURVA_S_API_GRANULARITY = { semanas: 'week', dias: 'day' };
+
+function loadCurvaSGranularity(gran) {
+    var d = window.dashboardData || {};
+    var apiGran = CURVA_S_API_GRANULARITY[gran];
+    if (!apiGran || !d.evmApiUrl || (d[gran + '_labels'] && d[gran + '_labels'].length)) {
+        return Promise.resolve();
+    }
+    // El navegador revalida con ETag/Last-Modified (respuesta 304 si no cambió)
+    return fetch(d.evmApiUrl + '?granularity=' + apiGran, { credentials: 'same-origin' })
+        .then(function(resp) {
+            if (!resp.ok) throw new Error('HTTP ' + resp.status);
+            return resp.json();
+        })
+        .then(function(data) {
+            d[gran + '_labels'] = data.labels || [];
+            d[gran + '_pv'] = data.pv || [];
+            d[gran + '_ev'] = data.ev || [];
+            d[gran + '_ac'] = data.ac || [];
+        });
+}
+
 // Cambiar granularidad de Curva S
 function setCurvaSGranularity(gran) {
+    if (CURVA_S_API_GRANULARITY[gran]) {
+        loadCurvaSGranularity(gran)
+            .then(function() { renderCurvaSGranularity(gran); })
+            .catch(function(e) {
+                console.error('Error cargando serie ' + gran + ':', e);
+                var selector = document.getElementById('granularitySelector');
+                if (selector) selector.value = 'meses';
+                renderCurvaSGranularity('meses');
+            });
+        return;
+    }
+    renderCurvaSGranularity(gran);
+}
+
+function renderCurvaSGranularity(gran) {
     try {
         var d = window.dashboardData;
         var chart = window.curvaSChart;